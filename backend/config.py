@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     # Ollama (Docker service name)
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://ollama:11434")
     OLLAMA_MODEL: str = "llama3.2:3b"
+    OLLAMA_CONCURRENCY: int = int(os.getenv("OLLAMA_CONCURRENCY", "4"))   # 同時リクエスト上限
+    OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", "60"))      # 1リクエストのタイムアウト（秒）
+    OLLAMA_MAX_RETRIES: int = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
     
     # e-Stat API
     ESTAT_APP_ID: str = os.getenv("ESTAT_APP_ID", "")
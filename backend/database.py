@@ -1,6 +1,7 @@
 import os
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "zoom_admin")
@@ -16,9 +17,42 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "zoom_dx_db")
 # URL-encode password to handle special characters
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{quote_plus(POSTGRES_PASSWORD)}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# コネクションプール設定（プロセス内で全ルーターが共有）
+# 上限 = DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW。uvicornワーカー数 × 上限が
+# Postgres の max_connections を超えないように設定すること。
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))          # 空き待ち（秒）
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # 再接続周期（秒）
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 非同期アクセス用エンジン（asyncpg）
+# /api/v1/map/*・/api/scores/*・/api/municipalities/* はこちらを使い、
+# クエリ待ちの間もイベントループを塞がない。プール設定は同期側と同じ値を使う。
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, class_=AsyncSession)
+
 Base = declarative_base()
 
 def get_db():
@@ -27,3 +61,42 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """非同期セッションを生成するジェネレーター（FastAPI Depends用）"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def get_db_conn():
+    """
+    プールからpsycopg2コネクションを借りるジェネレーター（FastAPI Depends用）
+
+    SQLAlchemyエンジンと同じプールを共有する。close() で接続はプールへ返却され、
+    未コミットのトランザクションはロールバックされる。
+    """
+    conn = engine.raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _pool_stats(pool) -> dict:
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_connections": DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW,
+    }
+
+
+def get_pool_metrics() -> dict:
+    """コネクションプールの利用状況（同期・非同期）"""
+    return {
+        "sync": _pool_stats(engine.pool),
+        "async": _pool_stats(async_engine.pool),
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+    }
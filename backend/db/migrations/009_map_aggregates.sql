@@ -0,0 +1,43 @@
+-- マイグレーション: 地図ドリルダウン用の集計マテリアライズドビュー
+-- 日付: 2026-10-17
+-- 目的: /api/v1/map/regions・/api/v1/map/prefectures を毎リクエストの
+--       municipalities LEFT JOIN dx_scores_improved 集計から解放する
+--       （スコア保存後に ImprovedScoreCalculator が REFRESH する）
+
+-- 前提テーブル（score_calculator.py と同じ定義）
+CREATE TABLE IF NOT EXISTS dx_scores_improved (
+    city_code VARCHAR(6) PRIMARY KEY REFERENCES municipalities(city_code),
+    total_score NUMERIC(5,1) NOT NULL,
+    cat_citizen_services NUMERIC(4,1),
+    cat_promotion_system NUMERIC(4,1),
+    cat_business_dx NUMERIC(4,1),
+    cat_education_dx NUMERIC(4,1),
+    cat_information NUMERIC(4,1),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 都道府県別集計（地方別集計はAPI側でこのビューから算出）
+CREATE MATERIALIZED VIEW IF NOT EXISTS map_prefecture_aggregates AS
+SELECT
+    m.prefecture,
+    ROUND(AVG(s.total_score), 1) as avg_score,
+    ROUND(AVG(s.cat_citizen_services), 1) as avg_citizen,
+    ROUND(AVG(s.cat_promotion_system), 1) as avg_promotion,
+    ROUND(AVG(s.cat_business_dx), 1) as avg_business,
+    ROUND(AVG(s.cat_education_dx), 1) as avg_education,
+    ROUND(AVG(s.cat_information), 1) as avg_information,
+    COUNT(*) as municipality_count,
+    SUM(m.population) as total_population,
+    NOW() as refreshed_at
+FROM municipalities m
+LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
+WHERE m.prefecture IS NOT NULL
+GROUP BY m.prefecture;
+
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY に必要な一意インデックス
+CREATE UNIQUE INDEX IF NOT EXISTS idx_map_prefecture_aggregates_pref
+    ON map_prefecture_aggregates(prefecture);
+
+COMMENT ON MATERIALIZED VIEW map_prefecture_aggregates IS '地図ドリルダウン用の都道府県別スコア集計（スコア保存後にREFRESH）';
+
+SELECT 'Migration 009: map_prefecture_aggregates created successfully' AS status;
@@ -0,0 +1,32 @@
+-- マイグレーション: 改善版DXスコアの順位インデックス
+-- 日付: 2026-10-17
+-- 目的: 自治体詳細の全国順位を COUNT(*) の全件走査ではなく主キー参照で返す
+--       （スコア保存後に services/score_ranks.refresh_score_ranks() が再構築）
+
+CREATE TABLE IF NOT EXISTS dx_score_ranks (
+    city_code VARCHAR(6) PRIMARY KEY REFERENCES municipalities(city_code) ON DELETE CASCADE,
+    total_score NUMERIC(5,1) NOT NULL,
+
+    -- 全国
+    national_rank INTEGER NOT NULL,
+    national_total INTEGER NOT NULL,
+    national_percentile NUMERIC(4,1),
+
+    -- 都道府県内
+    prefecture_rank INTEGER,
+    prefecture_total INTEGER,
+    prefecture_percentile NUMERIC(4,1),
+
+    -- 人口規模帯内
+    population_band VARCHAR(20),
+    band_rank INTEGER,
+    band_total INTEGER,
+    band_percentile NUMERIC(4,1),
+
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE dx_score_ranks IS '改善版DXスコアの全国・都道府県・人口規模帯別順位（スコア保存時に再構築）';
+COMMENT ON COLUMN dx_score_ranks.national_percentile IS 'パーセンタイル（100=最上位、0=最下位）';
+
+SELECT 'Migration 010: dx_score_ranks created successfully' AS status;
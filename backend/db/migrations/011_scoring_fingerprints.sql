@@ -0,0 +1,16 @@
+-- マイグレーション: 夜間スコアリングの差分実行用フィンガープリント
+-- 日付: 2026-10-17
+-- 目的: 自治体ごとに前回スコアリング時の入力ハッシュを保持し、
+--       入力（dx_status・統計列・ニュース・施政方針テキスト）が変わった自治体だけ再計算する
+
+CREATE TABLE IF NOT EXISTS scoring_input_fingerprints (
+    city_code VARCHAR(6) PRIMARY KEY REFERENCES municipalities(city_code) ON DELETE CASCADE,
+    input_hash VARCHAR(64) NOT NULL,      -- DB入力（dx_status・統計列・地域集計・ニュース）
+    text_hash VARCHAR(64),                -- 施政方針テキスト（NULL = テキスト分析未実施）
+    analysis_result JSONB,                -- テキスト分析結果（テキスト不変時に再利用）
+    scored_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE scoring_input_fingerprints IS '夜間スコアリングの差分判定用（scripts/nightly_scoring*.py が更新）';
+
+SELECT 'Migration 011: scoring_input_fingerprints created successfully' AS status;
@@ -0,0 +1,28 @@
+-- マイグレーション: 地方・都道府県別のDX導入率集計
+-- 日付: 2026-10-17
+-- 目的: Decision Readiness のピアプレッシャーを自治体ごとの COUNT(*) FILTER ではなく
+--       集計表の参照で求める（バッチ実行ごとに services/adoption_aggregates.py が再構築）
+
+CREATE TABLE IF NOT EXISTS dx_adoption_aggregates (
+    scope VARCHAR(12) NOT NULL,           -- 'region' / 'prefecture'
+    name VARCHAR(50) NOT NULL,            -- 地方名 / 都道府県名
+    total INTEGER NOT NULL,               -- dx_status のある自治体数
+    with_dept INTEGER NOT NULL,           -- DX推進部署あり
+    with_cio INTEGER NOT NULL,            -- CIOあり
+    with_ext_cio INTEGER NOT NULL,        -- 外部CIOあり
+    with_strategy INTEGER NOT NULL,       -- DX戦略あり
+    refreshed_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (scope, name)
+);
+
+COMMENT ON TABLE dx_adoption_aggregates IS '地方・都道府県別のDX導入状況集計（スコアリングバッチごとに再構築）';
+
+-- 集計で使う JSONB キーの式インデックス
+CREATE INDEX IF NOT EXISTS idx_municipalities_region_dx_dept
+    ON municipalities (region, (dx_status->>'dept')) WHERE dx_status IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_municipalities_prefecture_dx_dept
+    ON municipalities (prefecture, (dx_status->>'dept')) WHERE dx_status IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_municipalities_dx_cio
+    ON municipalities ((dx_status->>'cio'), (dx_status->>'ext_cio')) WHERE dx_status IS NOT NULL;
+
+SELECT 'Migration 012: dx_adoption_aggregates created successfully' AS status;
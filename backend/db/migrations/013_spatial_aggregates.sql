@@ -0,0 +1,60 @@
+-- マイグレーション: メッシュ・自治体単位の法人／建物集計
+-- 日付: 2026-10-17
+-- 目的: 事業所密度・認定法人数・建物の高さ／築年の分布を companies / buildings の
+--       全行走査ではなく集計表の参照で求める
+--       （取り込み処理が更新したメッシュ分だけ services/spatial_aggregates.py が再集計）
+
+-- 高さ帯: 10m未満 / 10-31m / 31-60m（旧絶対高さ制限31m超）/ 60m以上（超高層）
+-- 築年帯: 1981年未満（旧耐震）/ 1981-2000年 / 2001年以降（2000年基準）
+CREATE TABLE IF NOT EXISTS mesh_aggregates (
+    mesh_code VARCHAR(10) PRIMARY KEY,
+    city_code VARCHAR(6),                       -- meshes.municipality_code
+    company_count INTEGER NOT NULL DEFAULT 0,
+    certified_company_count INTEGER NOT NULL DEFAULT 0,  -- cert_flags に true が1つ以上
+    cert_counts JSONB NOT NULL DEFAULT '{}',    -- {"dx_cert": 3, "health_mgmt": 1}
+    building_count INTEGER NOT NULL DEFAULT 0,
+    height_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    height_count INTEGER NOT NULL DEFAULT 0,    -- 高さが判明している建物数
+    height_lt10 INTEGER NOT NULL DEFAULT 0,
+    height_10_31 INTEGER NOT NULL DEFAULT 0,
+    height_31_60 INTEGER NOT NULL DEFAULT 0,
+    height_ge60 INTEGER NOT NULL DEFAULT 0,
+    built_pre1981 INTEGER NOT NULL DEFAULT 0,
+    built_1981_2000 INTEGER NOT NULL DEFAULT 0,
+    built_post2000 INTEGER NOT NULL DEFAULT 0,
+    built_unknown INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mesh_aggregates_city ON mesh_aggregates (city_code);
+
+-- 自治体単位（mesh_aggregates の合計）
+CREATE TABLE IF NOT EXISTS municipality_spatial_aggregates (
+    city_code VARCHAR(6) PRIMARY KEY,
+    mesh_count INTEGER NOT NULL DEFAULT 0,      -- 法人・建物が1件以上ある3次メッシュ数
+    company_count INTEGER NOT NULL DEFAULT 0,
+    certified_company_count INTEGER NOT NULL DEFAULT 0,
+    cert_counts JSONB NOT NULL DEFAULT '{}',
+    building_count INTEGER NOT NULL DEFAULT 0,
+    height_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    height_count INTEGER NOT NULL DEFAULT 0,
+    height_lt10 INTEGER NOT NULL DEFAULT 0,
+    height_10_31 INTEGER NOT NULL DEFAULT 0,
+    height_31_60 INTEGER NOT NULL DEFAULT 0,
+    height_ge60 INTEGER NOT NULL DEFAULT 0,
+    built_pre1981 INTEGER NOT NULL DEFAULT 0,
+    built_1981_2000 INTEGER NOT NULL DEFAULT 0,
+    built_post2000 INTEGER NOT NULL DEFAULT 0,
+    built_unknown INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE mesh_aggregates IS '3次メッシュ別の法人・建物集計（取り込み時に差分更新）';
+COMMENT ON TABLE municipality_spatial_aggregates IS '自治体別の法人・建物集計（mesh_aggregates の合計）';
+
+-- 再集計時にメッシュ単位で引くための索引（ORM の index=True が無い環境向け）
+CREATE INDEX IF NOT EXISTS idx_companies_mesh_code ON companies (mesh_code);
+CREATE INDEX IF NOT EXISTS idx_buildings_mesh_code ON buildings (mesh_code);
+CREATE INDEX IF NOT EXISTS idx_meshes_municipality_code ON meshes (municipality_code);
+
+SELECT 'Migration 013: spatial aggregates created successfully' AS status;
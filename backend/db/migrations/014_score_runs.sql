@@ -0,0 +1,54 @@
+-- マイグレーション: スコア算出ランのバージョン管理
+-- 日付: 2026-10-17
+-- 目的: バッチごとのスコアを不変の「ラン」として保存し、公開中のランをポインタで切り替える
+--       （services/score_runs.py。旧ランは差分確認・ロールバック用に保持し、保持数を超えたら削除）
+
+CREATE TABLE IF NOT EXISTS score_runs (
+    run_id SERIAL PRIMARY KEY,
+    kind VARCHAR(30) NOT NULL,            -- 'dx_improved' / 'decision_readiness'
+    row_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    published_at TIMESTAMP                -- 公開（ポインタ切り替え）時刻
+);
+
+CREATE INDEX IF NOT EXISTS idx_score_runs_kind ON score_runs(kind, run_id DESC);
+
+-- 種別ごとの公開中ラン（1行を UPDATE するだけで切り替わる）
+CREATE TABLE IF NOT EXISTS score_run_pointer (
+    kind VARCHAR(30) PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES score_runs(run_id),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 改善版DXスコア（dx_scores_improved の各ラン時点の全件）
+CREATE TABLE IF NOT EXISTS dx_score_snapshots (
+    run_id INTEGER NOT NULL REFERENCES score_runs(run_id) ON DELETE CASCADE,
+    city_code VARCHAR(6) NOT NULL,
+    total_score NUMERIC(5,1) NOT NULL,
+    cat_citizen_services NUMERIC(4,1),
+    cat_promotion_system NUMERIC(4,1),
+    cat_business_dx NUMERIC(4,1),
+    cat_education_dx NUMERIC(4,1),
+    cat_information NUMERIC(4,1),
+    PRIMARY KEY (run_id, city_code)
+);
+
+-- Decision Readiness Score（各ラン時点の自治体ごと最新スコア）
+CREATE TABLE IF NOT EXISTS readiness_score_snapshots (
+    run_id INTEGER NOT NULL REFERENCES score_runs(run_id) ON DELETE CASCADE,
+    city_code VARCHAR(6) NOT NULL,
+    scored_at TIMESTAMP,
+    total_score INTEGER,
+    structural_pressure INTEGER,
+    leadership_commitment INTEGER,
+    peer_pressure INTEGER,
+    feasibility INTEGER,
+    accountability INTEGER,
+    confidence_level VARCHAR(10),
+    PRIMARY KEY (run_id, city_code)
+);
+
+COMMENT ON TABLE score_runs IS 'スコア算出バッチのラン（スナップショットは不変、保持数を超えた旧ランは削除）';
+COMMENT ON TABLE score_run_pointer IS '種別ごとに公開中のラン（APIキャッシュのキー・ロールバックはこの1行の切り替え）';
+
+SELECT 'Migration 014: score_runs created successfully' AS status;
@@ -0,0 +1,26 @@
+-- マイグレーション: スコアラン間の差分（変動自治体フィード）
+-- 日付: 2026-10-17
+-- 目的: ラン公開時に直前の公開ランとの差分（総合・柱ごと・閾値の通過）を保存し、
+--       /api/v1/map/movers で全件を取り直さずに変動を確認できるようにする
+--       （services/score_deltas.py。014_score_runs.sql が前提）
+
+CREATE TABLE IF NOT EXISTS score_run_deltas (
+    run_id INTEGER NOT NULL REFERENCES score_runs(run_id) ON DELETE CASCADE,
+    base_run_id INTEGER,                  -- 比較元（削除済みの場合もあるため外部キーなし）
+    city_code VARCHAR(6) NOT NULL,
+    total_before NUMERIC(5,1),            -- NULL = 比較元に無い（新規）
+    total_after NUMERIC(5,1) NOT NULL,
+    total_delta NUMERIC(5,1),
+    pillar_deltas JSONB NOT NULL DEFAULT '{}'::jsonb,   -- {柱: 差分}（変化した柱のみ）
+    crossed JSONB NOT NULL DEFAULT '[]'::jsonb,         -- [{"threshold": 42, "direction": "up"}]
+    PRIMARY KEY (run_id, city_code)
+);
+
+-- 差分の比較元（直前の公開ラン）
+ALTER TABLE score_runs ADD COLUMN IF NOT EXISTS base_run_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_score_run_deltas_delta ON score_run_deltas(run_id, total_delta);
+
+COMMENT ON TABLE score_run_deltas IS 'スコアラン公開時の直前ランとの差分（変化した自治体のみ）';
+
+SELECT 'Migration 015: score_run_deltas created successfully' AS status;
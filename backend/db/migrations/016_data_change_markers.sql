@@ -0,0 +1,41 @@
+-- マイグレーション: API 応答の元テーブルの変更マーカー
+-- 日付: 2026-10-17
+-- 目的: 条件付きGET のデータバージョン（services/conditional_response.py）が
+--       municipalities（enrich_dx_status* / enrich_census / import_estat_data が更新）や
+--       municipality_news の更新・削除も検知できるよう、テーブルごとの最終変更日時を残す
+--       （MAX(id) では追加しか分からない）
+
+CREATE TABLE IF NOT EXISTS data_change_markers (
+    table_name TEXT PRIMARY KEY,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+-- 文単位のトリガーなので、一括 UPDATE / COPY でも1文につき1回だけ書く
+CREATE OR REPLACE FUNCTION touch_data_change_marker() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_change_markers (table_name, changed_at)
+    VALUES (TG_TABLE_NAME, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE SET changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['municipalities', 'municipality_news',
+                             'municipality_patterns', 'education_info'] LOOP
+        IF to_regclass(t) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_data_change_marker ON %I', t);
+            EXECUTE format('CREATE TRIGGER trg_data_change_marker
+                            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                            FOR EACH STATEMENT EXECUTE FUNCTION touch_data_change_marker()', t);
+            INSERT INTO data_change_markers (table_name) VALUES (t) ON CONFLICT DO NOTHING;
+        END IF;
+    END LOOP;
+END $$;
+
+COMMENT ON TABLE data_change_markers IS 'API 応答の元テーブルの最終変更日時（条件付きGET のデータバージョン用）';
+
+SELECT 'Migration 016: data_change_markers created successfully' AS status;
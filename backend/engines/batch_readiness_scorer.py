@@ -0,0 +1,167 @@
+"""
+Batch engine for DecisionReadinessScorerV3.
+
+Regional/prefectural adoption counts are rebuilt once per run into
+dx_adoption_aggregates, and neighbor adoption comes from the k-NN graph
+(services/neighbor_graph.py). Local business context (companies, certified
+companies, meshes) is read once per run from municipality_spatial_aggregates
+(services/spatial_aggregates.py). Instead of 4-5 queries per city, pillar inputs for a
+chunk of cities are fetched with one query (fetch_pillar_inputs), dx_status is parsed once per
+chunk into a DxFeatureMatrix, scoring runs without DB access (optionally
+fanned out over a process pool), and results are written back with one
+COPY-based upsert.
+
+    engine = BatchReadinessScorer(conn)
+    results = engine.score_all(city_codes, analysis_results)
+    engine.write_scores(results)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from engines.decision_readiness_scorer import (
+    DecisionReadinessScore,
+    DecisionReadinessScorerV3,
+    fetch_pillar_inputs,
+)
+from services.adoption_aggregates import aggregates_table_exists, refresh_adoption_aggregates
+from services.bulk_writer import BulkWriteStats, copy_upsert
+from services.dx_features import DxFeatureMatrix
+from services.neighbor_graph import COORDINATE_QUERY, NeighborGraph
+from services.spatial_aggregates import load_municipality_spatial
+
+DRS_CHUNK_SIZE = int(os.getenv("DRS_CHUNK_SIZE", "500"))
+# Worker processes for the scoring step. Per-city scoring is a few microseconds of
+# pure Python once inputs are prefetched, so 1 (in-process) is usually fastest;
+# raise it when the pillar logic grows heavier.
+DRS_WORKERS = int(os.getenv("DRS_WORKERS", "1"))
+
+SCORE_COLUMNS = [
+    'city_code', 'structural_pressure', 'leadership_commitment', 'peer_pressure',
+    'feasibility', 'accountability', 'confidence_level',
+]
+
+# municipality_spatial_aggregates columns passed to the scorer as inputs
+SPATIAL_INPUT_COLUMNS = ['company_count', 'certified_company_count', 'mesh_count']
+
+# One row per city per day (idx_decision_readiness_scores_city_date)
+SCORE_CONFLICT_KEY = ['city_code', '((scored_at)::DATE)']
+
+ScoreTask = Tuple[str, Optional[Dict], Dict[str, float], dict]
+
+# Scorer used inside worker processes (no DB connection needed)
+_worker_scorer = DecisionReadinessScorerV3(None)
+
+
+def _score_task(task: ScoreTask) -> DecisionReadinessScore:
+    city_code, inputs, features, analysis_result = task
+    return _worker_scorer.score_inputs(city_code, inputs, features, analysis_result)
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BatchReadinessScorer:
+    def __init__(self, conn, chunk_size: int = DRS_CHUNK_SIZE, workers: int = DRS_WORKERS,
+                 refresh_aggregates: bool = True, neighbor_graph: bool = True,
+                 spatial_context: bool = True):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.refresh_aggregates = refresh_aggregates
+        self.use_neighbor_graph = neighbor_graph
+        self.use_spatial_context = spatial_context
+        self._use_aggregates_table: Optional[bool] = None
+        self._neighbor_rates: Optional[Dict[str, Dict[str, int]]] = None
+        self._spatial: Optional[Dict[str, Dict]] = None
+
+    def _prepare_spatial(self) -> Dict[str, Dict]:
+        """Company / mesh counts per city from municipality_spatial_aggregates (once per run)."""
+        if self._spatial is None:
+            self._spatial = load_municipality_spatial(self.conn) if self.use_spatial_context else {}
+        return self._spatial
+
+    def _prepare_neighbors(self) -> Dict[str, Dict[str, int]]:
+        """Neighbor DX-department adoption per city from the k-NN graph (once per run)."""
+        if self._neighbor_rates is None:
+            self._neighbor_rates = {}
+            if self.use_neighbor_graph:
+                cur = self.conn.cursor(cursor_factory=RealDictCursor)
+                try:
+                    cur.execute(COORDINATE_QUERY)
+                    coordinates = cur.fetchall()
+                    cur.execute("SELECT city_code FROM municipalities WHERE dx_status->>'dept' = 'true'")
+                    with_dept = {row['city_code']: True for row in cur.fetchall()}
+                finally:
+                    cur.close()
+                if len(coordinates) > 1:
+                    graph = NeighborGraph.load_or_build(coordinates)
+                    self._neighbor_rates = graph.neighbor_rates(with_dept)
+        return self._neighbor_rates
+
+    def _prepare_aggregates(self) -> bool:
+        """Rebuild dx_adoption_aggregates once per run (same transaction as the scores)."""
+        if self._use_aggregates_table is None:
+            if self.refresh_aggregates:
+                self._use_aggregates_table = refresh_adoption_aggregates(self.conn)
+            else:
+                self._use_aggregates_table = aggregates_table_exists(self.conn)
+        return self._use_aggregates_table
+
+    def build_tasks(self, city_codes: List[str],
+                    analysis_results: Optional[Dict[str, dict]] = None) -> List[ScoreTask]:
+        """Prefetch pillar inputs and parse dx_status, one query per chunk."""
+        analysis_results = analysis_results or {}
+        tasks: List[ScoreTask] = []
+        use_table = self._prepare_aggregates() if city_codes else False
+        neighbor_rates = self._prepare_neighbors() if city_codes else {}
+        spatial = self._prepare_spatial() if city_codes else {}
+        for chunk in _chunks(list(city_codes), self.chunk_size):
+            inputs = fetch_pillar_inputs(self.conn, chunk, use_aggregates_table=use_table)
+            features = DxFeatureMatrix.from_rows(
+                [{'city_code': code, 'dx_status': (inputs.get(code) or {}).get('dx_status')}
+                 for code in chunk])
+            for code in chunk:
+                row = inputs.get(code)
+                if row is not None:
+                    row = {k: v for k, v in row.items() if k != 'dx_status'}
+                    rates = neighbor_rates.get(code)
+                    if rates is not None:
+                        row['neighbor_with_dept'] = rates['with']
+                        row['neighbor_total'] = rates['total']
+                    context = spatial.get(code)
+                    if context is not None:
+                        row.update({c: context[c] for c in SPATIAL_INPUT_COLUMNS})
+                tasks.append((code, row, features.row(code), analysis_results.get(code, {})))
+        return tasks
+
+    def score_all(self, city_codes: List[str],
+                  analysis_results: Optional[Dict[str, dict]] = None) -> List[DecisionReadinessScore]:
+        """Score many cities; results are returned in city_codes order."""
+        tasks = self.build_tasks(city_codes, analysis_results)
+        if self.workers > 1 and len(tasks) > 1:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(_score_task, tasks, chunksize=chunksize))
+        return [_score_task(task) for task in tasks]
+
+    def write_scores(self, results: List[DecisionReadinessScore], commit: bool = False) -> BulkWriteStats:
+        """Upsert today's scores in one statement (total_score is a generated column)."""
+        return copy_upsert(
+            self.conn,
+            'decision_readiness_scores',
+            SCORE_COLUMNS,
+            (
+                (r.city_code, r.structural_pressure, r.leadership_commitment, r.peer_pressure,
+                 r.feasibility, r.accountability, r.confidence)
+                for r in results
+            ),
+            key_columns=SCORE_CONFLICT_KEY,
+            update_columns=SCORE_COLUMNS[1:],
+            commit=commit,
+        )
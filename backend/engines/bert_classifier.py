@@ -1,54 +1,117 @@
+import os
+import time
+from typing import Dict, List, Optional
+
 import torch
 from transformers import BertTokenizer, BertForSequenceClassification
 import numpy as np
 
+# Mock mapping for now until fine-tuned
+# 0: Low, 1: Medium, 2: High
+SCORE_MAP = {0: 5, 1: 15, 2: 25}
+LABELS = ["Low", "Medium", "High"]
+
+# CPU推論の既定設定（夜間バッチ向け）
+BERT_BATCH_SIZE = int(os.getenv("BERT_BATCH_SIZE", "16"))
+# int8 動的量子化は任意（有効にすると bert_score が fp32 と僅かに変わり得るため既定は無効）
+BERT_QUANTIZE = os.getenv("BERT_QUANTIZE", "false").lower() in ("1", "true", "yes")
+BERT_NUM_THREADS = int(os.getenv("BERT_NUM_THREADS", "0"))  # 0 = torch の既定
+
+
 class BertCommitmentClassifier:
-    def __init__(self, model_name="cl-tohoku/bert-base-japanese-whole-word-masking"):
+    def __init__(self, model_name="cl-tohoku/bert-base-japanese-whole-word-masking",
+                 quantize: Optional[bool] = None, max_length: int = 512):
         self.model_name = model_name
         self.tokenizer = None
         self.model = None
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        
+        self.max_length = max_length
+        # int8 動的量子化は CPU のみ（GPU では常に float のまま）
+        self.quantize = (BERT_QUANTIZE if quantize is None else quantize) and self.device.type == "cpu"
+        if BERT_NUM_THREADS > 0:
+            torch.set_num_threads(BERT_NUM_THREADS)
+
     def load_model(self):
         """
         Load the pre-trained BERT model.
         We might fine-tune this later with the 'several hundred labeled samples' mentioned by the user.
+
+        With BERT_QUANTIZE=true (or quantize=True) the Linear layers are dynamically quantized
+        to int8 on CPU. Off by default so the nightly bert_score stays fp32.
         """
         print(f"Loading BERT model: {self.model_name}...")
         try:
             self.tokenizer = BertTokenizer.from_pretrained(self.model_name)
-            self.model = BertForSequenceClassification.from_pretrained(self.model_name, num_labels=3) # Low, Medium, High
-            self.model.to(self.device)
-            self.model.eval()
-            print("✅ BERT model loaded.")
+            model = BertForSequenceClassification.from_pretrained(self.model_name, num_labels=3) # Low, Medium, High
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.model = model.to(self.device)
+            print(f"✅ BERT model loaded. (device={self.device}, int8={self.quantize})")
         except Exception as e:
             print(f"❌ Failed to load BERT: {e}")
 
+    def warm_up(self, batch_size: int = BERT_BATCH_SIZE) -> float:
+        """
+        Load the model (if needed) and run one dummy batch so that the first real
+        batch does not pay for lazy initialisation. Returns the elapsed seconds.
+        """
+        started = time.perf_counter()
+        if not self.model:
+            self.load_model()
+        if self.model:
+            self.predict_batch(["デジタル化を推進します。"] * batch_size, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        print(f"🔥 BERT warm-up: {elapsed:.1f}s")
+        return elapsed
+
     def predict_commitment(self, text: str) -> dict:
         """
         Predict the commitment level (0-100 score equivalent) from text.
         """
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: List[str], batch_size: int = BERT_BATCH_SIZE) -> List[Dict]:
+        """
+        Predict commitment levels for many texts at once.
+
+        Texts are tokenized once, sorted by token length and padded per batch
+        (dynamic padding), so short speeches are not padded to 512 tokens.
+        Results are returned in the input order.
+        """
         if not self.model:
             self.load_model()
-            
+
         if not self.model:
-            return {"score": 0, "label": "Error"}
-            
-        inputs = self.tokenizer(text, return_tensors="pt", max_length=512, truncation=True, padding=True)
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            
-        # Mock mapping for now until fine-tuned
-        # 0: Low, 1: Medium, 2: High
-        score_map = {0: 5, 1: 15, 2: 25} 
-        predicted_class = torch.argmax(probs).item()
-        confidence = probs[0][predicted_class].item()
-        
+            return [{"score": 0, "label": "Error"} for _ in texts]
+
+        if not texts:
+            return []
+
+        encoded = self.tokenizer(list(texts), max_length=self.max_length, truncation=True)
+        input_ids = encoded["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+
+        results: List[Optional[Dict]] = [None] * len(texts)
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                chunk = order[start:start + batch_size]
+                features = [{k: encoded[k][i] for k in encoded.keys()} for i in chunk]
+                inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt")
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+
+                outputs = self.model(**inputs)
+                probs = torch.nn.functional.softmax(outputs.logits, dim=-1).cpu().numpy()
+
+                for i, p in zip(chunk, probs):
+                    results[i] = self._to_result(p)
+        return results
+
+    @staticmethod
+    def _to_result(probs: np.ndarray) -> Dict:
+        predicted_class = int(np.argmax(probs))
         return {
-            "score": score_map.get(predicted_class, 0),
-            "label": ["Low", "Medium", "High"][predicted_class],
-            "confidence": confidence
+            "score": SCORE_MAP.get(predicted_class, 0),
+            "label": LABELS[predicted_class],
+            "confidence": float(probs[predicted_class])
         }
@@ -1,8 +1,12 @@
 from dataclasses import dataclass
 from typing import Dict, List, Optional
 import psycopg2
+from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
+from services.adoption_aggregates import adoption_source, aggregates_table_exists
+from services.dx_features import DxFeatureMatrix
+
 # Assuming these data sources are available or mocked for now
 # from backend.data_sources.estat_api import EstatAPI 
 
@@ -18,28 +22,90 @@ class DecisionReadinessScore:
     confidence: str               # 'high', 'medium', 'low'
     breakdown: Dict
 
+# All per-city pillar inputs in one round trip (used by score() and the batch engine).
+# Regional / prefectural DX adoption (peer pressure) comes from dx_adoption_aggregates,
+# refreshed once per batch run (services/adoption_aggregates.py).
+def pillar_input_query(use_aggregates_table: bool = True) -> str:
+    return f"""
+        WITH {adoption_source(use_aggregates_table)}
+        SELECT
+            m.city_code,
+            COALESCE(m.population_decline_rate, 0) as pop_decline,
+            COALESCE(m.elderly_ratio, 0) as elderly_ratio,
+            COALESCE(m.fiscal_index, 0.5) as fiscal_index, -- Default to average
+            COALESCE(m.staff_reduction_rate, 0) as staff_reduction,
+            m.region,
+            m.prefecture,
+            m.population,
+            m.dx_status,
+            COALESCE(ar.with_dept, 0) as regional_with_dept,
+            COALESCE(ar.total, 0) as regional_total,
+            COALESCE(ap.with_dept, 0) as prefecture_with_dept,
+            COALESCE(ap.total, 0) as prefecture_total
+        FROM municipalities m
+        LEFT JOIN adoption ar ON ar.scope = 'region' AND ar.name = m.region
+        LEFT JOIN adoption ap ON ap.scope = 'prefecture' AND ap.name = m.prefecture
+        WHERE m.city_code = ANY(%s)
+    """
+
+
+def fetch_pillar_inputs(conn, city_codes: List[str],
+                        use_aggregates_table: Optional[bool] = None) -> Dict[str, Dict]:
+    """
+    Fetch pillar inputs for many cities at once: {city_code: row dict}.
+    use_aggregates_table=None detects dx_adoption_aggregates (falls back to an inline CTE).
+    """
+    if use_aggregates_table is None:
+        use_aggregates_table = aggregates_table_exists(conn)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(pillar_input_query(use_aggregates_table), (list(city_codes),))
+        return {row['city_code']: dict(row) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
 class DecisionReadinessScorerV3:
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, features: Optional[DxFeatureMatrix] = None):
         self.conn = db_conn
         # in real usage, we might fetch e-Stat data live or from DB cache.
         # Here we assume data is already in DB (municipalities table) for Structural/Feasibility
+        # Optional pre-parsed dx_status features (shared with ImprovedScoreCalculator);
+        # when absent, dx_status is parsed from the fetched pillar inputs.
+        self.features = features
+
+    def _dx_features(self, city_code: str, inputs: Optional[Dict]) -> Dict[str, float]:
+        """Return the parsed dx_status feature row for a city."""
+        if self.features is not None and city_code in self.features:
+            return self.features.row(city_code)
+        dx_status = inputs['dx_status'] if inputs else None
+        return DxFeatureMatrix.from_dx(dx_status, city_code).row(city_code)
         
     def score(self, city_code: str, analysis_result: dict = {}) -> DecisionReadinessScore:
         """
         Calculate the 100-point Decision Readiness Score.
         analysis_result contains pre-computed AI insights.
         """
+        inputs = fetch_pillar_inputs(self.conn, [city_code]).get(city_code)
+        return self.score_inputs(city_code, inputs, self._dx_features(city_code, inputs), analysis_result)
+
+    def score_inputs(self, city_code: str, inputs: Optional[Dict], features: Dict[str, float],
+                     analysis_result: dict = {}) -> DecisionReadinessScore:
+        """
+        Score from prefetched inputs (no DB access; safe to run in worker processes).
+        inputs is a PILLAR_INPUT_QUERY row, or None if the city does not exist.
+        """
         # 1. Structural Pressure (30pts) - Data from DB (e-Stat sourced)
-        structural, s_breakdown = self._score_structural_pressure(city_code)
+        structural, s_breakdown = self._score_structural_pressure(inputs)
         
         # 2. Leadership Commitment (25pts) - Text Analysis (Ollama/BERT)
-        leadership, l_breakdown = self._score_leadership_commitment(city_code, analysis_result)
+        leadership, l_breakdown = self._score_leadership_commitment(city_code, analysis_result, features)
         
         # 3. Peer Pressure (20pts) - DB Analysis
-        peer, p_breakdown = self._score_peer_pressure(city_code)
+        peer, p_breakdown = self._score_peer_pressure(inputs, features)
         
         # 4. Feasibility (15pts) - DB Analysis (Digital Agency CSV)
-        feasibility, f_breakdown = self._score_feasibility(city_code)
+        feasibility, f_breakdown = self._score_feasibility(inputs, features)
         
         # 5. Accountability (10pts) - Text/DB Analysis
         accountability, a_breakdown = self._score_accountability(city_code, []) # TODO: Pass text if needed
@@ -69,27 +135,14 @@ class DecisionReadinessScorerV3:
         )
     
     # --- 1. Structural Pressure (30pts) ---
-    def _score_structural_pressure(self, city_code: str):
-        # Fetch data from DB
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT 
-                COALESCE(population_decline_rate, 0) as pop_decline,
-                COALESCE(elderly_ratio, 0) as elderly_ratio,
-                COALESCE(fiscal_index, 0.5) as fiscal_index, -- Default to average
-                COALESCE(staff_reduction_rate, 0) as staff_reduction
-            FROM municipalities 
-            WHERE city_code = %s
-        """, (city_code,))
-        row = cur.fetchone()
-        
-        if not row:
+    def _score_structural_pressure(self, inputs: Optional[Dict]):
+        if not inputs:
             return 0, {"error": "No data"}
             
-        pop_decline = row[0]
-        elderly_ratio = row[1]
-        fiscal_index = row[2]
-        staff_reduction = row[3]
+        pop_decline = inputs['pop_decline']
+        elderly_ratio = inputs['elderly_ratio']
+        fiscal_index = inputs['fiscal_index']
+        staff_reduction = inputs['staff_reduction']
         
         score = 0
         details = {}
@@ -131,7 +184,8 @@ class DecisionReadinessScorerV3:
         return min(score, 30), details
 
     # --- 2. Leadership Commitment (25pts) ---
-    def _score_leadership_commitment(self, city_code: str, analysis_result: dict):
+    def _score_leadership_commitment(self, city_code: str, analysis_result: dict,
+                                     features: Dict[str, float]):
         """
         analysis_result format:
         {
@@ -155,18 +209,12 @@ class DecisionReadinessScorerV3:
         details['mayor_speech'] = min(mayor_score, 12)
         
         # 2.2 Org Structure (8pts)
-        # Fetch from DB (enriched by dx_progress.csv -> stored in dx_status JSONB)
-        cur = self.conn.cursor()
-        cur.execute("SELECT dx_status FROM municipalities WHERE city_code = %s", (city_code,))
-        row = cur.fetchone()
-        dx_status = row[0] if row else {}
-        
+        # From dx_status features (enriched by dx_progress.csv -> stored in dx_status JSONB)
         org_score = 0
-        if dx_status:
-            # Logic based on real CSV column names (mapped)
-            if dx_status.get('dept'): org_score += 4
-            if dx_status.get('cio') == 'あり': org_score += 2
-            if dx_status.get('ext_cio') == 'あり': org_score += 2
+        # Logic based on real CSV column names (mapped)
+        if features['dept']: org_score += 4
+        if features['cio']: org_score += 2
+        if features['ext_cio']: org_score += 2
             
         score += min(org_score, 8)
         details['org_structure'] = min(org_score, 8)
@@ -181,47 +229,40 @@ class DecisionReadinessScorerV3:
         return min(score, 25), details
 
     # --- 3. Peer Pressure (20pts) ---
-    def _score_peer_pressure(self, city_code: str):
+    def _score_peer_pressure(self, inputs: Optional[Dict], features: Dict[str, float]):
         """
         Calculate peer pressure based on regional DX adoption patterns.
         Enhanced v2: Uses real data from dx_status field.
         """
         score = 0
         details = {}
-        cur = self.conn.cursor()
-
-        # Get this city's region and prefecture
-        cur.execute("""
-            SELECT region, prefecture, dx_status
-            FROM municipalities
-            WHERE city_code = %s
-        """, (city_code,))
-        row = cur.fetchone()
-        if not row:
+
+        if not inputs:
             return 0, {"error": "City not found"}
 
-        region, prefecture, dx_status = row
-        dx_status = dx_status or {}
+        prefecture = inputs['prefecture']
 
         # 3.1 Regional DX Adoption Rate (10pts)
-        # Count municipalities in same region with DX departments
-        cur.execute("""
-            SELECT
-                COUNT(*) FILTER (WHERE dx_status->>'dept' = 'true') as with_dept,
-                COUNT(*) as total
-            FROM municipalities
-            WHERE region = %s AND dx_status IS NOT NULL
-        """, (region,))
-        adoption = cur.fetchone()
-
-        if adoption and adoption[1] > 0:
-            adoption_rate = adoption[0] / adoption[1]
+        # Municipalities in same region with DX departments (dx_adoption_aggregates lookup)
+        with_dept, total = inputs['regional_with_dept'], inputs['regional_total']
+
+        if total > 0:
+            adoption_rate = with_dept / total
             regional_score = int(adoption_rate * 10)  # 0-10 pts
             score += min(regional_score, 10)
             details['regional_adoption'] = f"{adoption_rate:.1%}"
         else:
             details['regional_adoption'] = "0%"
 
+        # Prefecture-level adoption (signal only; not part of the score yet)
+        pref_with_dept, pref_total = inputs.get('prefecture_with_dept', 0), inputs.get('prefecture_total', 0)
+        details['prefecture_adoption'] = f"{pref_with_dept / pref_total:.1%}" if pref_total > 0 else "0%"
+
+        # Neighbor adoption among the k nearest municipalities (batch engine only; signal only)
+        if 'neighbor_total' in inputs:
+            nb_with, nb_total = inputs['neighbor_with_dept'], inputs['neighbor_total']
+            details['neighbor_adoption'] = f"{nb_with / nb_total:.1%}" if nb_total > 0 else "0%"
+
         # 3.2 Prefecture Leadership (5pts)
         # Advanced DX prefectures get bonus points
         advanced_prefectures = ['東京都', '神奈川県', '大阪府', '福岡県', '愛知県', '京都府']
@@ -240,9 +281,9 @@ class DecisionReadinessScorerV3:
         # 3.3 Government Policy Alignment (5pts)
         # Cities with external CIO or strategy get bonus (shows national policy adoption)
         policy_score = 0
-        if dx_status.get('ext_cio') == 'あり':
+        if features['ext_cio']:
             policy_score += 3
-        if dx_status.get('strategy'):
+        if features['strategy']:
             policy_score += 2
         score += min(policy_score, 5)
         details['policy_alignment'] = policy_score
@@ -250,45 +291,36 @@ class DecisionReadinessScorerV3:
         return min(score, 20), details
 
     # --- 4. Feasibility (15pts) ---
-    def _score_feasibility(self, city_code: str):
+    def _score_feasibility(self, inputs: Optional[Dict], features: Dict[str, float]):
         """
         Calculate feasibility based on technical readiness and organizational capacity.
         Enhanced v2: Uses dx_status JSON and population data.
         """
         score = 0
         details = {}
-        cur = self.conn.cursor()
-
-        # Get city data
-        cur.execute("""
-            SELECT dx_status, population
-            FROM municipalities
-            WHERE city_code = %s
-        """, (city_code,))
-        row = cur.fetchone()
-        if not row:
+
+        if not inputs:
             return 0, {"error": "City not found"}
 
-        dx_status, population = row
-        dx_status = dx_status or {}
-        population = population or 0
+        population = inputs['population'] or 0
 
         # 4.1 Technical Readiness (8pts)
         tech_score = 0
 
         # Cloud migration status
-        cloud_status = dx_status.get('cloud_migration', '')
-        if cloud_status == '完了':
+        # cloud_migration feature: 2 = 完了, 1 = 進行中
+        cloud_stage = features['cloud_migration']
+        if cloud_stage == 2:
             tech_score += 4
-        elif cloud_status == '進行中':
+        elif cloud_stage == 1:
             tech_score += 2
 
         # LGWAN connection (almost universal, but verify)
-        if dx_status.get('lgwan_connection', True):
+        if features['lgwan_connection']:
             tech_score += 2
 
         # DX department exists
-        if dx_status.get('dept'):
+        if features['dept']:
             tech_score += 2
 
         score += min(tech_score, 8)
@@ -313,11 +345,11 @@ class DecisionReadinessScorerV3:
         hr_score = 0
 
         # CIO appointed
-        if dx_status.get('cio') == 'あり':
+        if features['cio']:
             hr_score += 1
 
         # External CIO (shows ability to hire expertise)
-        if dx_status.get('ext_cio') == 'あり':
+        if features['ext_cio']:
             hr_score += 2
         elif population >= 100000:
             # Large cities likely have internal capacity
@@ -326,6 +358,14 @@ class DecisionReadinessScorerV3:
         score += min(hr_score, 3)
         details['hr'] = hr_score
 
+        # Local business base (context only, from municipality_spatial_aggregates)
+        if 'company_count' in inputs:
+            details['local_business'] = {
+                'companies': inputs['company_count'],
+                'certified': inputs['certified_company_count'],
+                'meshes': inputs['mesh_count'],
+            }
+
         return min(score, 15), details
 
     # --- 5. Accountability (10pts) ---
@@ -1,16 +1,36 @@
+import asyncio
+import json
+import random
+from typing import Dict, Optional
+
+import httpx
 import requests
 from config import settings
+from services.llm_cache import LLMResultCache, llm_cache
+
+# プロンプトを変更したら上げる（LLM結果キャッシュのキーに含まれる）
+SPEECH_PROMPT_VERSION = "speech-v1"
+
+# リトライ対象（Ollama の過負荷・一時的な障害）
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
 
 class OllamaAnalyzer:
-    def __init__(self):
+    def __init__(self, concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 cache: Optional[LLMResultCache] = None):
         self.base_url = settings.OLLAMA_URL
         self.model = settings.OLLAMA_MODEL
+        # Ollama サーバーへの同時リクエスト上限（OLLAMA_NUM_PARALLEL に合わせる）
+        self.concurrency = concurrency or settings.OLLAMA_CONCURRENCY
+        self.timeout = timeout or settings.OLLAMA_TIMEOUT
+        self.max_retries = settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.transport = transport  # テスト用（httpx.MockTransport）
+        self.cache = cache if cache is not None else llm_cache
 
-    def analyze_mayor_speech(self, text: str) -> dict:
-        """
-        Analyze Mayor's policy speech to detect commitment.
-        """
-        prompt = f"""
+    def _speech_prompt(self, text: str) -> str:
+        return f"""
         You are an expert political analyst. Analyze the following text from a Japanese mayor's policy speech regarding Digital Transformation (DX).
 
         Text: "{text[:3000]}"
@@ -26,36 +46,128 @@ class OllamaAnalyzer:
             "reason": "Short explanation in Japanese"
         }}
         """
-        
+
+    def _payload(self, prompt: str) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json"
+        }
+
+    @staticmethod
+    def _parse_speech_result(result: dict) -> dict:
+        # Parse the 'response' field which contains the actual JSON string
+        analysis = json.loads(result.get("response", "{}"))
+        return {
+            "first_person_commitment": analysis.get("first_person_commitment", False),
+            "budget_mentioned": analysis.get("budget_mentioned", False),
+            # "reason": analysis.get("reason", "")
+        }
+
+    @staticmethod
+    def _fallback(error: Exception) -> dict:
+        return {
+            "first_person_commitment": False,
+            "budget_mentioned": False,
+            "error": str(error)
+        }
+
+    def analyze_mayor_speech(self, text: str) -> dict:
+        """
+        Analyze Mayor's policy speech to detect commitment.
+        """
+        cached = self.cache.get(self.model, SPEECH_PROMPT_VERSION, text)
+        if cached is not None:
+            return cached
+
         try:
             response = requests.post(
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "format": "json" 
-                },
-                timeout=60
+                json=self._payload(self._speech_prompt(text)),
+                timeout=self.timeout
             )
             response.raise_for_status()
-            result = response.json()
-            
-            # Parse the 'response' field which contains the actual JSON string
-            import json
-            analysis = json.loads(result.get("response", "{}"))
-            
-            return {
-                "first_person_commitment": analysis.get("first_person_commitment", False),
-                "budget_mentioned": analysis.get("budget_mentioned", False),
-                # "reason": analysis.get("reason", "")
-            }
-            
+            result = self._parse_speech_result(response.json())
+            self.cache.put(self.model, SPEECH_PROMPT_VERSION, text, result)
+            return result
+
         except Exception as e:
             print(f"Ollama Error: {e}")
             # Fallback
-            return {
-                "first_person_commitment": False,
-                "budget_mentioned": False,
-                "error": str(e)
-            }
+            return self._fallback(e)
+
+    # --- 並列バッチ分析（夜間バッチ用） ---
+
+    def analyze_speeches(self, texts: Dict[str, str]) -> Dict[str, dict]:
+        """
+        複数自治体の施政方針を並列に分析する（同期呼び出し用ラッパー）
+
+        Args:
+            texts: {city_code: 本文}
+        Returns:
+            {city_code: analyze_mayor_speech と同じ形式の結果}
+        """
+        return asyncio.run(self.analyze_speeches_async(texts))
+
+    async def analyze_speeches_async(self, texts: Dict[str, str]) -> Dict[str, dict]:
+        """
+        1つの keep-alive クライアントを共有し、同時実行数を concurrency に制限して分析する
+
+        Ollama はサーバー側でリクエストをキューイングするため、上限を超えて投げても
+        速くはならずタイムアウトが増えるだけ。セマフォで in-flight 数を一定に保つ。
+        """
+        # 内容が変わっていない本文はキャッシュから返し、推論しない
+        results = {}
+        pending = {}
+        for city_code, text in texts.items():
+            cached = self.cache.get(self.model, SPEECH_PROMPT_VERSION, text)
+            if cached is not None:
+                results[city_code] = cached
+            else:
+                pending[city_code] = text
+        if not pending:
+            return results
+
+        limits = httpx.Limits(max_connections=self.concurrency,
+                              max_keepalive_connections=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                     limits=limits, transport=self.transport) as client:
+            async def run(city_code: str, text: str):
+                async with semaphore:
+                    return city_code, await self._analyze_with_retry(client, text)
+
+            analyzed = await asyncio.gather(*(run(code, text) for code, text in pending.items()))
+
+        for city_code, result in analyzed:
+            if "error" not in result:
+                self.cache.put(self.model, SPEECH_PROMPT_VERSION, pending[city_code], result)
+            results[city_code] = result
+        return results
+
+    async def _analyze_with_retry(self, client: httpx.AsyncClient, text: str) -> dict:
+        """タイムアウト・接続エラー・5xx/429 は指数バックオフ（ジッター付き）で再試行"""
+        payload = self._payload(self._speech_prompt(text))
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post("/api/generate", json=payload)
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    raise httpx.HTTPStatusError(
+                        f"retryable status {response.status_code}",
+                        request=response.request, response=response)
+                response.raise_for_status()
+                return self._parse_speech_result(response.json())
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = (
+                    isinstance(e, httpx.TransportError)
+                    or e.response.status_code in RETRYABLE_STATUS
+                )
+                if not retryable or attempt >= self.max_retries:
+                    print(f"Ollama Error: {e}")
+                    return self._fallback(e)
+                await asyncio.sleep(min(2 ** attempt, 30) + random.uniform(0, 0.5))
+            except Exception as e:
+                print(f"Ollama Error: {e}")
+                return self._fallback(e)
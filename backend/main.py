@@ -1,15 +1,24 @@
 """
 Zoom UP Public App - FastAPI Backend
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import os
+import logging
+import asyncpg
+import psycopg2
+from sqlalchemy import exc as sa_exc
 from dotenv import load_dotenv
 
 # .envファイルを読み込む（親ディレクトリにある場合を想定）
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 from routers import auth, municipalities, scores, proposals, map_data
+from database import get_pool_metrics
+from services.conditional_response import ConditionalResponseMiddleware
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Local Gov DX Intelligence API",
@@ -19,6 +28,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# 圧縮・ETag（304）。CORSヘッダーを304にも付けるため CORS より内側に置く
+app.add_middleware(ConditionalResponseMiddleware)
+
 # CORS設定
 # 本番環境では、必要な origins, methods, headers のみを許可してください
 allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
@@ -39,12 +51,29 @@ app.include_router(proposals.router)
 app.include_router(map_data.router)
 
 
+# DB接続不可・プール枯渇は 503 として返す（クライアント側でリトライ可能）
+@app.exception_handler(sa_exc.OperationalError)
+@app.exception_handler(sa_exc.TimeoutError)
+@app.exception_handler(psycopg2.OperationalError)
+@app.exception_handler(asyncpg.PostgresConnectionError)
+@app.exception_handler(ConnectionError)
+async def database_unavailable_handler(request: Request, exc: Exception):
+    logger.error(f"DB接続エラー: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "データベースに接続できません"})
+
+
 @app.get("/api/health")
 async def health_check():
     """ヘルスチェックエンドポイント"""
     return {"status": "ok", "version": "1.0.0"}
 
 
+@app.get("/api/health/db")
+async def db_pool_health():
+    """コネクションプールのメトリクス"""
+    return get_pool_metrics()
+
+
 @app.get("/")
 async def root():
     """ルートエンドポイント"""
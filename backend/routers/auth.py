@@ -8,11 +8,10 @@ import bcrypt
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
 
-from config import settings
+from database import get_db_conn
 
 logger = logging.getLogger(__name__)
 
@@ -29,21 +28,6 @@ JWT_ALGORITHM = 'HS256'
 JWT_EXPIRE_HOURS = int(os.getenv('JWT_EXPIRE_HOURS', '8'))
 
 
-def get_db_conn():
-    """DB接続を生成するジェネレーター"""
-    conn = psycopg2.connect(
-        host=settings.DB_HOST,
-        port=settings.DB_PORT,
-        database=settings.DB_NAME,
-        user=settings.DB_USER,
-        password=settings.DB_PASSWORD
-    )
-    try:
-        yield conn
-    finally:
-        conn.close()
-
-
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
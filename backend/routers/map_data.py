@@ -8,10 +8,30 @@ Map Data API ルーター
 - 自治体詳細（全データ）
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import hashlib
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import exc as sa_exc
 from sqlalchemy import text
-from database import get_db
+from database import get_async_db
+from services.map_snapshot import AggregateData, MapAggregateSnapshot
+from services.conditional_response import etag_matches
+from services.municipality_snapshot import MunicipalityFilter, MunicipalitySnapshot
+from services.neighbor_graph import NeighborGraphCache
+from services.peer_index import PeerIndexCache
+from services.score_deltas import (
+    DELTA_SPECS, compute_deltas, fetch_deltas, fetch_run, fetch_snapshot, summarize,
+)
+from services.response_encoding import (
+    IDENTITY, RESPONSE_MIN_COMPRESS_SIZE, encode_body, negotiate_encoding,
+)
+from services.score_ranks import format_ranks
+from services.score_runs import published_run_id
+from services.spatial_aggregates import format_spatial
+from services.vector_tiles import TILE_MAX_ZOOM, TILE_MIN_ZOOM, MunicipalityTiles
+from utils.mesh import decode_mesh, mesh_level
 from typing import Optional, List
 
 router = APIRouter(prefix="/api/v1/map", tags=["Map Data"])
@@ -34,69 +54,48 @@ for region, prefs in PREFECTURES_BY_REGION.items():
     for pref in prefs:
         REGION_BY_PREFECTURE[pref] = region
 
+# 地方・都道府県別集計のプロセス内スナップショット（集計ビューから読み込み）
+aggregate_snapshot = MapAggregateSnapshot(REGION_BY_PREFECTURE)
+
+# 自治体一覧のフィルタ別スナップショット（列形式で保持し、形式・圧縮ごとの本文を使い回す）
+municipality_snapshot = MunicipalitySnapshot(REGION_BY_PREFECTURE)
+
+# 同規模・類似自治体のプロセス内インデックス（スコア付き全自治体）
+peer_index = PeerIndexCache()
+
+# 緯度経度による近傍グラフ（TTLごとに座標の変更を確認して再構築）
+neighbor_graph = NeighborGraphCache()
+
+# 自治体コロプレスのベクタータイル（境界はプロセス内で1度だけ読み込み、タイルはディスクキャッシュ）
+municipality_tiles = MunicipalityTiles()
+
+
+def _cached_json(request: Request, data: AggregateData, key: str, build) -> Response:
+    """スナップショットのJSONをETag付きで返す（If-None-Match一致時は304）"""
+    etag = data.etag(key)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data.body(key, build), media_type='application/json', headers=headers)
+
 
 @router.get("/regions")
-async def get_region_scores(db: Session = Depends(get_db)):
+async def get_region_scores(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     地方別のスコア集計を返す（Level 1: 全国地図）
 
     Returns:
         各地方の平均スコア、自治体数、都道府県数
     """
-    result = db.execute(text("""
-        SELECT
-            m.prefecture,
-            ROUND(AVG(s.total_score), 1) as avg_score,
-            COUNT(*) as municipality_count,
-            SUM(m.population) as total_population
-        FROM municipalities m
-        LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
-        WHERE m.prefecture IS NOT NULL
-        GROUP BY m.prefecture
-        ORDER BY m.prefecture
-    """))
-
-    pref_data = [dict(row._mapping) for row in result]
-
-    # 地方ごとに集約
-    regions = {}
-    for pref in pref_data:
-        region_name = REGION_BY_PREFECTURE.get(pref['prefecture'], '不明')
-        if region_name not in regions:
-            regions[region_name] = {
-                'region': region_name,
-                'prefectures': [],
-                'total_score_sum': 0,
-                'total_count': 0,
-                'total_population': 0,
-            }
-        r = regions[region_name]
-        r['prefectures'].append(pref['prefecture'])
-        score = pref['avg_score'] or 0
-        r['total_score_sum'] += float(score) * pref['municipality_count']
-        r['total_count'] += pref['municipality_count']
-        r['total_population'] += pref['total_population'] or 0
-
-    # 平均スコアを算出
-    result_list = []
-    for r in regions.values():
-        avg = round(r['total_score_sum'] / r['total_count'], 1) if r['total_count'] > 0 else 0
-        result_list.append({
-            'region': r['region'],
-            'avg_score': avg,
-            'municipality_count': r['total_count'],
-            'prefecture_count': len(r['prefectures']),
-            'total_population': r['total_population'],
-            'prefectures': r['prefectures'],
-        })
-
-    return result_list
+    data = await aggregate_snapshot.get(db)
+    return _cached_json(request, data, 'regions', lambda: data.regions)
 
 
 @router.get("/prefectures")
 async def get_prefecture_scores(
+    request: Request,
     region: Optional[str] = Query(None, description="地方名でフィルタ"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     都道府県別のスコア集計を返す（Level 2: 地方ビュー）
@@ -104,50 +103,27 @@ async def get_prefecture_scores(
     Args:
         region: 地方名（'関東地方'など）でフィルタ可能
     """
-    query = """
-        SELECT
-            m.prefecture,
-            ROUND(AVG(s.total_score), 1) as avg_score,
-            ROUND(AVG(s.cat_citizen_services), 1) as avg_citizen,
-            ROUND(AVG(s.cat_promotion_system), 1) as avg_promotion,
-            ROUND(AVG(s.cat_business_dx), 1) as avg_business,
-            ROUND(AVG(s.cat_education_dx), 1) as avg_education,
-            ROUND(AVG(s.cat_information), 1) as avg_information,
-            COUNT(*) as municipality_count,
-            SUM(m.population) as total_population
-        FROM municipalities m
-        LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
-        WHERE m.prefecture IS NOT NULL
-    """
-    params = {}
-
-    if region and region in PREFECTURES_BY_REGION:
-        prefs = PREFECTURES_BY_REGION[region]
-        placeholders = ', '.join([f':p{i}' for i in range(len(prefs))])
-        query += f" AND m.prefecture IN ({placeholders})"
-        for i, p in enumerate(prefs):
-            params[f'p{i}'] = p
-
-    query += " GROUP BY m.prefecture ORDER BY m.prefecture"
-
-    result = db.execute(text(query), params)
-    rows = [dict(row._mapping) for row in result]
-
-    # 地方名を付与
-    for row in rows:
-        row['region'] = REGION_BY_PREFECTURE.get(row['prefecture'], '不明')
+    data = await aggregate_snapshot.get(db)
 
-    return rows
+    if region:
+        # 存在しない地方名の場合は空リスト
+        prefs = set(PREFECTURES_BY_REGION.get(region, []))
+        return _cached_json(request, data, f'prefectures:{region}',
+                            lambda: [p for p in data.prefectures if p['prefecture'] in prefs])
+    return _cached_json(request, data, 'prefectures', lambda: data.prefectures)
 
 
 @router.get("/municipalities")
 async def get_municipality_scores(
+    request: Request,
     prefecture: Optional[str] = Query(None, description="都道府県名でフィルタ"),
     region: Optional[str] = Query(None, description="地方名でフィルタ"),
     min_score: Optional[float] = Query(None, description="最小スコア"),
     max_score: Optional[float] = Query(None, description="最大スコア"),
     limit: int = Query(2500, description="取得件数上限"),
-    db: Session = Depends(get_db)
+    response_format: str = Query('rows', alias='format', pattern='^(rows|columns)$',
+                                 description="rows: 行の配列 / columns: 列ごとの配列（struct-of-arrays）"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     自治体一覧+スコアを返す（Level 3: 都道府県ビュー）
@@ -156,71 +132,73 @@ async def get_municipality_scores(
         prefecture: 都道府県名でフィルタ
         region: 地方名でフィルタ
         min_score/max_score: スコア範囲でフィルタ
+        format: レスポンス形式（columns は地図レイヤーにそのまま渡せる列形式）
+
+    フィルタごとのシリアライズ済み本文を返す（Accept-Encoding に応じて gzip/br、
+    ETag 一致時は 304）。
     """
-    query = """
-        SELECT
-            m.city_code,
-            m.city_name,
-            m.prefecture,
-            m.population,
-            m.latitude,
-            m.longitude,
-            COALESCE(s.total_score, 0) as total_score,
-            s.cat_citizen_services,
-            s.cat_promotion_system,
-            s.cat_business_dx,
-            s.cat_education_dx,
-            s.cat_information,
-            p.pattern_id,
-            p.pattern_name
-        FROM municipalities m
-        LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
-        LEFT JOIN municipality_patterns p ON m.city_code = p.city_code
-        WHERE m.latitude IS NOT NULL
-    """
-    params = {}
-
-    if prefecture:
-        query += " AND m.prefecture = :prefecture"
-        params['prefecture'] = prefecture
-    elif region and region in PREFECTURES_BY_REGION:
-        prefs = PREFECTURES_BY_REGION[region]
-        placeholders = ', '.join([f':p{i}' for i in range(len(prefs))])
-        query += f" AND m.prefecture IN ({placeholders})"
-        for i, p in enumerate(prefs):
-            params[f'p{i}'] = p
-
-    if min_score is not None:
-        query += " AND COALESCE(s.total_score, 0) >= :min_score"
-        params['min_score'] = min_score
-    if max_score is not None:
-        query += " AND COALESCE(s.total_score, 0) <= :max_score"
-        params['max_score'] = max_score
-
-    query += " ORDER BY s.total_score DESC NULLS LAST LIMIT :limit"
-    params['limit'] = limit
-
-    result = db.execute(text(query), params)
-    rows = []
-    for row in result:
-        r = dict(row._mapping)
-        r['region'] = REGION_BY_PREFECTURE.get(r['prefecture'], '不明')
-        r['latitude'] = float(r['latitude']) if r['latitude'] else None
-        r['longitude'] = float(r['longitude']) if r['longitude'] else None
-        rows.append(r)
-
-    return rows
+    flt = MunicipalityFilter(
+        prefecture=prefecture or None,
+        region_prefectures=(tuple(PREFECTURES_BY_REGION[region])
+                            if not prefecture and region in PREFECTURES_BY_REGION else None),
+        min_score=min_score,
+        max_score=max_score,
+        limit=limit,
+    )
+    entry = await municipality_snapshot.get(db, flt)
+
+    accept_encoding = request.headers.get('accept-encoding', '')
+    etag = entry.etag(flt.key(), response_format, entry.encoding_for(response_format, accept_encoding))
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    body, encoding = entry.body(response_format, accept_encoding)
+    if encoding != IDENTITY:
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+async def _fetch_ranks(db: AsyncSession, city_code: str) -> Optional[dict]:
+    """dx_score_ranks から順位を取得（テーブル未作成・行なしの場合は None）"""
+    try:
+        result = await db.execute(text("""
+            SELECT national_rank, national_total, national_percentile,
+                   prefecture_rank, prefecture_total, prefecture_percentile,
+                   population_band, band_rank, band_total, band_percentile
+            FROM dx_score_ranks
+            WHERE city_code = :city_code
+        """), {'city_code': city_code})
+    except sa_exc.ProgrammingError:
+        # 010未適用: ロールバックして従来の集計クエリを使う
+        await db.rollback()
+        return None
+    row = result.mappings().first()
+    return format_ranks(row) if row else None
+
+
+async def _fetch_spatial(db: AsyncSession, city_code: str) -> Optional[dict]:
+    """municipality_spatial_aggregates から法人・建物集計を取得（未作成・行なしは None）"""
+    try:
+        result = await db.execute(text("""
+            SELECT * FROM municipality_spatial_aggregates WHERE city_code = :city_code
+        """), {'city_code': city_code})
+    except sa_exc.ProgrammingError:
+        # 013未適用
+        await db.rollback()
+        return None
+    row = result.mappings().first()
+    return format_spatial(dict(row)) if row else None
 
 
 @router.get("/municipality/{city_code}")
-async def get_municipality_detail(city_code: str, db: Session = Depends(get_db)):
+async def get_municipality_detail(city_code: str, db: AsyncSession = Depends(get_async_db)):
     """
     自治体の詳細情報を返す（Level 4: 自治体ダッシュボード）
 
     全データ（DX指標15種、GIGA、ニュース、パターン、スコア）を返す
     """
     # 基本データ + スコア + パターン + GIGA
-    result = db.execute(text("""
+    result = await db.execute(text("""
         SELECT
             m.city_code, m.city_name, m.prefecture, m.population,
             m.latitude, m.longitude, m.dx_status,
@@ -246,7 +224,7 @@ async def get_municipality_detail(city_code: str, db: Session = Depends(get_db))
     data['region'] = REGION_BY_PREFECTURE.get(data['prefecture'], '不明')
 
     # ニュース記事を取得
-    news_result = db.execute(text("""
+    news_result = await db.execute(text("""
         SELECT title, url, source, category, published_at, collected_at
         FROM municipality_news
         WHERE city_code = :city_code
@@ -255,47 +233,254 @@ async def get_municipality_detail(city_code: str, db: Session = Depends(get_db))
     """), {'city_code': city_code})
     data['news'] = [dict(r._mapping) for r in news_result]
 
-    # 全国ランキング
-    rank_result = db.execute(text("""
-        SELECT COUNT(*) + 1 as rank
-        FROM dx_scores_improved
-        WHERE total_score > (SELECT total_score FROM dx_scores_improved WHERE city_code = :city_code)
-    """), {'city_code': city_code})
-    rank_row = rank_result.fetchone()
-    data['national_rank'] = rank_row._mapping['rank'] if rank_row else None
-
-    total_result = db.execute(text("SELECT COUNT(*) as total FROM dx_scores_improved"))
-    data['total_municipalities'] = total_result.fetchone()._mapping['total']
-
-    # 同規模自治体の比較データ（人口±30%の自治体Top5）
-    if data['population'] is not None and data['population'] > 0:
-        pop = data['population']
-        comparison_result = db.execute(text("""
-            SELECT m.city_name, m.population, s.total_score
-            FROM municipalities m
-            JOIN dx_scores_improved s ON m.city_code = s.city_code
-            WHERE m.population BETWEEN :pop_min AND :pop_max
-              AND m.city_code != :city_code
-            ORDER BY s.total_score DESC
-            LIMIT 5
-        """), {
-            'pop_min': int(pop * 0.7),
-            'pop_max': int(pop * 1.3),
-            'city_code': city_code
-        })
-        data['similar_municipalities'] = [dict(r._mapping) for r in comparison_result]
+    # 全国・都道府県・人口規模帯ランキング（スコア保存時に算出済みの順位を主キー参照）
+    ranks = await _fetch_ranks(db, city_code)
+    if ranks is not None:
+        data['ranks'] = ranks
+        data['national_rank'] = ranks['national']['rank']
+        data['total_municipalities'] = ranks['national']['total']
+    else:
+        # 順位インデックス未作成・未算出時は従来どおり都度集計
+        rank_result = await db.execute(text("""
+            SELECT COUNT(*) + 1 as rank
+            FROM dx_scores_improved
+            WHERE total_score > (SELECT total_score FROM dx_scores_improved WHERE city_code = :city_code)
+        """), {'city_code': city_code})
+        rank_row = rank_result.fetchone()
+        data['national_rank'] = rank_row._mapping['rank'] if rank_row else None
+
+        total_result = await db.execute(text("SELECT COUNT(*) as total FROM dx_scores_improved"))
+        data['total_municipalities'] = total_result.fetchone()._mapping['total']
+
+    # 同規模自治体の比較データ（人口±30%の自治体Top5）と多指標の近傍自治体
+    index = await peer_index.get(db)
+    data['similar_municipalities'] = index.similar(data['population'], exclude=city_code)
+    data['nearest_peers'] = index.nearest(city_code)
+
+    # 法人・建物の集計（取り込み時に算出済み）
+    spatial = await _fetch_spatial(db, city_code)
+    if spatial is not None:
+        data['spatial'] = spatial
 
     return data
 
 
+@router.get("/municipality/{city_code}/meshes")
+async def get_municipality_meshes(
+    city_code: str,
+    min_companies: int = Query(0, ge=0, description="法人数がこの値以上のメッシュのみ"),
+    limit: int = Query(2000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    自治体内の3次メッシュ別の法人・建物集計を返す（事業所密度のヒートマップ用）
+
+    各メッシュの中心座標はメッシュコードから算出する。法人数の多い順。
+    """
+    try:
+        result = await db.execute(text("""
+            SELECT mesh_code, company_count, certified_company_count, cert_counts,
+                   building_count, height_sum, height_count
+            FROM mesh_aggregates
+            WHERE city_code = :city_code AND company_count >= :min_companies
+            ORDER BY company_count DESC, mesh_code
+            LIMIT :limit
+        """), {'city_code': city_code, 'min_companies': min_companies, 'limit': limit})
+    except sa_exc.ProgrammingError:
+        await db.rollback()
+        raise HTTPException(status_code=503, detail="メッシュ集計が未作成です")
+    rows = [dict(r) for r in result.mappings()]
+    if not rows:
+        return []
+
+    # 建物由来の4次メッシュなどレベルが混在しうるため、レベルごとに変換
+    codes = np.array([int(r['mesh_code']) for r in rows], dtype=np.int64)
+    levels = mesh_level(codes)
+    lat, lon = np.empty(len(codes)), np.empty(len(codes))
+    for level in np.unique(levels).tolist():
+        mask = levels == level
+        lat[mask], lon[mask] = decode_mesh(codes[mask], level=level)
+    return [
+        {
+            'mesh_code': r['mesh_code'],
+            'lat': round(float(y), 6),
+            'lon': round(float(x), 6),
+            'company_count': r['company_count'],
+            'certified_company_count': r['certified_company_count'],
+            'cert_counts': r['cert_counts'] or {},
+            'building_count': r['building_count'],
+            'avg_height': round(r['height_sum'] / r['height_count'], 1) if r['height_count'] else None,
+        }
+        for r, y, x in zip(rows, lat.tolist(), lon.tolist())
+    ]
+
+
+@router.get("/municipality/{city_code}/peers")
+async def get_municipality_peers(
+    city_code: str,
+    k: int = Query(10, ge=1, le=50, description="取得する近傍自治体数"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    類似自治体を返す
+
+    人口（対数）・高齢化率・財政力指数・5カテゴリスコアを標準化した
+    距離が近い順に k 件。スコア未算出の自治体は404。
+    """
+    index = await peer_index.get(db)
+    if city_code not in index:
+        raise HTTPException(status_code=404, detail="スコア算出済みの自治体が見つかりません")
+    return index.nearest(city_code, k=k)
+
+
+@router.get("/municipality/{city_code}/neighbors")
+async def get_municipality_neighbors(
+    city_code: str,
+    k: int = Query(10, ge=1, le=50, description="取得する近傍自治体数"),
+    adjacent_only: bool = Query(False, description="隣接（一定距離以内）の自治体のみ"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    近隣自治体を距離順に返す
+
+    庁舎所在地の緯度経度による k 近傍。各自治体のスコア・DX推進部署の有無を付与する。
+    座標未登録の自治体は404。
+    """
+    graph = await neighbor_graph.get(db)
+    if city_code not in graph:
+        raise HTTPException(status_code=404, detail="座標が登録された自治体が見つかりません")
+    neighbors = graph.neighbors_of(city_code, k=k, adjacent_only=adjacent_only)
+    if not neighbors:
+        return []
+
+    result = await db.execute(text("""
+        SELECT m.city_code, m.city_name, m.prefecture, m.population,
+               s.total_score,
+               COALESCE(m.dx_status->>'dept' = 'true', false) as has_dx_dept
+        FROM municipalities m
+        LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
+        WHERE m.city_code = ANY(:codes)
+    """), {'codes': [n['city_code'] for n in neighbors]})
+    details = {r['city_code']: dict(r) for r in result.mappings()}
+    return [dict(details.get(n['city_code'], {}), **n) for n in neighbors]
+
+
+@router.get("/tiles/municipalities/{z}/{x}/{y}.mvt")
+async def get_municipality_tile(
+    z: int, x: int, y: int, request: Request, db: AsyncSession = Depends(get_async_db),
+):
+    """
+    自治体境界のベクタータイル（Mapbox Vector Tile、レイヤー名 municipalities）
+
+    total_score などのスコア属性を埋め込み済み。ズームに応じて境界を簡略化する。
+    範囲外のズームは404、該当する自治体が無いタイルは204。
+    再スコアリングまでは同じタイルを返すため ETag で再検証できる。
+    """
+    if not TILE_MIN_ZOOM <= z <= TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="タイルの範囲外です")
+    tile = await municipality_tiles.tile(db, z, x, y)
+    if tile is None:
+        raise HTTPException(status_code=503, detail="自治体境界データが未配置です")
+    data, version = tile
+    encoding = (negotiate_encoding(request.headers.get('accept-encoding', ''))
+                if len(data) >= RESPONSE_MIN_COMPRESS_SIZE else IDENTITY)
+    etag = f'"tile-{hashlib.sha1(f"{version}:{encoding}".encode("utf-8")).hexdigest()[:16]}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=300', 'Vary': 'Accept-Encoding'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    if not data:
+        return Response(status_code=204, headers=headers)
+    if encoding != IDENTITY:
+        data = encode_body(data, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(content=data, media_type='application/vnd.mapbox-vector-tile', headers=headers)
+
+
+@router.get("/runs")
+async def get_score_runs(
+    kind: str = Query('dx_improved', pattern='^(dx_improved|decision_readiness)$',
+                      description="スコア種別"),
+    limit: int = Query(30, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """保存済みのスコアラン一覧（新しい順、current = 公開中）。014未適用時は空リスト"""
+    try:
+        result = await db.execute(text("""
+            SELECT r.run_id, r.row_count, r.created_at, r.published_at,
+                   (p.run_id IS NOT NULL) AS current
+            FROM score_runs r
+            LEFT JOIN score_run_pointer p ON p.run_id = r.run_id
+            WHERE r.kind = :kind
+            ORDER BY r.run_id DESC
+            LIMIT :limit
+        """), {'kind': kind, 'limit': limit})
+    except sa_exc.ProgrammingError:
+        await db.rollback()
+        return []
+    return [dict(r) for r in result.mappings()]
+
+
+@router.get("/movers")
+async def get_score_movers(
+    kind: str = Query('dx_improved', pattern='^(dx_improved|decision_readiness)$',
+                      description="スコア種別"),
+    since_run: Optional[int] = Query(None, description="前回取得した run_id（省略時は直前の公開ラン）"),
+    limit: int = Query(20, ge=1, le=200, description="上昇・下降・閾値通過それぞれの件数上限"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    スコアの変動自治体フィード（公開中のランと比較元ランの差分）
+
+    since_run が公開中のランと同じなら changed=false だけを返す（ポーリング用）。
+    比較元が直前の公開ランなら保存済みの差分、それ以外は両ランのスナップショットから算出する。
+    """
+    spec = DELTA_SPECS[kind]
+    feed = {'kind': kind, 'run_id': None, 'base_run_id': None, 'published_at': None, 'changed': False}
+    run_id = await published_run_id(db, kind)
+    if run_id is None:
+        return feed
+    run = await fetch_run(db, run_id) or {}
+    feed.update(run_id=run_id, published_at=run.get('published_at'))
+    if since_run == run_id:
+        return feed
+
+    base_run_id = since_run if since_run is not None else run.get('base_run_id')
+    if base_run_id is None:
+        # 初回ラン（比較元なし）
+        return feed
+    deltas = await fetch_deltas(db, run_id) if base_run_id == run.get('base_run_id') else None
+    if deltas is None:
+        before = await fetch_snapshot(db, kind, base_run_id)
+        if not before:
+            raise HTTPException(status_code=404, detail=f"ラン #{base_run_id} が見つかりません（削除済み）")
+        deltas = compute_deltas(before, await fetch_snapshot(db, kind, run_id), spec)
+
+    feed.update(base_run_id=base_run_id, changed=bool(deltas), **summarize(deltas, spec, limit))
+
+    # 表示用に自治体名を付与（返す自治体分のみ）
+    codes = sorted({d['city_code'] for key in ('gainers', 'decliners', 'crossed') for d in feed[key]})
+    if codes:
+        result = await db.execute(text("""
+            SELECT city_code, city_name, prefecture FROM municipalities
+            WHERE city_code = ANY(:codes)
+        """), {'codes': codes})
+        names = {r['city_code']: r for r in result.mappings()}
+        for key in ('gainers', 'decliners', 'crossed'):
+            for d in feed[key]:
+                info = names.get(d['city_code'])
+                d['city_name'] = info['city_name'] if info else None
+                d['prefecture'] = info['prefecture'] if info else None
+    return feed
+
+
 @router.get("/stats")
-async def get_overall_stats(db: Session = Depends(get_db)):
+async def get_overall_stats(db: AsyncSession = Depends(get_async_db)):
     """
     全体統計情報を返す
 
     ダッシュボードのヘッダー部分に表示する統計データ
     """
-    result = db.execute(text("""
+    result = await db.execute(text("""
         SELECT
             COUNT(*) as total_municipalities,
             ROUND(AVG(total_score), 1) as avg_score,
@@ -307,7 +492,7 @@ async def get_overall_stats(db: Session = Depends(get_db)):
     stats = dict(result.fetchone()._mapping)
 
     # パターン分布
-    pattern_result = db.execute(text("""
+    pattern_result = await db.execute(text("""
         SELECT pattern_name, COUNT(*) as count
         FROM municipality_patterns
         WHERE pattern_id != 7
@@ -1,24 +1,11 @@
 from fastapi import APIRouter, Query, HTTPException, Depends
 from typing import List, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
 from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import settings
-
-def get_db_conn():
-    conn = psycopg2.connect(
-        host=settings.DB_HOST,
-        port=settings.DB_PORT,
-        database=settings.DB_NAME,
-        user=settings.DB_USER,
-        password=settings.DB_PASSWORD
-    )
-    try:
-        yield conn
-    finally:
-        conn.close()
+from database import get_async_db
 
 class MunicipalityResponse(BaseModel):
     city_code: str
@@ -45,42 +32,40 @@ async def list_municipalities(
     search: Optional[str] = Query(None, description="Search Keyword"),
     limit: int = Query(50, ge=1, le=2000), 
     offset: int = Query(0, ge=0),
-    conn = Depends(get_db_conn)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List municipalities with filters"""
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     query = "SELECT city_code, prefecture, city_name, city_type, region, population, NULL as latitude, NULL as longitude, official_url FROM municipalities WHERE 1=1"
-    params = []
+    params = {}
     
     if region:
-        query += " AND region = %s"
-        params.append(region)
+        query += " AND region = :region"
+        params['region'] = region
     if prefecture:
-        query += " AND prefecture = %s"
-        params.append(prefecture)
+        query += " AND prefecture = :prefecture"
+        params['prefecture'] = prefecture
     if search:
-        query += " AND (city_name LIKE %s OR prefecture LIKE %s)"
-        params.append(f"%{search}%")
-        params.append(f"%{search}%")
+        query += " AND (city_name LIKE :search OR prefecture LIKE :search)"
+        params['search'] = f"%{search}%"
         
-    query += " ORDER BY city_code LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
+    query += " ORDER BY city_code LIMIT :limit OFFSET :offset"
+    params['limit'] = limit
+    params['offset'] = offset
     
-    cur.execute(query, params)
-    return cur.fetchall()
+    result = await db.execute(text(query), params)
+    return [dict(r) for r in result.mappings()]
 
 @router.get('/{city_code}', response_model=MunicipalityDetailResponse)
-async def get_municipality(city_code: str, conn = Depends(get_db_conn)):
+async def get_municipality(city_code: str, db: AsyncSession = Depends(get_async_db)):
     """Get municipality details"""
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM municipalities WHERE city_code = %s", (city_code,))
-    result = cur.fetchone()
+    result = (await db.execute(
+        text("SELECT * FROM municipalities WHERE city_code = :city_code"),
+        {'city_code': city_code})).mappings().first()
     
     if not result:
         raise HTTPException(status_code=404, detail="Municipality not found")
         
-    return result
+    return dict(result)
 
 @router.get('/lists/regions')
 async def list_regions():
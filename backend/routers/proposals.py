@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from config import settings
+from database import get_db_conn
+from services.llm_cache import llm_cache
+
+# プロンプトを変更したら上げる（LLM結果キャッシュのキーに含まれる）
+PROPOSAL_PROMPT_VERSION = "proposal-v1"
 
 router = APIRouter(prefix='/api/proposals', tags=['Proposals'])
 
@@ -15,19 +19,6 @@ class ProposalResponse(BaseModel):
     proposal_text: str
     generated_at: str
 
-def get_db_conn():
-    conn = psycopg2.connect(
-        host=settings.DB_HOST,
-        port=settings.DB_PORT,
-        database=settings.DB_NAME,
-        user=settings.DB_USER,
-        password=settings.DB_PASSWORD
-    )
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 @router.post('/generate', response_model=ProposalResponse)
 async def generate_proposal(req: ProposalRequest, conn = Depends(get_db_conn)):
     """
@@ -79,6 +70,15 @@ async def generate_proposal(req: ProposalRequest, conn = Depends(get_db_conn)):
     import httpx
     from datetime import datetime
 
+    # 同じスコア行・フォーカスに対する提案文はキャッシュから返す
+    cached = llm_cache.get(settings.OLLAMA_MODEL, PROPOSAL_PROMPT_VERSION, prompt)
+    if cached is not None:
+        return {
+            "city_code": req.city_code,
+            "proposal_text": cached["proposal_text"],
+            "generated_at": cached["generated_at"]
+        }
+
     try:
         async with httpx.AsyncClient(timeout=60.0) as client:
             response = await client.post(
@@ -92,6 +92,11 @@ async def generate_proposal(req: ProposalRequest, conn = Depends(get_db_conn)):
             response.raise_for_status()
             result = response.json()
             generated_text = result.get("response", "Error generating text.")
+            if "response" in result:
+                llm_cache.put(settings.OLLAMA_MODEL, PROPOSAL_PROMPT_VERSION, prompt, {
+                    "proposal_text": generated_text,
+                    "generated_at": datetime.now().isoformat()
+                })
 
     except Exception as e:
         print(f"Ollama Gen Error: {e}")
@@ -3,27 +3,14 @@ Decision Readiness Score API
 """
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
 from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-# Use the config to get connection parameters
-# Or use a dependency if you have one. For now, creating a simple dependency.
-from config import settings
-
-def get_db_conn():
-    conn = psycopg2.connect(
-        host=settings.DB_HOST,
-        port=settings.DB_PORT,
-        database=settings.DB_NAME,
-        user=settings.DB_USER,
-        password=settings.DB_PASSWORD
-    )
-    try:
-        yield conn
-    finally:
-        conn.close()
+# Shared pooled async session dependency
+from database import get_async_db
+from services.score_runs import published_run_id
 
 router = APIRouter(prefix='/api/scores', tags=['Scores'])
 
@@ -54,45 +41,78 @@ class DecisionScoreResponse(BaseModel):
     # Optional breakdown if stored
     # breakdown: Optional[ScoreDetails]
 
-@router.get('/{city_code}', response_model=DecisionScoreResponse)
-async def get_score(city_code: str, conn = Depends(get_db_conn)):
+async def _score_join(db: AsyncSession, params: dict) -> str:
     """
-    Get the latest Decision Readiness Score for a municipality.
+    Score source for list endpoints: the published run snapshot when available
+    (immutable, keyed by run_id), otherwise the live decision_readiness_scores table.
     """
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    query = """
-        SELECT 
-            m.city_code, m.city_name, m.prefecture,
-            s.total_score, s.confidence_level, s.scored_at,
-            s.structural_pressure, s.leadership_commitment,
-            s.peer_pressure, s.feasibility, s.accountability,
-            s.evidence_urls, s.signal_keywords
-        FROM decision_readiness_scores s
-        JOIN municipalities m ON s.city_code = m.city_code
-        WHERE m.city_code = %s
-        ORDER BY s.scored_at DESC
-        LIMIT 1
+    run_id = await published_run_id(db, 'decision_readiness')
+    if run_id is None:
+        return "LEFT JOIN decision_readiness_scores s ON m.city_code = s.city_code"
+    params['run_id'] = run_id
+    return ("LEFT JOIN readiness_score_snapshots s "
+            "ON m.city_code = s.city_code AND s.run_id = :run_id")
+
+@router.get('/{city_code}', response_model=DecisionScoreResponse)
+async def get_score(city_code: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the Decision Readiness Score for a municipality.
+
+    Reads the published run snapshot when available, so a rollback (which only
+    moves the pointer) is reflected here as well; evidence and keywords come from
+    the live row the snapshot was taken from. Falls back to the latest live row.
     """
+    params = {'city_code': city_code}
+    run_id = await published_run_id(db, 'decision_readiness')
+    if run_id is None:
+        query = """
+            SELECT 
+                m.city_code, m.city_name, m.prefecture,
+                s.total_score, s.confidence_level, s.scored_at,
+                s.structural_pressure, s.leadership_commitment,
+                s.peer_pressure, s.feasibility, s.accountability,
+                s.evidence_urls, s.signal_keywords
+            FROM decision_readiness_scores s
+            JOIN municipalities m ON s.city_code = m.city_code
+            WHERE m.city_code = :city_code
+            ORDER BY s.scored_at DESC
+            LIMIT 1
+        """
+    else:
+        params['run_id'] = run_id
+        query = """
+            SELECT 
+                m.city_code, m.city_name, m.prefecture,
+                s.total_score, s.confidence_level, s.scored_at,
+                s.structural_pressure, s.leadership_commitment,
+                s.peer_pressure, s.feasibility, s.accountability,
+                d.evidence_urls, d.signal_keywords
+            FROM readiness_score_snapshots s
+            JOIN municipalities m ON s.city_code = m.city_code
+            LEFT JOIN decision_readiness_scores d
+                ON d.city_code = s.city_code AND d.scored_at = s.scored_at
+            WHERE s.run_id = :run_id AND m.city_code = :city_code
+            LIMIT 1
+        """
     
-    cur.execute(query, (city_code,))
-    result = cur.fetchone()
+    result = (await db.execute(text(query), params)).mappings().first()
     
     if not result:
         # Check if municipality exists
-        cur.execute("SELECT city_name FROM municipalities WHERE city_code = %s", (city_code,))
-        if not cur.fetchone():
+        exists = await db.execute(
+            text("SELECT city_name FROM municipalities WHERE city_code = :city_code"),
+            {'city_code': city_code})
+        if not exists.first():
             raise HTTPException(status_code=404, detail="Municipality not found")
         raise HTTPException(status_code=404, detail="Score not yet calculated for this municipality")
         
-    return result
+    return dict(result)
 
 @router.get('/ranking/{prefecture}', response_model=List[DecisionScoreResponse])
-async def get_prefecture_ranking(prefecture: str, conn = Depends(get_db_conn)):
+async def get_prefecture_ranking(prefecture: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get scores for all municipalities in a prefecture.
     """
-    cur = conn.cursor(cursor_factory=RealDictCursor)
     
     query = """
         SELECT 
@@ -106,23 +126,23 @@ async def get_prefecture_ranking(prefecture: str, conn = Depends(get_db_conn)):
             COALESCE(s.feasibility, 0) as feasibility,
             COALESCE(s.accountability, 0) as accountability
         FROM municipalities m
-        LEFT JOIN decision_readiness_scores s ON m.city_code = s.city_code
-        WHERE m.prefecture = %s
+        {score_join}
+        WHERE m.prefecture = :prefecture
         ORDER BY s.total_score DESC NULLS LAST
     """
+    params = {'prefecture': prefecture}
+    query = query.format(score_join=await _score_join(db, params))
+
+    result = await db.execute(text(query), params)
     
-    cur.execute(query, (prefecture,))
-    results = cur.fetchall()
-    
-    return results
+    return [dict(r) for r in result.mappings()]
 
 @router.get('/map/all')
-async def get_map_data(conn = Depends(get_db_conn)):
+async def get_map_data(db: AsyncSession = Depends(get_async_db)):
     """
     Get lightweight data for all municipalities for map visualization.
     Returns: list of {city_code, lat, lon, score, confidence}
     """
-    cur = conn.cursor(cursor_factory=RealDictCursor)
     # Query for latest score (lat/lon optional for now)
     query = """
         SELECT DISTINCT ON (m.city_code)
@@ -134,13 +154,14 @@ async def get_map_data(conn = Depends(get_db_conn)):
             COALESCE(s.total_score, 0) as total_score,
             COALESCE(s.confidence_level, 'unknown') as confidence
         FROM municipalities m
-        LEFT JOIN decision_readiness_scores s ON m.city_code = s.city_code
+        {score_join}
         ORDER BY m.city_code, s.scored_at DESC NULLS LAST
     """
-    
-    cur.execute(query)
-    results = cur.fetchall()
-    return results
+    params = {}
+    query = query.format(score_join=await _score_join(db, params))
+
+    result = await db.execute(text(query), params)
+    return [dict(r) for r in result.mappings()]
 
 # Batch Trigger
 from typing import List
@@ -150,7 +171,7 @@ class BatchRequest(BaseModel):
     city_codes: Optional[List[str]] = None
 
 @router.post('/batch', status_code=202)
-async def trigger_batch_scoring(req: BatchRequest, conn = Depends(get_db_conn)):
+async def trigger_batch_scoring(req: BatchRequest):
     """
     Trigger the scoring batch process.
     In production, this should launch a background task (Celery/RQ).
@@ -0,0 +1,51 @@
+"""
+自治体境界 GeoJSON（N03 形式）を取得してベクタータイルの元データとして保存する
+
+地図画面がこれまで毎回ブラウザから取得していたものと同じデータを、
+サーバー側に一度だけ配置する（/api/v1/map/tiles/municipalities/{z}/{x}/{y}.mvt が参照）。
+"""
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_tiles import MUNICIPALITY_BOUNDARY_PATH, BoundarySet
+
+BOUNDARY_URL = (
+    "https://raw.githubusercontent.com/smartnews-smri/japan-topography/main/"
+    "data/municipality/geojson/s0001/N03-21_210101.json"
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="自治体境界 GeoJSON の取得")
+    parser.add_argument("--url", default=BOUNDARY_URL)
+    parser.add_argument("--output", default=MUNICIPALITY_BOUNDARY_PATH)
+    args = parser.parse_args(argv)
+
+    print(f"🌐 Downloading {args.url} ...")
+    resp = requests.get(args.url, timeout=120)
+    resp.raise_for_status()
+    data = resp.json()
+
+    # 読み込めることを確認してから置き換える
+    boundaries = BoundarySet.from_geojson(data)
+    if not boundaries.boundaries:
+        print("❌ 境界ポリゴンが含まれていません")
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, args.output)
+    print(f"✅ {len(boundaries.boundaries)} 件の境界を保存しました: {args.output}")
+    print("   APIプロセスを再起動すると新しい境界でタイルを生成します")
+
+
+if __name__ == "__main__":
+    main()
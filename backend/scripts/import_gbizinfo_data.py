@@ -8,7 +8,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import SessionLocal, engine
 from models.spatial import Company, Mesh
-from utils.spatial import geocode_address, lat_lon_to_mesh
+from services.spatial_aggregates import refresh_spatial_aggregates
+from utils.spatial import geocode_addresses, lat_lon_to_mesh
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -55,6 +56,10 @@ def import_gbizinfo_sample():
         
         count_geocoded = 0
         seen_meshes = set()
+        # 集計を更新するメッシュ（書き込み先 + 移転した法人の旧メッシュ）
+        touched_meshes = set()
+        # Geocode all locations at once (shared addresses are looked up once)
+        coords_by_address = geocode_addresses([info.get("location") for info in results])
         
         for info in results:
             c_number = info.get("corporate_number")
@@ -65,7 +70,7 @@ def import_gbizinfo_sample():
                 continue
                 
             # Geocode
-            coords = geocode_address(c_addr)
+            coords = coords_by_address.get(c_addr)
             if coords:
                 lat, lon = coords
                 mesh_code = lat_lon_to_mesh(lat, lon, level=3) # 3rd Mesh (1km)
@@ -74,6 +79,9 @@ def import_gbizinfo_sample():
                 company = db.query(Company).filter(Company.corporate_number == c_number).first()
                 if not company:
                     company = Company(corporate_number=c_number)
+                elif company.mesh_code:
+                    touched_meshes.add(company.mesh_code)
+                touched_meshes.add(mesh_code)
                 
                 company.name = c_name
                 company.address = c_addr
@@ -104,8 +112,12 @@ def import_gbizinfo_sample():
             else:
                 print(f"   ⚠️ Could not geocode: {c_addr}")
         
+        # メッシュ・自治体単位の集計を同じトランザクションで更新（services/spatial_aggregates.py）
+        db.flush()
+        refresh_spatial_aggregates(db.connection().connection, touched_meshes)
         db.commit()
-        print(f"✅ Imported {count_geocoded} companies with spatial index.")
+        print(f"✅ Imported {count_geocoded} companies with spatial index "
+              f"({len(touched_meshes)} meshes re-aggregated).")
         
     except Exception as e:
         print(f"❌ Exception: {e}")
@@ -1,3 +1,4 @@
+import argparse
 import sys
 import os
 from pathlib import Path
@@ -8,8 +9,13 @@ from typing import List
 # Add backend to path
 sys.path.append(str(Path(__file__).parent.parent))  # Add /app to path
 from config import settings
-from engines.decision_readiness_scorer import DecisionReadinessScorerV3
+from engines.batch_readiness_scorer import BatchReadinessScorer
 from engines.ollama_analyzer import OllamaAnalyzer
+from services.scoring_fingerprints import (
+    compute_input_hashes, load_fingerprints, plan_incremental, save_fingerprints,
+    table_exists, text_hash,
+)
+from services.score_runs import snapshot_scores
 
 # BERTはオプショナル（torch/transformersが未インストールの場合はスキップ）
 try:
@@ -19,7 +25,15 @@ except ImportError:
     BERT_AVAILABLE = False
     print("⚠️ BERT分類器は利用不可（torch/transformersが未インストール）。Ollamaのみで動作します。")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Nightly Decision Readiness scoring")
+    parser.add_argument("--full", action="store_true",
+                        help="入力の変更有無に関わらず全対象を再計算する（既定は差分実行）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🌙 Starting Nightly Scoring Batch...")
     
     conn = psycopg2.connect(
@@ -31,7 +45,7 @@ def main():
     )
     
     # Initialize Engines
-    scorer = DecisionReadinessScorerV3(conn)
+    engine = BatchReadinessScorer(conn)
     
     # テキスト分析エンジンの初期化
     bert = BertCommitmentClassifier() if BERT_AVAILABLE else None
@@ -40,18 +54,62 @@ def main():
     try:
         cur = conn.cursor()
         
-        # 1. Select Target Cities (Limit 10 for testing)
-        cur.execute("SELECT city_code, city_name, official_url FROM municipalities LIMIT 10")
+        # 1. Select Target Cities (all municipalities; unchanged ones are skipped below)
+        cur.execute("SELECT city_code, city_name, official_url FROM municipalities ORDER BY city_code")
         targets = cur.fetchall()
         
         print(f"🎯 Processing {len(targets)} municipalities...")
         
+        # 2. Text Collection
+        combined_texts = {
+            city_code: " ".join(fetch_mayor_speech_text(city_code, speech_url))
+            for city_code, _, speech_url in targets
+        }
+
+        # 差分判定: 入力（DB・テキスト）が前回から変わった自治体だけ再計算
+        city_codes = [code for code, _, _ in targets]
+        fingerprints_available = table_exists(conn)
+        incremental = not args.full and fingerprints_available
+        input_hashes = compute_input_hashes(conn, city_codes) if fingerprints_available else {}
+        text_hashes = {code: text_hash(text) for code, text in combined_texts.items() if text}
+        stored = load_fingerprints(conn, city_codes) if incremental else {}
+        plan = plan_incremental({code: input_hashes.get(code, '') for code in city_codes}, stored, text_hashes)
+        print(f"   🔍 {'差分実行' if incremental else '全件実行'}: {plan}")
+
+        rescore = set(plan.rescore)
+        analyze_codes = [code for code in plan.analyze_text if combined_texts.get(code)]
+
+        # BERT（利用可能な場合のみ）: テキストが変わった自治体分をまとめてバッチ推論
+        bert_scores = {}
+        bert_failed = False
+        if bert and analyze_codes:
+            try:
+                bert.warm_up()
+                started = time.perf_counter()
+                bert_results = bert.predict_batch([combined_texts[code][:512] for code in analyze_codes])
+                bert_scores = {code: res.get("score", 0) for code, res in zip(analyze_codes, bert_results)}
+                print(f"   🧠 BERT: {len(analyze_codes)} texts / {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                bert_failed = True
+                print(f"     ⚠️ BERT Failed: {e}")
+
+        # Ollama: 同時実行数を制限して並列分析
+        ollama_results = {}
+        ollama_targets = {code: combined_texts[code][:2000] for code in analyze_codes}
+        if ollama_targets:
+            started = time.perf_counter()
+            ollama_results = ollama.analyze_speeches(ollama_targets)
+            print(f"   🦙 Ollama: {len(ollama_targets)} texts / {time.perf_counter() - started:.1f}s "
+                  f"(concurrency={ollama.concurrency})")
+            print(f"   {ollama.cache.stats()}")
+
+        fingerprints = []
+        analysis_results = {}
         for city_code, city_name, speech_url in targets:
-            print(f"   > Scoring {city_name} ({city_code})...")
+            if city_code not in rescore:
+                continue
             
-            # 2. Text Collection
-            texts = fetch_mayor_speech_text(city_code, speech_url)
-            combined_text = " ".join(texts)
+            combined_text = combined_texts[city_code]
             
             # 3. Analyze Text (Real Integration)
             analysis_result = {
@@ -59,43 +117,51 @@ def main():
                 "ollama_keywords": [],
                 "ollama_score": 0
             }
+            analysis_ok = True
             
-            if combined_text:
-                # BERT（利用可能な場合のみ）
-                if bert:
-                    try:
-                        bert_res = bert.predict_commitment(combined_text[:512])
-                        analysis_result["bert_score"] = bert_res.get("score", 0)
-                    except Exception as e:
-                        print(f"     ⚠️ BERT Failed: {e}")
+            if city_code in plan.reused_analysis:
+                # テキスト不変: 前回の分析結果を再利用
+                analysis_result = plan.reused_analysis[city_code]
+            elif combined_text:
+                analysis_result["bert_score"] = bert_scores.get(city_code, 0)
                     
                 # Ollama
-                try:
-                    # In real usage, pass fuller text. 
-                    ollama_res = ollama.analyze_mayor_speech(combined_text[:2000])
-                    # Map Ollama result to keywords
-                    if ollama_res.get("first_person_commitment"):
-                        analysis_result["ollama_keywords"].append("first_person")
-                    if ollama_res.get("budget_mentioned"):
-                        analysis_result["ollama_keywords"].append("budget")
-                except Exception as e:
-                    print(f"     ⚠️ Ollama Failed: {e}")
-
-            # 4. Score
-            result = scorer.score(city_code, analysis_result)
-            
-            print(f"     ✅ Score: {result.total} (Confidence: {result.confidence})")
-            
-            # 5. Save (Already done inside scorer.score() in my previous implementation? 
-            # No, looking at my previous implementations, I usually separate save.
-            # Let's check DecisionReadinessScorerV3 source.
-            # Ah, I see I didn't implement 'save_to_db' inside the 'score' method in the python file I wrote in Step 1921.
-            # I returned the object. So I need to save it here.
-            
-            save_score(conn, result)
-            
-            time.sleep(0.1)
-            
+                ollama_res = ollama_results.get(city_code, {})
+                if ollama_res.get("error"):
+                    analysis_ok = False
+                    print(f"     ⚠️ Ollama Failed ({city_name}): {ollama_res['error']}")
+                # Map Ollama result to keywords
+                if ollama_res.get("first_person_commitment"):
+                    analysis_result["ollama_keywords"].append("first_person")
+                if ollama_res.get("budget_mentioned"):
+                    analysis_result["ollama_keywords"].append("budget")
+
+            analysis_results[city_code] = analysis_result
+
+            # 分析に失敗した自治体はテキストハッシュを残さず、次回に再分析させる
+            reused = city_code in plan.reused_analysis
+            text_ok = bool(combined_text) and analysis_ok and (reused or not bert_failed)
+            fingerprints.append((
+                city_code,
+                input_hashes.get(city_code, ''),
+                text_hashes.get(city_code) if text_ok else None,
+                analysis_result if text_ok else None,
+            ))
+
+        # 4. Score (inputs prefetched per chunk, no per-city queries)
+        started = time.perf_counter()
+        results = engine.score_all(plan.rescore, analysis_results)
+        print(f"   🧮 Scored {len(results)} municipalities / {time.perf_counter() - started:.1f}s")
+
+        # 5. Save (one COPY-based upsert)
+        if results:
+            print(f"   💾 {engine.write_scores(results)}")
+
+        # スコア・フィンガープリント・ランの公開は同一トランザクションでコミット
+        if fingerprints and fingerprints_available:
+            save_fingerprints(conn, fingerprints)
+        if results:
+            snapshot_scores(conn, 'decision_readiness')
         conn.commit()
         print("✅ Batch Completed Successfully.")
         
@@ -119,36 +185,5 @@ def fetch_mayor_speech_text(city_code: str, url: str) -> List[str]:
         "補正予算にて5億円を計上し、全庁的な改革を行います。"
     ]
 
-def save_score(conn, result):
-    """
-    Save the score to DB.
-    """
-    cur = conn.cursor()
-    
-    # Simple Update/Insert (total_score is auto-generated)
-    query = """
-        INSERT INTO decision_readiness_scores
-        (city_code, structural_pressure, leadership_commitment, peer_pressure,
-         feasibility, accountability, confidence_level, scored_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-        ON CONFLICT (city_code, ((scored_at)::DATE)) DO UPDATE SET
-            structural_pressure = EXCLUDED.structural_pressure,
-            leadership_commitment = EXCLUDED.leadership_commitment,
-            peer_pressure = EXCLUDED.peer_pressure,
-            feasibility = EXCLUDED.feasibility,
-            accountability = EXCLUDED.accountability,
-            confidence_level = EXCLUDED.confidence_level
-    """
-
-    cur.execute(query, (
-        result.city_code,
-        result.structural_pressure,
-        result.leadership_commitment,
-        result.peer_pressure,
-        result.feasibility,
-        result.accountability,
-        result.confidence
-    ))
-
 if __name__ == "__main__":
     main()
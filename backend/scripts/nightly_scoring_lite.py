@@ -2,6 +2,7 @@
 Nightly Scoring Batch (Lite Version - No AI)
 AI Engines をスキップして、DBデータのみでスコアリングを実行
 """
+import argparse
 import sys
 import os
 from pathlib import Path
@@ -12,9 +13,21 @@ from typing import List
 # Add backend to path
 sys.path.append(str(Path(__file__).parent.parent))  # Add /app to path
 from config import settings
-from engines.decision_readiness_scorer import DecisionReadinessScorerV3
+from engines.batch_readiness_scorer import BatchReadinessScorer
+from services.scoring_fingerprints import (
+    compute_input_hashes, load_fingerprints, plan_incremental, save_fingerprints, table_exists,
+)
+from services.score_runs import snapshot_scores
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Nightly Decision Readiness scoring (lite)")
+    parser.add_argument("--full", action="store_true",
+                        help="入力の変更有無に関わらず全対象を再計算する（既定は差分実行）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🌙 Starting Nightly Scoring Batch (Lite Mode - No AI)...")
 
     conn = psycopg2.connect(
@@ -26,7 +39,7 @@ def main():
     )
 
     # Initialize Engines
-    scorer = DecisionReadinessScorerV3(conn)
+    engine = BatchReadinessScorer(conn)
 
     # NOTE: BERT/Ollama engines are skipped in lite mode
     print("   ⚠️ Running in LITE MODE (AI Engines disabled)")
@@ -45,46 +58,50 @@ def main():
         """)
         targets = cur.fetchall()
 
-        print(f"🎯 Processing {len(targets)} municipalities...")
-
-        success_count = 0
-        error_count = 0
-
-        for city_code, city_name in targets:
-            print(f"   > Scoring {city_name} ({city_code})...")
-
-            try:
-                # 3. Empty analysis_result (No AI)
-                analysis_result = {
-                    "bert_score": 0,
-                    "ollama_keywords": [],
-                    "ollama_score": 0
-                }
-
-                # 4. Score
-                result = scorer.score(city_code, analysis_result)
+        # 差分判定: DB入力が前回から変わった自治体だけ再計算
+        city_codes = [code for code, _ in targets]
+        fingerprints_available = table_exists(conn)
+        incremental = not args.full and fingerprints_available
+        input_hashes = compute_input_hashes(conn, city_codes) if fingerprints_available else {}
+        # --full でも保存済みのテキスト分析結果（フル版の BERT/Ollama）は再利用する
+        stored = load_fingerprints(conn, city_codes) if fingerprints_available else {}
+        plan = plan_incremental({code: input_hashes.get(code, '') for code in city_codes}, stored,
+                                full=not incremental)
+        print(f"   🔍 {'差分実行' if incremental else '全件実行'}: {plan}")
+        rescore = set(plan.rescore)
+        targets = [t for t in targets if t[0] in rescore]
 
-                print(f"     ✅ Score: {result.total}/100 (Confidence: {result.confidence})")
-                print(f"        - Structural: {result.structural_pressure}/30")
-                print(f"        - Leadership: {result.leadership_commitment}/25 (⚠️ No AI)")
-                print(f"        - Peer: {result.peer_pressure}/20")
-                print(f"        - Feasibility: {result.feasibility}/15")
-                print(f"        - Accountability: {result.accountability}/10")
-
-                # 5. Save
-                save_score(conn, result)
-                success_count += 1
-
-            except Exception as e:
-                print(f"     ❌ Error scoring {city_name}: {e}")
-                error_count += 1
-                continue
-
-            time.sleep(0.1)
+        print(f"🎯 Processing {len(targets)} municipalities...")
 
+        # 3. No AI: 前回フル版で分析済みの自治体はその結果を使い、無い自治体は空の analysis_result
+        #    （入力ハッシュを進めても、次回のフル版で AI なしのスコアが残らないように）
+        # 4. Score (inputs prefetched per chunk, no per-city queries)
+        started = time.perf_counter()
+        results = engine.score_all([code for code, _ in targets], plan.reused_analysis)
+        print(f"   🧮 Scored {len(results)} municipalities / {time.perf_counter() - started:.1f}s "
+              f"(⚠️ Leadership without AI: {len(results) - len(plan.reused_analysis)})")
+
+        # 5. Save (one COPY-based upsert) together with fingerprints
+        if results:
+            print(f"   💾 {engine.write_scores(results)}")
+        if results and fingerprints_available:
+            save_fingerprints(
+                conn,
+                [(r.city_code, input_hashes.get(r.city_code, ''), None, None) for r in results],
+                update_text=False,
+            )
+        # 変更があった場合のみ新しいランを公開（スコアと同一トランザクション）
+        if results:
+            snapshot_scores(conn, 'decision_readiness')
         conn.commit()
-        print(f"\n✅ Batch Completed Successfully.")
-        print(f"   📊 Success: {success_count}, Errors: {error_count}")
+
+        if results:
+            totals = sorted(r.total for r in results)
+            print(f"\n✅ Batch Completed Successfully.")
+            print(f"   📊 Scored: {len(results)}, "
+                  f"min/median/max: {totals[0]}/{totals[len(totals) // 2]}/{totals[-1]}")
+        else:
+            print(f"\n✅ Batch Completed Successfully. (no changes)")
 
     except Exception as e:
         print(f"❌ Batch Failed: {e}")
@@ -93,36 +110,5 @@ def main():
     finally:
         conn.close()
 
-def save_score(conn, result):
-    """
-    Save the score to DB.
-    """
-    cur = conn.cursor()
-
-    # Simple Update/Insert (total_score is auto-generated)
-    query = """
-        INSERT INTO decision_readiness_scores
-        (city_code, structural_pressure, leadership_commitment, peer_pressure,
-         feasibility, accountability, confidence_level, scored_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-        ON CONFLICT (city_code, ((scored_at)::DATE)) DO UPDATE SET
-            structural_pressure = EXCLUDED.structural_pressure,
-            leadership_commitment = EXCLUDED.leadership_commitment,
-            peer_pressure = EXCLUDED.peer_pressure,
-            feasibility = EXCLUDED.feasibility,
-            accountability = EXCLUDED.accountability,
-            confidence_level = EXCLUDED.confidence_level
-    """
-
-    cur.execute(query, (
-        result.city_code,
-        result.structural_pressure,
-        result.leadership_commitment,
-        result.peer_pressure,
-        result.feasibility,
-        result.accountability,
-        result.confidence
-    ))
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,40 @@
+"""
+メッシュ・自治体単位の法人／建物集計を全件再構築する
+
+013_spatial_aggregates.sql 適用直後の初回構築や、取り込み処理を経由せずに
+companies / buildings を更新した後に実行する。通常の取り込みでは差分更新される。
+"""
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.spatial_aggregates import refresh_spatial_aggregates
+
+
+def main():
+    conn = psycopg2.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        database=settings.DB_NAME,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD
+    )
+    started = time.perf_counter()
+    try:
+        if refresh_spatial_aggregates(conn, commit=True):
+            print(f"✅ 空間集計を再構築しました ({time.perf_counter() - started:.1f}秒)")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+スコア算出ランの一覧・ロールバック・削除
+
+    python scripts/score_runs.py list --kind dx_improved
+    python scripts/score_runs.py rollback --kind dx_improved --run 41
+    python scripts/score_runs.py prune --kind decision_readiness --keep 7
+    python scripts/score_runs.py snapshot --kind dx_improved   # 014適用直後の初回ラン作成
+
+ロールバックは公開ポインタの切り替えだけで完了する（dx_improved は
+dx_scores_improved・順位・集計ビューも戻したランの内容で作り直す）。
+"""
+import argparse
+import os
+import sys
+
+import psycopg2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.map_snapshot import refresh_map_aggregates
+from services.score_ranks import refresh_score_ranks
+from services.score_runs import (
+    RUN_KINDS, SCORE_RUN_RETENTION, list_runs, prune_runs, rollback_run, runs_table_exists,
+    snapshot_scores,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="スコア算出ランの管理")
+    parser.add_argument("command", choices=["list", "rollback", "prune", "snapshot"])
+    parser.add_argument("--kind", choices=sorted(RUN_KINDS), default="dx_improved")
+    parser.add_argument("--run", type=int, help="rollback 先の run_id")
+    parser.add_argument("--keep", type=int, default=SCORE_RUN_RETENTION,
+                        help="prune で残すラン数（新しい順）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "rollback" and args.run is None:
+        print("❌ rollback には --run を指定してください")
+        return
+
+    conn = psycopg2.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        database=settings.DB_NAME,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD
+    )
+    try:
+        if not runs_table_exists(conn):
+            print("❌ score_runs が未作成です（014_score_runs.sql を適用してください）")
+            return
+
+        if args.command == "list":
+            for run in list_runs(conn, args.kind):
+                mark = "*" if run["current"] else " "
+                print(f"{mark} #{run['run_id']:<6} {run['created_at']:%Y-%m-%d %H:%M}  "
+                      f"{run['row_count']}件")
+        elif args.command == "rollback":
+            rollback_run(conn, args.kind, args.run)
+            if args.kind == "dx_improved":
+                # 順位・集計ビューも戻したスコアと同じトランザクションで切り替える
+                refresh_score_ranks(conn, commit=False)
+                refresh_map_aggregates(conn, commit=False)
+            conn.commit()
+            print(f"✅ {args.kind} をラン #{args.run} に戻しました")
+        elif args.command == "prune":
+            pruned = prune_runs(conn, args.kind, args.keep)
+            conn.commit()
+            print(f"✅ {len(pruned)} 件のランを削除しました")
+        else:
+            snapshot_scores(conn, args.kind, commit=True)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
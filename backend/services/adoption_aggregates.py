@@ -0,0 +1,77 @@
+"""
+地方・都道府県別のDX導入率集計
+
+Decision Readiness のピアプレッシャーは「同じ地方で DX 推進部署を持つ自治体の割合」を
+使う。自治体ごとに地方全体を COUNT(*) FILTER で数えるとバッチ全体で O(N²) になるため、
+バッチ開始時に dx_adoption_aggregates を1文で再構築し、各自治体は参照するだけにする。
+
+集計表が未作成（012未適用）の場合は、同じ集計を CTE としてクエリに埋め込む。
+"""
+
+# 地方・都道府県別の集計（scope, name, total, with_*）
+ADOPTION_SELECT = """
+    SELECT 'region' as scope, region as name,
+           COUNT(*) as total,
+           COUNT(*) FILTER (WHERE dx_status->>'dept' = 'true') as with_dept,
+           COUNT(*) FILTER (WHERE dx_status->>'cio' = 'あり') as with_cio,
+           COUNT(*) FILTER (WHERE dx_status->>'ext_cio' = 'あり') as with_ext_cio,
+           COUNT(*) FILTER (WHERE dx_status->>'strategy' = 'true') as with_strategy
+    FROM municipalities
+    WHERE dx_status IS NOT NULL AND region IS NOT NULL
+    GROUP BY region
+    UNION ALL
+    SELECT 'prefecture', prefecture,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE dx_status->>'dept' = 'true'),
+           COUNT(*) FILTER (WHERE dx_status->>'cio' = 'あり'),
+           COUNT(*) FILTER (WHERE dx_status->>'ext_cio' = 'あり'),
+           COUNT(*) FILTER (WHERE dx_status->>'strategy' = 'true')
+    FROM municipalities
+    WHERE dx_status IS NOT NULL AND prefecture IS NOT NULL
+    GROUP BY prefecture
+"""
+
+ADOPTION_COLUMNS = "scope, name, total, with_dept, with_cio, with_ext_cio, with_strategy"
+
+
+def aggregates_table_exists(conn) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('dx_adoption_aggregates')")
+        return cur.fetchone()[0] is not None
+    finally:
+        cur.close()
+
+
+def refresh_adoption_aggregates(conn, commit: bool = False) -> bool:
+    """
+    dx_adoption_aggregates を再構築（バッチ側・psycopg2同期接続）
+
+    DELETE と INSERT を同一トランザクションで行う。集計表が無い場合は False。
+    """
+    if not aggregates_table_exists(conn):
+        print("⚠️ dx_adoption_aggregates が未作成です（012_dx_adoption_aggregates.sql を適用してください）")
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM dx_adoption_aggregates")
+        cur.execute(f"""
+            INSERT INTO dx_adoption_aggregates ({ADOPTION_COLUMNS}, refreshed_at)
+            SELECT {ADOPTION_COLUMNS}, NOW() FROM ({ADOPTION_SELECT}) a
+        """)
+        if commit:
+            conn.commit()
+    finally:
+        cur.close()
+    return True
+
+
+def adoption_source(use_table: bool) -> str:
+    """
+    ピアプレッシャー用クエリの WITH 句に置く集計ソース
+
+    use_table=True なら集計表を参照し、False なら同じ集計をその場で行う。
+    """
+    if use_table:
+        return f"adoption AS (SELECT {ADOPTION_COLUMNS} FROM dx_adoption_aggregates)"
+    return f"adoption AS ({ADOPTION_SELECT})"
@@ -0,0 +1,102 @@
+"""
+バルク書き込みユーティリティ - COPY + 一時テーブル経由の一括UPSERT
+
+1行ずつ INSERT ... ON CONFLICT を発行する代わりに、全行を一時テーブルへ
+COPY でストリーミングし、1本の INSERT ... SELECT ... ON CONFLICT で本テーブルへ
+マージする。全処理を1トランザクションで行うため、読み手（/api/v1/map/* など）が
+更新途中の状態を見ることはない。
+
+テーブル名・カラム名は呼び出し側のコード定数のみを想定（ユーザー入力は不可）。
+"""
+
+import csv
+import io
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class BulkWriteStats:
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def __str__(self) -> str:
+        return f"{self.table}: {self.rows} 行 / {self.seconds:.2f}秒 ({self.rows_per_sec:,.0f} 行/秒)"
+
+
+def _to_csv(rows: Iterable[Sequence]) -> Tuple[io.StringIO, int]:
+    """COPY (FORMAT csv) 用のバッファと行数を返す（None は空欄 = NULL）"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    buf.seek(0)
+    return buf, count
+
+
+def copy_upsert(
+    conn,
+    table: str,
+    columns: List[str],
+    rows: Iterable[Sequence],
+    key_columns: List[str],
+    update_columns: Optional[List[str]] = None,
+    extra_updates: Optional[Dict[str, str]] = None,
+    commit: bool = True,
+) -> BulkWriteStats:
+    """
+    rows を一時テーブルへCOPYし、1文で table へUPSERTする
+
+    Args:
+        conn: psycopg2 コネクション
+        table: 書き込み先テーブル
+        columns: rows の各要素に対応するカラム名
+        rows: 書き込む行（columns 順のタプル/リスト）
+        key_columns: ON CONFLICT の対象カラム（一意制約）
+        update_columns: 衝突時に EXCLUDED で上書きするカラム（既定: key以外の全カラム）
+        extra_updates: 衝突時に追加で設定する式（例: {'updated_at': 'NOW()'}）
+        commit: True の場合はマージ後にコミットする
+
+    Returns:
+        BulkWriteStats（行数・所要時間・スループット）
+    """
+    started = time.perf_counter()
+    tmp_table = f"tmp_bulk_{table}"
+    column_list = ', '.join(columns)
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in key_columns]
+    assignments = [f"{c} = EXCLUDED.{c}" for c in update_columns]
+    assignments += [f"{c} = {expr}" for c, expr in (extra_updates or {}).items()]
+    conflict_action = f"DO UPDATE SET {', '.join(assignments)}" if assignments else "DO NOTHING"
+
+    buf, row_count = _to_csv(rows)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            CREATE TEMP TABLE {tmp_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP
+        """)
+        cur.copy_expert(f"COPY {tmp_table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {column_list} FROM {tmp_table}
+            ON CONFLICT ({', '.join(key_columns)}) {conflict_action}
+        """)
+        cur.execute(f"DROP TABLE {tmp_table}")
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return BulkWriteStats(table=table, rows=row_count, seconds=time.perf_counter() - started)
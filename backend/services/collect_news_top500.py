@@ -2,145 +2,172 @@
 Collect News for Top Municipalities
 人口上位の自治体を対象に、DX・Zoom・カスハラ関連のニュースを収集するスクリプト
 
-API制限（1日100回無料を想定）を考慮し、
-まずは Top 10 自治体 × 3カテゴリ = 30クエリ で実行する。
+API制限（日次の無料枠）を考慮し、news_scheduler の日次クォータ台帳・
+トークンバケットの範囲で、優先度の高い自治体から並行に収集する。
 """
 
+import asyncio
 import os
-import time
+from datetime import datetime
+import httpx
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from google_search_collector import GoogleNewsCollector, NewsDataUpdater
+from google_search_collector import (
+    AsyncGoogleNewsCollector, CATEGORY_QUERIES, QUOTA_STATUS_CODES, NewsDataUpdater,
+    dedupe_results,
+)
+from news_scheduler import (
+    NEWS_DAILY_QUOTA, NEWS_MAX_IN_FLIGHT, NEWS_QUERIES_PER_MINUTE, NEWS_QUERY_BURST,
+    CollectionJob, NewsCollectionScheduler, QuotaExhausted, QuotaLedger, TokenBucket,
+)
 
 # APIレートリミット対策
 # 無料枠: 1,500リクエスト/日
 # 別アプリ使用: 50-150回/日（平均100回）
-# 本アプリ目標: 1,020回/日 (340自治体 × 3カテゴリ)
-# 合計: 1,120-1,170回/日 (無料枠の75%程度)
-# 全2,406自治体を8日間で完了
-BATCH_SIZE = 340
-SLEEP_BETWEEN_QUERIES = 1.0
+# 本アプリ上限: NEWS_DAILY_QUOTA（既定 1,020回/日。1自治体 = 5クエリ → 204自治体/日）
+# 使用数は news_query_quota に記録し、上限に達したら止める（news_scheduler）
+# 人口上位500自治体を、古い順・スコア・直近のニュース件数の優先度で回す
+CANDIDATE_LIMIT = int(os.getenv("NEWS_CANDIDATE_LIMIT", "500"))
+RECENT_SIGNAL_DAYS = 30
 
-def get_next_batch_municipalities(limit: int):
-    """
-    ニュース収集対象の自治体を取得（ローテーション）
-    
-    1. 人口上位500自治体を対象とする
-    2. その中で、ニュース最終収集日時(collected_at)が古い順、
-       または未収集(NULL)の自治体を優先して取得する
-    """
-    conn = psycopg2.connect(
+
+def connect():
+    return psycopg2.connect(
         host=os.getenv("POSTGRES_HOST", "localhost"),
         port=int(os.getenv("POSTGRES_PORT", "5432")),
         user=os.getenv("POSTGRES_USER", "zoom_admin"),
         password=os.getenv("POSTGRES_PASSWORD", "password"),
         dbname=os.getenv("POSTGRES_DB", "zoom_dx_db")
     )
+
+
+def get_candidate_municipalities(conn, limit: int):
+    """
+    ニュース収集対象の自治体を取得（優先度の材料つき）
+
+    1. 人口上位 limit 自治体を対象とする
+    2. 最終収集日時（新着0件だった収集も含む）、改善版DXスコア、
+       直近 RECENT_SIGNAL_DAYS 日に公開されたニュース件数を付ける
+    """
     cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
         # 複雑なクエリになるため、CTEを使用
         cur.execute("""
-            WITH top_500 AS (
+            WITH top_n AS (
                 SELECT city_code, city_name, prefecture, population
                 FROM municipalities
                 WHERE population IS NOT NULL
                 ORDER BY population DESC
-                LIMIT 500
+                LIMIT %s
             ),
             latest_collection AS (
-                SELECT city_code, MAX(collected_at) as last_collected
+                SELECT city_code,
+                       MAX(collected_at) as last_collected,
+                       COUNT(*) FILTER (
+                           WHERE published_date >= CURRENT_DATE - %s
+                       ) as recent_news
                 FROM municipality_news
                 GROUP BY city_code
             )
-            SELECT 
-                t.city_code, 
-                t.city_name, 
-                t.prefecture, 
+            SELECT
+                t.city_code,
+                t.city_name,
+                t.prefecture,
                 t.population,
-                l.last_collected
-            FROM top_500 t
+                -- スケジューラで全クエリが成功した日時を優先（失敗した収集で一部だけ保存された
+                -- ニュースの collected_at では進めない）。未記録の自治体は従来どおりニュースから
+                COALESCE(a.attempted_at, l.last_collected) as last_collected,
+                COALESCE(l.recent_news, 0) as recent_news,
+                s.total_score
+            FROM top_n t
             LEFT JOIN latest_collection l ON t.city_code = l.city_code
-            ORDER BY l.last_collected ASC NULLS FIRST
-            LIMIT %s;
-        """, (limit,))
+            LEFT JOIN news_collection_attempts a ON t.city_code = a.city_code
+            LEFT JOIN dx_scores_improved s ON t.city_code = s.city_code;
+        """, (limit, RECENT_SIGNAL_DAYS))
         return cur.fetchall()
     finally:
         cur.close()
-        conn.close()
+
+
+def print_city(job: CollectionJob, counts):
+    detail = ", ".join(f"{category} {found}/{saved}" for category, (found, saved) in counts.items())
+    print(f"   ✓ {job.city_name} (priority {job.priority:.2f}): {detail}")
+
+
+async def collect(municipalities, ledger: QuotaLedger):
+    collector = AsyncGoogleNewsCollector()
+    updater = NewsDataUpdater()
+
+    async def search(query: str, num_results: int):
+        try:
+            return await collector.search(query, num_results)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in QUOTA_STATUS_CODES:
+                print(f"\n⛔ API limit reached: {e.response.status_code}")
+                raise QuotaExhausted() from e
+            raise
+
+    scheduler = NewsCollectionScheduler(
+        search=search,
+        save=updater.save_news,
+        ledger=ledger,
+        bucket=TokenBucket(NEWS_QUERIES_PER_MINUTE / 60, NEWS_QUERY_BURST),
+        categories=CATEGORY_QUERIES,
+        dedupe=dedupe_results,
+        max_in_flight=NEWS_MAX_IN_FLIGHT,
+    )
+    now = datetime.now()
+    jobs = [CollectionJob.from_row(m, now) for m in municipalities]
+    try:
+        return await scheduler.run(jobs, on_city=print_city)
+    finally:
+        await collector.close()
+        updater.close()
+
 
 def main():
-    print(f"🚀 Starting Daily News Collection (Batch Size: {BATCH_SIZE})")
+    print(f"🚀 Starting Daily News Collection (Daily quota: {NEWS_DAILY_QUOTA} queries)")
     print("=" * 60)
-    
+
     # APIキー確認
     if not os.getenv("GOOGLE_API_KEY") or not os.getenv("GOOGLE_CSE_ID"):
         print("❌ Error: GOOGLE_API_KEY and GOOGLE_CSE_ID must be set.")
         return
 
+    conn = connect()
     try:
-        municipalities = get_next_batch_municipalities(BATCH_SIZE)
-        print(f"📋 Target Municipalities: {len(municipalities)}")
-        for m in municipalities:
-            last_date = m.get('last_collected')
-            status = f"Last processed: {last_date}" if last_date else "Never processed"
-            print(f"   - {m['city_name']} ({m['prefecture']}): {status}")
+        # 台帳テーブル（news_collection_attempts を含む）を候補取得より先に作成
+        ledger = QuotaLedger(conn, NEWS_DAILY_QUOTA)
+        remaining = ledger.remaining()
+        print(f"📊 Quota remaining today: {remaining}")
+        if remaining <= 0:
+            print("⏸  Daily quota already used. Nothing to do.")
+            return
+
+        municipalities = get_candidate_municipalities(conn, CANDIDATE_LIMIT)
+        print(f"📋 Candidate Municipalities: {len(municipalities)}")
         print("-" * 60)
-        
-        collector = GoogleNewsCollector()
-        updater = NewsDataUpdater()
-        
-        total_queries = 0
-        total_saved = 0
-        
-        for i, muni in enumerate(municipalities, 1):
-            city_code = muni['city_code']
-            city_name = muni['city_name']
-            
-            print(f"\n[{i}/{len(municipalities)}] Processing: {city_name}")
-            
-            try:
-                # 1. DX News
-                print("   🔍 DX News...", end="", flush=True)
-                dx_news = collector.search_dx_news(city_name)
-                saved_dx = updater.save_news(city_code, 'dx', dx_news)
-                print(f" Found {len(dx_news)}, Saved {saved_dx}")
-                time.sleep(SLEEP_BETWEEN_QUERIES)
-                total_queries += 1 # search_dx_news内で複数クエリ投げている場合は修正が必要だが、一旦簡易カウント
-                
-                # 2. Zoom News
-                print("   🔍 Zoom News...", end="", flush=True)
-                zoom_news = collector.search_zoom_deployments(city_name)
-                saved_zoom = updater.save_news(city_code, 'zoom', zoom_news)
-                print(f" Found {len(zoom_news)}, Saved {saved_zoom}")
-                time.sleep(SLEEP_BETWEEN_QUERIES)
-                total_queries += 1
-                
-                # 3. Kasuhara News
-                print("   🔍 Kasuhara News...", end="", flush=True)
-                kasuhara_news = collector.search_kasuhara_news(city_name)
-                saved_kasuhara = updater.save_news(city_code, 'kasuhara', kasuhara_news)
-                print(f" Found {len(kasuhara_news)}, Saved {saved_kasuhara}")
-                time.sleep(SLEEP_BETWEEN_QUERIES)
-                total_queries += 1
-                
-                total_saved += (saved_dx + saved_zoom + saved_kasuhara)
-                
-            except Exception as e:
-                print(f"\n❌ Error processing {city_name}: {e}")
-                # エラーが出ても続行
-        
+
+        stats = asyncio.run(collect(municipalities, ledger))
+
         print("\n" + "=" * 60)
         print("✅ Collection Complete!")
-        print(f"   Total Municipalities: {len(municipalities)}")
-        print(f"   Total Saved Articles: {total_saved}")
-        print(f"   Est. Queries Used:    ~{total_queries} (plus internal multi-queries)")
+        print(f"   Municipalities:       {stats.cities}")
+        print(f"   Queries Sent:         {stats.queries}")
+        print(f"   Found / Saved:        {stats.found} / {stats.saved}")
+        print(f"   Quota Used Today:     {ledger.used()} / {NEWS_DAILY_QUOTA}")
+        if stats.failed:
+            print(f"   Failed (retry next):  {stats.failed}")
+        if stats.stopped:
+            print(f"   Stopped:              {stats.stopped} limit reached")
         print("=" * 60)
-        
+
     except Exception as e:
         print(f"\n❌ Fatal Error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     main()
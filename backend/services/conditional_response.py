@@ -0,0 +1,215 @@
+"""
+API全体の圧縮と条件付きGET（ETag / If-None-Match）
+
+地図・スコア・自治体APIの応答は夜間のスコア算出とニュース収集でしか変わらない。
+そこで「データバージョン」を1つの文字列として持ち、GET 応答に強い ETag を付ける。
+
+- データバージョン: 集計ビューの refreshed_at（スコア保存）、公開中のスコアラン
+  （score_run_pointer。ロールバックも反映される）、scoring_input_fingerprints の
+  最新 scored_at（夜間スコアリング。入力が変わった自治体だけ更新されるため
+  dx_status 等の取り込みも反映される）、data_change_markers（municipalities・
+  municipality_news 等の追加・更新・削除。016_data_change_markers.sql のトリガーが記録）、
+  municipality_spatial_aggregates の件数と最新 refreshed_at（法人・建物集計。
+  自治体詳細の spatial とメッシュ一覧）。DATA_VERSION_TTL 秒ごとに確認する
+- VERSIONED_PATH_PREFIXES 配下: ETag = バージョン + パス + クエリ + エンコーディング。
+  If-None-Match 一致時はハンドラを呼ばずに 304 を返す（DBにもシリアライズにも触れない）
+- それ以外のパス: 応答本文のハッシュを ETag にする（304 で転送量だけ省く）
+- 圧縮: Accept-Encoding に応じて br / gzip（services.response_encoding）
+- ルート側で ETag や Content-Encoding を付けた応答（スナップショット・タイル）はそのまま通す
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+from starlette.datastructures import Headers, MutableHeaders
+
+from services.map_snapshot import current_aggregate_version
+from services.response_encoding import (
+    IDENTITY, RESPONSE_MIN_COMPRESS_SIZE, encode_body, negotiate_encoding,
+)
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "30"))
+
+# データバージョンで ETag を決める（= 304 をハンドラ前に返す）パス
+VERSIONED_PATH_PREFIXES = ('/api/v1/map/', '/api/scores/', '/api/municipalities/')
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'text/', 'application/javascript',
+    'application/vnd.mapbox-vector-tile', 'application/x-protobuf',
+)
+
+_VERSION_QUERIES = (
+    "SELECT string_agg(kind || ':' || run_id, ',' ORDER BY kind) FROM score_run_pointer",
+    "SELECT MAX(scored_at) FROM scoring_input_fingerprints",
+    # 自治体マスタ・ニュース・パターン・GIGA（取り込みスクリプトの更新・削除も文単位のトリガーで記録）
+    "SELECT string_agg(table_name || ':' || changed_at::text, ',' ORDER BY table_name) "
+    "FROM data_change_markers",
+    # 法人・建物の空間集計（gBizINFO ETL / refresh_spatial_aggregates。削除のみの更新も件数で検知）
+    "SELECT COUNT(*) || ':' || COALESCE(MAX(refreshed_at)::text, '') FROM municipality_spatial_aggregates",
+)
+
+
+def _default_session_factory():
+    from database import AsyncSessionLocal
+    return AsyncSessionLocal()
+
+
+class DataVersion:
+    """API応答の元データのバージョン（プロセス内で TTL ごとに確認）"""
+
+    def __init__(self, session_factory: Callable = _default_session_factory,
+                 ttl_seconds: float = DATA_VERSION_TTL):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self._token: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.ttl_seconds
+
+    def set(self, token: Optional[str]) -> None:
+        """バージョンを直接設定する（スコア保存直後の即時反映・テスト用）"""
+        self._token = token
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._checked_at = None
+
+    async def get(self) -> Optional[str]:
+        """現在のバージョン。確認できない（DB不可・テーブル未作成）場合は None"""
+        if self._fresh():
+            return self._token
+        async with self._lock:
+            if not self._fresh():
+                self.set(await self._load())
+            return self._token
+
+    async def _load(self) -> Optional[str]:
+        try:
+            async with self.session_factory() as db:
+                parts = [await current_aggregate_version(db)]
+                for query in _VERSION_QUERIES:
+                    try:
+                        value = (await db.execute(text(query))).scalar()
+                    except sa_exc.ProgrammingError:
+                        await db.rollback()
+                        value = None
+                    parts.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        except Exception as e:
+            # DB に届かない間はバージョン無し（本文ハッシュの ETag）で応答する
+            logger.warning(f"データバージョン取得失敗: {e}")
+            return None
+        if all(p is None for p in parts):
+            return None
+        return '|'.join('' if p is None else str(p) for p in parts)
+
+
+def version_etag(version: str, path: str, query_string: bytes, encoding: str) -> str:
+    key = f"{version}\n{path}?{query_string.decode('latin-1')}\n{encoding}"
+    return f'"v-{hashlib.sha1(key.encode()).hexdigest()[:24]}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"b-{hashlib.sha1(body).hexdigest()[:24]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class ConditionalResponseMiddleware:
+    """GET 応答の圧縮と ETag 付与（ASGI ミドルウェア）"""
+
+    def __init__(self, app, version: Optional[DataVersion] = None,
+                 versioned_prefixes: Tuple[str, ...] = VERSIONED_PATH_PREFIXES):
+        self.app = app
+        self.version = version if version is not None else data_version
+        self.versioned_prefixes = versioned_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get('if-none-match')
+        encoding = negotiate_encoding(request_headers.get('accept-encoding', ''))
+
+        etag = None
+        if scope['path'].startswith(self.versioned_prefixes):
+            version = await self.version.get()
+            if version is not None:
+                etag = version_etag(version, scope['path'], scope.get('query_string', b''), encoding)
+                if etag_matches(if_none_match, etag):
+                    await self._send_not_modified(send, etag)
+                    return
+
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, capture)
+        if start is None:
+            return
+        body = b''.join(chunks)
+        headers = MutableHeaders(raw=list(start['headers']))
+
+        # エラー応答と、ルート側でキャッシュ制御済みの応答はそのまま返す
+        if start['status'] != 200 or 'etag' in headers or 'content-encoding' in headers:
+            await self._send(send, start['status'], headers, body)
+            return
+
+        headers.add_vary_header('Accept-Encoding')
+        if (encoding != IDENTITY and len(body) >= RESPONSE_MIN_COMPRESS_SIZE
+                and _is_compressible(headers.get('content-type', ''))):
+            body = encode_body(body, encoding)
+            headers['Content-Encoding'] = encoding
+        if etag is None:
+            etag = body_etag(body)
+        headers['ETag'] = etag
+        if 'cache-control' not in headers:
+            headers['Cache-Control'] = 'no-cache'
+
+        if etag_matches(if_none_match, etag):
+            await self._send_not_modified(send, etag, headers.get('cache-control'))
+            return
+        headers['Content-Length'] = str(len(body))
+        await self._send(send, 200, headers, body)
+
+    @staticmethod
+    async def _send(send, status: int, headers: MutableHeaders, body: bytes) -> None:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers.raw})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_not_modified(self, send, etag: str, cache_control: str = 'no-cache') -> None:
+        headers = MutableHeaders(raw=[])
+        headers['ETag'] = etag
+        headers['Vary'] = 'Accept-Encoding'
+        headers['Cache-Control'] = cache_control or 'no-cache'
+        await self._send(send, 304, headers, b'')
+
+
+# アプリ全体で共有するデータバージョン
+data_version = DataVersion()
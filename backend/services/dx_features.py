@@ -0,0 +1,212 @@
+"""
+DX指標の特徴量抽出 - dx_status JSONB を数値特徴量行列に変換
+
+municipalities.dx_status は自治体DX調査の文字列（'実施'・'20/26'・'76.9%' 等）を
+そのまま保持している。スコア算出・パターン分類・Decision Readiness の各段階で
+同じ文字列を何度もパースしないよう、1自治体1回だけパースして
+「1指標 = 1列」の float 行列にまとめる。
+
+使い方:
+    features = DxFeatureMatrix.from_rows(rows)     # rows: city_code, dx_status を持つdict
+    features.column('cio')                         # 全自治体分の ndarray
+    features.row('131041')                         # 1自治体分の {列名: 値}
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# --- 文字列パーサー（同一文字列の再パースを避けるため lru_cache） ---
+
+NEGATIVE_KEYWORDS = ('未実施', '未導入', '未活用', '未策定', '未任命', 'なし', '検討中')
+POSITIVE_KEYWORDS = ('実施', '導入済', '活用中', '策定済', '任命済', 'あり')
+
+_PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)')
+
+
+@lru_cache(maxsize=4096)
+def _parse_fraction_str(value_str: str) -> Tuple[int, int]:
+    value_str = value_str.strip()
+
+    # 分数形式（例: "20/26"）
+    if '/' in value_str:
+        parts = value_str.split('/')
+        if len(parts) == 2:
+            try:
+                return (int(parts[0].strip()), int(parts[1].strip()))
+            except ValueError:
+                return (0, 0)
+
+    # パーセンテージ形式（例: "76.9%"）は100分率として扱う
+    match = _PERCENT_RE.search(value_str)
+    if match:
+        return (int(float(match.group(1))), 100)
+
+    return (0, 0)
+
+
+def parse_fraction(value) -> Tuple[int, int]:
+    """分数形式の文字列（例: '20/26'）を (分子, 分母) に分解"""
+    if not value:
+        return (0, 0)
+    return _parse_fraction_str(str(value))
+
+
+@lru_cache(maxsize=4096)
+def _parse_percentage_str(value_str: str) -> float:
+    match = _NUMBER_RE.search(value_str)
+    if match:
+        return float(match.group(1)) / 100.0
+    return 0.0
+
+
+def parse_percentage(value) -> float:
+    """パーセンテージ文字列を0.0-1.0に変換"""
+    if not value:
+        return 0.0
+    return _parse_percentage_str(str(value))
+
+
+@lru_cache(maxsize=4096)
+def _parse_boolean_str(value_str: str) -> float:
+    # 否定キーワードを先にチェック（部分一致の誤判定防止）
+    if any(kw in value_str for kw in NEGATIVE_KEYWORDS):
+        return 0.0
+    return 1.0 if any(kw in value_str for kw in POSITIVE_KEYWORDS) else 0.0
+
+
+def parse_boolean_indicator(value) -> float:
+    """実施/未実施を1.0/0.0に変換"""
+    if not value:
+        return 0.0
+    return _parse_boolean_str(str(value))
+
+
+def _equals(expected: str) -> Callable:
+    return lambda value: 1.0 if value == expected else 0.0
+
+
+def _truthy(value) -> float:
+    return 1.0 if value else 0.0
+
+
+def _cloud_stage(value) -> float:
+    """クラウド移行状況: 完了=2 / 進行中=1 / その他=0"""
+    return {'完了': 2.0, '進行中': 1.0}.get(value, 0.0)
+
+
+# --- 特徴量定義: (列名, dx_statusのキー, パーサー, 既定値) ---
+
+KEY_MYNUMBER = '住民サービスのDX_マイナンバーカードの保有状況'
+KEY_ONLINE_32 = '住民サービスのDX_オンライン手続の導入状況_32手続（内閣府・総務省が規定）'
+KEY_ONLINE_26 = '住民サービスのDX_オンライン手続の導入状況_26手続（総務省が規定）'
+KEY_ONLINE_PROC = '住民サービスのDX_よく使う32手続のオンライン化状況'
+KEY_POLICY = '自治体DXの推進体制等_全体方針策定'
+
+FEATURE_SPECS: List[Tuple[str, str, Callable, object]] = [
+    # 住民サービスDX（カテゴリ1）
+    ('mynumber_rate', KEY_MYNUMBER, parse_percentage, '0%'),
+    ('online32_num', KEY_ONLINE_32, lambda v: parse_fraction(v)[0], '0/0'),
+    ('online32_den', KEY_ONLINE_32, lambda v: parse_fraction(v)[1], '0/0'),
+    ('online26_num', KEY_ONLINE_26, lambda v: parse_fraction(v)[0], '0/0'),
+    ('online26_den', KEY_ONLINE_26, lambda v: parse_fraction(v)[1], '0/0'),
+    ('online_proc_rate', KEY_ONLINE_PROC, parse_percentage, '0%'),
+    # 推進体制（カテゴリ2）
+    ('policy', KEY_POLICY, parse_boolean_indicator, None),
+    ('cio_appointed', '自治体DXの推進体制等_CIOの任命', parse_boolean_indicator, None),
+    ('cio_sub_appointed', '自治体DXの推進体制等_CIO補佐官等の任命', parse_boolean_indicator, None),
+    ('org_structure', '自治体DXの推進体制等_全庁的な体制構築', parse_boolean_indicator, None),
+    ('external_talent', '自治体DXの推進体制等_外部人材活用', parse_boolean_indicator, None),
+    ('staff_training', '自治体DXの推進体制等_全職員対象研修の実施', parse_boolean_indicator, None),
+    ('hr_development', '自治体DXの推進体制等_職員育成の取組', parse_boolean_indicator, None),
+    # 業務DX（カテゴリ3）
+    ('ai', '自治体業務のDX_AIの導入状況', parse_boolean_indicator, None),
+    ('rpa', '自治体業務のDX_RPAの導入状況', parse_boolean_indicator, None),
+    ('telework', '自治体業務のDX_テレワークの導入状況', parse_boolean_indicator, None),
+    # パターン分類（PatternClassifier は全体方針を完全一致で判定する）
+    ('policy_strict', KEY_POLICY, _equals('実施'), ''),
+    # Decision Readiness（簡易スキーマ: enrich_dx_status_lite / enrich_realistic_baseline）
+    ('dept', 'dept', _truthy, None),
+    ('cio', 'cio', _equals('あり'), None),
+    ('ext_cio', 'ext_cio', _equals('あり'), None),
+    ('strategy', 'strategy', _truthy, None),
+    ('cloud_migration', 'cloud_migration', _cloud_stage, ''),
+    ('lgwan_connection', 'lgwan_connection', _truthy, True),
+]
+
+FEATURE_COLUMNS: List[str] = [name for name, _, _, _ in FEATURE_SPECS]
+
+CATEGORY2_COLUMNS = [
+    'policy', 'cio_appointed', 'cio_sub_appointed', 'org_structure',
+    'external_talent', 'staff_training', 'hr_development',
+]
+CATEGORY3_COLUMNS = ['ai', 'rpa', 'telework']
+
+
+def extract_features(dx_status: Optional[Dict]) -> np.ndarray:
+    """1自治体分の dx_status を FEATURE_COLUMNS 順の特徴量ベクトルに変換"""
+    dx = dx_status or {}
+    return np.array(
+        [parser(dx.get(key, default)) for _, key, parser, default in FEATURE_SPECS],
+        dtype=float,
+    )
+
+
+class DxFeatureMatrix:
+    """dx_status を1回だけパースした特徴量行列（行=自治体、列=指標）"""
+
+    columns = FEATURE_COLUMNS
+    _column_index = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+    def __init__(self, city_codes: List[str], values: np.ndarray,
+                 has_dx: np.ndarray, nonempty: np.ndarray):
+        self.city_codes = city_codes
+        self.values = values
+        # has_dx: dx_status IS NOT NULL / nonempty: dx_status が空でない
+        self.has_dx = has_dx
+        self.nonempty = nonempty
+        self._row_index = {code: i for i, code in enumerate(city_codes)}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], key: str = 'dx_status') -> 'DxFeatureMatrix':
+        """city_code と dx_status を含む行（RealDictCursorの結果等）から構築"""
+        rows = list(rows)
+        values = np.zeros((len(rows), len(FEATURE_COLUMNS)))
+        for i, row in enumerate(rows):
+            values[i] = extract_features(row[key])
+        return cls(
+            city_codes=[row['city_code'] for row in rows],
+            values=values,
+            has_dx=np.array([row[key] is not None for row in rows], dtype=bool),
+            nonempty=np.array([bool(row[key]) for row in rows], dtype=bool),
+        )
+
+    @classmethod
+    def from_dx(cls, dx_status: Optional[Dict], city_code: str = '') -> 'DxFeatureMatrix':
+        """単一自治体分の1行行列を構築"""
+        return cls.from_rows([{'city_code': city_code, 'dx_status': dx_status}])
+
+    def __len__(self) -> int:
+        return len(self.city_codes)
+
+    def __contains__(self, city_code: str) -> bool:
+        return city_code in self._row_index
+
+    def column(self, name: str) -> np.ndarray:
+        """指標1列分（全自治体）を返す"""
+        return self.values[:, self._column_index[name]]
+
+    def sum_columns(self, names: List[str]) -> np.ndarray:
+        """複数指標の行方向合計（カテゴリ生スコア）"""
+        return self.values[:, [self._column_index[n] for n in names]].sum(axis=1)
+
+    def row(self, city_code: str) -> Optional[Dict[str, float]]:
+        """1自治体分の特徴量を {列名: 値} で返す"""
+        i = self._row_index.get(city_code)
+        if i is None:
+            return None
+        return dict(zip(FEATURE_COLUMNS, self.values[i].tolist()))
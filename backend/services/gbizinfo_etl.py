@@ -0,0 +1,290 @@
+"""
+gBizINFO 法人基本情報CSVのストリーミング取り込み
+
+全国の法人基本情報は数百万行あり、ORM で1行ずつ存在確認・INSERT する方式では
+終わらない。ZIP 内の CSV を先頭から順に読み、一定行数ごとのバッチで処理する。
+
+    read      ZIP 内 CSV を1行ずつ読む（解凍結果を全件メモリに載せない）
+    filter    住所の先頭の都道府県で絞り込む（prefectures=None なら全国）
+    geocode   バッチ内の住所を重複排除してまとめてジオコーディング（キャッシュ付き）
+    mesh      座標配列を utils.mesh.encode_mesh で一括して3次メッシュに変換
+    write     meshes / companies へ COPY + UPSERT し、書き込んだメッシュの集計
+              （mesh_aggregates 等）を差分更新（1バッチ = 1トランザクション）
+
+メモリ使用量はバッチサイズ（GBIZINFO_BATCH_SIZE）とジオコードキャッシュの
+LRU 上限で決まり、ファイルの行数には依存しない。
+各バッチのコミット後に「CSV の何行目まで取り込んだか」をチェックポイント
+（JSON）に保存し、中断後は同じファイルならその行から再開する。
+書き込みは UPSERT のため、コミット直後に落ちて同じバッチを再処理しても結果は変わらない。
+"""
+
+import csv
+import io
+import itertools
+import json
+import os
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import settings
+from services.bulk_writer import copy_upsert
+from services.score_calculator import REGIONS
+from services.spatial_aggregates import refresh_spatial_aggregates, spatial_tables_exist
+from utils.mesh import decode_mesh, encode_mesh
+from utils.spatial import geocode_addresses
+
+GBIZINFO_BATCH_SIZE = int(os.getenv("GBIZINFO_BATCH_SIZE", "20000"))
+GBIZINFO_CHECKPOINT_PATH = os.getenv(
+    "GBIZINFO_CHECKPOINT_PATH", os.path.join(settings.DATA_DIR, "cache", "gbizinfo_etl_checkpoint.json"))
+
+MESH_LEVEL = 3
+PREFECTURES = tuple(REGIONS)
+
+COMPANY_COLUMNS = ['corporate_number', 'name', 'address', 'lat', 'lon', 'mesh_code', 'cert_flags']
+MESH_COLUMNS = ['code', 'lat', 'lon', 'level']
+
+
+@dataclass
+class CompanyRecord:
+    corporate_number: str
+    name: Optional[str]
+    address: str
+    prefecture: str
+
+
+@dataclass
+class EtlStats:
+    scanned: int = 0
+    matched: int = 0
+    geocoded: int = 0
+    written: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def __str__(self) -> str:
+        seconds = time.perf_counter() - self.started
+        rate = self.scanned / seconds if seconds > 0 else 0.0
+        return (f"読込 {self.scanned:,} 行 / 対象 {self.matched:,} / 座標あり {self.geocoded:,} / "
+                f"書込 {self.written:,} ({self.batches} バッチ, {seconds:.0f}秒, {rate:,.0f} 行/秒)")
+
+
+# --- read ---
+
+def find_csv_member(zf: zipfile.ZipFile) -> str:
+    csv_files = [name for name in zf.namelist() if name.endswith(".csv")]
+    if not csv_files:
+        raise FileNotFoundError("ZIP 内に CSV がありません")
+    return csv_files[0]
+
+
+def read_rows(zip_path: str, encoding: str = 'utf-8-sig') -> Iterator[Dict[str, str]]:
+    """ZIP 内の CSV を辞書として1行ずつ返す（BOM 付き UTF-8 を想定）"""
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        with zf.open(find_csv_member(zf), 'r') as f:
+            yield from csv.DictReader(io.TextIOWrapper(f, encoding=encoding, errors='replace'))
+
+
+# --- filter ---
+
+def prefecture_of(address: str) -> Optional[str]:
+    """住所先頭の都道府県名（該当なしは None）"""
+    for pref in PREFECTURES:
+        if address.startswith(pref):
+            return pref
+    return None
+
+
+def extract_record(row: Dict[str, str]) -> Optional[CompanyRecord]:
+    """CSV の1行から法人番号・名称・住所を取り出す（住所がなければ None）"""
+    # Header: "法人番号","商号または名称",...,"登記住所",...
+    name = row.get("商号または名称") or row.get("法人名") or row.get("name")
+    # API calls it "location" or "国内所在地", CSV calls it "登記住所"
+    address = row.get("登記住所")
+    if not address:
+        pref = row.get("都道府県") or ""
+        city = row.get("市区町村（郡）") or ""
+        detail = row.get("番地以下") or ""
+        if pref or city:
+            address = f"{pref}{city}{detail}"
+    corporate_number = row.get("法人番号") or row.get("corporate_number")
+    if not address or not corporate_number:
+        return None
+    return CompanyRecord(corporate_number, name, address, prefecture_of(address) or "")
+
+
+def filter_records(rows: Iterable[Dict[str, str]], prefectures: Optional[Set[str]],
+                   stats: EtlStats) -> Iterator[Tuple[int, Optional[CompanyRecord]]]:
+    """
+    (行番号, レコード) を返す。対象外の行もレコード None で返し、
+    チェックポイントの行番号が取り込み対象の有無に関わらず進むようにする。
+    """
+    for position, row in enumerate(rows, start=1):
+        stats.scanned += 1
+        record = extract_record(row)
+        if record is not None and prefectures is not None and record.prefecture not in prefectures:
+            record = None
+        if record is not None:
+            stats.matched += 1
+        yield position, record
+
+
+def batched(items: Iterator[Tuple[int, Optional[CompanyRecord]]],
+            size: int) -> Iterator[Tuple[int, List[CompanyRecord]]]:
+    """対象レコード size 件ごとに (バッチ末尾の行番号, レコード) を返す"""
+    batch: List[CompanyRecord] = []
+    position = 0
+    for position, record in items:
+        if record is not None:
+            batch.append(record)
+            if len(batch) >= size:
+                yield position, batch
+                batch = []
+    if batch or position:
+        yield position, batch
+
+
+# --- geocode + mesh ---
+
+def locate(records: Sequence[CompanyRecord], workers: int = 1) -> Tuple[List[CompanyRecord], np.ndarray, np.ndarray]:
+    """座標が得られたレコードと lat/lon 配列（同じ住所はバッチ内で1回だけ検索）"""
+    coords = geocode_addresses((r.address for r in records), workers=workers)
+    located = [r for r in records if coords.get(r.address)]
+    lat = np.array([coords[r.address][0] for r in located], dtype=float)
+    lon = np.array([coords[r.address][1] for r in located], dtype=float)
+    return located, lat, lon
+
+
+def build_rows(records: Sequence[CompanyRecord], lat: np.ndarray,
+               lon: np.ndarray) -> Tuple[List[tuple], List[tuple]]:
+    """companies / meshes に書き込む行（メッシュ変換はバッチ全体で1回）"""
+    if not records:
+        return [], []
+    codes = encode_mesh(lat, lon, MESH_LEVEL)
+
+    unique_codes = np.unique(codes)
+    center_lat, center_lon = decode_mesh(unique_codes, MESH_LEVEL)
+    mesh_rows = [
+        (str(code), float(clat), float(clon), MESH_LEVEL)
+        for code, clat, clon in zip(unique_codes.tolist(), center_lat, center_lon)
+    ]
+
+    # 同じ法人番号がバッチ内に複数あれば後の行を採用（1文の UPSERT で同一行を2回更新できないため）
+    company_rows = {}
+    for record, y, x, code in zip(records, lat.tolist(), lon.tolist(), codes.tolist()):
+        company_rows[record.corporate_number] = (
+            record.corporate_number, record.name, record.address, y, x, str(code), '{}')
+    return list(company_rows.values()), mesh_rows
+
+
+# --- write ---
+
+def previous_mesh_codes(conn, corporate_numbers: List[str]) -> Set[str]:
+    """既存法人の現在のメッシュ（移転した法人の旧メッシュも再集計するため）"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT DISTINCT mesh_code FROM companies
+            WHERE corporate_number = ANY(%s) AND mesh_code IS NOT NULL
+        """, (corporate_numbers,))
+        return {row[0] for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def write_batch(conn, company_rows: List[tuple], mesh_rows: List[tuple],
+                refresh_aggregates: bool = False) -> int:
+    """
+    meshes → companies の順に UPSERT してコミット（外部キーのためメッシュを先に）
+
+    refresh_aggregates=True なら、書き込んだメッシュと移転元メッシュの集計を
+    同じトランザクションで更新する。
+    """
+    touched = {row[0] for row in mesh_rows}
+    if refresh_aggregates and company_rows:
+        touched |= previous_mesh_codes(conn, [row[0] for row in company_rows])
+    if mesh_rows:
+        copy_upsert(conn, 'meshes', MESH_COLUMNS, mesh_rows,
+                    key_columns=['code'], update_columns=[], commit=False)
+    if company_rows:
+        # cert_flags は他の処理が付与するため、既存行では上書きしない
+        copy_upsert(conn, 'companies', COMPANY_COLUMNS, company_rows,
+                    key_columns=['corporate_number'],
+                    update_columns=['name', 'address', 'lat', 'lon', 'mesh_code'], commit=False)
+    if refresh_aggregates and touched:
+        refresh_spatial_aggregates(conn, touched)
+    conn.commit()
+    return len(company_rows)
+
+
+# --- checkpoint ---
+
+def source_signature(zip_path: str) -> Dict:
+    """再開可否の判定に使うファイルの識別情報"""
+    st = os.stat(zip_path)
+    return {'file': os.path.basename(zip_path), 'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def load_checkpoint(path: str, zip_path: str) -> int:
+    """同じファイルのチェックポイントがあれば取り込み済みの行数を返す"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('source') != source_signature(zip_path):
+        print("ℹ️  チェックポイントは別のファイルのものです。先頭から取り込みます。")
+        return 0
+    return int(checkpoint.get('rows_done', 0))
+
+
+def save_checkpoint(path: str, zip_path: str, rows_done: int) -> None:
+    """一時ファイルに書いてから置き換える（途中で落ちても壊れない）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'source': source_signature(zip_path), 'rows_done': rows_done,
+                   'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S')}, f)
+    os.replace(tmp, path)
+
+
+# --- pipeline ---
+
+def run_pipeline(conn, zip_path: str, prefectures: Optional[Iterable[str]] = None,
+                 batch_size: int = GBIZINFO_BATCH_SIZE, workers: int = 1,
+                 checkpoint_path: Optional[str] = GBIZINFO_CHECKPOINT_PATH,
+                 resume: bool = True, refresh_aggregates: bool = True) -> EtlStats:
+    """
+    ZIP 内の法人CSVを companies / meshes に取り込む
+
+    Args:
+        conn: psycopg2 コネクション
+        prefectures: 対象の都道府県名（None は全国）
+        checkpoint_path: None ならチェックポイントを使わない
+        resume: False ならチェックポイントを無視して先頭から取り込む
+        refresh_aggregates: メッシュ・自治体集計をバッチごとに差分更新する
+                            （013未適用なら自動的に無効）
+    """
+    stats = EtlStats()
+    prefs = set(prefectures) if prefectures else None
+    if refresh_aggregates and not spatial_tables_exist(conn):
+        print("⚠️ mesh_aggregates が未作成のため集計は更新しません（013_spatial_aggregates.sql）")
+        refresh_aggregates = False
+    start = load_checkpoint(checkpoint_path, zip_path) if checkpoint_path and resume else 0
+    if start:
+        print(f"⏩ {start:,} 行目まで取り込み済み。続きから再開します。")
+
+    rows = itertools.islice(read_rows(zip_path), start, None)
+    for position, records in batched(filter_records(rows, prefs, stats), batch_size):
+        located, lat, lon = locate(records, workers=workers)
+        company_rows, mesh_rows = build_rows(located, lat, lon)
+        stats.geocoded += len(located)
+        stats.written += write_batch(conn, company_rows, mesh_rows, refresh_aggregates=refresh_aggregates)
+        stats.batches += 1
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, zip_path, start + position)
+        print(f"   {stats}")
+    return stats
@@ -0,0 +1,172 @@
+"""
+ジオコーディング結果の永続キャッシュ（正規化住所キー）
+
+gBizINFO の取り込みでは同じ登記住所（ビル・本店所在地）を持つ法人が多く、
+住所ごとに jageocoder を引き直すのは無駄が大きい。正規化した住所をキーに
+(lat, lon) を保存し、取り込みを繰り返しても検索は新しい住所の分だけにする。
+
+- 保存先: SQLite（GEOCODE_CACHE_PATH、既定は DATA_DIR/cache/geocode_cache.sqlite3）
+- メモリ: 直近 GEOCODE_MEMORY_SIZE 件（既定100,000件）を LRU で保持
+- 見つからなかった住所も「該当なし」として保存する（同じ辞書なら結果は変わらない）
+- キーには辞書（JAGEOCODER_DB_DIR）を含めるため、辞書を差し替えると引き直しになる
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import settings
+
+GEOCODE_CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH", os.path.join(settings.DATA_DIR, "cache", "geocode_cache.sqlite3"))
+GEOCODE_MEMORY_SIZE = int(os.getenv("GEOCODE_MEMORY_SIZE", "100000"))
+GEOCODE_CACHE_ENABLED = os.getenv("GEOCODE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+Coords = Optional[Tuple[float, float]]
+
+# メモリ上で「未登録」と「該当なし（None）」を区別するための番兵
+_MISSING = object()
+
+_WHITESPACE = re.compile(r"\s+")
+# 数字の後ろの長音・ダッシュ類は番地のハイフンとして扱う（例: 1ー2ー3 → 1-2-3）
+_DIGIT_DASH = re.compile(r"(?<=\d)[‐‑‒–—―−ーｰ－]")
+
+
+def normalize_address(address: str) -> str:
+    """
+    表記ゆれを吸収したキャッシュキー用の住所
+
+    NFKC（全角英数字・記号を半角に）、空白の除去、番地のハイフン統一のみ行う。
+    丁目・番地の漢数字変換などは jageocoder 側に任せる。
+    """
+    if not address:
+        return ""
+    text = unicodedata.normalize("NFKC", address)
+    text = _WHITESPACE.sub("", text)
+    return _DIGIT_DASH.sub("-", text)
+
+
+class GeocodeCache:
+    """メモリ LRU + SQLite の2段キャッシュ"""
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, dictionary: str = "",
+                 memory_size: int = GEOCODE_MEMORY_SIZE, enabled: bool = GEOCODE_CACHE_ENABLED):
+        self.path = path
+        self.dictionary = dictionary
+        self.memory_size = memory_size
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Coords]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    dictionary TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    lat REAL,
+                    lon REAL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (dictionary, address)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, coords: Coords) -> None:
+        self._memory[key] = coords
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Coords]:
+        """
+        キャッシュ済みの住所だけを返す（正規化済みキーで指定）
+
+        値が None のものは「該当なし」としてキャッシュされている住所。
+        """
+        if not self.enabled:
+            return {}
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Coords] = {}
+        lookup = []
+        with self._lock:
+            for key in keys:
+                value = self._memory.get(key, _MISSING)
+                if value is _MISSING:
+                    lookup.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = value
+            if lookup:
+                try:
+                    conn = self._connect()
+                    # SQLite のバインド変数上限（999）を超えないよう分割
+                    for start in range(0, len(lookup), 900):
+                        part = lookup[start:start + 900]
+                        rows = conn.execute(
+                            f"SELECT address, lat, lon FROM geocode_cache "
+                            f"WHERE dictionary = ? AND address IN ({','.join('?' * len(part))})",
+                            [self.dictionary, *part],
+                        ).fetchall()
+                        for address, lat, lon in rows:
+                            coords = (lat, lon) if lat is not None else None
+                            found[address] = coords
+                            self._remember(address, coords)
+                except sqlite3.Error as e:
+                    # キャッシュ障害で取り込み自体を止めない
+                    print(f"⚠️ ジオコードキャッシュ読み込み失敗: {e}")
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, values: Dict[str, Coords]) -> None:
+        """結果をまとめて保存（None は該当なしとして保存）"""
+        if not self.enabled or not values:
+            return
+        now = time.time()
+        with self._lock:
+            for key, coords in values.items():
+                self._remember(key, coords)
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    """INSERT OR REPLACE INTO geocode_cache (dictionary, address, lat, lon, created_at)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    [
+                        (self.dictionary, key,
+                         coords[0] if coords else None, coords[1] if coords else None, now)
+                        for key, coords in values.items()
+                    ],
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ ジオコードキャッシュ書き込み失敗: {e}")
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM geocode_cache WHERE dictionary = ?", (self.dictionary,)
+            ).fetchone()[0]
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"ジオコードキャッシュ: ヒット {self.hits} / ミス {self.misses} ({rate:.0f}%)"
@@ -16,6 +16,33 @@ import json
 from datetime import datetime
 
 
+# カテゴリごとの検索クエリ（テンプレート, 取得件数）。1テンプレート = APIクエリ1回
+CATEGORY_QUERIES = {
+    'dx': [
+        ("{city_name} DX推進", 5),
+        ("{city_name} デジタル化", 5),
+        ("{city_name} スマートシティ", 5),
+    ],
+    'zoom': [
+        ("{city_name} Zoom 導入", 10),
+    ],
+    'kasuhara': [
+        ("{city_name} カスハラ OR クレーム OR 苦情", 5),
+    ],
+}
+
+# 日次上限・レート超過を示すステータス（これ以上投げても消費するだけ）
+QUOTA_STATUS_CODES = (403, 429)
+
+
+def dedupe_results(results: List[Dict]) -> List[Dict]:
+    """リンクで重複削除（先に出た結果を残す）"""
+    unique = {}
+    for r in results:
+        unique.setdefault(r['link'], r)
+    return list(unique.values())
+
+
 class GoogleNewsCollector:
     """Google Custom Search APIでニュース収集"""
 
@@ -29,7 +56,32 @@ class GoogleNewsCollector:
             )
 
         self.api_url = "https://www.googleapis.com/customsearch/v1"
-        self.client = httpx.Client(timeout=30.0)
+        self.client = self._make_client()
+
+    def _make_client(self):
+        return httpx.Client(timeout=30.0)
+
+    def _params(self, query: str, num_results: int) -> Dict:
+        return {
+            'key': self.api_key,
+            'cx': self.cse_id,
+            'q': query,
+            'num': min(num_results, 10),
+            'lr': 'lang_ja',  # 日本語のみ
+            'dateRestrict': 'y1',  # 過去1年以内
+        }
+
+    def _parse(self, data: Dict) -> List[Dict]:
+        return [
+            {
+                'title': item.get('title', ''),
+                'link': item.get('link', ''),
+                'snippet': item.get('snippet', ''),
+                'source': item.get('displayLink', ''),
+                'date': self._extract_date(item)
+            }
+            for item in data.get('items', [])
+        ]
 
     def search(self, query: str, num_results: int = 10) -> List[Dict]:
         """
@@ -51,31 +103,9 @@ class GoogleNewsCollector:
             ]
         """
         try:
-            params = {
-                'key': self.api_key,
-                'cx': self.cse_id,
-                'q': query,
-                'num': min(num_results, 10),
-                'lr': 'lang_ja',  # 日本語のみ
-                'dateRestrict': 'y1',  # 過去1年以内
-            }
-
-            response = self.client.get(self.api_url, params=params)
+            response = self.client.get(self.api_url, params=self._params(query, num_results))
             response.raise_for_status()
-
-            data = response.json()
-
-            results = []
-            for item in data.get('items', []):
-                results.append({
-                    'title': item.get('title', ''),
-                    'link': item.get('link', ''),
-                    'snippet': item.get('snippet', ''),
-                    'source': item.get('displayLink', ''),
-                    'date': self._extract_date(item)
-                })
-
-            return results
+            return self._parse(response.json())
 
         except httpx.HTTPStatusError as e:
             print(f"❌ API Error: {e.response.status_code} - {e.response.text}")
@@ -95,37 +125,49 @@ class GoogleNewsCollector:
 
         return None
 
-    def search_dx_news(self, city_name: str) -> List[Dict]:
-        """DX関連ニュースを検索"""
-        queries = [
-            f"{city_name} DX推進",
-            f"{city_name} デジタル化",
-            f"{city_name} スマートシティ",
-        ]
-
+    def search_category(self, city_name: str, category: str) -> List[Dict]:
+        """カテゴリの全クエリを検索（重複削除済み）"""
         all_results = []
-        for query in queries:
-            results = self.search(query, num_results=5)
-            all_results.extend(results)
+        for template, num_results in CATEGORY_QUERIES[category]:
+            all_results.extend(self.search(template.format(city_name=city_name), num_results))
+        return dedupe_results(all_results)
 
-        # 重複削除
-        unique_results = {r['link']: r for r in all_results}.values()
-        return list(unique_results)
+    def search_dx_news(self, city_name: str) -> List[Dict]:
+        """DX関連ニュースを検索"""
+        return self.search_category(city_name, 'dx')
 
     def search_zoom_deployments(self, city_name: str) -> List[Dict]:
         """Zoom導入事例を検索"""
-        query = f"{city_name} Zoom 導入"
-        return self.search(query, num_results=10)
+        return self.search_category(city_name, 'zoom')
 
     def search_kasuhara_news(self, city_name: str) -> List[Dict]:
         """カスハラ関連ニュースを検索"""
-        query = f"{city_name} カスハラ OR クレーム OR 苦情"
-        return self.search(query, num_results=5)
+        return self.search_category(city_name, 'kasuhara')
 
     def close(self):
         self.client.close()
 
 
+class AsyncGoogleNewsCollector(GoogleNewsCollector):
+    """
+    非同期版（collect_news_top500 のスケジューラから並行して呼ぶ）
+
+    エラー（日次上限・レート超過の 403/429、5xx、通信エラー）は握りつぶさず送出し、
+    呼び出し側で収集を止める・その自治体を未収集のままにする、を判断できるようにする。
+    """
+
+    def _make_client(self):
+        return httpx.AsyncClient(timeout=30.0)
+
+    async def search(self, query: str, num_results: int = 10) -> List[Dict]:
+        response = await self.client.get(self.api_url, params=self._params(query, num_results))
+        response.raise_for_status()
+        return self._parse(response.json())
+
+    async def close(self):
+        await self.client.aclose()
+
+
 class NewsDataUpdater:
     """検索結果をデータベースに保存"""
 
@@ -4,22 +4,36 @@ import json
 import logging
 from typing import Dict, Any, Optional
 
+from services.llm_cache import LLMResultCache, llm_cache
+
 logger = logging.getLogger(__name__)
 
+# プロンプトを変更したら上げる（LLM結果キャッシュのキーに含まれる）
+NEWS_PROMPT_VERSION = "news-v1"
+
+
 class LLMAnalyzer:
     """
     Ollamaを使用してニュースを分析・特定するクラス
     """
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMResultCache] = None):
         # MacのDockerからホストのOllamaにアクセスする場合、host.docker.internalが便利
         # あるいはOllamaもDocker内ならサービス名指定
         self.ollama_host = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
         self.model = os.getenv("OLLAMA_MODEL", "llama3")
+        self.cache = cache if cache is not None else llm_cache
 
     async def analyze_news(self, title: str, snippet: str) -> Dict[str, Any]:
         """
         ニュースのタイトルとスニペットから、導入確度をスコアリングする
+
+        同じタイトル・スニペットの分析結果はキャッシュから返す
         """
+        cache_input = f"{title}\n{snippet}"
+        cached = self.cache.get(self.model, NEWS_PROMPT_VERSION, cache_input)
+        if cached is not None:
+            return cached
+
         prompt = f"""
 You are a professional sales strategist for Zoom Video Communications in Japan.
 Your task is to analyze the following local government news and determine if it indicates a buying signal for Zoom or DX solutions.
@@ -60,6 +74,7 @@ Output ONLY a JSON object with the following format (no markdown, no explanation
                 # JSONパース
                 try:
                     data = json.loads(response_text)
+                    self.cache.put(self.model, NEWS_PROMPT_VERSION, cache_input, data)
                     return data
                 except json.JSONDecodeError:
                     logger.warning(f"JSON Parse Error: {response_text}")
@@ -0,0 +1,158 @@
+"""
+LLM分析結果の永続キャッシュ（内容ハッシュキー）
+
+施政方針分析（OllamaAnalyzer）・ニュース分析（LLMAnalyzer）・提案文生成
+（/api/proposals/generate）は、毎晩ほぼ同じ入力に対して推論を繰り返している。
+(モデル名, プロンプトテンプレートのバージョン, 入力テキスト) の SHA-256 を
+キーに結果を保存し、入力が変わらなければ推論を省略する。
+
+- 保存先: SQLite（LLM_CACHE_PATH、既定は DATA_DIR/cache/llm_cache.sqlite3）
+  バッチとAPIの複数プロセスから共有でき、追加の依存もない
+- 有効期限: LLM_CACHE_TTL_DAYS（既定30日）
+- 上限: LLM_CACHE_MAX_ENTRIES（既定50,000件）。超過分は最終参照が古い順に削除
+
+プロンプトを変更したら、各呼び出し側の *_PROMPT_VERSION を上げること
+（旧キャッシュは参照されなくなり、期限切れ・上限超過で削除される）。
+失敗時のフォールバック結果はキャッシュしない。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from config import settings
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(settings.DATA_DIR, "cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# put() がこの回数に達するごとに期限切れ・上限超過分を削除する
+_EVICT_EVERY = 100
+
+
+def cache_key(model: str, prompt_version: str, input_text: str) -> str:
+    """(モデル, テンプレートバージョン, 入力) の SHA-256"""
+    h = hashlib.sha256()
+    for part in (model, prompt_version, input_text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMResultCache:
+    """SQLite に JSON で保存する LLM 結果キャッシュ"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_days: float = LLM_CACHE_TTL_DAYS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, model: str, prompt_version: str, input_text: str) -> Optional[Any]:
+        """キャッシュ済みの結果を返す（未登録・期限切れは None）"""
+        if not self.enabled:
+            return None
+        key = cache_key(model, prompt_version, input_text)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value FROM llm_cache WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+        except sqlite3.Error as e:
+            # キャッシュ障害で分析自体を止めない
+            print(f"⚠️ LLMキャッシュ読み込み失敗: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, model: str, prompt_version: str, input_text: str, value: Any) -> None:
+        """結果を保存（同じキーは上書き）"""
+        if not self.enabled:
+            return
+        key = cache_key(model, prompt_version, input_text)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    """INSERT OR REPLACE INTO llm_cache
+                       (key, model, prompt_version, value, created_at, accessed_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (key, model, prompt_version, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                self._puts += 1
+                if self._puts % _EVICT_EVERY == 0:
+                    self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLMキャッシュ書き込み失敗: {e}")
+
+    def evict(self) -> None:
+        """期限切れと上限超過分を削除"""
+        with self._lock:
+            conn = self._connect()
+            self._evict(conn, time.time())
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"LLMキャッシュ: ヒット {self.hits} / ミス {self.misses} ({rate:.0f}%)"
+
+
+# プロセス内で共有するキャッシュ
+llm_cache = LLMResultCache()
@@ -0,0 +1,204 @@
+"""
+地図ドリルダウン用の集計スナップショット
+
+/api/v1/map/regions・/api/v1/map/prefectures はダッシュボード表示のたびに
+最初に呼ばれるが、元データはスコア算出バッチ（夜間）でしか変わらない。
+そこで都道府県別集計をマテリアライズドビュー map_prefecture_aggregates に
+保持し（スコア保存と同じトランザクションで refresh_map_aggregates() により更新）、API プロセス内では
+その内容をシリアライズ済みのままメモリに保持して返す。
+
+- バージョン: ビューの refreshed_at。TTL 経過ごとに1行だけ問い合わせて変化を確認する
+- ETag: バージョン + ビュー種別から生成。If-None-Match 一致時は 304 を返す
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+MAP_SNAPSHOT_TTL = float(os.getenv("MAP_SNAPSHOT_TTL", "60"))
+
+PREFECTURE_COLUMNS = """
+    prefecture, avg_score, avg_citizen, avg_promotion, avg_business,
+    avg_education, avg_information, municipality_count, total_population
+"""
+
+# マテリアライズドビュー未作成（009未適用）時のフォールバック集計
+LIVE_PREFECTURE_QUERY = """
+    SELECT
+        m.prefecture,
+        ROUND(AVG(s.total_score), 1) as avg_score,
+        ROUND(AVG(s.cat_citizen_services), 1) as avg_citizen,
+        ROUND(AVG(s.cat_promotion_system), 1) as avg_promotion,
+        ROUND(AVG(s.cat_business_dx), 1) as avg_business,
+        ROUND(AVG(s.cat_education_dx), 1) as avg_education,
+        ROUND(AVG(s.cat_information), 1) as avg_information,
+        COUNT(*) as municipality_count,
+        SUM(m.population) as total_population
+    FROM municipalities m
+    LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
+    WHERE m.prefecture IS NOT NULL
+    GROUP BY m.prefecture
+    ORDER BY m.prefecture
+"""
+
+
+def refresh_map_aggregates(conn, commit: bool = True) -> None:
+    """
+    スコア保存後に集計ビューを更新する（バッチ側・psycopg2同期接続）
+
+    CONCURRENTLY で更新するため、更新中も API からの読み取りはブロックされない。
+    commit=False ならスコア保存・ラン公開と同じトランザクションで更新する
+    （refreshed_at = バージョンもスコアと同時に切り替わる）。
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'map_prefecture_aggregates'")
+        row = cur.fetchone()
+        if row is None:
+            print("⚠️ map_prefecture_aggregates が未作成です（009_map_aggregates.sql を適用してください）")
+            return
+        concurrently = "CONCURRENTLY " if row[0] else ""
+        cur.execute(f"REFRESH MATERIALIZED VIEW {concurrently}map_prefecture_aggregates")
+        if commit:
+            conn.commit()
+    finally:
+        cur.close()
+
+
+async def current_aggregate_version(db) -> Optional[str]:
+    """
+    集計ビューの refreshed_at（スコア保存ごとに更新）をバージョン文字列で返す
+
+    スコアに追従するプロセス内キャッシュ（本モジュール・peer_index）が共用する。
+    ビュー未作成時は None。
+    """
+    try:
+        result = await db.execute(text("SELECT MAX(refreshed_at) FROM map_prefecture_aggregates"))
+    except sa_exc.ProgrammingError:
+        # ビュー未作成: ロールバックしてフォールバック集計を使う
+        await db.rollback()
+        return None
+    refreshed_at = result.scalar()
+    return refreshed_at.isoformat() if refreshed_at else None
+
+
+@dataclass
+class AggregateData:
+    """ある時点の集計結果と、ビュー種別ごとのシリアライズ済みJSON"""
+    version: str
+    prefectures: List[Dict]
+    regions: List[Dict]
+    loaded_at: float = field(default_factory=time.monotonic)
+    _bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, key: str) -> str:
+        digest = hashlib.sha1(f"{self.version}:{key}".encode()).hexdigest()[:20]
+        return f'"{digest}"'
+
+    def body(self, key: str, build: Callable[[], List[Dict]]) -> bytes:
+        """key に対応するJSONを初回のみシリアライズして以後は使い回す"""
+        if key not in self._bodies:
+            self._bodies[key] = json.dumps(
+                build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return self._bodies[key]
+
+
+class MapAggregateSnapshot:
+    """都道府県・地方別集計のプロセス内スナップショット"""
+
+    def __init__(self, region_by_prefecture: Dict[str, str], ttl_seconds: float = MAP_SNAPSHOT_TTL):
+        self.region_by_prefecture = region_by_prefecture
+        self.ttl_seconds = ttl_seconds
+        self._data: Optional[AggregateData] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._data = None
+
+    def load_rows(self, rows: List[Dict], version: str) -> AggregateData:
+        """都道府県別集計行からスナップショットを構築（地方別集計もここで算出）"""
+        prefectures = jsonable_encoder(rows)
+        for row in prefectures:
+            row['region'] = self.region_by_prefecture.get(row['prefecture'], '不明')
+        self._data = AggregateData(
+            version=version,
+            prefectures=prefectures,
+            regions=self._aggregate_regions(prefectures),
+        )
+        return self._data
+
+    def _aggregate_regions(self, pref_data: List[Dict]) -> List[Dict]:
+        """都道府県別集計を地方ごとに集約（平均スコアは自治体数で加重）"""
+        regions = {}
+        for pref in pref_data:
+            region_name = pref['region']
+            if region_name not in regions:
+                regions[region_name] = {
+                    'region': region_name,
+                    'prefectures': [],
+                    'total_score_sum': 0,
+                    'total_count': 0,
+                    'total_population': 0,
+                }
+            r = regions[region_name]
+            r['prefectures'].append(pref['prefecture'])
+            score = pref['avg_score'] or 0
+            r['total_score_sum'] += float(score) * pref['municipality_count']
+            r['total_count'] += pref['municipality_count']
+            r['total_population'] += pref['total_population'] or 0
+
+        result_list = []
+        for r in regions.values():
+            avg = round(r['total_score_sum'] / r['total_count'], 1) if r['total_count'] > 0 else 0
+            result_list.append({
+                'region': r['region'],
+                'avg_score': avg,
+                'municipality_count': r['total_count'],
+                'prefecture_count': len(r['prefectures']),
+                'total_population': r['total_population'],
+                'prefectures': r['prefectures'],
+            })
+        return result_list
+
+    async def get(self, db) -> AggregateData:
+        """
+        現在のスナップショットを返す
+
+        TTL 内はDBに触れない。TTL 経過後はビューの refreshed_at だけを確認し、
+        変わっていなければそのまま延長、変わっていれば再読み込みする。
+        """
+        data = self._data
+        if data is not None and time.monotonic() - data.loaded_at < self.ttl_seconds:
+            return data
+
+        async with self._lock:
+            data = self._data
+            if data is not None and time.monotonic() - data.loaded_at < self.ttl_seconds:
+                return data
+
+            version = await self._current_version(db)
+            if data is not None and version is not None and version == data.version:
+                data.loaded_at = time.monotonic()
+                return data
+            return await self._reload(db, version)
+
+    async def _current_version(self, db) -> Optional[str]:
+        return await current_aggregate_version(db)
+
+    async def _reload(self, db, version: Optional[str]) -> AggregateData:
+        if version is not None:
+            result = await db.execute(text(
+                f"SELECT {PREFECTURE_COLUMNS} FROM map_prefecture_aggregates ORDER BY prefecture"))
+        else:
+            result = await db.execute(text(LIVE_PREFECTURE_QUERY))
+        rows = [dict(r) for r in result.mappings()]
+        # ビューが無い場合は読み込み時刻をバージョンとする（TTLごとに再集計）
+        return self.load_rows(rows, version or f"live-{time.time()}")
@@ -0,0 +1,253 @@
+"""
+自治体一覧（/api/v1/map/municipalities）のフィルタ別スナップショット
+
+一覧は最大2,500行あり、スコア算出バッチでしか変わらないにもかかわらず、
+表示切り替えのたびに行ごとの dict 化・型変換・地方の逆引きをしていた。
+ここではフィルタ条件ごとに結果を列（struct-of-arrays）として保持し、
+形式（rows / columns）とエンコーディング（identity / gzip / br）ごとの
+シリアライズ済み本文を初回に作って使い回す。
+
+- rows: 従来どおり行オブジェクトの配列
+- columns: {"length": n, "fields": [...], "columns": {field: [...]}}。
+  キー名の繰り返しが無く、地図側は配列のまま属性として扱える
+- バージョン: 公開中のスコアラン（services/score_runs.py）の run_id。
+  ラン未導入時は集計ビューの refreshed_at。TTL ごとに確認し、変わっていれば
+  全フィルタの結果を破棄する
+- 保持するフィルタ数は MUNICIPALITY_SNAPSHOT_MAX_ENTRIES 件まで（LRU）
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from services.map_snapshot import current_aggregate_version
+from services.response_encoding import (
+    IDENTITY, RESPONSE_MIN_COMPRESS_SIZE, encode_body, negotiate_encoding,
+)
+from services.score_runs import published_run_id
+
+MUNICIPALITY_SNAPSHOT_TTL = float(os.getenv("MUNICIPALITY_SNAPSHOT_TTL", "60"))
+MUNICIPALITY_SNAPSHOT_MAX_ENTRIES = int(os.getenv("MUNICIPALITY_SNAPSHOT_MAX_ENTRIES", "128"))
+
+MUNICIPALITY_QUERY = """
+    SELECT
+        m.city_code,
+        m.city_name,
+        m.prefecture,
+        m.population,
+        m.latitude,
+        m.longitude,
+        COALESCE(s.total_score, 0) as total_score,
+        s.cat_citizen_services,
+        s.cat_promotion_system,
+        s.cat_business_dx,
+        s.cat_education_dx,
+        s.cat_information,
+        p.pattern_id,
+        p.pattern_name
+    FROM municipalities m
+    {score_join}
+    LEFT JOIN municipality_patterns p ON m.city_code = p.city_code
+    WHERE m.latitude IS NOT NULL
+"""
+
+LIVE_SCORE_JOIN = "LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code"
+# 公開中ランのスナップショット（書き込み中のバッチと競合しない）
+RUN_SCORE_JOIN = "LEFT JOIN dx_score_snapshots s ON m.city_code = s.city_code AND s.run_id = :run_id"
+
+# 小数（NUMERIC → Decimal）で返る列
+FLOAT_FIELDS = (
+    'total_score', 'cat_citizen_services', 'cat_promotion_system',
+    'cat_business_dx', 'cat_education_dx', 'cat_information',
+)
+# 0 も欠損扱いにする座標列（従来の `float(x) if x else None` と同じ）
+COORDINATE_FIELDS = ('latitude', 'longitude')
+
+
+@dataclass(frozen=True)
+class MunicipalityFilter:
+    prefecture: Optional[str] = None
+    region_prefectures: Optional[Tuple[str, ...]] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    limit: int = 2500
+
+    def key(self) -> str:
+        return json.dumps([self.prefecture, self.region_prefectures,
+                           self.min_score, self.max_score, self.limit], ensure_ascii=False)
+
+    def query(self, run_id: Optional[int] = None) -> Tuple[str, Dict]:
+        """run_id 指定時はそのランのスナップショット、無ければ dx_scores_improved を読む"""
+        if run_id is not None:
+            query = MUNICIPALITY_QUERY.format(score_join=RUN_SCORE_JOIN)
+            params: Dict = {'run_id': run_id}
+        else:
+            query = MUNICIPALITY_QUERY.format(score_join=LIVE_SCORE_JOIN)
+            params = {}
+        if self.prefecture:
+            query += " AND m.prefecture = :prefecture"
+            params['prefecture'] = self.prefecture
+        elif self.region_prefectures:
+            placeholders = ', '.join([f':p{i}' for i in range(len(self.region_prefectures))])
+            query += f" AND m.prefecture IN ({placeholders})"
+            for i, p in enumerate(self.region_prefectures):
+                params[f'p{i}'] = p
+
+        if self.min_score is not None:
+            query += " AND COALESCE(s.total_score, 0) >= :min_score"
+            params['min_score'] = self.min_score
+        if self.max_score is not None:
+            query += " AND COALESCE(s.total_score, 0) <= :max_score"
+            params['max_score'] = self.max_score
+
+        query += " ORDER BY s.total_score DESC NULLS LAST LIMIT :limit"
+        params['limit'] = self.limit
+        return query, params
+
+
+def build_columns(fields: Sequence[str], rows: Sequence[Sequence],
+                  region_by_prefecture: Dict[str, str]) -> Dict[str, List]:
+    """
+    結果行を列に転置し、JSON向けの型変換と地方列の付与を列単位で行う
+    """
+    transposed = list(zip(*rows)) if rows else [()] * len(fields)
+    columns: Dict[str, List] = {}
+    for name, values in zip(fields, transposed):
+        if name in COORDINATE_FIELDS:
+            values = [float(v) if v else None for v in values]
+        elif name in FLOAT_FIELDS:
+            values = [float(v) if isinstance(v, Decimal) else v for v in values]
+        columns[name] = list(values)
+    columns['region'] = [region_by_prefecture.get(p, '不明') for p in columns.get('prefecture', [])]
+    return columns
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@dataclass
+class MunicipalitySnapshotEntry:
+    """あるフィルタの結果（列）と、形式・エンコーディングごとの本文"""
+    version: str
+    columns: Dict[str, List]
+    _bodies: Dict[Tuple[str, str], bytes] = field(default_factory=dict)
+
+    @property
+    def length(self) -> int:
+        return len(next(iter(self.columns.values()), []))
+
+    def rows(self) -> List[Dict]:
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+    def etag(self, key: str, fmt: str, encoding: str = IDENTITY) -> str:
+        """強い ETag（本文のバイト列ごとに異なるよう Content-Encoding も含める）"""
+        digest = hashlib.sha1(f"{self.version}:{key}:{fmt}:{encoding}".encode()).hexdigest()[:20]
+        return f'"{digest}"'
+
+    def _identity(self, fmt: str) -> bytes:
+        identity = self._bodies.get((fmt, IDENTITY))
+        if identity is None:
+            if fmt == 'columns':
+                identity = _dumps({'length': self.length, 'fields': list(self.columns),
+                                   'columns': self.columns})
+            else:
+                identity = _dumps(self.rows())
+            self._bodies[(fmt, IDENTITY)] = identity
+        return identity
+
+    def encoding_for(self, fmt: str, accept_encoding: str = '') -> str:
+        """返す Content-Encoding（小さい本文は圧縮しない）。圧縮自体は行わない"""
+        if len(self._identity(fmt)) < RESPONSE_MIN_COMPRESS_SIZE:
+            return IDENTITY
+        return negotiate_encoding(accept_encoding)
+
+    def body(self, fmt: str, accept_encoding: str = '') -> Tuple[bytes, str]:
+        """(本文, Content-Encoding) を返す。形式・エンコーディングごとに初回のみ生成"""
+        encoding = self.encoding_for(fmt, accept_encoding)
+        identity = self._identity(fmt)
+        if encoding == IDENTITY:
+            return identity, encoding
+        encoded = self._bodies.get((fmt, encoding))
+        if encoded is None:
+            encoded = self._bodies[(fmt, encoding)] = encode_body(identity, encoding)
+        return encoded, encoding
+
+
+class MunicipalitySnapshot:
+    """フィルタ条件 → MunicipalitySnapshotEntry のプロセス内キャッシュ"""
+
+    def __init__(self, region_by_prefecture: Dict[str, str],
+                 ttl_seconds: float = MUNICIPALITY_SNAPSHOT_TTL,
+                 max_entries: int = MUNICIPALITY_SNAPSHOT_MAX_ENTRIES):
+        self.region_by_prefecture = region_by_prefecture
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, MunicipalitySnapshotEntry]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._run_id: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self._version = None
+        self._run_id = None
+        self._checked_at = 0.0
+
+    def load_rows(self, key: str, fields: Sequence[str], rows: Sequence[Sequence],
+                  version: str) -> MunicipalitySnapshotEntry:
+        entry = MunicipalitySnapshotEntry(
+            version=version,
+            columns=build_columns(fields, rows, self.region_by_prefecture),
+        )
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def _current_version(self, db) -> Tuple[str, Optional[int]]:
+        """
+        TTL ごとにバージョンを確認し、変わっていればキャッシュを破棄する
+
+        公開中のスコアラン（score_run_pointer）があれば run_id をバージョンとし、
+        そのランのスナップショットを読む。無ければ集計ビューの refreshed_at。
+        """
+        if self._version is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return self._version, self._run_id
+        async with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+                return self._version, self._run_id
+            run_id = await published_run_id(db, 'dx_improved')
+            if run_id is not None:
+                version = f"run-{run_id}"
+            else:
+                # ビューが無い場合は確認時刻をバージョンとする（TTLごとに再読み込み）
+                version = await current_aggregate_version(db) or f"live-{time.time()}"
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                self._run_id = run_id
+            self._checked_at = time.monotonic()
+            return version, run_id
+
+    async def get(self, db, flt: MunicipalityFilter) -> MunicipalitySnapshotEntry:
+        version, run_id = await self._current_version(db)
+        key = flt.key()
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(key)
+            return entry
+        query, params = flt.query(run_id)
+        result = await db.execute(text(query), params)
+        return self.load_rows(key, list(result.keys()), result.all(), version)
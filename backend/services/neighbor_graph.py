@@ -0,0 +1,277 @@
+"""
+自治体の近傍グラフ（緯度経度ベース）
+
+ピアプレッシャーと地図の「近隣自治体」表示のため、全自治体の k 近傍を
+あらかじめ算出して保持する。
+
+- 距離: 役所所在地（municipalities.latitude/longitude）間の大円距離（km）
+- 近傍: 各自治体から近い順に NEIGHBOR_K 件（int32 のインデックス配列 + float32 距離）
+- 隣接: 近傍のうち NEIGHBOR_ADJACENCY_KM 以内を「隣接」とみなす
+  （境界ポリゴンはDBに無いため、庁舎間距離による近似）
+
+全国約1,700自治体なら全組み合わせの距離計算でもブロック単位で数ミリ秒のため、
+KD木などの空間インデックスは使わずNumPyで厳密に求める。
+構築結果は .npz（NEIGHBOR_GRAPH_PATH）に保存し、座標が変わらない限り再利用する。
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+
+from config import settings
+
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", "10"))
+NEIGHBOR_ADJACENCY_KM = float(os.getenv("NEIGHBOR_ADJACENCY_KM", "20"))
+NEIGHBOR_GRAPH_PATH = os.getenv(
+    "NEIGHBOR_GRAPH_PATH", os.path.join(settings.DATA_DIR, "cache", "neighbor_graph.npz"))
+NEIGHBOR_GRAPH_TTL = float(os.getenv("NEIGHBOR_GRAPH_TTL", "300"))
+
+EARTH_RADIUS_KM = 6371.0
+
+COORDINATE_QUERY = """
+    SELECT city_code, latitude, longitude
+    FROM municipalities
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ORDER BY city_code
+"""
+
+# 座標のバージョン（API側キャッシュの更新確認用。座標の全行は転送しない）
+COORDINATE_VERSION_QUERY = """
+    SELECT COUNT(*) || ':' || COALESCE(md5(string_agg(
+               city_code || ':' || latitude::text || ':' || longitude::text, ',' ORDER BY city_code)), '')
+    FROM municipalities
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+"""
+
+# 距離行列をこの行数ずつ計算する（メモリ: _BLOCK × N × 8byte）
+_BLOCK = 512
+
+
+def coordinates_fingerprint(city_codes: Sequence[str], lat: np.ndarray, lon: np.ndarray) -> str:
+    h = hashlib.sha1()
+    h.update("\0".join(city_codes).encode("utf-8"))
+    h.update(np.round(np.asarray(lat, dtype=float), 6).tobytes())
+    h.update(np.round(np.asarray(lon, dtype=float), 6).tobytes())
+    return h.hexdigest()
+
+
+def nearest_points(lat: Sequence[float], lon: Sequence[float],
+                   ref_lat: Sequence[float], ref_lon: Sequence[float]):
+    """
+    各点 (lat, lon) に最も近い参照点のインデックスと距離（km）
+
+    メッシュ中心 → 最寄りの役所所在地の割り当てなどに使う。
+    """
+    lat_r, lon_r = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    ref_lat_r = np.radians(np.asarray(ref_lat, dtype=float))
+    ref_lon_r = np.radians(np.asarray(ref_lon, dtype=float))
+    cos_ref = np.cos(ref_lat_r)
+    index = np.zeros(len(lat_r), dtype=np.int64)
+    distance = np.zeros(len(lat_r), dtype=float)
+    for start in range(0, len(lat_r), _BLOCK):
+        stop = min(start + _BLOCK, len(lat_r))
+        dlat = lat_r[start:stop, None] - ref_lat_r[None, :]
+        dlon = lon_r[start:stop, None] - ref_lon_r[None, :]
+        a = (np.sin(dlat / 2) ** 2
+             + np.cos(lat_r[start:stop, None]) * cos_ref[None, :] * np.sin(dlon / 2) ** 2)
+        d = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        index[start:stop] = np.argmin(d, axis=1)
+        distance[start:stop] = d[np.arange(stop - start), index[start:stop]]
+    return index, distance
+
+
+class NeighborGraph:
+    """全自治体の k 近傍（行 i の近傍 = neighbors[i]、距離 = distances_km[i]）"""
+
+    def __init__(self, city_codes: List[str], neighbors: np.ndarray, distances_km: np.ndarray,
+                 fingerprint: str = '', adjacency_km: float = NEIGHBOR_ADJACENCY_KM):
+        self.city_codes = list(city_codes)
+        self.neighbors = neighbors
+        self.distances_km = distances_km
+        self.fingerprint = fingerprint
+        self.adjacency_km = adjacency_km
+        self._index = {code: i for i, code in enumerate(self.city_codes)}
+
+    @classmethod
+    def build(cls, city_codes: Sequence[str], lat: Sequence[float], lon: Sequence[float],
+              k: int = NEIGHBOR_K, adjacency_km: float = NEIGHBOR_ADJACENCY_KM) -> 'NeighborGraph':
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        n = len(city_codes)
+        k = max(0, min(k, n - 1))
+        lat_r, lon_r = np.radians(lat), np.radians(lon)
+        cos_lat = np.cos(lat_r)
+
+        neighbors = np.zeros((n, k), dtype=np.int32)
+        distances = np.zeros((n, k), dtype=np.float32)
+        for start in range(0, n, _BLOCK):
+            stop = min(start + _BLOCK, n)
+            # haversine（ブロック行 × 全列）
+            dlat = lat_r[start:stop, None] - lat_r[None, :]
+            dlon = lon_r[start:stop, None] - lon_r[None, :]
+            a = np.sin(dlat / 2) ** 2 + cos_lat[start:stop, None] * cos_lat[None, :] * np.sin(dlon / 2) ** 2
+            d = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+            d[np.arange(stop - start), np.arange(start, stop)] = np.inf  # 自分自身を除外
+            if k == 0:
+                continue
+            idx = np.argpartition(d, k - 1, axis=1)[:, :k]
+            part = np.take_along_axis(d, idx, axis=1)
+            order = np.argsort(part, axis=1)
+            neighbors[start:stop] = np.take_along_axis(idx, order, axis=1)
+            distances[start:stop] = np.take_along_axis(part, order, axis=1)
+
+        return cls(list(city_codes), neighbors, distances,
+                   fingerprint=coordinates_fingerprint(city_codes, lat, lon),
+                   adjacency_km=adjacency_km)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable, k: int = NEIGHBOR_K,
+                  adjacency_km: float = NEIGHBOR_ADJACENCY_KM) -> 'NeighborGraph':
+        """city_code, latitude, longitude を持つ行から構築"""
+        rows = list(rows)
+        return cls.build(
+            [r['city_code'] for r in rows],
+            [float(r['latitude']) for r in rows],
+            [float(r['longitude']) for r in rows],
+            k=k, adjacency_km=adjacency_km,
+        )
+
+    # --- 保存・読み込み（.npz） ---
+
+    def save(self, path: str = NEIGHBOR_GRAPH_PATH) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            city_codes=np.array(self.city_codes),
+            neighbors=self.neighbors,
+            distances_km=self.distances_km,
+            fingerprint=np.array(self.fingerprint),
+            adjacency_km=np.array(self.adjacency_km),
+        )
+
+    @classmethod
+    def load(cls, path: str = NEIGHBOR_GRAPH_PATH) -> Optional['NeighborGraph']:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(
+                [str(c) for c in data['city_codes']],
+                data['neighbors'],
+                data['distances_km'],
+                fingerprint=str(data['fingerprint']),
+                adjacency_km=float(data['adjacency_km']),
+            )
+
+    @classmethod
+    def load_or_build(cls, rows: List, path: str = NEIGHBOR_GRAPH_PATH,
+                      k: int = NEIGHBOR_K) -> 'NeighborGraph':
+        """保存済みグラフが同じ座標・k から作られていれば再利用し、違えば再構築して保存"""
+        rows = list(rows)
+        fingerprint = coordinates_fingerprint(
+            [r['city_code'] for r in rows],
+            np.array([float(r['latitude']) for r in rows]),
+            np.array([float(r['longitude']) for r in rows]),
+        )
+        try:
+            cached = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            cached = None
+        if cached is not None and cached.fingerprint == fingerprint and cached.k == min(k, len(rows) - 1):
+            return cached
+        graph = cls.from_rows(rows, k=k)
+        try:
+            graph.save(path)
+        except OSError as e:
+            print(f"⚠️ 近傍グラフの保存に失敗: {e}")
+        return graph
+
+    # --- 参照 ---
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1] if self.neighbors.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return len(self.city_codes)
+
+    def __contains__(self, city_code: str) -> bool:
+        return city_code in self._index
+
+    def neighbors_of(self, city_code: str, k: Optional[int] = None,
+                     adjacent_only: bool = False) -> List[Dict]:
+        """近い順の近傍 [{city_code, distance_km, adjacent}]"""
+        i = self._index.get(city_code)
+        if i is None:
+            return []
+        result = []
+        for j, dist in zip(self.neighbors[i][:k], self.distances_km[i][:k]):
+            adjacent = bool(dist <= self.adjacency_km)
+            if adjacent_only and not adjacent:
+                break
+            result.append({
+                'city_code': self.city_codes[j],
+                'distance_km': round(float(dist), 1),
+                'adjacent': adjacent,
+            })
+        return result
+
+    def neighbor_rates(self, flags: Dict[str, bool]) -> Dict[str, Dict[str, int]]:
+        """
+        各自治体の近傍で flags が True の数（例: DX推進部署あり）
+
+        Returns: {city_code: {'with': 件数, 'total': 近傍数}}
+        """
+        values = np.array([1 if flags.get(code) else 0 for code in self.city_codes], dtype=np.int32)
+        counts = values[self.neighbors].sum(axis=1) if self.k else np.zeros(len(self), dtype=np.int32)
+        return {code: {'with': int(counts[i]), 'total': self.k} for i, code in enumerate(self.city_codes)}
+
+
+class NeighborGraphCache:
+    """
+    API プロセス内の近傍グラフ（MapAggregateSnapshot と同じ更新方式）
+
+    TTL 内はDBに触れない。TTL 経過後は座標のバージョン（件数 + ハッシュ）だけを確認し、
+    変わっていれば座標を読み直して再構築する（同じ座標の .npz があればそれを使う）。
+    """
+
+    def __init__(self, path: str = NEIGHBOR_GRAPH_PATH, ttl_seconds: float = NEIGHBOR_GRAPH_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._graph: Optional[NeighborGraph] = None
+        self._version: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (self._graph is not None and self._checked_at is not None
+                and time.monotonic() - self._checked_at < self.ttl_seconds)
+
+    def invalidate(self) -> None:
+        self._graph = None
+        self._version = None
+        self._checked_at = None
+
+    def set(self, graph: NeighborGraph, version: Optional[str] = None) -> None:
+        self._graph = graph
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    async def get(self, db) -> NeighborGraph:
+        if self._fresh():
+            return self._graph
+        async with self._lock:
+            if self._fresh():
+                return self._graph
+            version = (await db.execute(text(COORDINATE_VERSION_QUERY))).scalar()
+            if self._graph is not None and version == self._version:
+                self._checked_at = time.monotonic()
+                return self._graph
+            result = await db.execute(text(COORDINATE_QUERY))
+            rows = [dict(r) for r in result.mappings()]
+            self.set(await asyncio.to_thread(NeighborGraph.load_or_build, rows, self.path), version)
+            return self._graph
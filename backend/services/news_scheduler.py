@@ -0,0 +1,310 @@
+"""
+ニュース収集スケジューラ（Google Custom Search の日次枠を使い切る）
+
+従来の collect_news_top500 は1クエリずつ直列に投げて SLEEP_BETWEEN_QUERIES 秒待ち、
+日次の使用量は「340自治体 × 3カテゴリ」の手計算だった（実際は DX が3クエリのため
+1自治体5クエリ）。ここでは以下で枠内に収めつつ並行に投げる。
+
+- トークンバケット: 毎分上限（既定 100クエリ/分）を超えない送信間隔
+- 日次クォータ台帳: news_query_quota に日付ごとの使用数を永続化。自治体の全クエリ分を
+  送信前に条件付き UPDATE で確保するため、並行・複数プロセスでも上限を超えない
+  （Google の日次枠は太平洋時間の0時にリセットされるため、日付も同じ基準）
+- 優先度キュー: 未収集・収集が古い自治体を優先し、スコアと直近のニュース件数で補正
+  （新着0件でも収集日時が進むよう、全クエリが成功した自治体を news_collection_attempts に記録する）
+- 同時実行: NEWS_MAX_IN_FLIGHT 件までのリクエストを同時に待つ
+
+403/429（他アプリとの共用で枠を使い切った等）を受けたら以降の自治体は投げない。
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+# 本アプリの1日あたりの上限（無料枠 1,500/日 のうち別アプリ分 50-150回 を除いた目安）
+NEWS_DAILY_QUOTA = int(os.getenv("NEWS_DAILY_QUOTA", "1020"))
+NEWS_QUERIES_PER_MINUTE = float(os.getenv("NEWS_QUERIES_PER_MINUTE", "100"))
+NEWS_QUERY_BURST = int(os.getenv("NEWS_QUERY_BURST", "10"))
+NEWS_MAX_IN_FLIGHT = int(os.getenv("NEWS_MAX_IN_FLIGHT", "8"))
+NEWS_QUOTA_TZ = os.getenv("NEWS_QUOTA_TZ", "America/Los_Angeles")
+
+# 優先度の重み（合計1）と、鮮度を頭打ちにする日数
+STALE_WEIGHT = 0.6
+SCORE_WEIGHT = 0.25
+SIGNAL_WEIGHT = 0.15
+STALE_CAP_DAYS = 30
+SIGNAL_CAP = 10
+
+
+class QuotaExhausted(Exception):
+    """API側で日次枠・レート上限に達した"""
+
+
+class TokenBucket:
+    """非同期トークンバケット（rate 個/秒、最大 capacity 個まで貯まる）"""
+
+    def __init__(self, rate: float, capacity: int,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate と capacity は正の値を指定してください")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # ロックを持ったまま待つ = 待ち手は到着順に1つずつ払い出される
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await self._sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class QuotaLedger:
+    """日付ごとのクエリ使用数（news_query_quota）"""
+
+    def __init__(self, conn, daily_quota: int = NEWS_DAILY_QUOTA, tz: str = NEWS_QUOTA_TZ):
+        self.conn = conn
+        self.daily_quota = daily_quota
+        self.tz = ZoneInfo(tz)
+        self.create_table()
+
+    def create_table(self):
+        cur = self.conn.cursor()
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS news_query_quota (
+                    quota_day DATE PRIMARY KEY,
+                    used INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT NOW()
+                );
+
+                -- 新着が無く municipality_news.collected_at が進まない自治体も
+                -- 「収集済み」として鮮度に反映するための最終収集日時
+                CREATE TABLE IF NOT EXISTS news_collection_attempts (
+                    city_code VARCHAR(6) PRIMARY KEY,
+                    attempted_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+            """)
+            self.conn.commit()
+        finally:
+            cur.close()
+
+    def today(self):
+        return datetime.now(self.tz).date()
+
+    def reserve(self, n: int) -> bool:
+        """n クエリ分を確保（上限を超える場合は確保せず False）"""
+        day = self.today()
+        cur = self.conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO news_query_quota (quota_day, used) VALUES (%s, 0)
+                ON CONFLICT (quota_day) DO NOTHING
+            """, (day,))
+            cur.execute("""
+                UPDATE news_query_quota SET used = used + %s, updated_at = NOW()
+                WHERE quota_day = %s AND used + %s <= %s
+                RETURNING used
+            """, (n, day, n, self.daily_quota))
+            reserved = cur.fetchone() is not None
+            self.conn.commit()
+            return reserved
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def mark_collected(self, city_code: str) -> None:
+        cur = self.conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO news_collection_attempts (city_code, attempted_at) VALUES (%s, NOW())
+                ON CONFLICT (city_code) DO UPDATE SET attempted_at = EXCLUDED.attempted_at
+            """, (city_code,))
+            self.conn.commit()
+        finally:
+            cur.close()
+
+    def used(self) -> int:
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT used FROM news_query_quota WHERE quota_day = %s", (self.today(),))
+            row = cur.fetchone()
+            return row[0] if row else 0
+        finally:
+            cur.close()
+
+    def remaining(self) -> int:
+        return max(self.daily_quota - self.used(), 0)
+
+
+def job_priority(last_collected: Optional[datetime], score: Optional[float],
+                 recent_news: int, now: datetime) -> float:
+    """
+    収集の優先度（0〜1、大きいほど先）
+
+    鮮度: 未収集は 1、それ以外は最終収集からの日数 / STALE_CAP_DAYS（頭打ち）
+    スコア: 改善版DXスコア / 100（未算出は 0）
+    シグナル: 直近のニュース件数 / SIGNAL_CAP（動きのある自治体を追い続ける）
+    """
+    if last_collected is None:
+        stale = 1.0
+    else:
+        days = (now - last_collected).total_seconds() / 86400
+        stale = min(max(days, 0) / STALE_CAP_DAYS, 1.0)
+    score_part = min(max(float(score or 0) / 100, 0.0), 1.0)
+    signal = min(recent_news or 0, SIGNAL_CAP) / SIGNAL_CAP
+    return STALE_WEIGHT * stale + SCORE_WEIGHT * score_part + SIGNAL_WEIGHT * signal
+
+
+@dataclass(order=True)
+class CollectionJob:
+    sort_key: Tuple[float, str]
+    city_code: str = field(compare=False)
+    city_name: str = field(compare=False)
+    priority: float = field(compare=False)
+
+    @classmethod
+    def from_row(cls, row: Dict, now: datetime) -> "CollectionJob":
+        priority = job_priority(row.get('last_collected'), row.get('total_score'),
+                                row.get('recent_news') or 0, now)
+        # 最小ヒープなので符号を反転（同点は city_code 順で決定的に）
+        return cls((-priority, row['city_code']), row['city_code'], row['city_name'], priority)
+
+
+@dataclass
+class CollectionStats:
+    cities: int = 0
+    queries: int = 0
+    found: int = 0
+    saved: int = 0
+    failed: int = 0  # 失敗・未送信のクエリがあった自治体（収集済みにしない）
+    stopped: Optional[str] = None  # 'quota' = 台帳の上限, 'api' = API側の上限
+
+
+class NewsCollectionScheduler:
+    """
+    優先度順に自治体を取り出し、レート・日次枠の範囲で並行にニュースを収集する
+
+    search: async (query, num_results) -> 結果リスト（上限到達時は QuotaExhausted、
+            それ以外の失敗も例外で返す。空リストは「該当なし」として扱う）
+    save: (city_code, category, 結果リスト) -> 保存件数（同期。スレッドで直列に実行）
+    """
+
+    def __init__(self, search: Callable[[str, int], Awaitable[List[Dict]]],
+                 save: Callable[[str, str, List[Dict]], int],
+                 ledger: QuotaLedger, bucket: TokenBucket,
+                 categories: Dict[str, Sequence[Tuple[str, int]]],
+                 dedupe: Callable[[List[Dict]], List[Dict]] = lambda results: results,
+                 max_in_flight: int = NEWS_MAX_IN_FLIGHT):
+        self.search = search
+        self.save = save
+        self.ledger = ledger
+        self.bucket = bucket
+        self.categories = categories
+        self.dedupe = dedupe
+        self.max_in_flight = max_in_flight
+        self.queries_per_city = sum(len(queries) for queries in categories.values())
+
+    async def run(self, jobs: Iterable[CollectionJob],
+                  on_city: Optional[Callable[[CollectionJob, Dict[str, Tuple[int, int]]], None]] = None
+                  ) -> CollectionStats:
+        queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        self._stats = CollectionStats()
+        self._on_city = on_city
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._ledger_lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()
+
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.max_in_flight)]
+        await asyncio.gather(*workers)
+        return self._stats
+
+    async def _worker(self, queue: asyncio.PriorityQueue) -> None:
+        while self._stats.stopped is None:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._collect_city(job)
+
+    async def _reserve(self) -> bool:
+        async with self._ledger_lock:
+            if self._stats.stopped is not None:
+                return False
+            if not await asyncio.to_thread(self.ledger.reserve, self.queries_per_city):
+                self._stats.stopped = 'quota'
+                return False
+            return True
+
+    async def _query(self, query: str, num_results: int) -> Optional[List[Dict]]:
+        """検索結果。上限到達後に投げなかったクエリ・失敗したクエリは None"""
+        async with self._in_flight:
+            # 待っている間に API 側の上限に達した場合は、確保済みでも投げない
+            if self._stats.stopped == 'api':
+                return None
+            await self.bucket.acquire()
+            if self._stats.stopped == 'api':
+                return None
+            self._stats.queries += 1
+            try:
+                return await self.search(query, num_results)
+            except QuotaExhausted:
+                self._stats.stopped = 'api'
+                return None
+            except Exception as e:
+                print(f"❌ Search error ({query}): {e}")
+                return None
+
+    async def _collect_city(self, job: CollectionJob) -> None:
+        # 自治体の全クエリ分を先に確保する（途中で枠が尽きて一部カテゴリだけ、にしない）
+        if not await self._reserve():
+            return
+        plan = [
+            (category, template.format(city_name=job.city_name), num_results)
+            for category, queries in self.categories.items()
+            for template, num_results in queries
+        ]
+        results = await asyncio.gather(*(self._query(q, n) for _, q, n in plan))
+        complete = all(items is not None for items in results)
+
+        by_category: Dict[str, List[Dict]] = {category: [] for category in self.categories}
+        for (category, _, _), items in zip(plan, results):
+            by_category[category].extend(items or [])
+
+        counts = {}
+        async with self._save_lock:
+            for category, items in by_category.items():
+                items = self.dedupe(items)
+                saved = await asyncio.to_thread(self.save, job.city_code, category, items) if items else 0
+                counts[category] = (len(items), saved)
+                self._stats.found += len(items)
+                self._stats.saved += saved
+        self._stats.cities += 1
+        # 失敗・未送信のクエリがある自治体は収集済みにせず、次回も古い順で優先させる
+        if complete:
+            async with self._ledger_lock:
+                await asyncio.to_thread(self.ledger.mark_collected, job.city_code)
+        else:
+            self._stats.failed += 1
+        if self._on_city is not None:
+            self._on_city(job, counts)
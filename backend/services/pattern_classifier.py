@@ -11,6 +11,8 @@ from psycopg2.extras import RealDictCursor
 from typing import Optional, Dict, Tuple
 import re
 
+from services.dx_features import DxFeatureMatrix
+
 
 class PatternClassifier:
     """DX推進パターン分類器"""
@@ -73,24 +75,34 @@ class PatternClassifier:
         data = self.get_municipality_data(city_code)
         
         if not data or not data['dx_status']:
+            return self.classify_features(None, data['population'] if data else 0)
+        
+        features = DxFeatureMatrix.from_dx(data['dx_status'], city_code)
+        return self.classify_features(features.row(city_code), data['population'] or 0)
+    
+    def classify_features(self, features: Optional[Dict[str, float]],
+                          population: int) -> Tuple[int, str, float, Dict]:
+        """
+        特徴量（DxFeatureMatrix.row() の結果）からパターンを判定
+        
+        Args:
+            features: dx_status の特徴量。None はデータ不足（Pattern 7）
+            population: 人口
+        """
+        if features is None:
             return (7, self.PATTERNS[7], 0.0, {
                 'policy_status': None,
                 'mynumber_rate': 0.0,
                 'online_proc_rate': 0.0,
-                'population': data['population'] if data else 0
+                'population': population or 0
             })
         
-        dx_status = data['dx_status']
-        population = data['population'] or 0
+        population = population or 0
         
         # 指標の抽出
-        policy = dx_status.get('自治体DXの推進体制等_全体方針策定', '') == '実施'
-        mynumber = self.parse_percentage(
-            dx_status.get('住民サービスのDX_マイナンバーカードの保有状況', '0%')
-        )
-        online_proc = self.parse_percentage(
-            dx_status.get('住民サービスのDX_よく使う32手続のオンライン化状況', '0%')
-        )
+        policy = features['policy_strict'] == 1.0
+        mynumber = features['mynumber_rate']
+        online_proc = features['online_proc_rate']
         
         indicators = {
             'policy_status': '実施' if policy else '未実施',
@@ -155,17 +167,21 @@ class PatternClassifier:
         """全自治体の一括分類"""
         print("🚀 全自治体のパターン分類を開始します...")
         
-        # 全自治体のcity_codeを取得
-        self.cur.execute("SELECT city_code FROM municipalities ORDER BY city_code;")
-        city_codes = [row['city_code'] for row in self.cur.fetchall()]
+        # 全自治体のdx_statusを1回で取得し、特徴量行列にまとめてパース
+        self.cur.execute("SELECT city_code, population, dx_status FROM municipalities ORDER BY city_code;")
+        rows = self.cur.fetchall()
+        features = DxFeatureMatrix.from_rows(rows)
         
-        total = len(city_codes)
+        total = len(rows)
         success_count = 0
         pattern_counts = {i: 0 for i in range(1, 8)}
         
-        for i, city_code in enumerate(city_codes, 1):
+        for i, row in enumerate(rows, 1):
+            city_code = row['city_code']
             try:
-                pattern_id, pattern_name, confidence, indicators = self.classify_municipality(city_code)
+                city_features = features.row(city_code) if row['dx_status'] else None
+                pattern_id, pattern_name, confidence, indicators = self.classify_features(
+                    city_features, row['population'])
                 self.save_classification(city_code, pattern_id, pattern_name, confidence, indicators)
                 
                 pattern_counts[pattern_id] += 1
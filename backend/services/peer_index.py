@@ -0,0 +1,159 @@
+"""
+同規模・類似自治体のピアインデックス
+
+自治体詳細の「同規模自治体の比較」は、従来リクエストごとに
+population BETWEEN pop*0.7 AND pop*1.3 の範囲検索とスコア順ソートを発行していた。
+スコアが変わるのは夜間バッチだけなので、スコア付き全自治体を人口順に並べた
+配列をプロセス内に保持し、以下をメモリ上で返す。
+
+- similar(): 人口±30%帯のスコア上位（従来と同じ定義。二分探索で帯を切り出す）
+- nearest(): 人口（対数）・高齢化率・財政力指数・5カテゴリスコアの
+             標準化ユークリッド距離による k 近傍
+
+インデックスは地図集計ビュー（map_prefecture_aggregates）の refreshed_at を
+バージョンとして、スコア保存後の更新に追従する。
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from services.map_snapshot import current_aggregate_version
+
+PEER_INDEX_TTL = float(os.getenv("PEER_INDEX_TTL", "60"))
+
+# 人口帯比較の幅（従来の ±30%）
+SIMILAR_POPULATION_RATIO = 0.3
+
+# k 近傍で使う特徴量（population は対数変換してから標準化）
+PEER_FEATURES = [
+    'population', 'elderly_ratio', 'fiscal_index',
+    'cat_citizen_services', 'cat_promotion_system', 'cat_business_dx',
+    'cat_education_dx', 'cat_information',
+]
+
+PEER_QUERY = """
+    SELECT m.city_code, m.city_name, m.prefecture, m.population,
+           m.elderly_ratio, m.fiscal_index, s.total_score,
+           s.cat_citizen_services, s.cat_promotion_system, s.cat_business_dx,
+           s.cat_education_dx, s.cat_information
+    FROM municipalities m
+    JOIN dx_scores_improved s ON m.city_code = s.city_code
+"""
+
+
+class PeerIndex:
+    """スコア付き自治体の人口ソート済み配列と標準化特徴量行列"""
+
+    def __init__(self, rows: List[Dict], version: str = ''):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # 人口順に整列（人口不明は帯検索の対象外だが k 近傍には含める）
+        rows = sorted(jsonable_encoder(rows), key=lambda r: (r['population'] is None, r['population'] or 0))
+        self.rows = rows
+        self._row_index = {r['city_code']: i for i, r in enumerate(rows)}
+        self._populations = np.array(
+            [r['population'] for r in rows if r['population'] is not None], dtype=float)
+        self._scores = np.array(
+            [r['total_score'] if r['total_score'] is not None else -np.inf for r in rows], dtype=float)
+        self._features = self._standardize(rows)
+
+    @staticmethod
+    def _standardize(rows: List[Dict]) -> np.ndarray:
+        """特徴量を z 値に変換（欠損は列平均 = 0 で補完）"""
+        raw = np.array(
+            [[np.nan if r[c] is None else float(r[c]) for c in PEER_FEATURES] for r in rows],
+            dtype=float,
+        ).reshape(len(rows), len(PEER_FEATURES))
+        pop = raw[:, 0]
+        raw[:, 0] = np.where(pop > 0, np.log(np.where(pop > 0, pop, 1.0)), np.nan)
+
+        with np.errstate(invalid='ignore'):
+            mean = np.nanmean(raw, axis=0) if len(rows) else np.zeros(len(PEER_FEATURES))
+            std = np.nanstd(raw, axis=0) if len(rows) else np.ones(len(PEER_FEATURES))
+        mean = np.nan_to_num(mean)
+        std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+        z = (raw - mean) / std
+        return np.nan_to_num(z, nan=0.0)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, city_code: str) -> bool:
+        return city_code in self._row_index
+
+    def similar(self, population: Optional[int], exclude: Optional[str] = None,
+                limit: int = 5) -> List[Dict]:
+        """人口±30%の自治体をスコア降順で返す（従来の BETWEEN クエリと同じ結果）"""
+        if not population or population <= 0:
+            return []
+        lo = np.searchsorted(self._populations, int(population * (1 - SIMILAR_POPULATION_RATIO)), side='left')
+        hi = np.searchsorted(self._populations, int(population * (1 + SIMILAR_POPULATION_RATIO)), side='right')
+        candidates = [i for i in range(lo, hi) if self.rows[i]['city_code'] != exclude]
+        candidates.sort(key=lambda i: -self._scores[i])
+        return [
+            {k: self.rows[i][k] for k in ('city_name', 'population', 'total_score')}
+            for i in candidates[:limit]
+        ]
+
+    def nearest(self, city_code: str, k: int = 5) -> List[Dict]:
+        """人口・高齢化率・財政力・カテゴリスコアが近い自治体を距離順に返す"""
+        i = self._row_index.get(city_code)
+        if i is None or len(self.rows) < 2:
+            return []
+        distances = np.sqrt(((self._features - self._features[i]) ** 2).sum(axis=1))
+        distances[i] = np.inf
+        k = min(k, len(self.rows) - 1)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [
+            {
+                'city_code': self.rows[j]['city_code'],
+                'city_name': self.rows[j]['city_name'],
+                'prefecture': self.rows[j]['prefecture'],
+                'population': self.rows[j]['population'],
+                'total_score': self.rows[j]['total_score'],
+                'distance': round(float(distances[j]), 3),
+            }
+            for j in nearest
+        ]
+
+
+class PeerIndexCache:
+    """PeerIndex のプロセス内キャッシュ（MapAggregateSnapshot と同じ更新方式）"""
+
+    def __init__(self, ttl_seconds: float = PEER_INDEX_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._index: Optional[PeerIndex] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._index = None
+
+    def load_rows(self, rows: List[Dict], version: str) -> PeerIndex:
+        self._index = PeerIndex(rows, version)
+        return self._index
+
+    async def get(self, db) -> PeerIndex:
+        index = self._index
+        if index is not None and time.monotonic() - index.loaded_at < self.ttl_seconds:
+            return index
+
+        async with self._lock:
+            index = self._index
+            if index is not None and time.monotonic() - index.loaded_at < self.ttl_seconds:
+                return index
+
+            version = await current_aggregate_version(db)
+            if index is not None and version is not None and version == index.version:
+                index.loaded_at = time.monotonic()
+                return index
+            result = await db.execute(text(PEER_QUERY))
+            rows = [dict(r) for r in result.mappings()]
+            return self.load_rows(rows, version or f"live-{time.time()}")
@@ -0,0 +1,72 @@
+"""
+レスポンス本文の圧縮（Accept-Encoding ネゴシエーション）
+
+シリアライズ済みスナップショットを返すエンドポイントは、圧縮結果も
+スナップショットと一緒に保持して使い回す。ここではエンコーディングの選択と
+圧縮処理だけを持つ。
+
+- br: brotli パッケージがインストールされている場合のみ（任意依存）
+- gzip: 標準ライブラリ
+- RESPONSE_MIN_COMPRESS_SIZE 未満の本文は圧縮しない
+"""
+
+import gzip
+import os
+from typing import Dict, List
+
+# brotli は任意（未インストールなら gzip のみで応答する）
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+RESPONSE_MIN_COMPRESS_SIZE = int(os.getenv("RESPONSE_MIN_COMPRESS_SIZE", "1024"))
+
+IDENTITY = "identity"
+
+
+def supported_encodings() -> List[str]:
+    """優先順（同じ q 値なら先頭を選ぶ）"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Accept-Encoding から使うエンコーディングを選ぶ（該当なしは identity）"""
+    weights = _parse_accept_encoding(accept_encoding)
+    best, best_q = IDENTITY, 0.0
+    for name in supported_encodings():
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def encode_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 で同じ本文からは同じバイト列になる（ETag と整合させるため）
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
@@ -9,12 +9,24 @@
 """
 
 import os
-import re
 import numpy as np
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from typing import Optional, Dict, List, Tuple
 
+from services.bulk_writer import BulkWriteStats, copy_upsert
+from services.dx_features import (
+    CATEGORY2_COLUMNS,
+    CATEGORY3_COLUMNS,
+    DxFeatureMatrix,
+    parse_boolean_indicator,
+    parse_fraction,
+    parse_percentage,
+)
+from services.map_snapshot import refresh_map_aggregates
+from services.score_ranks import refresh_score_ranks
+from services.score_runs import snapshot_scores
+
 
 # 8地方区分の定義
 REGIONS = {
@@ -61,6 +73,9 @@ class ImprovedScoreCalculator:
         self._cat3_stats = None
         self._max_news_count = None
 
+        # dx_status特徴量行列（全自治体分を1回だけパース）
+        self._features: Optional[DxFeatureMatrix] = None
+
     def parse_fraction(self, value: Optional[str]) -> Tuple[int, int]:
         """
         分数形式の文字列（例: '20/26'）を分子と分母に分解
@@ -68,51 +83,15 @@ class ImprovedScoreCalculator:
         Returns:
             (分子, 分母) のタプル
         """
-        if not value:
-            return (0, 0)
-
-        value_str = str(value).strip()
-
-        # 分数形式（例: "20/26"）
-        if '/' in value_str:
-            parts = value_str.split('/')
-            if len(parts) == 2:
-                try:
-                    numerator = int(parts[0].strip())
-                    denominator = int(parts[1].strip())
-                    return (numerator, denominator)
-                except ValueError:
-                    return (0, 0)
-
-        # パーセンテージ形式（例: "76.9%"）
-        match = re.search(r'(\d+(?:\.\d+)?)\s*%', value_str)
-        if match:
-            percentage = float(match.group(1))
-            # 100分率として扱う
-            return (int(percentage), 100)
-
-        return (0, 0)
+        return parse_fraction(value)
 
     def parse_percentage(self, value: Optional[str]) -> float:
         """パーセンテージ文字列を0.0-1.0に変換"""
-        if not value:
-            return 0.0
-        match = re.search(r'(\d+(?:\.\d+)?)', str(value))
-        if match:
-            return float(match.group(1)) / 100.0
-        return 0.0
+        return parse_percentage(value)
 
     def parse_boolean_indicator(self, value: Optional[str]) -> float:
         """実施/未実施を1.0/0.0に変換"""
-        if not value:
-            return 0.0
-        value_str = str(value)
-        # 否定キーワードを先にチェック（部分一致の誤判定防止）
-        negative_keywords = ['未実施', '未導入', '未活用', '未策定', '未任命', 'なし', '検討中']
-        if any(kw in value_str for kw in negative_keywords):
-            return 0.0
-        positive_keywords = ['実施', '導入済', '活用中', '策定済', '任命済', 'あり']
-        return 1.0 if any(kw in value_str for kw in positive_keywords) else 0.0
+        return parse_boolean_indicator(value)
 
     def coverage_penalty(self, denominator: int, max_denominator: int = 32) -> float:
         """
@@ -136,7 +115,17 @@ class ImprovedScoreCalculator:
         penalty = 1.0 - np.exp(-denominator / max_denominator)
         return penalty
 
-    def calculate_category1_improved(self, dx_status: Dict) -> float:
+    def get_feature_matrix(self) -> DxFeatureMatrix:
+        """dx_statusを持つ全自治体の特徴量行列を取得（インスタンス内でキャッシュ）"""
+        if self._features is None:
+            self.cur.execute(
+                "SELECT city_code, dx_status FROM municipalities WHERE dx_status IS NOT NULL")
+            self._features = DxFeatureMatrix.from_rows(self.cur.fetchall())
+        return self._features
+
+    # --- カテゴリ計算（特徴量行列に対するベクトル演算） ---
+
+    def category1_scores(self, features: DxFeatureMatrix) -> np.ndarray:
         """
         カテゴリ1: 住民サービスDX（改善版）
 
@@ -145,155 +134,92 @@ class ImprovedScoreCalculator:
         - カバレッジペナルティで小規模自治体の過大評価を防止
         """
         # マイナンバーカード保有率（15点）
-        mynumber_rate = self.parse_percentage(
-            dx_status.get('住民サービスのDX_マイナンバーカードの保有状況', '0%'))
-        mynumber_score = mynumber_rate * 15
-
-        # 32手続オンライン化（12点）- 分母正規化適用
-        online_32_raw = dx_status.get('住民サービスのDX_オンライン手続の導入状況_32手続（内閣府・総務省が規定）', '0/0')
-        numerator_32, denominator_32 = self.parse_fraction(online_32_raw)
-
-        if denominator_32 > 0:
-            online_32_rate = numerator_32 / denominator_32
-            coverage_factor_32 = self.coverage_penalty(denominator_32, 32)
-            online_32_score = online_32_rate * coverage_factor_32 * 12
-        else:
-            online_32_score = 0.0
-
-        # 26手続オンライン化（8点）- 分母正規化適用
-        online_26_raw = dx_status.get('住民サービスのDX_オンライン手続の導入状況_26手続（総務省が規定）', '0/0')
-        numerator_26, denominator_26 = self.parse_fraction(online_26_raw)
-
-        if denominator_26 > 0:
-            online_26_rate = numerator_26 / denominator_26
-            coverage_factor_26 = self.coverage_penalty(denominator_26, 26)
-            online_26_score = online_26_rate * coverage_factor_26 * 8
-        else:
-            online_26_score = 0.0
-
-        total = mynumber_score + online_32_score + online_26_score
-        return min(total, 35.0)
-
-    def get_category2_stats(self) -> Dict:
-        """カテゴリ2の全国統計を取得（Z-score計算用）"""
-        if self._cat2_stats is not None:
-            return self._cat2_stats
-
-        # 全自治体のカテゴリ2生スコアを計算
-        self.cur.execute("SELECT dx_status FROM municipalities WHERE dx_status IS NOT NULL")
-        rows = self.cur.fetchall()
+        mynumber_score = features.column('mynumber_rate') * 15
+
+        # 32手続オンライン化（12点）/ 26手続オンライン化（8点）- 分母正規化適用
+        num_32, den_32 = features.column('online32_num'), features.column('online32_den')
+        num_26, den_26 = features.column('online26_num'), features.column('online26_den')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            online_32_score = np.where(
+                den_32 > 0, (num_32 / den_32) * (1.0 - np.exp(-den_32 / 32)) * 12, 0.0)
+            online_26_score = np.where(
+                den_26 > 0, (num_26 / den_26) * (1.0 - np.exp(-den_26 / 26)) * 8, 0.0)
+
+        return np.minimum(mynumber_score + online_32_score + online_26_score, 35.0)
+
+    @staticmethod
+    def _zscore_rescale(raw: np.ndarray, stats: Dict, max_points: float) -> np.ndarray:
+        """Z-scoreを0-max_pointsに再スケーリング（-3σ〜+3σを想定）"""
+        if stats['std'] > 0:
+            z_score = (raw - stats['mean']) / stats['std']
+            return np.clip(((z_score + 3) / 6) * max_points, 0.0, max_points)
+        # 標準偏差が0の場合（全て同じ値）は中央値
+        return np.full(raw.shape, max_points / 2)
 
-        raw_scores = []
-        for row in rows:
-            dx = row['dx_status'] or {}
+    def category2_scores(self, features: DxFeatureMatrix) -> np.ndarray:
+        """
+        カテゴリ2: 推進体制（Z-score正規化版）
 
-            policy = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_全体方針策定'))
-            cio = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_CIOの任命'))
-            cio_sub = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_CIO補佐官等の任命'))
-            org = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_全庁的な体制構築'))
-            external = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_外部人材活用'))
-            training = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_全職員対象研修の実施'))
-            hr_dev = self.parse_boolean_indicator(dx.get('自治体DXの推進体制等_職員育成の取組'))
+        改善点:
+        - 7項目の合計をZ-scoreで標準化
+        - 0-25点の範囲に再スケーリング
+        """
+        raw = features.sum_columns(CATEGORY2_COLUMNS)
+        return self._zscore_rescale(raw, self.get_category2_stats(), 25.0)
 
-            # 7項目の合計（0-7）
-            raw_score = policy + cio + cio_sub + org + external + training + hr_dev
-            raw_scores.append(raw_score)
+    def category3_scores(self, features: DxFeatureMatrix) -> np.ndarray:
+        """カテゴリ3: 業務DX（Z-score正規化版）"""
+        raw = features.sum_columns(CATEGORY3_COLUMNS)
+        return self._zscore_rescale(raw, self.get_category3_stats(), 20.0)
 
-        raw_scores = np.array(raw_scores)
+    @staticmethod
+    def _summary_stats(raw_scores: np.ndarray) -> Dict:
+        """Z-score計算用の要約統計"""
         if len(raw_scores) == 0:
-            self._cat2_stats = {'mean': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0}
-            return self._cat2_stats
-
-        self._cat2_stats = {
+            return {'mean': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0}
+        return {
             'mean': np.mean(raw_scores),
             'std': np.std(raw_scores),
             'min': np.min(raw_scores),
             'max': np.max(raw_scores)
         }
 
+    def calculate_category1_improved(self, dx_status: Dict) -> float:
+        """カテゴリ1: 住民サービスDX（単一自治体）"""
+        return float(self.category1_scores(DxFeatureMatrix.from_dx(dx_status))[0])
+
+    def get_category2_stats(self) -> Dict:
+        """カテゴリ2の全国統計を取得（Z-score計算用）"""
+        if self._cat2_stats is not None:
+            return self._cat2_stats
+
+        # 全自治体のカテゴリ2生スコア（7項目の合計: 0-7）
+        features = self.get_feature_matrix()
+        self._cat2_stats = self._summary_stats(
+            features.sum_columns(CATEGORY2_COLUMNS)[features.has_dx])
+
         print(f"📊 カテゴリ2統計: 平均={self._cat2_stats['mean']:.2f}, 標準偏差={self._cat2_stats['std']:.2f}")
         return self._cat2_stats
 
     def calculate_category2_normalized(self, dx_status: Dict) -> float:
-        """
-        カテゴリ2: 推進体制（Z-score正規化版）
-
-        改善点:
-        - 7項目の合計をZ-scoreで標準化
-        - 0-25点の範囲に再スケーリング
-        """
-        policy = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_全体方針策定'))
-        cio = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_CIOの任命'))
-        cio_sub = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_CIO補佐官等の任命'))
-        org = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_全庁的な体制構築'))
-        external = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_外部人材活用'))
-        training = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_全職員対象研修の実施'))
-        hr_dev = self.parse_boolean_indicator(dx_status.get('自治体DXの推進体制等_職員育成の取組'))
-
-        raw_score = policy + cio + cio_sub + org + external + training + hr_dev
-
-        # Z-score標準化
-        stats = self.get_category2_stats()
-        if stats['std'] > 0:
-            z_score = (raw_score - stats['mean']) / stats['std']
-            # Z-scoreを0-25の範囲に変換（-3σ〜+3σを想定）
-            normalized = ((z_score + 3) / 6) * 25
-            return np.clip(normalized, 0.0, 25.0)
-        else:
-            # 標準偏差が0の場合（全て同じ値）
-            return 12.5  # 中央値
+        """カテゴリ2: 推進体制（単一自治体）"""
+        return float(self.category2_scores(DxFeatureMatrix.from_dx(dx_status))[0])
 
     def get_category3_stats(self) -> Dict:
         """カテゴリ3の全国統計を取得"""
         if self._cat3_stats is not None:
             return self._cat3_stats
 
-        self.cur.execute("SELECT dx_status FROM municipalities WHERE dx_status IS NOT NULL")
-        rows = self.cur.fetchall()
-
-        raw_scores = []
-        for row in rows:
-            dx = row['dx_status'] or {}
-
-            ai = self.parse_boolean_indicator(dx.get('自治体業務のDX_AIの導入状況'))
-            rpa = self.parse_boolean_indicator(dx.get('自治体業務のDX_RPAの導入状況'))
-            telework = self.parse_boolean_indicator(dx.get('自治体業務のDX_テレワークの導入状況'))
-
-            raw_score = ai + rpa + telework
-            raw_scores.append(raw_score)
-
-        raw_scores = np.array(raw_scores)
-        if len(raw_scores) == 0:
-            self._cat3_stats = {'mean': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0}
-            return self._cat3_stats
-
-        self._cat3_stats = {
-            'mean': np.mean(raw_scores),
-            'std': np.std(raw_scores),
-            'min': np.min(raw_scores),
-            'max': np.max(raw_scores)
-        }
+        features = self.get_feature_matrix()
+        self._cat3_stats = self._summary_stats(
+            features.sum_columns(CATEGORY3_COLUMNS)[features.has_dx])
 
         print(f"📊 カテゴリ3統計: 平均={self._cat3_stats['mean']:.2f}, 標準偏差={self._cat3_stats['std']:.2f}")
         return self._cat3_stats
 
     def calculate_category3_normalized(self, dx_status: Dict) -> float:
-        """
-        カテゴリ3: 業務DX（Z-score正規化版）
-        """
-        ai = self.parse_boolean_indicator(dx_status.get('自治体業務のDX_AIの導入状況'))
-        rpa = self.parse_boolean_indicator(dx_status.get('自治体業務のDX_RPAの導入状況'))
-        telework = self.parse_boolean_indicator(dx_status.get('自治体業務のDX_テレワークの導入状況'))
-
-        raw_score = ai + rpa + telework
-
-        stats = self.get_category3_stats()
-        if stats['std'] > 0:
-            z_score = (raw_score - stats['mean']) / stats['std']
-            normalized = ((z_score + 3) / 6) * 20
-            return np.clip(normalized, 0.0, 20.0)
-        else:
-            return 10.0
+        """カテゴリ3: 業務DX（単一自治体）"""
+        return float(self.category3_scores(DxFeatureMatrix.from_dx(dx_status))[0])
 
     def get_max_news_count(self) -> int:
         """ニュース記事数の最大値を取得"""
@@ -327,58 +253,122 @@ class ImprovedScoreCalculator:
         if not row:
             return None
 
-        dx = row['dx_status'] or {}
+        return self._build_results([row], DxFeatureMatrix.from_rows([row]), self.get_max_news_count())[0]
 
+    def fetch_bulk_inputs(self) -> List[Dict]:
+        """
+        全自治体のスコア算出入力を1クエリで取得（バルクモード用）
+
+        municipalities / education_info / municipality_patterns とニュース件数を
+        集合演算で一括取得する。ニュース件数は相関サブクエリではなく
+        GROUP BY 済みのCTEをJOINし、最大件数も同じラウンドトリップで返す。
+        """
+        self.cur.execute("""
+            WITH news AS (
+                SELECT city_code, COUNT(*) as cnt
+                FROM municipality_news
+                GROUP BY city_code
+            )
+            SELECT DISTINCT ON (m.city_code)
+                m.city_code, m.city_name, m.prefecture, m.population,
+                m.latitude, m.longitude, m.dx_status,
+                e.computer_per_student,
+                p.pattern_id, p.pattern_name,
+                COALESCE(n.cnt, 0) as news_count,
+                (SELECT COALESCE(MAX(cnt), 1) FROM news) as max_news_count
+            FROM municipalities m
+            LEFT JOIN education_info e ON m.city_code = e.city_code
+            LEFT JOIN municipality_patterns p ON m.city_code = p.city_code
+            LEFT JOIN news n ON m.city_code = n.city_code
+            ORDER BY m.city_code
+        """)
+        return self.cur.fetchall()
+
+    def _build_results(self, rows: List[Dict], features: DxFeatureMatrix,
+                       max_news: int) -> List[Dict]:
+        """入力行と特徴量行列から5カテゴリ+総合スコアを算出して結果dictを組み立てる"""
         # --- カテゴリ1: 住民サービスDX（改善版）---
-        cat1 = self.calculate_category1_improved(dx)
+        cat1 = self.category1_scores(features)
 
         # --- カテゴリ2: 推進体制（Z-score正規化版）---
-        cat2 = self.calculate_category2_normalized(dx)
+        cat2 = self.category2_scores(features)
 
         # --- カテゴリ3: 業務DX（Z-score正規化版）---
-        cat3 = self.calculate_category3_normalized(dx)
+        cat3 = self.category3_scores(features)
 
         # --- カテゴリ4: 教育DX ---
-        giga = row['computer_per_student'] or 0
-        giga_normalized = min(float(giga) / 1.0, 1.0)
-        cat4 = giga_normalized * 10
+        giga = np.array([float(r['computer_per_student'] or 0) for r in rows])
+        cat4 = np.minimum(giga / 1.0, 1.0) * 10
 
         # --- カテゴリ5: 情報発信 ---
-        news_count = row['news_count'] or 0
-        max_news = self.get_max_news_count()
-        news_normalized = min(news_count / max_news, 1.0) if max_news > 0 else 0.0
-        cat5 = news_normalized * 10
+        news_count = np.array([r['news_count'] or 0 for r in rows], dtype=float)
+        if max_news > 0:
+            cat5 = np.minimum(news_count / max_news, 1.0) * 10
+        else:
+            cat5 = np.zeros(len(rows))
 
         # --- 総合スコア ---
         total = cat1 + cat2 + cat3 + cat4 + cat5
-        total = min(round(total, 1), 100.0)
 
-        return {
-            'city_code': row['city_code'],
-            'city_name': row['city_name'],
-            'prefecture': row['prefecture'],
-            'region': REGIONS.get(row['prefecture'], '不明'),
-            'population': row['population'],
-            'latitude': float(row['latitude']) if row['latitude'] else None,
-            'longitude': float(row['longitude']) if row['longitude'] else None,
-            'total_score': total,
-            'category_scores': {
-                'citizen_services': round(cat1, 1),
-                'promotion_system': round(cat2, 1),
-                'business_dx': round(cat3, 1),
-                'education_dx': round(cat4, 1),
-                'information': round(cat5, 1),
-            },
-            'pattern_id': row['pattern_id'],
-            'pattern_name': row['pattern_name'],
-            'giga_rate': float(giga) if giga else None,
-            'news_count': news_count,
-        }
+        results = []
+        for i, row in enumerate(rows):
+            results.append({
+                'city_code': row['city_code'],
+                'city_name': row['city_name'],
+                'prefecture': row['prefecture'],
+                'region': REGIONS.get(row['prefecture'], '不明'),
+                'population': row['population'],
+                'latitude': float(row['latitude']) if row['latitude'] else None,
+                'longitude': float(row['longitude']) if row['longitude'] else None,
+                'total_score': min(round(float(total[i]), 1), 100.0),
+                'category_scores': {
+                    'citizen_services': round(float(cat1[i]), 1),
+                    'promotion_system': round(float(cat2[i]), 1),
+                    'business_dx': round(float(cat3[i]), 1),
+                    'education_dx': round(float(cat4[i]), 1),
+                    'information': round(float(cat5[i]), 1),
+                },
+                'pattern_id': row['pattern_id'],
+                'pattern_name': row['pattern_name'],
+                'giga_rate': float(giga[i]) if giga[i] else None,
+                'news_count': row['news_count'] or 0,
+            })
+        return results
+
+    def calculate_all_scores_bulk(self) -> List[Dict]:
+        """
+        全自治体のスコアをバルクモードで算出
+
+        入力を fetch_bulk_inputs() で一括取得し、dx_statusを特徴量行列に
+        1回だけパースしたうえで5カテゴリをNumPy配列でベクトル計算する。
+        計算式は calculate_score() と同一。
+        """
+        rows = self.fetch_bulk_inputs()
+        if not rows:
+            return []
+
+        # 全自治体の特徴量行列をそのまま全国統計にも流用する（追加クエリなし）
+        self._features = DxFeatureMatrix.from_rows(rows)
+        if self._max_news_count is None:
+            self._max_news_count = rows[0]['max_news_count']
 
-    def calculate_all_scores(self) -> List[Dict]:
-        """全自治体のスコアを算出"""
+        return self._build_results(rows, self._features, self._max_news_count)
+
+    def calculate_all_scores(self, bulk: bool = True) -> List[Dict]:
+        """
+        全自治体のスコアを算出
+
+        Args:
+            bulk: True の場合は一括取得+ベクトル計算（既定）。
+                  False の場合は自治体ごとに calculate_score() を呼ぶ従来方式。
+        """
         print("🚀 改善版DXスコア算出を開始...")
 
+        if bulk:
+            results = self.calculate_all_scores_bulk()
+            print(f"✅ 完了: {len(results)} 自治体のスコア算出（バルクモード）")
+            return results
+
         # まず統計情報を計算
         self.get_category2_stats()
         self.get_category3_stats()
@@ -397,6 +387,35 @@ class ImprovedScoreCalculator:
         print(f"✅ 完了: {len(results)} 自治体のスコア算出")
         return results
 
+    SCORE_COLUMNS = [
+        'city_code', 'total_score', 'cat_citizen_services', 'cat_promotion_system',
+        'cat_business_dx', 'cat_education_dx', 'cat_information',
+    ]
+
+    def write_scores(self, results: List[Dict], commit: bool = True) -> BulkWriteStats:
+        """
+        算出結果を dx_scores_improved に一括UPSERT
+
+        全行を一時テーブルへCOPYし、1文・1トランザクションでマージする。
+        """
+        rows = (
+            (
+                r['city_code'], float(r['total_score']),
+                float(r['category_scores']['citizen_services']),
+                float(r['category_scores']['promotion_system']),
+                float(r['category_scores']['business_dx']),
+                float(r['category_scores']['education_dx']),
+                float(r['category_scores']['information']),
+            )
+            for r in results
+        )
+        return copy_upsert(
+            self.conn, 'dx_scores_improved', self.SCORE_COLUMNS, rows,
+            key_columns=['city_code'],
+            extra_updates={'updated_at': 'NOW()'},
+            commit=commit,
+        )
+
     def save_scores_to_db(self):
         """全自治体のスコアをDBに保存"""
         # テーブル作成
@@ -417,29 +436,18 @@ class ImprovedScoreCalculator:
 
         results = self.calculate_all_scores()
 
-        for r in results:
-            cats = r['category_scores']
-            self.cur.execute("""
-                INSERT INTO dx_scores_improved
-                (city_code, total_score, cat_citizen_services, cat_promotion_system,
-                 cat_business_dx, cat_education_dx, cat_information, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (city_code) DO UPDATE SET
-                    total_score = EXCLUDED.total_score,
-                    cat_citizen_services = EXCLUDED.cat_citizen_services,
-                    cat_promotion_system = EXCLUDED.cat_promotion_system,
-                    cat_business_dx = EXCLUDED.cat_business_dx,
-                    cat_education_dx = EXCLUDED.cat_education_dx,
-                    cat_information = EXCLUDED.cat_information,
-                    updated_at = NOW();
-            """, (
-                r['city_code'], float(r['total_score']),
-                float(cats['citizen_services']), float(cats['promotion_system']),
-                float(cats['business_dx']), float(cats['education_dx']), float(cats['information'])
-            ))
+        write_stats = self.write_scores(results, commit=False)
+        print(f"💾 {len(results)} 件の改善版スコアをDBに保存しました")
+        print(f"   ⚡ {write_stats}")
+
+        # 同じトランザクションでランを作成・公開（スコアと公開ポインタが同時に切り替わる）
+        snapshot_scores(self.conn, 'dx_improved')
 
+        # 自治体詳細用の順位インデックスと地図ドリルダウン用の集計ビュー（APIはこのビューを
+        # スナップショットとして配信）も同じトランザクションで更新し、ポインタと同時に切り替える
+        refresh_score_ranks(self.conn, commit=False)
+        refresh_map_aggregates(self.conn, commit=False)
         self.conn.commit()
-        print(f"💾 {len(results)} 件の改善版スコアをDBに保存しました")
 
         # 統計表示
         self.cur.execute("""
@@ -0,0 +1,265 @@
+"""
+スコアラン間の差分（変動自治体フィード）
+
+営業側が「どの自治体が動いたか」を知るには、これまで全件リストを2回取得して
+手で突き合わせるしかなかった。ラン公開時（services/score_runs.snapshot_scores）に
+直前の公開ランとの差分を score_run_deltas に保存し、/api/v1/map/movers は
+その小さな表だけを返す。
+
+- 差分: 総合スコアと柱（カテゴリ）ごと。変化した自治体だけを保存する
+- 閾値の通過: 地図の色分け境界（改善版DXスコア）、確信度の境界
+  （Decision Readiness: 60=medium, 80=high）をまたいだものを上昇／下降で記録
+- 任意の旧ランとの比較（クライアントが複数ランを取りこぼした場合）は
+  両ランのスナップショットからその場で算出する
+
+差分表が未作成（015未適用）の場合は保存しない。
+"""
+
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from services.bulk_writer import copy_upsert
+
+
+@dataclass(frozen=True)
+class DeltaSpec:
+    snapshot_table: str
+    pillars: Sequence[str]
+    thresholds: Sequence[float]
+
+
+DELTA_SPECS: Dict[str, DeltaSpec] = {
+    # 地図の色分け境界（frontend mapApi.getScoreColorStops と同じ）
+    'dx_improved': DeltaSpec(
+        'dx_score_snapshots',
+        ['cat_citizen_services', 'cat_promotion_system', 'cat_business_dx',
+         'cat_education_dx', 'cat_information'],
+        (15, 22, 28, 34, 38, 42, 48),
+    ),
+    # 確信度の境界（DecisionReadinessScorerV3._determine_confidence）
+    'decision_readiness': DeltaSpec(
+        'readiness_score_snapshots',
+        ['structural_pressure', 'leadership_commitment', 'peer_pressure',
+         'feasibility', 'accountability'],
+        (60, 80),
+    ),
+}
+
+DELTA_COLUMNS = [
+    'run_id', 'base_run_id', 'city_code', 'total_before', 'total_after', 'total_delta',
+    'pillar_deltas', 'crossed',
+]
+
+
+@dataclass
+class CityDelta:
+    city_code: str
+    total_before: Optional[float]
+    total_after: float
+    total_delta: Optional[float]
+    pillar_deltas: Dict[str, float] = field(default_factory=dict)
+    crossed: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            'city_code': self.city_code,
+            'total_before': self.total_before,
+            'total_after': self.total_after,
+            'total_delta': self.total_delta,
+            'pillar_deltas': self.pillar_deltas,
+            'crossed': self.crossed,
+        }
+
+
+def _num(value) -> float:
+    if value is None:
+        return np.nan
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _round(value: float) -> float:
+    return round(float(value), 1)
+
+
+def compute_deltas(before: Dict[str, Dict], after: Dict[str, Dict], spec: DeltaSpec) -> List[CityDelta]:
+    """
+    2つのスナップショット {city_code: 行} の差分（変化した自治体のみ、city_code 順）
+
+    比較元に無い自治体は新規（total_before / total_delta = None）として含める。
+    """
+    codes = sorted(after)
+    if not codes:
+        return []
+    columns = ['total_score', *spec.pillars]
+    after_m = np.array([[_num(after[c].get(k)) for k in columns] for c in codes], dtype=float)
+    before_m = np.array([[_num((before.get(c) or {}).get(k)) for k in columns] for c in codes],
+                        dtype=float)
+    is_new = np.array([c not in before for c in codes])
+    diff = np.round(after_m - before_m, 1)
+    # NULL→値 / 値→NULL の柱も変化として扱う
+    changed_cells = ((diff != 0) & ~np.isnan(diff)) | (np.isnan(after_m) != np.isnan(before_m))
+    changed = is_new | changed_cells.any(axis=1)
+
+    thresholds = np.asarray(spec.thresholds, dtype=float)
+    band_before = np.searchsorted(thresholds, np.nan_to_num(before_m[:, 0]), side='right')
+    band_after = np.searchsorted(thresholds, np.nan_to_num(after_m[:, 0]), side='right')
+
+    deltas = []
+    for i in np.flatnonzero(changed):
+        pillar_deltas = {
+            name: _round(diff[i, j + 1])
+            for j, name in enumerate(spec.pillars)
+            if changed_cells[i, j + 1] and not np.isnan(diff[i, j + 1])
+        }
+        crossed = []
+        if not is_new[i] and band_before[i] != band_after[i]:
+            lo, hi = sorted((band_before[i], band_after[i]))
+            direction = 'up' if band_after[i] > band_before[i] else 'down'
+            crossed = [{'threshold': float(t), 'direction': direction} for t in thresholds[lo:hi]]
+        deltas.append(CityDelta(
+            city_code=codes[i],
+            total_before=None if is_new[i] else _round(before_m[i, 0]),
+            total_after=_round(np.nan_to_num(after_m[i, 0])),
+            total_delta=None if is_new[i] else _round(np.nan_to_num(diff[i, 0])),
+            pillar_deltas=pillar_deltas,
+            crossed=crossed,
+        ))
+    return deltas
+
+
+def summarize(deltas: List[CityDelta], spec: DeltaSpec, limit: int = 20) -> Dict:
+    """フィード本体: 上昇／下降の上位・閾値通過・件数・柱ごとの上昇／下降数"""
+    moved = [d for d in deltas if d.total_delta]
+    gainers = sorted((d for d in moved if d.total_delta > 0), key=lambda d: (-d.total_delta, d.city_code))
+    decliners = sorted((d for d in moved if d.total_delta < 0), key=lambda d: (d.total_delta, d.city_code))
+    crossed = sorted((d for d in deltas if d.crossed),
+                     key=lambda d: (-abs(d.total_delta or 0), d.city_code))
+    pillar_summary = {
+        name: {
+            'up': sum(1 for d in deltas if d.pillar_deltas.get(name, 0) > 0),
+            'down': sum(1 for d in deltas if d.pillar_deltas.get(name, 0) < 0),
+        }
+        for name in spec.pillars
+    }
+    return {
+        'summary': {
+            'changed': len(deltas),
+            'new': sum(1 for d in deltas if d.total_before is None),
+            'up': len(gainers),
+            'down': len(decliners),
+            'crossed': len(crossed),
+        },
+        'pillar_summary': pillar_summary,
+        'gainers': [d.to_dict() for d in gainers[:limit]],
+        'decliners': [d.to_dict() for d in decliners[:limit]],
+        'crossed': [d.to_dict() for d in crossed[:limit]],
+    }
+
+
+# ---- バッチ側（psycopg2 同期接続） ----
+
+def deltas_table_exists(conn) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('score_run_deltas')")
+        return cur.fetchone()[0] is not None
+    finally:
+        cur.close()
+
+
+def load_snapshot(conn, kind: str, run_id: int) -> Dict[str, Dict]:
+    spec = DELTA_SPECS[kind]
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT city_code, total_score, {', '.join(spec.pillars)} "
+            f"FROM {spec.snapshot_table} WHERE run_id = %s", (run_id,))
+        names = ['city_code', 'total_score', *spec.pillars]
+        return {row[0]: dict(zip(names, row)) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def record_deltas(conn, kind: str, run_id: int, base_run_id: Optional[int]) -> Optional[int]:
+    """
+    run_id と比較元ラン（直前の公開ラン）の差分を score_run_deltas に保存
+
+    保存件数を返す。比較元が無い（初回ラン）・差分表が無い場合は None。
+    """
+    if base_run_id is None or not deltas_table_exists(conn):
+        return None
+    spec = DELTA_SPECS[kind]
+    deltas = compute_deltas(load_snapshot(conn, kind, base_run_id),
+                            load_snapshot(conn, kind, run_id), spec)
+    copy_upsert(
+        conn, 'score_run_deltas', DELTA_COLUMNS,
+        (
+            (run_id, base_run_id, d.city_code, d.total_before, d.total_after, d.total_delta,
+             json.dumps(d.pillar_deltas), json.dumps(d.crossed))
+            for d in deltas
+        ),
+        key_columns=['run_id', 'city_code'], commit=False,
+    )
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE score_runs SET base_run_id = %s WHERE run_id = %s", (base_run_id, run_id))
+    finally:
+        cur.close()
+    return len(deltas)
+
+
+# ---- API側（SQLAlchemy 非同期セッション） ----
+
+async def fetch_run(db, run_id: int) -> Optional[Dict]:
+    """score_runs の1行（base_run_id は015未適用なら None）"""
+    try:
+        result = await db.execute(text("""
+            SELECT run_id, kind, base_run_id, created_at, published_at
+            FROM score_runs WHERE run_id = :run_id
+        """), {'run_id': run_id})
+    except sa_exc.ProgrammingError:
+        await db.rollback()
+        result = await db.execute(text("""
+            SELECT run_id, kind, NULL AS base_run_id, created_at, published_at
+            FROM score_runs WHERE run_id = :run_id
+        """), {'run_id': run_id})
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def fetch_deltas(db, run_id: int) -> Optional[List[CityDelta]]:
+    """保存済みの差分（015未適用の場合は None）"""
+    try:
+        result = await db.execute(text("""
+            SELECT city_code, total_before, total_after, total_delta, pillar_deltas, crossed
+            FROM score_run_deltas WHERE run_id = :run_id
+        """), {'run_id': run_id})
+    except sa_exc.ProgrammingError:
+        await db.rollback()
+        return None
+    return [
+        CityDelta(
+            city_code=r['city_code'],
+            total_before=_round(r['total_before']) if r['total_before'] is not None else None,
+            total_after=_round(r['total_after']),
+            total_delta=_round(r['total_delta']) if r['total_delta'] is not None else None,
+            pillar_deltas=r['pillar_deltas'] or {},
+            crossed=r['crossed'] or [],
+        )
+        for r in result.mappings()
+    ]
+
+
+async def fetch_snapshot(db, kind: str, run_id: int) -> Dict[str, Dict]:
+    """ランのスナップショット {city_code: 行}（ランが無ければ空）"""
+    spec = DELTA_SPECS[kind]
+    result = await db.execute(text(
+        f"SELECT city_code, total_score, {', '.join(spec.pillars)} "
+        f"FROM {spec.snapshot_table} WHERE run_id = :run_id"), {'run_id': run_id})
+    return {r['city_code']: dict(r) for r in result.mappings()}
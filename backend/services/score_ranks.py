@@ -0,0 +1,138 @@
+"""
+改善版DXスコアの順位インデックス
+
+dx_scores_improved の保存後に、全国・都道府県・人口規模帯ごとの順位と
+パーセンタイルをウィンドウ関数1文で算出して dx_score_ranks に書き込む。
+自治体詳細API は順位を主キー参照1回で取得できる。
+
+順位は「自分より高いスコアの自治体数 + 1」（同点は同順位）で、
+従来の COUNT(*) + 1 による全国順位と同じ定義。
+"""
+
+from typing import List, Optional, Tuple
+
+# 人口規模帯: (ラベル, 下限, 上限)  ※上限は含まない。None は上限なし
+POPULATION_BANDS: List[Tuple[str, int, Optional[int]]] = [
+    ('1万人未満', 0, 10000),
+    ('1万〜3万人', 10000, 30000),
+    ('3万〜10万人', 30000, 100000),
+    ('10万〜50万人', 100000, 500000),
+    ('50万人以上', 500000, None),
+]
+UNKNOWN_BAND = '不明'
+
+
+def population_band(population: Optional[int]) -> str:
+    """人口から人口規模帯のラベルを返す"""
+    if population is None:
+        return UNKNOWN_BAND
+    for label, lower, upper in POPULATION_BANDS:
+        if population >= lower and (upper is None or population < upper):
+            return label
+    return UNKNOWN_BAND
+
+
+def population_band_sql(column: str = 'm.population') -> str:
+    """population_band() と同じ判定をSQLのCASE式で返す"""
+    whens = []
+    for label, lower, upper in POPULATION_BANDS:
+        cond = f"{column} >= {lower}" if upper is None else f"{column} >= {lower} AND {column} < {upper}"
+        whens.append(f"WHEN {cond} THEN '{label}'")
+    return f"CASE {' '.join(whens)} ELSE '{UNKNOWN_BAND}' END"
+
+
+REFRESH_RANKS_SQL = f"""
+    WITH base AS (
+        SELECT s.city_code, s.total_score, m.prefecture,
+               {population_band_sql()} as population_band
+        FROM dx_scores_improved s
+        JOIN municipalities m ON m.city_code = s.city_code
+    )
+    INSERT INTO dx_score_ranks (
+        city_code, total_score,
+        national_rank, national_total, national_percentile,
+        prefecture_rank, prefecture_total, prefecture_percentile,
+        population_band, band_rank, band_total, band_percentile,
+        updated_at
+    )
+    SELECT
+        city_code, total_score,
+        RANK() OVER (ORDER BY total_score DESC),
+        COUNT(*) OVER (),
+        ROUND((PERCENT_RANK() OVER (ORDER BY total_score) * 100)::numeric, 1),
+        RANK() OVER (PARTITION BY prefecture ORDER BY total_score DESC),
+        COUNT(*) OVER (PARTITION BY prefecture),
+        ROUND((PERCENT_RANK() OVER (PARTITION BY prefecture ORDER BY total_score) * 100)::numeric, 1),
+        population_band,
+        RANK() OVER (PARTITION BY population_band ORDER BY total_score DESC),
+        COUNT(*) OVER (PARTITION BY population_band),
+        ROUND((PERCENT_RANK() OVER (PARTITION BY population_band ORDER BY total_score) * 100)::numeric, 1),
+        NOW()
+    FROM base
+    ON CONFLICT (city_code) DO UPDATE SET
+        total_score = EXCLUDED.total_score,
+        national_rank = EXCLUDED.national_rank,
+        national_total = EXCLUDED.national_total,
+        national_percentile = EXCLUDED.national_percentile,
+        prefecture_rank = EXCLUDED.prefecture_rank,
+        prefecture_total = EXCLUDED.prefecture_total,
+        prefecture_percentile = EXCLUDED.prefecture_percentile,
+        population_band = EXCLUDED.population_band,
+        band_rank = EXCLUDED.band_rank,
+        band_total = EXCLUDED.band_total,
+        band_percentile = EXCLUDED.band_percentile,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def refresh_score_ranks(conn, commit: bool = True) -> None:
+    """
+    dx_scores_improved から順位インデックスを再構築（バッチ側・psycopg2同期接続）
+
+    UPSERT と削除を1トランザクションで行うため、API は常に新旧どちらか一方の
+    完全な順位を参照する。commit=False ならスコア保存・ラン公開と同じ
+    トランザクションに含め、順位がスコアと同時に切り替わるようにする。
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('dx_score_ranks')")
+        if cur.fetchone()[0] is None:
+            print("⚠️ dx_score_ranks が未作成です（010_score_ranks.sql を適用してください）")
+            return
+        cur.execute(REFRESH_RANKS_SQL)
+        cur.execute("""
+            DELETE FROM dx_score_ranks r
+            WHERE NOT EXISTS (SELECT 1 FROM dx_scores_improved s WHERE s.city_code = r.city_code)
+        """)
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def format_ranks(row) -> dict:
+    """dx_score_ranks の1行をAPIレスポンス用の入れ子dictに変換"""
+    def _pct(value):
+        return float(value) if value is not None else None
+
+    return {
+        'national': {
+            'rank': row['national_rank'],
+            'total': row['national_total'],
+            'percentile': _pct(row['national_percentile']),
+        },
+        'prefecture': {
+            'rank': row['prefecture_rank'],
+            'total': row['prefecture_total'],
+            'percentile': _pct(row['prefecture_percentile']),
+        },
+        'population_band': {
+            'band': row['population_band'],
+            'rank': row['band_rank'],
+            'total': row['band_total'],
+            'percentile': _pct(row['band_percentile']),
+        },
+    }
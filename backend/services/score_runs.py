@@ -0,0 +1,212 @@
+"""
+スコア算出ランのバージョン管理（不変スナップショット + 公開ポインタ）
+
+dx_scores_improved はその場で上書き、decision_readiness_scores は日付キーで
+UPSERT されるため、「どのバッチの結果か」という単位が無かった。ここでは
+バッチごとに全件のスナップショットを新しいラン（score_runs）として書き、
+最後に score_run_pointer の1行を更新して公開する。
+
+- API は公開中の run_id を引き、そのランのスナップショットだけを読む
+  （書き込み中の行を読むことが無く、キャッシュは run_id をキーにできる）
+- 旧ランは差分確認用に SCORE_RUN_RETENTION 件まで保持し、超えたら削除する
+  （公開中のランは削除しない）
+- ロールバックはポインタを旧ランに戻すだけ。dx_improved は従来の読み手のため
+  dx_scores_improved もそのランの内容に戻す
+
+ラン用テーブルが未作成（014未適用）の場合は何もしない。
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from services.score_deltas import record_deltas
+
+SCORE_RUN_RETENTION = int(os.getenv("SCORE_RUN_RETENTION", "14"))
+
+
+@dataclass(frozen=True)
+class RunKind:
+    snapshot_table: str
+    columns: List[str]
+    source_sql: str
+
+
+DX_SCORE_COLUMNS = [
+    'city_code', 'total_score', 'cat_citizen_services', 'cat_promotion_system',
+    'cat_business_dx', 'cat_education_dx', 'cat_information',
+]
+READINESS_SCORE_COLUMNS = [
+    'city_code', 'scored_at', 'total_score', 'structural_pressure', 'leadership_commitment',
+    'peer_pressure', 'feasibility', 'accountability', 'confidence_level',
+]
+
+RUN_KINDS: Dict[str, RunKind] = {
+    'dx_improved': RunKind(
+        'dx_score_snapshots', DX_SCORE_COLUMNS,
+        f"SELECT {', '.join(DX_SCORE_COLUMNS)} FROM dx_scores_improved",
+    ),
+    # 差分実行でも全自治体を含むよう、自治体ごとの最新スコアを写す
+    'decision_readiness': RunKind(
+        'readiness_score_snapshots', READINESS_SCORE_COLUMNS,
+        f"""SELECT DISTINCT ON (city_code) {', '.join(READINESS_SCORE_COLUMNS)}
+            FROM decision_readiness_scores
+            ORDER BY city_code, scored_at DESC""",
+    ),
+}
+
+
+def runs_table_exists(conn) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('score_runs'), to_regclass('score_run_pointer')")
+        return all(v is not None for v in cur.fetchone())
+    finally:
+        cur.close()
+
+
+def current_run_id(conn, kind: str) -> Optional[int]:
+    """公開中の run_id（未公開なら None）"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT run_id FROM score_run_pointer WHERE kind = %s", (kind,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+
+
+def create_run(conn, kind: str) -> int:
+    """現在のスコアを新しいランとして書き込む（未公開）"""
+    spec = RUN_KINDS[kind]
+    columns = ', '.join(spec.columns)
+    cur = conn.cursor()
+    try:
+        cur.execute("INSERT INTO score_runs (kind) VALUES (%s) RETURNING run_id", (kind,))
+        run_id = cur.fetchone()[0]
+        cur.execute(f"""
+            INSERT INTO {spec.snapshot_table} (run_id, {columns})
+            SELECT %s, {columns} FROM ({spec.source_sql}) src
+        """, (run_id,))
+        cur.execute("UPDATE score_runs SET row_count = %s WHERE run_id = %s", (cur.rowcount, run_id))
+    finally:
+        cur.close()
+    return run_id
+
+
+def publish_run(conn, kind: str, run_id: int) -> None:
+    """公開ポインタを run_id に切り替える（コミット時点で API 側に反映）"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO score_run_pointer (kind, run_id, updated_at) VALUES (%s, %s, NOW())
+            ON CONFLICT (kind) DO UPDATE SET run_id = EXCLUDED.run_id, updated_at = NOW()
+        """, (kind, run_id))
+        cur.execute("UPDATE score_runs SET published_at = NOW() WHERE run_id = %s", (run_id,))
+    finally:
+        cur.close()
+
+
+def prune_runs(conn, kind: str, keep: int = SCORE_RUN_RETENTION) -> List[int]:
+    """新しい順に keep 件を残して旧ランを削除（公開中のランは残す）"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            DELETE FROM score_runs
+            WHERE kind = %s
+              AND run_id NOT IN (
+                  SELECT run_id FROM score_runs WHERE kind = %s ORDER BY run_id DESC LIMIT %s)
+              AND run_id NOT IN (SELECT run_id FROM score_run_pointer)
+            RETURNING run_id
+        """, (kind, kind, max(keep, 1)))
+        return sorted(row[0] for row in cur.fetchall())
+    finally:
+        cur.close()
+
+
+def snapshot_scores(conn, kind: str, keep: int = SCORE_RUN_RETENTION,
+                    commit: bool = False) -> Optional[int]:
+    """
+    スコア保存後に呼ぶ: ラン作成 → 直前の公開ランとの差分保存 → 公開 → 旧ラン削除
+
+    スコアの書き込みと同じトランザクションで呼べば、スコアとポインタが同時に切り替わる。
+    ラン用テーブルが無い場合は None。
+    """
+    if not runs_table_exists(conn):
+        print("⚠️ score_runs が未作成です（014_score_runs.sql を適用してください）")
+        return None
+    base_run_id = current_run_id(conn, kind)
+    run_id = create_run(conn, kind)
+    # 直前の公開ランとの差分（変動自治体フィード）もポインタと同時に公開する
+    changed = record_deltas(conn, kind, run_id, base_run_id)
+    publish_run(conn, kind, run_id)
+    pruned = prune_runs(conn, kind, keep)
+    if commit:
+        conn.commit()
+    print(f"   🗂️ {kind} ラン #{run_id} を公開"
+          + (f"（#{base_run_id} から {changed} 自治体が変動）" if changed is not None else "")
+          + (f"（旧ラン {len(pruned)} 件を削除）" if pruned else ""))
+    return run_id
+
+
+def list_runs(conn, kind: str) -> List[Dict]:
+    """ランの一覧（新しい順、current = 公開中）"""
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute("""
+            SELECT r.run_id, r.row_count, r.created_at, r.published_at,
+                   (p.run_id IS NOT NULL) AS current
+            FROM score_runs r
+            LEFT JOIN score_run_pointer p ON p.run_id = r.run_id
+            WHERE r.kind = %s
+            ORDER BY r.run_id DESC
+        """, (kind,))
+        return [dict(row) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def rollback_run(conn, kind: str, run_id: int) -> None:
+    """
+    公開ポインタを既存のラン run_id に戻す
+
+    dx_improved は dx_scores_improved もそのランの内容に戻す（順位・集計ビューは
+    呼び出し側がコミット前に同じトランザクションで再構築する）。
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT kind FROM score_runs WHERE run_id = %s", (run_id,))
+        row = cur.fetchone()
+        if row is None or row[0] != kind:
+            raise ValueError(f"{kind} のラン #{run_id} は存在しません")
+        if kind == 'dx_improved':
+            columns = ', '.join(DX_SCORE_COLUMNS)
+            updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in DX_SCORE_COLUMNS[1:])
+            cur.execute(f"""
+                INSERT INTO dx_scores_improved ({columns})
+                SELECT {columns} FROM dx_score_snapshots WHERE run_id = %s
+                ON CONFLICT (city_code) DO UPDATE SET {updates}, updated_at = NOW()
+            """, (run_id,))
+            cur.execute("""
+                DELETE FROM dx_scores_improved s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM dx_score_snapshots r WHERE r.run_id = %s AND r.city_code = s.city_code)
+            """, (run_id,))
+    finally:
+        cur.close()
+    publish_run(conn, kind, run_id)
+
+
+async def published_run_id(db, kind: str) -> Optional[int]:
+    """API側: 公開中の run_id（テーブル未作成・未公開の場合は None）"""
+    try:
+        result = await db.execute(
+            text("SELECT run_id FROM score_run_pointer WHERE kind = :kind"), {'kind': kind})
+    except sa_exc.ProgrammingError:
+        await db.rollback()
+        return None
+    return result.scalar()
@@ -0,0 +1,182 @@
+"""
+夜間スコアリングの差分判定
+
+前回スコアリング時の入力フィンガープリントを scoring_input_fingerprints に保持し、
+入力が変わった自治体だけを再計算する。
+
+- input_hash: スコア計算に使う DB 入力のハッシュ（1クエリで全対象を算出）
+    dx_status・人口/高齢化率/財政力指数/人口減少率/職員減少率・地方/都道府県、
+    同地方の DX 部署設置数（ピアプレッシャーの入力）、ニュースの件数と最終収集日時
+- text_hash: 施政方針テキストのハッシュ。変わっていなければ前回の
+    テキスト分析結果（BERT/Ollama）を再利用し、テキスト分析を省略する
+
+スコアリングロジックを変更したら SCORER_INPUT_VERSION を上げること（全件再計算される）。
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.bulk_writer import copy_upsert
+
+SCORER_INPUT_VERSION = "drs-v3.1"
+
+_INPUT_COLUMNS = """
+    COALESCE(m.dx_status::text, ''),
+    COALESCE(m.population::text, ''),
+    COALESCE(m.population_decline_rate::text, ''),
+    COALESCE(m.elderly_ratio::text, ''),
+    COALESCE(m.fiscal_index::text, ''),
+    COALESCE(m.staff_reduction_rate::text, ''),
+    COALESCE(m.region, ''),
+    COALESCE(m.prefecture, ''),
+    r.with_dept::text, r.total::text
+"""
+
+
+def _input_hash_query(with_news: bool) -> str:
+    news_cte = """
+        , news AS (
+            SELECT city_code, COUNT(*) as news_count, MAX(collected_at) as last_collected
+            FROM municipality_news
+            GROUP BY city_code
+        )
+    """ if with_news else ""
+    news_join = "LEFT JOIN news n ON n.city_code = m.city_code" if with_news else ""
+    news_columns = (", COALESCE(n.news_count, 0)::text, COALESCE(n.last_collected::text, '')"
+                    if with_news else "")
+    return f"""
+        WITH regional AS (
+            SELECT region,
+                   COUNT(*) FILTER (WHERE dx_status->>'dept' = 'true') as with_dept,
+                   COUNT(*) as total
+            FROM municipalities
+            WHERE dx_status IS NOT NULL
+            GROUP BY region
+        ){news_cte}
+        SELECT m.city_code,
+               md5(concat_ws('|', %s, {_INPUT_COLUMNS}{news_columns})) as input_hash
+        FROM municipalities m
+        LEFT JOIN regional r ON r.region IS NOT DISTINCT FROM m.region
+        {news_join}
+        WHERE m.city_code = ANY(%s)
+    """
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StoredFingerprint:
+    input_hash: str
+    text_hash: Optional[str]
+    analysis_result: Optional[Dict]
+
+
+@dataclass
+class IncrementalPlan:
+    """差分判定結果"""
+    rescore: List[str] = field(default_factory=list)        # 再計算する自治体
+    analyze_text: List[str] = field(default_factory=list)   # うちテキスト分析も必要な自治体
+    unchanged: List[str] = field(default_factory=list)      # スキップする自治体
+    reused_analysis: Dict[str, Dict] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return (f"再計算 {len(self.rescore)} 件（テキスト分析 {len(self.analyze_text)} 件）"
+                f" / スキップ {len(self.unchanged)} 件")
+
+
+def table_exists(conn) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('scoring_input_fingerprints')")
+        return cur.fetchone()[0] is not None
+    finally:
+        cur.close()
+
+
+def compute_input_hashes(conn, city_codes: List[str]) -> Dict[str, str]:
+    """対象自治体の DB 入力ハッシュを1クエリで算出"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('municipality_news')")
+        with_news = cur.fetchone()[0] is not None
+        cur.execute(_input_hash_query(with_news), (SCORER_INPUT_VERSION, list(city_codes)))
+        return {code: h for code, h in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def load_fingerprints(conn, city_codes: List[str]) -> Dict[str, StoredFingerprint]:
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT city_code, input_hash, text_hash, analysis_result
+            FROM scoring_input_fingerprints
+            WHERE city_code = ANY(%s)
+        """, (list(city_codes),))
+        return {row[0]: StoredFingerprint(*row[1:]) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def plan_incremental(
+    input_hashes: Dict[str, str],
+    stored: Dict[str, StoredFingerprint],
+    text_hashes: Optional[Dict[str, str]] = None,
+    full: bool = False,
+) -> IncrementalPlan:
+    """
+    入力ハッシュと前回値を比較して再計算対象を決める
+
+    text_hashes を渡さない場合（Liteモード）はテキスト分析の判定を行わず、
+    保存済みの分析結果があれば再利用する（AIなしのスコアで上書きしないため）。
+    テキストが空の自治体はテキスト分析の対象外。
+    full=True の場合は全件を再計算対象にする（分析結果の再利用判定は同じ）。
+    """
+    plan = IncrementalPlan()
+    for city_code, input_hash in input_hashes.items():
+        prev = stored.get(city_code)
+        new_text = (text_hashes or {}).get(city_code)
+        text_changed = (
+            text_hashes is not None and new_text is not None
+            and (prev is None or prev.text_hash != new_text or prev.analysis_result is None)
+        )
+        if not full and prev is not None and prev.input_hash == input_hash and not text_changed:
+            plan.unchanged.append(city_code)
+            continue
+        plan.rescore.append(city_code)
+        if text_changed:
+            plan.analyze_text.append(city_code)
+        elif (prev is not None and prev.analysis_result is not None
+              and (new_text is not None or text_hashes is None)):
+            plan.reused_analysis[city_code] = prev.analysis_result
+    return plan
+
+
+def save_fingerprints(
+    conn,
+    rows: Iterable[Tuple[str, str, Optional[str], Optional[Dict]]],
+    commit: bool = False,
+    update_text: bool = True,
+):
+    """
+    (city_code, input_hash, text_hash, analysis_result) を一括UPSERT
+
+    update_text=False の場合（Liteモード）は既存のテキストハッシュ・分析結果を残す。
+    """
+    return copy_upsert(
+        conn,
+        'scoring_input_fingerprints',
+        ['city_code', 'input_hash', 'text_hash', 'analysis_result'],
+        (
+            (code, ih, th, json.dumps(ar, ensure_ascii=False) if ar is not None else None)
+            for code, ih, th, ar in rows
+        ),
+        key_columns=['city_code'],
+        update_columns=None if update_text else ['input_hash'],
+        extra_updates={'scored_at': 'NOW()'},
+        commit=commit,
+    )
@@ -0,0 +1,262 @@
+"""
+メッシュ・自治体単位の法人／建物集計
+
+事業所密度や認定法人数を地図・スコアリングで使うたびに companies / buildings を
+全行走査しないよう、3次メッシュ単位（mesh_aggregates）と自治体単位
+（municipality_spatial_aggregates）の集計表を持つ。
+
+- 取り込み処理（gBizINFO ETL など）は書き込んだメッシュコードを渡して
+  refresh_spatial_aggregates() を呼ぶ。再集計はそのメッシュと、
+  それを含む自治体の分だけ（同じトランザクション内で行う）
+- mesh_codes=None なら全件を再構築する
+- meshes.municipality_code が未設定のメッシュは、メッシュ中心に最も近い
+  役所所在地の自治体に割り当てる（境界ポリゴンがDBに無いための近似）
+
+集計表が未作成（013未適用）の場合は何もしない。
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from services.bulk_writer import copy_upsert
+from services.neighbor_graph import COORDINATE_QUERY, nearest_points
+
+HEIGHT_BANDS = ['height_lt10', 'height_10_31', 'height_31_60', 'height_ge60']
+AGE_BANDS = ['built_pre1981', 'built_1981_2000', 'built_post2000', 'built_unknown']
+
+# mesh_aggregates / municipality_spatial_aggregates 共通の件数カラム
+COUNT_COLUMNS = [
+    'company_count', 'certified_company_count', 'building_count',
+    'height_sum', 'height_count', *HEIGHT_BANDS, *AGE_BANDS,
+]
+
+_MESH_AGGREGATE_SQL = """
+    WITH target AS (
+        SELECT code, municipality_code FROM meshes {where}
+    ),
+    comp AS (
+        SELECT c.mesh_code,
+               COUNT(*) AS company_count,
+               COUNT(*) FILTER (WHERE EXISTS (
+                   SELECT 1 FROM jsonb_each_text(COALESCE(c.cert_flags::jsonb, '{{}}'::jsonb)) kv
+                   WHERE kv.value = 'true'
+               )) AS certified_company_count
+        FROM companies c JOIN target t ON t.code = c.mesh_code
+        GROUP BY c.mesh_code
+    ),
+    cert AS (
+        SELECT mesh_code, jsonb_object_agg(key, n) AS cert_counts
+        FROM (
+            SELECT c.mesh_code, kv.key, COUNT(*) AS n
+            FROM companies c JOIN target t ON t.code = c.mesh_code
+            CROSS JOIN LATERAL jsonb_each_text(COALESCE(c.cert_flags::jsonb, '{{}}'::jsonb)) kv
+            WHERE kv.value = 'true'
+            GROUP BY c.mesh_code, kv.key
+        ) f
+        GROUP BY mesh_code
+    ),
+    bld AS (
+        SELECT b.mesh_code,
+               COUNT(*) AS building_count,
+               COALESCE(SUM(b.height) FILTER (WHERE b.height > 0), 0) AS height_sum,
+               COUNT(*) FILTER (WHERE b.height > 0) AS height_count,
+               COUNT(*) FILTER (WHERE b.height > 0 AND b.height < 10) AS height_lt10,
+               COUNT(*) FILTER (WHERE b.height >= 10 AND b.height < 31) AS height_10_31,
+               COUNT(*) FILTER (WHERE b.height >= 31 AND b.height < 60) AS height_31_60,
+               COUNT(*) FILTER (WHERE b.height >= 60) AS height_ge60,
+               COUNT(*) FILTER (WHERE b.year_built > 0 AND b.year_built < 1981) AS built_pre1981,
+               COUNT(*) FILTER (WHERE b.year_built BETWEEN 1981 AND 2000) AS built_1981_2000,
+               COUNT(*) FILTER (WHERE b.year_built > 2000) AS built_post2000,
+               COUNT(*) FILTER (WHERE b.year_built IS NULL OR b.year_built <= 0) AS built_unknown
+        FROM buildings b JOIN target t ON t.code = b.mesh_code
+        GROUP BY b.mesh_code
+    )
+    INSERT INTO mesh_aggregates (mesh_code, city_code, cert_counts, {columns}, refreshed_at)
+    SELECT t.code, t.municipality_code, COALESCE(cert.cert_counts, '{{}}'::jsonb),
+           COALESCE(comp.company_count, 0), COALESCE(comp.certified_company_count, 0),
+           COALESCE(bld.building_count, 0), COALESCE(bld.height_sum, 0), COALESCE(bld.height_count, 0),
+           COALESCE(bld.height_lt10, 0), COALESCE(bld.height_10_31, 0),
+           COALESCE(bld.height_31_60, 0), COALESCE(bld.height_ge60, 0),
+           COALESCE(bld.built_pre1981, 0), COALESCE(bld.built_1981_2000, 0),
+           COALESCE(bld.built_post2000, 0), COALESCE(bld.built_unknown, 0),
+           NOW()
+    FROM target t
+    LEFT JOIN comp ON comp.mesh_code = t.code
+    LEFT JOIN cert ON cert.mesh_code = t.code
+    LEFT JOIN bld ON bld.mesh_code = t.code
+    WHERE comp.mesh_code IS NOT NULL OR bld.mesh_code IS NOT NULL
+    RETURNING city_code
+"""
+
+_MUNICIPALITY_AGGREGATE_SQL = """
+    INSERT INTO municipality_spatial_aggregates (city_code, mesh_count, cert_counts, {columns}, refreshed_at)
+    SELECT a.city_code, COUNT(*), COALESCE(cc.cert_counts, '{{}}'::jsonb), {sums}, NOW()
+    FROM mesh_aggregates a
+    LEFT JOIN (
+        SELECT city_code, jsonb_object_agg(key, n) AS cert_counts
+        FROM (
+            SELECT a.city_code, kv.key, SUM(kv.value::int) AS n
+            FROM mesh_aggregates a
+            CROSS JOIN LATERAL jsonb_each_text(a.cert_counts) kv
+            {where}
+            GROUP BY a.city_code, kv.key
+        ) f
+        GROUP BY city_code
+    ) cc ON cc.city_code = a.city_code
+    {where}
+    GROUP BY a.city_code, cc.cert_counts
+"""
+
+
+def _filter(column: str, values: Optional[Iterable[str]]) -> Tuple[str, tuple]:
+    """values=None なら全件（NULL以外）、それ以外は ANY(%s) で絞り込む"""
+    if values is None:
+        return f"WHERE {column} IS NOT NULL", ()
+    return f"WHERE {column} = ANY(%s)", (list(values),)
+
+
+def spatial_tables_exist(conn) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('mesh_aggregates'), to_regclass('municipality_spatial_aggregates')")
+        return all(v is not None for v in cur.fetchone())
+    finally:
+        cur.close()
+
+
+def assign_mesh_municipalities(conn, mesh_codes: Optional[Iterable[str]] = None) -> int:
+    """municipality_code が未設定のメッシュを最寄りの役所所在地の自治体に割り当てる"""
+    where, params = _filter('code', mesh_codes)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(f"""
+            SELECT code, lat, lon FROM meshes
+            {where} AND municipality_code IS NULL AND lat IS NOT NULL AND lon IS NOT NULL
+        """, params)
+        meshes = cur.fetchall()
+        if not meshes:
+            return 0
+        cur.execute(COORDINATE_QUERY)
+        offices = cur.fetchall()
+    finally:
+        cur.close()
+    if not offices:
+        return 0
+
+    index, _ = nearest_points(
+        [float(m['lat']) for m in meshes], [float(m['lon']) for m in meshes],
+        [float(o['latitude']) for o in offices], [float(o['longitude']) for o in offices],
+    )
+    copy_upsert(
+        conn, 'meshes', ['code', 'municipality_code'],
+        ((m['code'], offices[i]['city_code']) for m, i in zip(meshes, index.tolist())),
+        key_columns=['code'], update_columns=['municipality_code'], commit=False,
+    )
+    return len(meshes)
+
+
+def refresh_mesh_aggregates(conn, mesh_codes: Optional[Iterable[str]] = None) -> Set[str]:
+    """対象メッシュの集計を作り直し、影響を受けた自治体コードを返す"""
+    mesh_codes = None if mesh_codes is None else list(mesh_codes)
+    where, params = _filter('code', mesh_codes)
+    cur = conn.cursor()
+    try:
+        if mesh_codes is None:
+            cur.execute("DELETE FROM mesh_aggregates RETURNING city_code")
+        else:
+            cur.execute("DELETE FROM mesh_aggregates WHERE mesh_code = ANY(%s) RETURNING city_code", params)
+        affected = {row[0] for row in cur.fetchall()}
+        cur.execute(_MESH_AGGREGATE_SQL.format(where=where, columns=', '.join(COUNT_COLUMNS)), params)
+        affected.update(row[0] for row in cur.fetchall())
+    finally:
+        cur.close()
+    affected.discard(None)
+    return affected
+
+
+def refresh_municipality_aggregates(conn, city_codes: Optional[Iterable[str]] = None) -> None:
+    """mesh_aggregates から自治体単位の集計を作り直す"""
+    city_codes = None if city_codes is None else list(city_codes)
+    if city_codes is not None and not city_codes:
+        return
+    where, params = _filter('a.city_code', city_codes)
+    sums = ', '.join(f"SUM(a.{c})" for c in COUNT_COLUMNS)
+    cur = conn.cursor()
+    try:
+        if city_codes is None:
+            cur.execute("DELETE FROM municipality_spatial_aggregates")
+        else:
+            cur.execute("DELETE FROM municipality_spatial_aggregates WHERE city_code = ANY(%s)", params)
+        # {where} は2か所に現れるため、パラメータも2回渡す
+        cur.execute(
+            _MUNICIPALITY_AGGREGATE_SQL.format(where=where, columns=', '.join(COUNT_COLUMNS), sums=sums),
+            params * 2,
+        )
+    finally:
+        cur.close()
+
+
+def refresh_spatial_aggregates(conn, mesh_codes: Optional[Iterable[str]] = None,
+                               commit: bool = False) -> bool:
+    """
+    メッシュ → 自治体の順に集計を更新（取り込み処理と同じトランザクションで呼ぶ）
+
+    mesh_codes=None は全件再構築。集計表が無い場合は False。
+    """
+    if not spatial_tables_exist(conn):
+        print("⚠️ mesh_aggregates が未作成です（013_spatial_aggregates.sql を適用してください）")
+        return False
+    mesh_codes = None if mesh_codes is None else list(mesh_codes)
+    if mesh_codes is not None and not mesh_codes:
+        return True
+    assign_mesh_municipalities(conn, mesh_codes)
+    affected = refresh_mesh_aggregates(conn, mesh_codes)
+    refresh_municipality_aggregates(conn, None if mesh_codes is None else affected)
+    if commit:
+        conn.commit()
+    return True
+
+
+def load_municipality_spatial(conn, city_codes: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """スコアリング用: {city_code: 集計行}（集計表が無ければ空）"""
+    if not spatial_tables_exist(conn):
+        return {}
+    where, params = _filter('city_code', city_codes)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(f"SELECT * FROM municipality_spatial_aggregates {where}", params)
+        return {row['city_code']: dict(row) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def format_spatial(row) -> Dict:
+    """API レスポンス用に集計行を整形（件数・平均高さ・分布）"""
+    height_count = row['height_count'] or 0
+    mesh_count = row.get('mesh_count')
+    company_count = row['company_count'] or 0
+    result = {
+        'companies': {
+            'count': company_count,
+            'certified': row['certified_company_count'] or 0,
+            'cert_counts': row['cert_counts'] or {},
+        },
+        'buildings': {
+            'count': row['building_count'] or 0,
+            'avg_height': round(row['height_sum'] / height_count, 1) if height_count else None,
+            'height_bands': {
+                '<10m': row['height_lt10'], '10-31m': row['height_10_31'],
+                '31-60m': row['height_31_60'], '60m+': row['height_ge60'],
+            },
+            'age_bands': {
+                '~1980': row['built_pre1981'], '1981-2000': row['built_1981_2000'],
+                '2001~': row['built_post2000'], 'unknown': row['built_unknown'],
+            },
+        },
+    }
+    if mesh_count is not None:
+        result['mesh_count'] = mesh_count
+        # 3次メッシュは約1km²のため、メッシュあたり件数 ≒ km²あたり密度
+        result['companies']['per_mesh'] = round(company_count / mesh_count, 2) if mesh_count else None
+    return result
@@ -0,0 +1,447 @@
+"""
+自治体コロプレス用のベクタータイル（Mapbox Vector Tile）
+
+地図画面は全国の自治体境界 GeoJSON（数十MB）を毎回 GitHub から取得し、
+クライアント側でスコアを結合していた。サーバー側で境界を一度だけ読み込み、
+タイル単位に切り出した MVT にスコア属性を埋め込んで返す。
+
+- 境界: N03 形式の GeoJSON（MUNICIPALITY_BOUNDARY_PATH、
+  scripts/fetch_municipality_boundaries.py で取得）。Web メルカトルに投影して保持
+- 簡略化: タイル座標（extent 4096）上で TILE_SIMPLIFY_PX ピクセルのグリッドに丸めて
+  連続する重複点を除く。ズームが低いほどグリッドが地理的に粗くなり、自然に間引かれる
+- 切り出し: タイル範囲 + バッファで Sutherland–Hodgman クリップ
+- 属性: N03_004（名称）・N03_007（5桁コード）はフロントの既存の式と互換、
+  city_code・prefecture・total_score を追加
+- キャッシュ: TILE_CACHE_DIR/{スコアのバージョン}/{z}/{x}/{y}.mvt。
+  再スコアリングでバージョン（map_prefecture_aggregates.refreshed_at）が変わると
+  新しいディレクトリに作り直し、古いバージョンは削除する
+
+MVT のエンコードは仕様（v2.1）に必要な範囲のみを自前で実装している（追加依存なし）。
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from config import settings
+from services.map_snapshot import current_aggregate_version
+
+MUNICIPALITY_BOUNDARY_PATH = os.getenv(
+    "MUNICIPALITY_BOUNDARY_PATH", os.path.join(settings.DATA_DIR, "boundaries", "municipalities.geojson"))
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", os.path.join(settings.DATA_DIR, "cache", "tiles"))
+TILE_MIN_ZOOM = int(os.getenv("TILE_MIN_ZOOM", "3"))
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "12"))
+TILE_SIMPLIFY_PX = float(os.getenv("TILE_SIMPLIFY_PX", "1.0"))
+# スコア属性の再読み込み間隔（秒）。バージョンが変わっていなければ再利用
+TILE_ATTRIBUTE_TTL = float(os.getenv("TILE_ATTRIBUTE_TTL", "60"))
+
+LAYER_NAME = "municipalities"
+EXTENT = 4096
+BUFFER = 64
+MAX_LAT = 85.0511287798
+
+TILE_ATTRIBUTE_QUERY = """
+    SELECT m.city_code, m.city_name, m.prefecture, s.total_score
+    FROM municipalities m
+    LEFT JOIN dx_scores_improved s ON m.city_code = s.city_code
+"""
+
+
+# --- 境界データ ---
+
+def project(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """経緯度 → Web メルカトルの正規化座標（0〜1、y は下向き）"""
+    lat = np.clip(lat, -MAX_LAT, MAX_LAT)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return np.column_stack([x, y])
+
+
+@dataclass
+class Boundary:
+    code5: str                          # N03_007（チェックディジットなし5桁）
+    properties: Dict[str, str]
+    polygons: List[List[np.ndarray]]    # [[外周, 穴, ...], ...]（正規化座標）
+
+
+class BoundarySet:
+    """全自治体の境界と外接矩形（タイルとの交差判定用）"""
+
+    def __init__(self, boundaries: List[Boundary]):
+        self.boundaries = boundaries
+        bbox = np.zeros((len(boundaries), 4))
+        for i, b in enumerate(boundaries):
+            points = np.vstack([ring for polygon in b.polygons for ring in polygon])
+            bbox[i] = [points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()]
+        self.bbox = bbox
+
+    @classmethod
+    def from_geojson(cls, data: Dict) -> 'BoundarySet':
+        boundaries = []
+        for feature in data.get('features', []):
+            geometry = feature.get('geometry') or {}
+            props = feature.get('properties') or {}
+            if geometry.get('type') == 'Polygon':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                parts = geometry['coordinates']
+            else:
+                continue
+            polygons = []
+            for part in parts:
+                rings = []
+                for ring in part:
+                    coords = np.asarray(ring, dtype=float)
+                    if len(coords) >= 4:
+                        rings.append(project(coords[:-1, 0], coords[:-1, 1]))  # 閉じ点を除く
+                if rings:
+                    polygons.append(rings)
+            if polygons:
+                boundaries.append(Boundary(
+                    code5=str(props.get('N03_007') or ''),
+                    properties={k: props.get(k) for k in ('N03_001', 'N03_004', 'N03_007')},
+                    polygons=polygons,
+                ))
+        return cls(boundaries)
+
+    @classmethod
+    def load(cls, path: str = MUNICIPALITY_BOUNDARY_PATH) -> Optional['BoundarySet']:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return cls.from_geojson(json.load(f))
+
+    def intersecting(self, z: int, x: int, y: int) -> np.ndarray:
+        """タイル（バッファ込み）と外接矩形が交差する境界のインデックス"""
+        n = 2 ** z
+        pad = BUFFER / EXTENT
+        x0, y0 = (x - pad) / n, (y - pad) / n
+        x1, y1 = (x + 1 + pad) / n, (y + 1 + pad) / n
+        b = self.bbox
+        return np.nonzero((b[:, 0] <= x1) & (b[:, 2] >= x0) & (b[:, 1] <= y1) & (b[:, 3] >= y0))[0]
+
+
+# --- ジオメトリ処理 ---
+
+def _clip_edge(points: np.ndarray, axis: int, bound: float, keep_greater: bool) -> np.ndarray:
+    """Sutherland–Hodgman の1辺分（閉じたリングを半平面で切る）"""
+    if len(points) == 0:
+        return points
+    prev = np.roll(points, 1, axis=0)
+    inside = points[:, axis] >= bound if keep_greater else points[:, axis] <= bound
+    prev_inside = np.roll(inside, 1)
+    crossing = inside != prev_inside
+    # 辺をまたがない点の t は使わない（0除算の警告のみ抑止）
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (bound - prev[:, axis]) / (points[:, axis] - prev[:, axis])
+        intersection = prev + t[:, None] * (points - prev)
+    # 各点について [交点（辺をまたぐ場合）, 点（内側の場合）] の順に出力
+    out = np.empty((len(points) * 2, 2))
+    keep = np.empty(len(points) * 2, dtype=bool)
+    out[0::2], keep[0::2] = intersection, crossing
+    out[1::2], keep[1::2] = points, inside
+    return out[keep]
+
+
+def clip_ring(points: np.ndarray, low: float, high: float) -> np.ndarray:
+    for axis in (0, 1):
+        points = _clip_edge(points, axis, low, keep_greater=True)
+        points = _clip_edge(points, axis, high, keep_greater=False)
+    return points
+
+
+def signed_area(ring: np.ndarray) -> float:
+    """タイル座標（y 下向き）での符号付き面積。MVT では外周が正"""
+    x, y = ring[:, 0].astype(float), ring[:, 1].astype(float)
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2.0
+
+
+def simplify_ring(ring: np.ndarray, grid: int) -> Optional[np.ndarray]:
+    """グリッドに丸めて連続重複点を除く（3点未満・面積0になれば None）"""
+    snapped = (np.round(ring / grid) * grid).astype(np.int64)
+    keep = np.any(snapped != np.roll(snapped, 1, axis=0), axis=1)
+    snapped = snapped[keep]
+    if len(snapped) < 3 or signed_area(snapped) == 0:
+        return None
+    return snapped
+
+
+def tile_polygons(boundary: Boundary, z: int, x: int, y: int,
+                  simplify_px: float = TILE_SIMPLIFY_PX) -> List[List[np.ndarray]]:
+    """境界をタイル座標に変換・クリップ・簡略化し、MVT の巻き方向に揃える"""
+    n = 2 ** z
+    grid = max(1, int(round(EXTENT / 256 * simplify_px)))
+    result = []
+    for polygon in boundary.polygons:
+        rings = []
+        for i, ring in enumerate(polygon):
+            local = (ring * n - [x, y]) * EXTENT
+            local = clip_ring(local, -BUFFER, EXTENT + BUFFER)
+            simplified = simplify_ring(local, grid) if len(local) >= 3 else None
+            if simplified is None:
+                if i == 0:
+                    break  # 外周が消えたらポリゴンごと除外
+                continue
+            area = signed_area(simplified)
+            if (i == 0) != (area > 0):
+                simplified = simplified[::-1]
+            rings.append(simplified)
+        if rings:
+            result.append(rings)
+    return result
+
+
+# --- MVT エンコード ---
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, data: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed(number: int, values: Sequence[int]) -> bytes:
+    return _bytes_field(number, b''.join(_varint(int(v)) for v in values))
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return (values << 1) ^ (values >> 63)
+
+
+def encode_geometry(polygons: List[List[np.ndarray]]) -> List[int]:
+    """ポリゴン群を MVT のコマンド列（MoveTo / LineTo / ClosePath）に変換"""
+    commands: List[int] = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for rings in polygons:
+        for ring in rings:
+            deltas = _zigzag(np.diff(np.vstack([cursor, ring]), axis=0))
+            cursor = ring[-1]
+            commands.append((1 << 3) | 1)                    # MoveTo x1
+            commands.extend(deltas[0].tolist())
+            commands.append(((len(ring) - 1) << 3) | 2)      # LineTo
+            commands.extend(deltas[1:].ravel().tolist())
+            commands.append((1 << 3) | 7)                    # ClosePath
+    return commands
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _field(6, 0) + _varint((value << 1) ^ (value >> 63))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def encode_layer(name: str, features: List[tuple]) -> bytes:
+    """features: [(id, properties, polygons)] → Layer（キー・値は重複排除）"""
+    keys: Dict[str, int] = {}
+    values: Dict[tuple, int] = {}
+    body = bytearray()
+    for feature_id, properties, polygons in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        feature = (_field(1, 0) + _varint(feature_id)
+                   + _packed(2, tags)
+                   + _field(3, 0) + _varint(3)               # POLYGON
+                   + _packed(4, encode_geometry(polygons)))
+        body += _bytes_field(2, feature)
+
+    layer = (_field(15, 0) + _varint(2)
+             + _bytes_field(1, name.encode('utf-8'))
+             + bytes(body)
+             + b''.join(_bytes_field(3, k.encode('utf-8')) for k in keys)
+             + b''.join(_bytes_field(4, _encode_value(v)) for (_, v) in values)
+             + _field(5, 0) + _varint(EXTENT))
+    return _bytes_field(3, layer)
+
+
+def render_tile(boundaries: BoundarySet, attributes: Dict[str, Dict], z: int, x: int, y: int,
+                simplify_px: float = TILE_SIMPLIFY_PX) -> bytes:
+    """1タイル分の MVT（該当する自治体が無ければ空バイト列）"""
+    features = []
+    for i in boundaries.intersecting(z, x, y).tolist():
+        boundary = boundaries.boundaries[i]
+        polygons = tile_polygons(boundary, z, x, y, simplify_px)
+        if not polygons:
+            continue
+        props = {k: v for k, v in boundary.properties.items() if v is not None}
+        props.update(attributes.get(boundary.code5, {}))
+        features.append((i + 1, props, polygons))
+    return encode_layer(LAYER_NAME, features) if features else b''
+
+
+def tile_attributes(rows) -> Dict[str, Dict]:
+    """スコア行 → {5桁コード: 埋め込む属性}（N03_007 は6桁コードの先頭5桁）"""
+    attributes = {}
+    for r in rows:
+        code = r['city_code'] or ''
+        attrs = {'city_code': code, 'prefecture': r['prefecture']}
+        if r['total_score'] is not None:
+            attrs['total_score'] = round(float(r['total_score']), 1)
+        attributes.setdefault(code[:5], attrs)
+    return attributes
+
+
+# --- ディスクキャッシュ ---
+
+class TileDiskCache:
+    """{root}/{version}/{z}/{x}/{y}.mvt。新しいバージョンを書いたら古いものを削除"""
+
+    def __init__(self, root: str = TILE_CACHE_DIR):
+        self.root = root
+        self._current: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _dir_name(version: str) -> str:
+        return hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+
+    def _path(self, version: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, self._dir_name(version), str(z), str(x), f"{y}.mvt")
+
+    def get(self, version: str, z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            with open(self._path(version, z, x, y), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, version: str, z: int, x: int, y: int, data: bytes, prune: bool = True) -> None:
+        """prune=False なら書くだけ（version が最新か呼び出し側で確かめてから prune する）"""
+        path = self._path(version, z, x, y)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ タイルキャッシュ書き込み失敗: {e}")
+            return
+        if prune:
+            self.prune(version)
+
+    def prune(self, version: str) -> None:
+        """再スコアリング前のバージョンのタイルを削除"""
+        if self._current == version:
+            return
+        with self._lock:
+            if self._current == version:
+                return
+            keep = self._dir_name(version)
+            for name in os.listdir(self.root):
+                if name != keep:
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            self._current = version
+
+
+# --- API 用 ---
+
+class MunicipalityTiles:
+    """境界（初回のみ読み込み）・スコア属性（バージョン追従）・ディスクキャッシュをまとめる"""
+
+    def __init__(self, boundary_path: str = MUNICIPALITY_BOUNDARY_PATH,
+                 cache: Optional[TileDiskCache] = None, attribute_ttl: float = TILE_ATTRIBUTE_TTL):
+        self.boundary_path = boundary_path
+        self.cache = cache if cache is not None else TileDiskCache()
+        self.attribute_ttl = attribute_ttl
+        self._boundaries: Optional[BoundarySet] = None
+        self._attributes: Optional[Dict[str, Dict]] = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        # 属性とバージョンの入れ替え・旧バージョンの削除を直列化する
+        self._refresh_lock = asyncio.Lock()
+
+    def set_boundaries(self, boundaries: BoundarySet) -> None:
+        self._boundaries = boundaries
+
+    def set_attributes(self, attributes: Dict[str, Dict], version: str) -> None:
+        self._attributes = attributes
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._attributes = None
+        self._version = None
+
+    async def boundaries(self) -> Optional[BoundarySet]:
+        if self._boundaries is None:
+            async with self._lock:
+                if self._boundaries is None:
+                    self._boundaries = await asyncio.to_thread(BoundarySet.load, self.boundary_path)
+        return self._boundaries
+
+    def _fresh(self) -> bool:
+        return self._attributes is not None and time.monotonic() - self._checked_at < self.attribute_ttl
+
+    async def snapshot(self, db) -> Tuple[Dict[str, Dict], str]:
+        """(スコア属性, バージョン) の組。TTL 内は前回値を再利用し、両者は常に同じ世代"""
+        if self._fresh():
+            return self._attributes, self._version
+        async with self._refresh_lock:
+            if self._fresh():
+                return self._attributes, self._version
+            attributes = self._attributes
+            version = await current_aggregate_version(db)
+            if attributes is None or version is None or version != self._version:
+                result = await db.execute(text(TILE_ATTRIBUTE_QUERY))
+                attributes = tile_attributes(list(result.mappings()))
+                if version is None:
+                    # 集計ビュー未作成: 属性の内容からバージョンを作る
+                    version = "attrs-" + hashlib.sha1(
+                        json.dumps(attributes, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+            self.set_attributes(attributes, version)
+            return attributes, version
+
+    async def version(self, db) -> str:
+        """スコアのバージョン（TTL 内は前回値を再利用）"""
+        _, version = await self.snapshot(db)
+        return version
+
+    async def tile(self, db, z: int, x: int, y: int) -> Optional[tuple]:
+        """(MVT バイト列, バージョン)。境界データが無ければ None"""
+        boundaries = await self.boundaries()
+        if boundaries is None:
+            return None
+        # 描画中にバージョンが進んでも、取得した世代の属性で描いてその世代のディレクトリに書く
+        attributes, version = await self.snapshot(db)
+        data = self.cache.get(version, z, x, y)
+        if data is None:
+            data = await asyncio.to_thread(render_tile, boundaries, attributes, z, x, y)
+            await asyncio.to_thread(self.cache.put, version, z, x, y, data, False)
+            # 古い世代のタイルで新しい世代のディレクトリを消さないよう、最新のときだけ削除
+            async with self._refresh_lock:
+                if version == self._version:
+                    await asyncio.to_thread(self.cache.prune, version)
+        return data, version
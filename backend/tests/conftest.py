@@ -15,6 +15,7 @@ os.environ.setdefault('POSTGRES_USER', 'zoom_admin')
 os.environ.setdefault('POSTGRES_PASSWORD', 'changeme')
 os.environ.setdefault('POSTGRES_DB', 'zoom_dx_db')
 os.environ.setdefault('JWT_SECRET_KEY', 'test_secret_key_for_testing_only')
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
 
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
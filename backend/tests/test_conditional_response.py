@@ -0,0 +1,187 @@
+"""
+圧縮・条件付きGETミドルウェアのテスト (test_conditional_response.py)
+
+小さなアプリにミドルウェアを載せ、データバージョンは固定値を使う。
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.conditional_response import (
+    ConditionalResponseMiddleware, DataVersion, etag_matches,
+)
+
+
+class FixedVersion:
+    def __init__(self, token):
+        self.token = token
+
+    async def get(self):
+        return self.token
+
+
+@pytest.fixture
+def setup():
+    calls = {'rows': 0}
+    app = FastAPI()
+
+    @app.get('/api/v1/map/rows')
+    async def rows():
+        calls['rows'] += 1
+        return [{'city_code': str(i).zfill(6), 'total_score': i / 10} for i in range(200)]
+
+    @app.get('/api/v1/map/tagged')
+    async def tagged():
+        return Response(content=b'{}', media_type='application/json', headers={'ETag': '"own"'})
+
+    @app.get('/api/other')
+    async def other():
+        calls['other'] = calls.get('other', 0) + 1
+        return {'message': 'x' * 2000}
+
+    @app.get('/api/small')
+    async def small():
+        return {'ok': True}
+
+    @app.get('/api/v1/map/missing')
+    async def missing():
+        return Response(status_code=404)
+
+    version = FixedVersion('2026-10-17T03:00:00||')
+    app.add_middleware(ConditionalResponseMiddleware, version=version)
+    with TestClient(app) as client:
+        yield client, calls, version
+
+
+def test_gzip_and_versioned_etag(setup):
+    client, calls, _ = setup
+    response = client.get('/api/v1/map/rows', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert response.headers['etag'].startswith('"v-')
+    assert len(response.json()) == 200
+
+    identity = client.get('/api/v1/map/rows', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in identity.headers
+    # エンコーディングごとに別の表現なので強い ETag も別
+    assert identity.headers['etag'] != response.headers['etag']
+
+
+def test_not_modified_skips_handler(setup):
+    client, calls, _ = setup
+    etag = client.get('/api/v1/map/rows', headers={'Accept-Encoding': 'gzip'}).headers['etag']
+    assert calls['rows'] == 1
+    second = client.get('/api/v1/map/rows',
+                        headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['etag'] == etag
+    assert second.content == b''
+    assert calls['rows'] == 1
+
+
+def test_etag_changes_with_version_and_query(setup):
+    client, calls, version = setup
+    etag = client.get('/api/v1/map/rows').headers['etag']
+    assert client.get('/api/v1/map/rows?limit=5').headers['etag'] != etag
+    version.token = '2026-10-18T03:00:00||'
+    response = client.get('/api/v1/map/rows', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+
+def test_body_hash_etag_without_version(setup):
+    """バージョン対象外のパスは本文ハッシュで 304（ハンドラは実行される）"""
+    client, calls, version = setup
+    etag = client.get('/api/other').headers['etag']
+    assert etag.startswith('"b-')
+    second = client.get('/api/other', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert calls['other'] == 2
+
+    version.token = None
+    etag = client.get('/api/v1/map/rows').headers['etag']
+    assert etag.startswith('"b-')
+
+
+def test_passthrough(setup):
+    client, _, _ = setup
+    tagged = client.get('/api/v1/map/tagged', headers={'Accept-Encoding': 'gzip'})
+    assert tagged.headers['etag'] == '"own"'
+    missing = client.get('/api/v1/map/missing')
+    assert missing.status_code == 404
+    assert 'etag' not in missing.headers
+
+
+def test_small_body_not_compressed(setup):
+    client, _, _ = setup
+    response = client.get('/api/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.json() == {'ok': True}
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('*', '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"a"', '"b"')
+
+
+def test_data_version_unavailable():
+    """DB に届かない場合は None（本文ハッシュの ETag にフォールバック）"""
+    class Unreachable:
+        async def __aenter__(self):
+            raise ConnectionError('refused')
+
+        async def __aexit__(self, *args):
+            return False
+
+    version = DataVersion(session_factory=Unreachable, ttl_seconds=60)
+    assert asyncio.run(version.get()) is None
+
+
+def test_data_version_combines_sources():
+    from datetime import datetime
+    from sqlalchemy import exc as sa_exc
+
+    class Result:
+        def __init__(self, value):
+            self.value = value
+
+        def scalar(self):
+            return self.value
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            return False
+
+        async def execute(self, statement):
+            sql = str(statement)
+            if 'map_prefecture_aggregates' in sql:
+                return Result(datetime(2026, 10, 17, 3, 0))
+            if 'score_run_pointer' in sql:
+                return Result('decision_readiness:3,dx_improved:5')
+            if 'scoring_input_fingerprints' in sql:
+                raise sa_exc.ProgrammingError(sql, {}, Exception('relation does not exist'))
+            if 'municipality_spatial_aggregates' in sql:
+                return Result('1741:2026-10-16 22:00:00')
+            if 'data_change_markers' in sql:
+                return Result('municipalities:2026-10-16 21:00:00+09')
+            return Result(1234)
+
+        async def rollback(self):
+            pass
+
+    version = DataVersion(session_factory=Session, ttl_seconds=60)
+    assert asyncio.run(version.get()) == (
+        '2026-10-17T03:00:00|decision_readiness:3,dx_improved:5||municipalities:2026-10-16 21:00:00+09|'
+        '1741:2026-10-16 22:00:00')
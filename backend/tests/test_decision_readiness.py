@@ -0,0 +1,116 @@
+"""
+Decision Readiness スコア（V3）とバッチエンジンのテスト
+
+柱の入力は fetch_pillar_inputs の結果を模擬する（DB不要）。
+"""
+import pytest
+
+from engines import batch_readiness_scorer
+from engines.batch_readiness_scorer import BatchReadinessScorer
+from engines.decision_readiness_scorer import DecisionReadinessScorerV3
+from services.dx_features import DxFeatureMatrix
+
+
+def make_inputs(city_code, **overrides):
+    row = {
+        'city_code': city_code,
+        'pop_decline': 0.22, 'elderly_ratio': 0.42, 'fiscal_index': 0.25, 'staff_reduction': 0.15,
+        'region': '東北地方', 'prefecture': '宮城県', 'population': 120000,
+        'dx_status': {'dept': True, 'cio': 'あり', 'ext_cio': 'あり', 'strategy': True,
+                      'cloud_migration': '完了', 'lgwan_connection': True},
+        'regional_with_dept': 30, 'regional_total': 100,
+        'prefecture_with_dept': 12, 'prefecture_total': 35,
+    }
+    row.update(overrides)
+    return row
+
+
+INPUTS = {
+    '041009': make_inputs('041009'),
+    '042021': make_inputs('042021', population=20000, prefecture='青森県', dx_status=None,
+                          regional_with_dept=0, regional_total=0),
+}
+
+
+def features_for(row):
+    return DxFeatureMatrix.from_dx(row['dx_status'], row['city_code']).row(row['city_code'])
+
+
+class TestScoreInputs:
+
+    def test_pillars(self):
+        scorer = DecisionReadinessScorerV3(None)
+        row = INPUTS['041009']
+        result = scorer.score_inputs('041009', row, features_for(row),
+                                     {'bert_score': 5, 'ollama_keywords': ['budget', 'first_person']})
+        assert result.structural_pressure == 10 + 6 + 2
+        assert result.leadership_commitment == 7 + 8 + 5
+        assert result.peer_pressure == 3 + 3 + 5
+        assert result.feasibility == 8 + 3 + 3
+        assert result.accountability == 4
+        assert result.total == 18 + 20 + 11 + 14 + 4
+        assert result.breakdown['peer']['regional_adoption'] == '30.0%'
+        assert result.breakdown['peer']['prefecture_adoption'] == '34.3%'
+
+    def test_missing_city(self):
+        """自治体が存在しない場合は DB 版と同じく各柱がエラー扱い"""
+        scorer = DecisionReadinessScorerV3(None)
+        result = scorer.score_inputs('999999', None, features_for({'city_code': '999999', 'dx_status': None}))
+        assert result.structural_pressure == 0
+        assert result.peer_pressure == 0
+        assert result.feasibility == 0
+        assert result.breakdown['peer'] == {'error': 'City not found'}
+
+
+class TestBatchReadinessScorer:
+
+    @pytest.fixture(autouse=True)
+    def prefetch(self, monkeypatch):
+        calls = []
+
+        def fake_fetch(conn, city_codes, use_aggregates_table=None):
+            calls.append(list(city_codes))
+            return {code: dict(INPUTS[code]) for code in city_codes if code in INPUTS}
+
+        refreshes = []
+        monkeypatch.setattr(batch_readiness_scorer, 'fetch_pillar_inputs', fake_fetch)
+        monkeypatch.setattr(batch_readiness_scorer, 'refresh_adoption_aggregates',
+                            lambda conn: refreshes.append(conn) or True)
+        monkeypatch.setattr(BatchReadinessScorer, '_prepare_neighbors', lambda self: {})
+        monkeypatch.setattr(batch_readiness_scorer, 'load_municipality_spatial', lambda conn: {})
+        return {'queries': calls, 'refreshes': refreshes}
+
+    def test_matches_single_city_scoring(self, prefetch):
+        engine = BatchReadinessScorer(None, chunk_size=2)
+        analysis = {'041009': {'bert_score': 5, 'ollama_keywords': ['budget']}}
+        results = engine.score_all(['041009', '042021', '999999'], analysis)
+
+        scorer = DecisionReadinessScorerV3(None)
+        for result in results:
+            row = INPUTS.get(result.city_code)
+            expected = scorer.score_inputs(
+                result.city_code, row,
+                features_for(row or {'city_code': result.city_code, 'dx_status': None}),
+                analysis.get(result.city_code, {}))
+            assert result == expected
+        # チャンク単位で1クエリ、集計表の再構築は1回
+        assert prefetch['queries'] == [['041009', '042021'], ['999999']]
+        assert len(prefetch['refreshes']) == 1
+
+    def test_process_pool(self):
+        codes = ['041009', '042021'] * 10
+        serial = BatchReadinessScorer(None, workers=1).score_all(codes)
+        parallel = BatchReadinessScorer(None, workers=2).score_all(codes)
+        assert [r.total for r in parallel] == [r.total for r in serial]
+
+    def test_spatial_context_in_breakdown(self, monkeypatch):
+        spatial = {'041009': {'company_count': 1200, 'certified_company_count': 35, 'mesh_count': 80}}
+        monkeypatch.setattr(batch_readiness_scorer, 'load_municipality_spatial', lambda conn: spatial)
+        with_context, without = BatchReadinessScorer(None).score_all(['041009', '042021'])
+
+        assert with_context.breakdown['feasibility']['local_business'] == {
+            'companies': 1200, 'certified': 35, 'meshes': 80}
+        assert 'local_business' not in without.breakdown['feasibility']
+        # 参考情報のみでスコアは変えない
+        plain = BatchReadinessScorer(None, spatial_context=False).score_all(['041009'])[0]
+        assert plain.feasibility == with_context.feasibility
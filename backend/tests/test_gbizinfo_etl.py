@@ -0,0 +1,149 @@
+"""
+gBizINFO ストリーミング取り込みのテスト
+
+ZIP は tmp_path に作成し、ジオコーディングとDB書き込みは差し替える。
+"""
+import csv
+import io
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+import services.gbizinfo_etl as etl
+from utils.mesh import encode_mesh
+
+HEADER = ["法人番号", "商号または名称", "登記住所"]
+ROWS = [
+    ["1000000000001", "札幌A", "北海道札幌市中央区北1条西2丁目"],
+    ["1000000000002", "札幌B", "北海道札幌市中央区北１条西２丁目"],
+    ["1000000000003", "東京C", "東京都千代田区丸の内1丁目"],
+    ["1000000000004", "住所なし", ""],
+    ["1000000000005", "函館D", "北海道函館市東雲町4番13号"],
+    ["1000000000006", "不明E", "該当なし県どこか"],
+]
+
+COORDS = {
+    "北海道札幌市中央区北1条西2丁目": (43.0621, 141.3544),
+    "北海道札幌市中央区北１条西２丁目": (43.0621, 141.3544),
+    "東京都千代田区丸の内1丁目": (35.6812, 139.7671),
+    "北海道函館市東雲町4番13号": (41.7687, 140.7288),
+}
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    writer.writerows(ROWS)
+    path = tmp_path / "hojin.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("hojin.csv", "﻿" + buf.getvalue())
+    return str(path)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """ジオコーディングと書き込みを差し替え、書き込まれた行を記録する"""
+    written = {"companies": [], "meshes": [], "geocoded": [], "refresh": []}
+
+    def fake_geocode(addresses, workers=1):
+        addresses = list(addresses)
+        written["geocoded"].append(addresses)
+        return {a: COORDS.get(a) for a in addresses}
+
+    def fake_write(conn, company_rows, mesh_rows, refresh_aggregates=False):
+        written["refresh"].append(refresh_aggregates)
+        written["companies"].extend(company_rows)
+        written["meshes"].extend(mesh_rows)
+        return len(company_rows)
+
+    monkeypatch.setattr(etl, "geocode_addresses", fake_geocode)
+    monkeypatch.setattr(etl, "write_batch", fake_write)
+    monkeypatch.setattr(etl, "spatial_tables_exist", lambda conn: True)
+    return written
+
+
+def test_prefecture_of():
+    assert etl.prefecture_of("北海道札幌市") == "北海道"
+    assert etl.prefecture_of("神奈川県横浜市") == "神奈川県"
+    assert etl.prefecture_of("札幌市") is None
+    assert len(etl.PREFECTURES) == 47
+
+
+def test_imports_all_prefectures_by_default(zip_path, pipeline):
+    stats = etl.run_pipeline(None, zip_path, batch_size=2, checkpoint_path=None)
+
+    numbers = [row[0] for row in pipeline["companies"]]
+    assert numbers == ["1000000000001", "1000000000002", "1000000000003", "1000000000005"]
+    assert stats.scanned == 6
+    assert stats.matched == 5
+    assert stats.geocoded == 4
+    assert stats.written == 4
+    assert pipeline["refresh"] and all(pipeline["refresh"])
+
+
+def test_aggregates_skipped_without_tables(zip_path, pipeline, monkeypatch):
+    monkeypatch.setattr(etl, "spatial_tables_exist", lambda conn: False)
+    etl.run_pipeline(None, zip_path, checkpoint_path=None)
+    assert pipeline["refresh"] == [False]
+
+
+def test_prefecture_filter(zip_path, pipeline):
+    etl.run_pipeline(None, zip_path, prefectures=["東京都"], checkpoint_path=None)
+    assert [row[0] for row in pipeline["companies"]] == ["1000000000003"]
+
+
+def test_mesh_codes_are_vectorized_and_deduped(zip_path, pipeline):
+    etl.run_pipeline(None, zip_path, prefectures=["北海道"], checkpoint_path=None)
+
+    sapporo = str(int(encode_mesh(43.0621, 141.3544, 3)))
+    mesh_codes = [row[0] for row in pipeline["meshes"]]
+    assert mesh_codes.count(sapporo) == 1
+    assert [row[5] for row in pipeline["companies"]][:2] == [sapporo, sapporo]
+    # メッシュはセル中心の座標
+    lat, lon = pipeline["meshes"][mesh_codes.index(sapporo)][1:3]
+    assert abs(lat - 43.0621) < 1 / 120 and abs(lon - 141.3544) < 1 / 80
+
+
+def test_checkpoint_resume(zip_path, pipeline, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    etl.run_pipeline(None, zip_path, batch_size=2, checkpoint_path=checkpoint)
+    with open(checkpoint, encoding="utf-8") as f:
+        assert json.load(f)["rows_done"] == 6
+
+    # 最後まで取り込み済みなら何もしない
+    pipeline["companies"].clear()
+    stats = etl.run_pipeline(None, zip_path, batch_size=2, checkpoint_path=checkpoint)
+    assert stats.scanned == 0
+    assert pipeline["companies"] == []
+
+    # 途中から再開
+    etl.save_checkpoint(checkpoint, zip_path, 3)
+    etl.run_pipeline(None, zip_path, batch_size=2, checkpoint_path=checkpoint)
+    assert [row[0] for row in pipeline["companies"]] == ["1000000000005"]
+
+    # --restart 相当
+    pipeline["companies"].clear()
+    etl.run_pipeline(None, zip_path, batch_size=2, checkpoint_path=checkpoint, resume=False)
+    assert len(pipeline["companies"]) == 4
+
+
+def test_checkpoint_for_other_file_is_ignored(zip_path, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    with open(checkpoint, "w", encoding="utf-8") as f:
+        json.dump({"source": {"file": "other.zip", "size": 1, "mtime": 0}, "rows_done": 100}, f)
+    assert etl.load_checkpoint(checkpoint, zip_path) == 0
+
+
+def test_build_rows_keeps_last_duplicate_company():
+    records = [
+        etl.CompanyRecord("1", "旧名", "北海道A", "北海道"),
+        etl.CompanyRecord("1", "新名", "北海道B", "北海道"),
+    ]
+    companies, meshes = etl.build_rows(records, np.array([43.0, 43.0]), np.array([141.0, 141.0]))
+    assert len(companies) == 1
+    assert companies[0][1] == "新名"
+    assert len(meshes) == 1
@@ -0,0 +1,114 @@
+"""
+ジオコーディングキャッシュ・バッチジオコーダーのテスト
+
+jageocoder の辞書は使わず、検索関数を差し替えて重複排除とキャッシュの動作を確認する。
+"""
+import pytest
+
+import utils.spatial as spatial
+from services.geocode_cache import GeocodeCache, normalize_address
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GeocodeCache(path=str(tmp_path / 'geocode.sqlite3'), dictionary='test-dict')
+
+
+@pytest.fixture
+def searched(monkeypatch):
+    """_search_many を差し替え、検索された住所を記録する"""
+    calls = []
+
+    def fake_search_many(addresses):
+        calls.append(list(addresses))
+        return [None if 'なし' in a else (43.0 + len(a) / 1000, 141.0) for a in addresses]
+
+    monkeypatch.setattr(spatial, '_search_many', fake_search_many)
+    return calls
+
+
+class TestNormalizeAddress:
+    def test_fullwidth_and_spaces(self):
+        assert normalize_address('北海道札幌市中央区　北１条西２丁目') == '北海道札幌市中央区北1条西2丁目'
+
+    def test_banchi_dashes(self):
+        assert normalize_address('大通西4ー1－2') == '大通西4-1-2'
+
+    def test_keeps_long_vowel_in_words(self):
+        assert normalize_address('センタービル') == 'センタービル'
+
+    def test_empty(self):
+        assert normalize_address('') == ''
+        assert normalize_address(None) == ''
+
+
+class TestGeocodeCache:
+    def test_round_trip_including_misses(self, cache):
+        cache.put_many({'a': (43.0, 141.0), 'b': None})
+        cache.clear_memory()
+        assert cache.get_many(['a', 'b', 'c']) == {'a': (43.0, 141.0), 'b': None}
+        assert cache.hits == 2
+        assert cache.misses == 1
+
+    def test_persists_across_instances(self, cache, tmp_path):
+        cache.put_many({'a': (43.0, 141.0)})
+        other = GeocodeCache(path=cache.path, dictionary='test-dict')
+        assert other.get_many(['a']) == {'a': (43.0, 141.0)}
+
+    def test_dictionary_is_part_of_key(self, cache):
+        cache.put_many({'a': (43.0, 141.0)})
+        other = GeocodeCache(path=cache.path, dictionary='other-dict')
+        assert other.get_many(['a']) == {}
+
+    def test_memory_lru_is_bounded(self, tmp_path):
+        cache = GeocodeCache(path=str(tmp_path / 'g.sqlite3'), memory_size=2)
+        cache.put_many({'a': (1.0, 1.0), 'b': (2.0, 2.0), 'c': (3.0, 3.0)})
+        assert list(cache._memory) == ['b', 'c']
+        # メモリから落ちても SQLite から引ける
+        assert cache.get_many(['a']) == {'a': (1.0, 1.0)}
+
+    def test_disabled(self, tmp_path):
+        cache = GeocodeCache(path=str(tmp_path / 'g.sqlite3'), enabled=False)
+        cache.put_many({'a': (1.0, 1.0)})
+        assert cache.get_many(['a']) == {}
+
+
+class TestGeocodeAddresses:
+    def test_dedupes_normalized_addresses(self, cache, searched):
+        addresses = ['札幌市北1条西2丁目', '札幌市北１条西２丁目', '札幌市 北1条西2丁目', '札幌市北8条西5丁目']
+        result = spatial.geocode_addresses(addresses, workers=1, cache=cache)
+
+        assert len(searched) == 1
+        assert sorted(searched[0]) == ['札幌市北1条西2丁目', '札幌市北8条西5丁目']
+        # 入力の表記のままキーで返す
+        assert set(result) == set(addresses)
+        assert result['札幌市北１条西２丁目'] == result['札幌市北1条西2丁目']
+
+    def test_second_call_uses_cache(self, cache, searched):
+        spatial.geocode_addresses(['札幌市北1条', '該当なし町'], workers=1, cache=cache)
+        result = spatial.geocode_addresses(['札幌市北1条', '該当なし町'], workers=1, cache=cache)
+
+        assert len(searched) == 1
+        assert result['該当なし町'] is None
+        assert result['札幌市北1条'] is not None
+
+    def test_unavailable_dictionary_is_not_cached(self, cache, monkeypatch):
+        monkeypatch.setattr(spatial, '_search_many', lambda addresses: None)
+        result = spatial.geocode_addresses(['札幌市北1条'], workers=1, cache=cache)
+
+        assert result == {'札幌市北1条': None}
+        assert len(cache) == 0
+
+    def test_lookup_errors_are_not_cached(self, cache, monkeypatch):
+        """検索エラー（辞書のロック等）は該当なしとして保存せず、次回に再検索する"""
+        monkeypatch.setattr(spatial, '_search_many',
+                            lambda addresses: [spatial.SEARCH_ERROR, None][:len(addresses)])
+        result = spatial.geocode_addresses(['札幌市北1条', '該当なし町'], workers=1, cache=cache)
+
+        assert result == {'札幌市北1条': None, '該当なし町': None}
+        cache.clear_memory()
+        assert cache.get_many(['札幌市北1条', '該当なし町']) == {'該当なし町': None}
+
+    def test_skips_empty_addresses(self, cache, searched):
+        assert spatial.geocode_addresses(['', None], workers=1, cache=cache) == {}
+        assert searched == []
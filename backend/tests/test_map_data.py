@@ -4,7 +4,7 @@
 /api/v1/map/* エンドポイントのテストケース。
 """
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 
 import sys
@@ -13,7 +13,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
 from routers.map_data import router
-from database import get_db
+from database import get_async_db
+from services.map_snapshot import MapAggregateSnapshot
 
 
 def make_mock_region():
@@ -83,14 +84,27 @@ class TestRegionsEndpoint:
 
     def test_get_regions_returns_list(self, client):
         """正常系: レスポンスがリスト形式であること"""
-        with patch('routers.map_data.get_db') as mock_get_db:
-            mock_db = MagicMock()
-            mock_db.execute.return_value = None
-            mock_db.fetchall.return_value = [make_mock_region()]
-            mock_get_db.return_value = iter([mock_db])
+        from routers.map_data import REGION_BY_PREFECTURE
 
-            response = client.get('/api/v1/map/regions')
-            assert response.status_code in [200, 500]
+        data = MapAggregateSnapshot(REGION_BY_PREFECTURE).load_rows(
+            [make_mock_prefecture()], version='2026-10-17T03:00:00')
+
+        async def fake_db():
+            yield MagicMock()
+
+        app.dependency_overrides[get_async_db] = fake_db
+        try:
+            with patch('routers.map_data.aggregate_snapshot.get', AsyncMock(return_value=data)):
+                response = client.get('/api/v1/map/regions')
+        finally:
+            app.dependency_overrides.clear()
+
+        # DB未接続時のハンドラ（503）も許容
+        assert response.status_code in [200, 500, 503]
+        if response.status_code == 200:
+            body = response.json()
+            assert isinstance(body, list)
+            assert body[0]['region'] == '関東地方'
 
 
 class TestPrefecturesEndpoint:
@@ -174,3 +188,516 @@ class TestStatsEndpoint:
                 assert body['min_score'] >= 0
             if 'max_score' in body and body['max_score'] is not None:
                 assert body['max_score'] <= 100
+
+
+class TestAggregateSnapshot:
+    """地方・都道府県別集計スナップショット（ETag/304）のテスト"""
+
+    @pytest.fixture
+    def snapshot(self, client):
+        """DBに触れないよう、スナップショットを事前ロードしてDB依存を差し替える"""
+        from routers.map_data import aggregate_snapshot
+        from database import get_async_db
+
+        async def no_db():
+            yield None
+
+        tokyo = make_mock_prefecture()
+        kanagawa = dict(tokyo, prefecture='神奈川県', avg_score=40.0, municipality_count=33,
+                        total_population=9200000)
+        aggregate_snapshot.load_rows([kanagawa, tokyo], version='2026-10-17T03:00:00')
+        app.dependency_overrides[get_async_db] = no_db
+        yield aggregate_snapshot
+        app.dependency_overrides.clear()
+        aggregate_snapshot.invalidate()
+
+    def test_regions_from_snapshot(self, client, snapshot):
+        """地方別集計は都道府県別集計から自治体数加重で算出される"""
+        response = client.get('/api/v1/map/regions')
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body) == 1
+        kanto = body[0]
+        assert kanto['region'] == '関東地方'
+        assert kanto['municipality_count'] == 56
+        assert kanto['prefecture_count'] == 2
+        assert kanto['avg_score'] == round((40.0 * 33 + 42.1 * 23) / 56, 1)
+
+    def test_etag_not_modified(self, client, snapshot):
+        """If-None-Match が一致すれば304を返す"""
+        first = client.get('/api/v1/map/regions')
+        etag = first.headers['etag']
+        second = client.get('/api/v1/map/regions', headers={'If-None-Match': etag})
+        assert second.status_code == 304
+
+    def test_etag_changes_with_version(self, client, snapshot):
+        """集計ビューが更新されるとETagが変わる"""
+        etag_before = client.get('/api/v1/map/prefectures').headers['etag']
+        snapshot.load_rows([make_mock_prefecture()], version='2026-10-18T03:00:00')
+        etag_after = client.get('/api/v1/map/prefectures').headers['etag']
+        assert etag_before != etag_after
+
+    def test_prefectures_region_filter(self, client, snapshot):
+        """地方フィルタ: 該当地方のみ、存在しない地方は空リスト"""
+        body = client.get('/api/v1/map/prefectures?region=関東地方').json()
+        assert {p['prefecture'] for p in body} == {'東京都', '神奈川県'}
+        assert client.get('/api/v1/map/prefectures?region=近畿地方').json() == []
+        assert client.get('/api/v1/map/prefectures?region=存在しない地方').json() == []
+
+
+class TestMunicipalitySnapshot:
+    """自治体一覧のフィルタ別スナップショット（列形式・圧縮・ETag）のテスト"""
+
+    FIELDS = ['city_code', 'city_name', 'prefecture', 'population', 'latitude', 'longitude',
+              'total_score', 'cat_citizen_services', 'cat_promotion_system', 'cat_business_dx',
+              'cat_education_dx', 'cat_information', 'pattern_id', 'pattern_name']
+
+    @pytest.fixture
+    def session(self, client):
+        """集計ビューのバージョン確認と一覧クエリに応答する偽セッション"""
+        from datetime import datetime
+        from decimal import Decimal
+        from database import get_async_db
+        from routers.map_data import municipality_snapshot
+
+        class Result:
+            def __init__(self, rows, value=None):
+                self.rows = rows
+                self.value = value
+
+            def scalar(self):
+                return self.value
+
+            def keys(self):
+                return TestMunicipalitySnapshot.FIELDS
+
+            def all(self):
+                return self.rows
+
+        class Session:
+            version = datetime(2026, 10, 17, 3, 0)
+            run_id = None
+            queries = 0
+            last_query = None
+
+            async def execute(self, statement, params=None):
+                if 'score_run_pointer' in str(statement):
+                    return Result([], self.run_id)
+                if 'map_prefecture_aggregates' in str(statement):
+                    return Result([], self.version)
+                self.queries += 1
+                self.last_query = (str(statement), params)
+                rows = [
+                    ('13' + str(i).zfill(4), f'市{i}', '東京都', 10000 + i, Decimal('35.6'),
+                     Decimal('139.7'), Decimal(f'{40 + i % 10}.5'), Decimal('18.5'), None,
+                     Decimal('8.9'), Decimal('4.3'), Decimal('5.1'), 2, '推進型')
+                    for i in range(params['limit'])
+                ]
+                rows.append(('470007', '離島村', '沖縄県', 300, 0, None, 0, None, None,
+                             None, None, None, None, None))
+                return Result(rows)
+
+        session = Session()
+
+        async def fake_db():
+            yield session
+
+        municipality_snapshot.invalidate()
+        app.dependency_overrides[get_async_db] = fake_db
+        yield session
+        app.dependency_overrides.clear()
+        municipality_snapshot.invalidate()
+
+    def test_columns_format(self, client, session):
+        """columns 形式は列ごとの配列で、rows 形式と同じ値を持つ"""
+        columns = client.get('/api/v1/map/municipalities?limit=3&format=columns').json()
+        rows = client.get('/api/v1/map/municipalities?limit=3').json()
+        assert columns['length'] == len(rows) == 4
+        assert set(columns['fields']) == set(self.FIELDS) | {'region'}
+        for i, row in enumerate(rows):
+            assert row == {name: columns['columns'][name][i] for name in columns['fields']}
+        assert rows[0]['region'] == '関東地方' and rows[-1]['region'] == '九州・沖縄地方'
+        assert rows[0]['latitude'] == 35.6 and rows[0]['total_score'] == 40.5
+        # 座標の0は欠損扱い（従来の挙動）
+        assert rows[-1]['latitude'] is None and rows[-1]['total_score'] == 0
+
+    def test_snapshot_reused_per_filter(self, client, session):
+        """同じフィルタはクエリせず、フィルタが変われば別に読み込む"""
+        client.get('/api/v1/map/municipalities?limit=3')
+        client.get('/api/v1/map/municipalities?limit=3&format=columns')
+        assert session.queries == 1
+        client.get('/api/v1/map/municipalities?limit=5')
+        assert session.queries == 2
+
+    def test_gzip_negotiation(self, client, session):
+        """Accept-Encoding に応じて圧縮し、Vary を付ける"""
+        response = client.get('/api/v1/map/municipalities?limit=50',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['content-encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['vary']
+        assert len(response.json()) == 51
+
+        raw = client.get('/api/v1/map/municipalities?limit=50',
+                         headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in raw.headers
+        assert raw.json() == response.json()
+
+    def test_etag_per_format_and_version(self, client, session):
+        from datetime import datetime
+        from routers.map_data import municipality_snapshot
+
+        rows_etag = client.get('/api/v1/map/municipalities?limit=3').headers['etag']
+        columns_etag = client.get('/api/v1/map/municipalities?limit=3&format=columns').headers['etag']
+        assert rows_etag != columns_etag
+        not_modified = client.get('/api/v1/map/municipalities?limit=3',
+                                  headers={'If-None-Match': rows_etag})
+        assert not_modified.status_code == 304
+
+        # スコア再計算（集計ビューの更新）後は読み直してETagも変わる
+        session.version = datetime(2026, 10, 18, 3, 0)
+        municipality_snapshot._checked_at = 0.0
+        assert client.get('/api/v1/map/municipalities?limit=3').headers['etag'] != rows_etag
+        assert session.queries == 2
+
+    def test_etag_per_encoding(self, client, session):
+        """圧縮の有無で本文が異なるため ETag も別（強い検証子）"""
+        url = '/api/v1/map/municipalities?limit=50'
+        gzip_etag = client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['etag']
+        raw_etag = client.get(url, headers={'Accept-Encoding': 'identity'}).headers['etag']
+        assert gzip_etag != raw_etag
+
+        # If-None-Match はカンマ区切りの候補・* も受け付ける
+        listed = client.get(url, headers={'Accept-Encoding': 'gzip',
+                                          'If-None-Match': f'"other", {gzip_etag}'})
+        assert listed.status_code == 304
+        mismatched = client.get(url, headers={'Accept-Encoding': 'identity',
+                                              'If-None-Match': gzip_etag})
+        assert mismatched.status_code == 200
+        assert client.get(url, headers={'If-None-Match': '*'}).status_code == 304
+
+    def test_reads_published_run(self, client, session):
+        """公開中のスコアランがあればそのスナップショットを読み、ランが変われば読み直す"""
+        from routers.map_data import municipality_snapshot
+
+        session.run_id = 7
+        etag = client.get('/api/v1/map/municipalities?limit=3').headers['etag']
+        query, params = session.last_query
+        assert 'dx_score_snapshots' in query and params['run_id'] == 7
+
+        session.run_id = 8
+        municipality_snapshot._checked_at = 0.0
+        assert client.get('/api/v1/map/municipalities?limit=3').headers['etag'] != etag
+        assert session.last_query[1]['run_id'] == 8
+        assert session.queries == 2
+
+    def test_invalid_format(self, client, session):
+        assert client.get('/api/v1/map/municipalities?format=arrow').status_code == 422
+
+
+class TestResponseEncoding:
+    def test_negotiate(self):
+        from services import response_encoding
+        from services.response_encoding import negotiate_encoding
+
+        assert negotiate_encoding('') == 'identity'
+        assert negotiate_encoding('gzip, deflate') == 'gzip'
+        assert negotiate_encoding('gzip;q=0') == 'identity'
+        assert negotiate_encoding('*') == response_encoding.supported_encodings()[0]
+        expected = 'br' if response_encoding.brotli is not None else 'gzip'
+        assert negotiate_encoding('gzip;q=0.8, br') == expected
+
+
+class TestScoreRanks:
+    """順位インデックス（dx_score_ranks）のテスト"""
+
+    def test_population_band_boundaries(self):
+        """人口規模帯は下限を含み上限を含まない"""
+        from services.score_ranks import population_band
+        assert population_band(9999) == '1万人未満'
+        assert population_band(10000) == '1万〜3万人'
+        assert population_band(100000) == '10万〜50万人'
+        assert population_band(500000) == '50万人以上'
+        assert population_band(None) == '不明'
+
+    def test_format_ranks(self):
+        """順位行は全国・都道府県・人口規模帯の入れ子dictになる"""
+        from decimal import Decimal
+        from services.score_ranks import format_ranks
+        ranks = format_ranks({
+            'national_rank': 12, 'national_total': 1741, 'national_percentile': Decimal('99.4'),
+            'prefecture_rank': 2, 'prefecture_total': 62, 'prefecture_percentile': Decimal('98.4'),
+            'population_band': '50万人以上', 'band_rank': 1, 'band_total': 35,
+            'band_percentile': None,
+        })
+        assert ranks['national'] == {'rank': 12, 'total': 1741, 'percentile': 99.4}
+        assert ranks['prefecture']['rank'] == 2
+        assert ranks['population_band']['band'] == '50万人以上'
+        assert ranks['population_band']['percentile'] is None
+
+    def test_fetch_ranks_falls_back_without_table(self):
+        """テーブル未作成時はロールバックして None を返す（呼び出し側が都度集計）"""
+        import asyncio
+        from sqlalchemy import exc as sa_exc
+        from routers.map_data import _fetch_ranks
+
+        class MissingTableSession:
+            rolled_back = False
+
+            async def execute(self, *args, **kwargs):
+                raise sa_exc.ProgrammingError('SELECT', {}, Exception('relation does not exist'))
+
+            async def rollback(self):
+                self.rolled_back = True
+
+        session = MissingTableSession()
+        assert asyncio.run(_fetch_ranks(session, '131041')) is None
+        assert session.rolled_back
+
+
+def make_peer_row(city_code, population, score, elderly=0.3, fiscal=0.5, prefecture='東京都'):
+    return {
+        'city_code': city_code, 'city_name': f'市{city_code}', 'prefecture': prefecture,
+        'population': population, 'elderly_ratio': elderly, 'fiscal_index': fiscal,
+        'total_score': score,
+        'cat_citizen_services': score, 'cat_promotion_system': score, 'cat_business_dx': score,
+        'cat_education_dx': score, 'cat_information': score,
+    }
+
+
+class TestPeerIndex:
+    """同規模・類似自治体インデックスのテスト"""
+
+    ROWS = [
+        make_peer_row('000001', 100000, 40.0, elderly=0.30, fiscal=0.50),
+        make_peer_row('000002', 70000, 55.0, elderly=0.25, fiscal=0.80),
+        make_peer_row('000003', 130000, 35.0, elderly=0.38, fiscal=0.40),
+        make_peer_row('000004', 131000, 90.0, elderly=0.22, fiscal=0.95),
+        make_peer_row('000005', 69000, 80.0, elderly=0.41, fiscal=0.30),
+        make_peer_row('000006', 105000, 41.0, elderly=0.31, fiscal=0.52),
+        make_peer_row('000007', None, 50.0, elderly=0.45, fiscal=0.20),
+    ]
+
+    def test_similar_matches_between_query(self):
+        """人口±30%（両端含む）をスコア降順、自分自身は除外"""
+        from services.peer_index import PeerIndex
+        index = PeerIndex(self.ROWS)
+        similar = index.similar(100000, exclude='000001')
+        assert [s['city_name'] for s in similar] == ['市000002', '市000006', '市000003']
+
+    def test_similar_without_population(self):
+        from services.peer_index import PeerIndex
+        assert PeerIndex(self.ROWS).similar(None) == []
+
+    def test_nearest_peers(self):
+        """多指標の距離が最も近い自治体が先頭、自分自身は含まない"""
+        from services.peer_index import PeerIndex
+        index = PeerIndex(self.ROWS)
+        peers = index.nearest('000001', k=3)
+        assert len(peers) == 3
+        assert peers[0]['city_code'] == '000006'
+        assert '000001' not in [p['city_code'] for p in peers]
+        assert peers == sorted(peers, key=lambda p: p['distance'])
+        assert index.nearest('999999') == []
+
+    def test_peers_endpoint(self, client):
+        from routers.map_data import peer_index
+        from database import get_async_db
+
+        async def no_db():
+            yield None
+
+        peer_index.load_rows(self.ROWS, version='2026-10-17T03:00:00')
+        app.dependency_overrides[get_async_db] = no_db
+        try:
+            response = client.get('/api/v1/map/municipality/000001/peers?k=2')
+            assert response.status_code == 200
+            assert [p['city_code'] for p in response.json()][0] == '000006'
+            assert client.get('/api/v1/map/municipality/999999/peers').status_code == 404
+        finally:
+            app.dependency_overrides.clear()
+            peer_index.invalidate()
+
+
+class TestNeighborGraph:
+    """緯度経度による近傍グラフのテスト"""
+
+    ROWS = [
+        {'city_code': '131016', 'latitude': 35.694, 'longitude': 139.753},  # 千代田区
+        {'city_code': '131024', 'latitude': 35.670, 'longitude': 139.772},  # 中央区
+        {'city_code': '131032', 'latitude': 35.658, 'longitude': 139.752},  # 港区
+        {'city_code': '141003', 'latitude': 35.444, 'longitude': 139.638},  # 横浜市
+        {'city_code': '271004', 'latitude': 34.694, 'longitude': 135.502},  # 大阪市
+    ]
+
+    def test_nearest_in_distance_order(self):
+        from services.neighbor_graph import NeighborGraph
+        graph = NeighborGraph.from_rows(self.ROWS, k=3, adjacency_km=20)
+        neighbors = graph.neighbors_of('131016')
+        assert [n['city_code'] for n in neighbors] == ['131024', '131032', '141003']
+        assert neighbors[0]['adjacent'] and not neighbors[2]['adjacent']
+        assert 2.5 < neighbors[0]['distance_km'] < 3.5
+        assert [n['city_code'] for n in graph.neighbors_of('131016', adjacent_only=True)] == ['131024', '131032']
+
+    def test_neighbor_rates(self):
+        from services.neighbor_graph import NeighborGraph
+        graph = NeighborGraph.from_rows(self.ROWS, k=2)
+        rates = graph.neighbor_rates({'131024': True, '131032': True})
+        assert rates['131016'] == {'with': 2, 'total': 2}
+        # 大阪市の近傍2件は横浜市と東京の区（うち1件がフラグあり）
+        assert rates['271004'] == {'with': 1, 'total': 2}
+
+    def test_save_and_reuse(self, tmp_path):
+        from services.neighbor_graph import NeighborGraph
+        path = str(tmp_path / 'graph.npz')
+        built = NeighborGraph.load_or_build(self.ROWS, path=path, k=3)
+        loaded = NeighborGraph.load(path)
+        assert loaded.fingerprint == built.fingerprint
+        assert loaded.neighbors.dtype.itemsize == 4
+        assert loaded.neighbors_of('271004') == built.neighbors_of('271004')
+
+    def test_cache_rebuilds_when_coordinates_change(self, tmp_path):
+        """TTL経過後は座標のバージョンだけ確認し、変わった場合のみ再構築する"""
+        import asyncio
+        from services.neighbor_graph import NeighborGraphCache
+
+        state = {'version': '5:a', 'rows': self.ROWS}
+        executed = []
+
+        class Result:
+            def __init__(self, value=None, rows=()):
+                self.value, self.rows = value, rows
+
+            def scalar(self):
+                return self.value
+
+            def mappings(self):
+                return self.rows
+
+        class Session:
+            async def execute(self, statement, params=None):
+                sql = str(statement)
+                executed.append('version' if 'md5' in sql else 'rows')
+                if 'md5' in sql:
+                    return Result(state['version'])
+                return Result(rows=state['rows'])
+
+        cache = NeighborGraphCache(path=str(tmp_path / 'graph.npz'), ttl_seconds=0)
+        first = asyncio.run(cache.get(Session()))
+        assert asyncio.run(cache.get(Session())) is first
+        assert executed == ['version', 'rows', 'version']
+
+        moved = dict(self.ROWS[-1], latitude=35.0)
+        state.update(version='5:b', rows=self.ROWS[:-1] + [moved])
+        rebuilt = asyncio.run(cache.get(Session()))
+        assert rebuilt is not first and rebuilt.fingerprint != first.fingerprint
+
+    def test_neighbors_endpoint_unknown_city(self, client):
+        from routers.map_data import neighbor_graph
+        from services.neighbor_graph import NeighborGraph
+        from database import get_async_db
+
+        async def no_db():
+            yield None
+
+        neighbor_graph.set(NeighborGraph.from_rows(self.ROWS, k=3))
+        app.dependency_overrides[get_async_db] = no_db
+        try:
+            assert client.get('/api/v1/map/municipality/999999/neighbors').status_code == 404
+        finally:
+            app.dependency_overrides.clear()
+            neighbor_graph.invalidate()
+
+
+class TestSpatialAggregates:
+    """メッシュ・自治体単位の法人／建物集計のテスト"""
+
+    ROW = {
+        'city_code': '011002', 'mesh_count': 40,
+        'company_count': 1000, 'certified_company_count': 25,
+        'cert_counts': {'dx_cert': 20, 'health_mgmt': 8},
+        'building_count': 500, 'height_sum': 6000.0, 'height_count': 400,
+        'height_lt10': 250, 'height_10_31': 120, 'height_31_60': 25, 'height_ge60': 5,
+        'built_pre1981': 100, 'built_1981_2000': 200, 'built_post2000': 150, 'built_unknown': 50,
+    }
+
+    def test_format_spatial(self):
+        from services.spatial_aggregates import format_spatial
+        spatial = format_spatial(self.ROW)
+        assert spatial['companies']['per_mesh'] == 25.0
+        assert spatial['companies']['cert_counts'] == {'dx_cert': 20, 'health_mgmt': 8}
+        assert spatial['buildings']['avg_height'] == 15.0
+        assert spatial['buildings']['height_bands']['31-60m'] == 25
+        assert sum(spatial['buildings']['age_bands'].values()) == 500
+
+    def test_format_spatial_without_buildings(self):
+        from services.spatial_aggregates import format_spatial
+        row = dict(self.ROW, building_count=0, height_sum=0, height_count=0, mesh_count=0)
+        spatial = format_spatial(row)
+        assert spatial['buildings']['avg_height'] is None
+        assert spatial['companies']['per_mesh'] is None
+
+    def test_nearest_points(self):
+        from services.neighbor_graph import nearest_points
+        rows = TestNeighborGraph.ROWS
+        index, distance = nearest_points(
+            [35.69, 34.70], [139.75, 135.50],
+            [r['latitude'] for r in rows], [r['longitude'] for r in rows])
+        assert [rows[i]['city_code'] for i in index] == ['131016', '271004']
+        assert (distance < 1.5).all()
+
+    def test_fetch_spatial_falls_back_without_table(self):
+        import asyncio
+        from sqlalchemy import exc as sa_exc
+        from routers.map_data import _fetch_spatial
+
+        class MissingTableSession:
+            rolled_back = False
+
+            async def execute(self, *args, **kwargs):
+                raise sa_exc.ProgrammingError('SELECT', {}, Exception('relation does not exist'))
+
+            async def rollback(self):
+                self.rolled_back = True
+
+        session = MissingTableSession()
+        assert asyncio.run(_fetch_spatial(session, '011002')) is None
+        assert session.rolled_back
+
+    def test_meshes_endpoint(self, client):
+        from database import get_async_db
+        from utils.mesh import encode_mesh
+
+        sapporo = str(int(encode_mesh(43.0621, 141.3544, 3)))
+        quarter = str(int(encode_mesh(43.0621, 141.3544, 4)))
+        rows = [
+            {'mesh_code': sapporo, 'company_count': 300, 'certified_company_count': 4,
+             'cert_counts': {'dx_cert': 4}, 'building_count': 0, 'height_sum': 0, 'height_count': 0},
+            {'mesh_code': quarter, 'company_count': 10, 'certified_company_count': 0,
+             'cert_counts': {}, 'building_count': 20, 'height_sum': 300.0, 'height_count': 20},
+        ]
+
+        class Result:
+            def mappings(self):
+                return rows
+
+        class Session:
+            async def execute(self, *args, **kwargs):
+                return Result()
+
+        async def fake_db():
+            yield Session()
+
+        app.dependency_overrides[get_async_db] = fake_db
+        try:
+            response = client.get('/api/v1/map/municipality/011002/meshes')
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [m['mesh_code'] for m in data] == [sapporo, quarter]
+        # セル中心の座標（元の点から半セル以内）
+        assert abs(data[0]['lat'] - 43.0621) < 1 / 120 and abs(data[0]['lon'] - 141.3544) < 1 / 80
+        assert abs(data[1]['lat'] - 43.0621) < 1 / 240
+        assert data[0]['avg_height'] is None
+        assert data[1]['avg_height'] == 15.0
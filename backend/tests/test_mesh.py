@@ -0,0 +1,73 @@
+"""
+JIS X 0410 地域メッシュ（utils.mesh）のテスト
+"""
+import numpy as np
+import pytest
+
+from utils.mesh import (
+    decode_mesh, encode_mesh, mesh_level, mesh_neighbors, mesh_to_bbox, parent_mesh,
+)
+
+TOKYO_STATION = (35.681236, 139.767125)
+
+
+class TestEncodeMesh:
+
+    @pytest.mark.parametrize('level,expected', [
+        (1, 5339), (2, 533946), (3, 53394611), (4, 533946113), (5, 5339461132),
+    ])
+    def test_known_point(self, level, expected):
+        assert int(encode_mesh(*TOKYO_STATION, level=level)) == expected
+
+    def test_vectorized_matches_scalar(self):
+        rng = np.random.default_rng(0)
+        lat = rng.uniform(24, 46, 1000)
+        lon = rng.uniform(123, 146, 1000)
+        codes = encode_mesh(lat, lon, level=3)
+        assert codes.dtype == np.int64
+        assert all(codes[i] == encode_mesh(lat[i], lon[i], level=3) for i in range(0, 1000, 97))
+
+    def test_cell_boundary(self):
+        """セル境界上の点は北東側のセルに属する"""
+        assert int(encode_mesh(36.0, 140.0, level=1)) == 5440
+
+    def test_invalid_level(self):
+        with pytest.raises(ValueError):
+            encode_mesh(35.0, 139.0, level=6)
+
+
+class TestDecodeMesh:
+
+    def test_roundtrip(self):
+        rng = np.random.default_rng(1)
+        lat = rng.uniform(24, 46, 500)
+        lon = rng.uniform(123, 146, 500)
+        for level in (1, 2, 3, 4, 5):
+            codes = encode_mesh(lat, lon, level)
+            assert np.array_equal(encode_mesh(*decode_mesh(codes), level), codes)
+
+    def test_bbox(self):
+        south, west, north, east = mesh_to_bbox(53394611)
+        assert south == pytest.approx(35.675)
+        assert west == pytest.approx(139.7625)
+        assert north - south == pytest.approx(30 / 3600)
+        assert east - west == pytest.approx(45 / 3600)
+
+    def test_level_from_digits(self):
+        assert mesh_level([5339, 533946, 53394611, 533946113, 5339461132]).tolist() == [1, 2, 3, 4, 5]
+
+
+class TestMeshNeighbors:
+
+    def test_inner_cell(self):
+        assert sorted(mesh_neighbors(53394611).tolist()) == [
+            53394600, 53394601, 53394602, 53394610, 53394612, 53394620, 53394621, 53394622]
+
+    def test_across_level1_boundary(self):
+        """1次メッシュ南西角のセルは隣の1次メッシュのコードを返す"""
+        neighbors = mesh_neighbors(53390000, level=3).tolist()
+        assert 52387799 in neighbors  # 南西
+        assert 53380709 in neighbors  # 西
+
+    def test_parent(self):
+        assert int(parent_mesh(5339461132, level=5, parent_level=3)) == 53394611
@@ -0,0 +1,207 @@
+"""
+ニュース収集スケジューラのテスト (test_news_scheduler.py)
+
+Google API・DBは使わず、検索関数と台帳を差し替えて
+優先度順・日次上限・同時実行数・API側の上限での停止を確認する。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from services.news_scheduler import (
+    CollectionJob, NewsCollectionScheduler, QuotaExhausted, QuotaLedger, TokenBucket,
+    job_priority,
+)
+
+NOW = datetime(2026, 10, 17, 9, 0)
+CATEGORIES = {
+    'dx': [("{city_name} DX推進", 5), ("{city_name} デジタル化", 5)],
+    'zoom': [("{city_name} Zoom 導入", 10)],
+}
+
+
+class MemoryLedger:
+    def __init__(self, quota):
+        self.daily_quota = quota
+        self.used = 0
+        self.collected = []
+
+    def reserve(self, n):
+        if self.used + n > self.daily_quota:
+            return False
+        self.used += n
+        return True
+
+    def mark_collected(self, city_code):
+        self.collected.append(city_code)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def unlimited_bucket():
+    return TokenBucket(rate=1e9, capacity=1000)
+
+
+def make_jobs(*rows):
+    return [CollectionJob.from_row(row, NOW) for row in rows]
+
+
+class TestPriority:
+    def test_never_collected_first(self):
+        never = job_priority(None, 0, 0, NOW)
+        recent = job_priority(NOW - timedelta(days=1), 100, 10, NOW)
+        assert never > recent
+
+    def test_score_and_signal_break_staleness_ties(self):
+        last = NOW - timedelta(days=10)
+        assert job_priority(last, 60, 0, NOW) > job_priority(last, 20, 0, NOW)
+        assert job_priority(last, 20, 5, NOW) > job_priority(last, 20, 0, NOW)
+
+    def test_staleness_is_capped(self):
+        assert job_priority(NOW - timedelta(days=300), 0, 0, NOW) == \
+            job_priority(NOW - timedelta(days=30), 0, 0, NOW)
+
+
+class TestTokenBucket:
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+
+        async def take(n):
+            for _ in range(n):
+                await bucket.acquire()
+
+        asyncio.run(take(3))
+        assert clock.now == 0  # 貯まっている分は待たずに払い出す
+        asyncio.run(take(4))
+        assert clock.now == pytest.approx(2.0)  # 以降は 2個/秒
+
+
+class TestQuotaLedger:
+    def test_reserve_is_conditional_update(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = None
+        conn = MagicMock()
+        conn.cursor.return_value = cursor
+        ledger = QuotaLedger(conn, daily_quota=100)
+
+        assert ledger.reserve(5) is False
+        sql, params = cursor.execute.call_args_list[-1].args
+        assert 'used + %s <= %s' in sql and 'RETURNING used' in sql
+        assert params[0] == 5 and params[-1] == 100
+
+
+class TestScheduler:
+    def run(self, jobs, ledger, search=None, **kwargs):
+        saved = []
+        sent = []
+
+        async def default_search(query, num_results):
+            sent.append(query)
+            return [{'link': f'https://example.jp/{query}'}]
+
+        scheduler = NewsCollectionScheduler(
+            search=search or default_search,
+            save=lambda city_code, category, items: saved.append((city_code, category)) or len(items),
+            ledger=ledger, bucket=unlimited_bucket(), categories=CATEGORIES, **kwargs,
+        )
+        return asyncio.run(scheduler.run(jobs)), saved, sent
+
+    def test_quota_is_never_exceeded(self):
+        """1自治体 = 3クエリ、上限 8 なら2自治体まで（一部カテゴリだけの収集はしない）"""
+        jobs = make_jobs(*({'city_code': f'0{i}', 'city_name': f'市{i}'} for i in range(5)))
+        ledger = MemoryLedger(quota=8)
+        stats, saved, sent = self.run(jobs, ledger)
+
+        assert stats.cities == 2 and stats.queries == 3 * 2 == len(sent)
+        assert ledger.used == 6
+        assert stats.stopped == 'quota'
+
+    def test_priority_order(self):
+        jobs = make_jobs(
+            {'city_code': '01', 'city_name': '古い市', 'last_collected': NOW - timedelta(days=20)},
+            {'city_code': '02', 'city_name': '未収集町'},
+            {'city_code': '03', 'city_name': '最近村', 'last_collected': NOW - timedelta(days=1)},
+        )
+        ledger = MemoryLedger(quota=6)
+        self.run(jobs, ledger, max_in_flight=1)
+        assert ledger.collected == ['02', '01']
+
+    def test_concurrency_limit(self):
+        in_flight = 0
+        peak = 0
+
+        async def slow_search(query, num_results):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return []
+
+        jobs = make_jobs(*({'city_code': f'0{i}', 'city_name': f'市{i}'} for i in range(6)))
+        stats, saved, _ = self.run(jobs, MemoryLedger(quota=100), search=slow_search, max_in_flight=4)
+        assert stats.cities == 6
+        assert 1 < peak <= 4
+        assert saved == []  # 結果が無いカテゴリは保存しない
+
+    def test_api_limit_stops_collection(self):
+        sent = []
+
+        async def exhausted(query, num_results):
+            sent.append(query)
+            raise QuotaExhausted()
+
+        jobs = make_jobs(*({'city_code': f'0{i}', 'city_name': f'市{i}'} for i in range(3)))
+        ledger = MemoryLedger(quota=100)
+        stats, _, _ = self.run(jobs, ledger, search=exhausted, max_in_flight=1)
+
+        assert stats.stopped == 'api'
+        assert stats.cities == 1
+        # 拒否された後は、確保済みの残りクエリも投げない
+        assert len(sent) == stats.queries == 1
+        assert ledger.collected == []  # 次回やり直す
+
+    def test_failed_city_is_not_marked_collected(self):
+        """5xx・通信エラーのあった自治体は収集済みにせず、他の自治体は続行する"""
+        async def flaky(query, num_results):
+            if query.startswith('市0') and 'Zoom' in query:
+                raise RuntimeError('503 Service Unavailable')
+            return [{'link': f'https://example.jp/{query}'}]
+
+        jobs = make_jobs(*({'city_code': f'0{i}', 'city_name': f'市{i}'} for i in range(2)))
+        ledger = MemoryLedger(quota=100)
+        stats, saved, _ = self.run(jobs, ledger, search=flaky)
+
+        assert stats.stopped is None
+        assert stats.failed == 1
+        assert ledger.collected == ['01']
+        # 成功したカテゴリの結果は保存する
+        assert ('00', 'dx') in saved and ('00', 'zoom') not in saved
+
+    def test_results_grouped_and_deduped_per_category(self):
+        async def search(query, num_results):
+            return [{'link': 'https://example.jp/same'}]
+
+        jobs = make_jobs({'city_code': '01', 'city_name': '市'})
+        found = {}
+
+        scheduler = NewsCollectionScheduler(
+            search=search,
+            save=lambda city_code, category, items: found.setdefault(category, len(items)),
+            ledger=MemoryLedger(quota=10), bucket=unlimited_bucket(), categories=CATEGORIES,
+            dedupe=lambda items: list({i['link']: i for i in items}.values()),
+        )
+        asyncio.run(scheduler.run(jobs))
+        assert found == {'dx': 1, 'zoom': 1}
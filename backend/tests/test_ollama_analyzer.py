@@ -0,0 +1,128 @@
+"""
+OllamaAnalyzer 並列バッチ分析のテスト
+
+httpx.MockTransport で Ollama サーバーを模擬する（ネットワーク不要）。
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from engines.ollama_analyzer import OllamaAnalyzer
+from services.llm_cache import LLMResultCache
+
+
+def ollama_response(first_person=True, budget=False):
+    return httpx.Response(200, json={
+        'response': json.dumps({'first_person_commitment': first_person, 'budget_mentioned': budget}),
+    })
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """バックオフ待ちをスキップ"""
+    async def instant(_seconds):
+        return None
+    monkeypatch.setattr('engines.ollama_analyzer.asyncio.sleep', instant)
+
+
+class TestAnalyzeSpeeches:
+
+    def test_results_keyed_by_city(self):
+        def handler(request):
+            prompt = json.loads(request.content)['prompt']
+            budget = '5億円を計上' in prompt
+            return ollama_response(first_person=not budget, budget=budget)
+
+        analyzer = OllamaAnalyzer(cache=LLMResultCache(':memory:', enabled=False), concurrency=2, transport=httpx.MockTransport(handler))
+        results = analyzer.analyze_speeches({'000001': '私が責任を持って', '000002': '5億円を計上'})
+        assert results['000001'] == {'first_person_commitment': True, 'budget_mentioned': False}
+        assert results['000002'] == {'first_person_commitment': False, 'budget_mentioned': True}
+
+    def test_concurrency_is_bounded(self):
+        in_flight = {'now': 0, 'max': 0}
+
+        async def handler(request):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            await asyncio.sleep(0)
+            in_flight['now'] -= 1
+            return ollama_response()
+
+        analyzer = OllamaAnalyzer(cache=LLMResultCache(':memory:', enabled=False), concurrency=3, transport=httpx.MockTransport(handler))
+        results = analyzer.analyze_speeches({f'{i:06d}': 'text' for i in range(20)})
+        assert len(results) == 20
+        assert in_flight['max'] <= 3
+
+    def test_retries_transient_errors(self):
+        calls = {'n': 0}
+
+        def handler(request):
+            calls['n'] += 1
+            if calls['n'] == 1:
+                raise httpx.ConnectError('refused')
+            if calls['n'] == 2:
+                return httpx.Response(503)
+            return ollama_response()
+
+        analyzer = OllamaAnalyzer(cache=LLMResultCache(':memory:', enabled=False), concurrency=1, max_retries=3, transport=httpx.MockTransport(handler))
+        results = analyzer.analyze_speeches({'000001': 'text'})
+        assert calls['n'] == 3
+        assert results['000001']['first_person_commitment'] is True
+
+    def test_gives_up_after_max_retries(self):
+        analyzer = OllamaAnalyzer(cache=LLMResultCache(':memory:', enabled=False), concurrency=1, max_retries=2,
+                                  transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+        result = analyzer.analyze_speeches({'000001': 'text'})['000001']
+        assert result['first_person_commitment'] is False
+        assert 'error' in result
+
+
+class TestLLMResultCache:
+
+    def test_roundtrip_and_key_components(self):
+        cache = LLMResultCache(':memory:', enabled=True)
+        cache.put('llama3', 'speech-v1', '本文', {'budget_mentioned': True})
+        assert cache.get('llama3', 'speech-v1', '本文') == {'budget_mentioned': True}
+        # モデル・テンプレートバージョン・入力のどれかが違えば別キー
+        assert cache.get('llama3', 'speech-v2', '本文') is None
+        assert cache.get('qwen', 'speech-v1', '本文') is None
+        assert cache.get('llama3', 'speech-v1', '本文2') is None
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_expired_entries_are_ignored(self):
+        cache = LLMResultCache(':memory:', ttl_days=0, enabled=True)
+        cache.put('llama3', 'v1', 'text', {'x': 1})
+        assert cache.get('llama3', 'v1', 'text') is None
+
+    def test_evicts_least_recently_used(self):
+        cache = LLMResultCache(':memory:', max_entries=2, enabled=True)
+        cache.put('m', 'v1', 'a', 1)
+        cache.put('m', 'v1', 'b', 2)
+        cache.put('m', 'v1', 'c', 3)
+        cache.get('m', 'v1', 'a')
+        cache.evict()
+        assert len(cache) == 2
+        assert cache.get('m', 'v1', 'a') == 1
+
+    def test_analyzer_skips_cached_inputs(self):
+        calls = {'n': 0}
+
+        def handler(request):
+            calls['n'] += 1
+            return ollama_response()
+
+        cache = LLMResultCache(':memory:', enabled=True)
+        analyzer = OllamaAnalyzer(cache=cache, concurrency=2, transport=httpx.MockTransport(handler))
+        analyzer.analyze_speeches({'000001': 'a', '000002': 'b'})
+        results = analyzer.analyze_speeches({'000001': 'a', '000002': 'b', '000003': 'c'})
+        assert calls['n'] == 3
+        assert len(results) == 3
+
+    def test_failures_are_not_cached(self):
+        cache = LLMResultCache(':memory:', enabled=True)
+        analyzer = OllamaAnalyzer(cache=cache, concurrency=1, max_retries=0,
+                                  transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+        analyzer.analyze_speeches({'000001': 'a'})
+        assert len(cache) == 0
@@ -385,3 +385,180 @@ class TestRegionMapping:
         assert REGIONS['大阪府'] == '近畿地方'
         assert REGIONS['沖縄県'] == '九州・沖縄地方'
         assert REGIONS['愛知県'] == '中部地方'
+
+
+# ============================================================
+# 8. バルクモード（ベクトル計算）の回帰テスト
+# ============================================================
+
+def make_bulk_row(city_code, dx_status, giga=None, news_count=0, max_news_count=10,
+                  prefecture='東京都'):
+    """fetch_bulk_inputs() が返す1行分のモックデータを生成する"""
+    return {
+        'city_code': city_code,
+        'city_name': f'テスト市{city_code}',
+        'prefecture': prefecture,
+        'population': 50000,
+        'latitude': 35.0,
+        'longitude': 139.0,
+        'dx_status': dx_status,
+        'computer_per_student': giga,
+        'pattern_id': 1,
+        'pattern_name': 'DX Leaders',
+        'news_count': news_count,
+        'max_news_count': max_news_count,
+    }
+
+
+class TestBulkScoring:
+    """バルクモードが単一自治体算出と同じ結果を返すことを保証"""
+
+    BULK_ROWS = [
+        make_bulk_row('011002', {
+            '住民サービスのDX_マイナンバーカードの保有状況': '75%',
+            '住民サービスのDX_オンライン手続の導入状況_32手続（内閣府・総務省が規定）': '20/26',
+            '住民サービスのDX_オンライン手続の導入状況_26手続（総務省が規定）': '15/20',
+            '自治体DXの推進体制等_全体方針策定': '実施',
+            '自治体DXの推進体制等_CIOの任命': '任命済',
+            '自治体業務のDX_AIの導入状況': '導入済',
+        }, giga=0.8, news_count=10),
+        make_bulk_row('131041', {
+            '住民サービスのDX_マイナンバーカードの保有状況': '60%',
+            '自治体DXの推進体制等_外部人材活用': '活用中',
+            '自治体業務のDX_RPAの導入状況': '未導入',
+        }, giga=1.2, news_count=3),
+        make_bulk_row('271004', None, news_count=0),
+    ]
+
+    def test_bulk_matches_scalar(self, calculator):
+        """バルク計算の各カテゴリがスカラー計算と一致する"""
+        calculator.cur.fetchall.return_value = self.BULK_ROWS
+        results = calculator.calculate_all_scores(bulk=True)
+
+        assert [r['city_code'] for r in results] == ['011002', '131041', '271004']
+        for row, result in zip(self.BULK_ROWS, results):
+            dx = row['dx_status'] or {}
+            cat1 = calculator.calculate_category1_improved(dx)
+            cat2 = calculator.calculate_category2_normalized(dx)
+            cat3 = calculator.calculate_category3_normalized(dx)
+            cat4 = min(float(row['computer_per_student'] or 0), 1.0) * 10
+            cat5 = min(row['news_count'] / row['max_news_count'], 1.0) * 10
+            cats = result['category_scores']
+            assert cats['citizen_services'] == round(cat1, 1)
+            assert cats['promotion_system'] == round(cat2, 1)
+            assert cats['business_dx'] == round(cat3, 1)
+            assert cats['education_dx'] == round(cat4, 1)
+            assert cats['information'] == round(cat5, 1)
+            assert result['total_score'] == min(round(cat1 + cat2 + cat3 + cat4 + cat5, 1), 100.0)
+
+    def test_bulk_stats_exclude_missing_dx(self, calculator):
+        """Z-score統計はdx_statusを持つ自治体のみから算出される"""
+        calculator.cur.fetchall.return_value = self.BULK_ROWS
+        calculator.calculate_all_scores(bulk=True)
+
+        # 011002: 推進体制2項目、131041: 1項目 → 平均1.5（dx_statusなしの271004は除外）
+        assert calculator._cat2_stats['mean'] == 1.5
+        assert calculator._max_news_count == 10
+
+    def test_bulk_single_query(self, calculator):
+        """バルクモードは自治体数に関わらず1回のクエリで入力を取得する"""
+        calculator.cur.fetchall.return_value = self.BULK_ROWS
+        calculator.calculate_all_scores(bulk=True)
+        assert calculator.cur.execute.call_count == 1
+
+    def test_bulk_empty(self, calculator):
+        """自治体0件の場合は空リスト"""
+        calculator.cur.fetchall.return_value = []
+        assert calculator.calculate_all_scores(bulk=True) == []
+
+
+# ============================================================
+# 9. dx_status特徴量行列の回帰テスト
+# ============================================================
+
+class TestDxFeatureMatrix:
+    """特徴量抽出がスカラーパーサーと同じ値を返すことを保証"""
+
+    def test_columns_match_parsers(self, calculator):
+        """各列の値がパーサーの結果と一致する"""
+        from services.dx_features import DxFeatureMatrix
+        dx = TestBulkScoring.BULK_ROWS[0]['dx_status']
+        row = DxFeatureMatrix.from_dx(dx, '011002').row('011002')
+
+        assert abs(row['mynumber_rate'] - 0.75) < 1e-9
+        assert (row['online32_num'], row['online32_den']) == (20, 26)
+        assert (row['online26_num'], row['online26_den']) == (15, 20)
+        assert row['policy'] == 1.0
+        assert row['cio_appointed'] == 1.0
+        assert row['rpa'] == 0.0
+
+    def test_missing_dx_status(self):
+        """dx_statusなし（NULL）は全指標0、has_dx=False"""
+        from services.dx_features import DxFeatureMatrix
+        features = DxFeatureMatrix.from_rows(TestBulkScoring.BULK_ROWS)
+        assert list(features.has_dx) == [True, True, False]
+        assert features.row('271004')['policy'] == 0.0
+        assert features.row('999999') is None
+
+    def test_lite_schema_columns(self):
+        """Decision Readiness用の簡易スキーマ列"""
+        from services.dx_features import DxFeatureMatrix
+        dx = {'dept': True, 'cio': 'あり', 'ext_cio': 'なし', 'cloud_migration': '進行中'}
+        row = DxFeatureMatrix.from_dx(dx, 'x').row('x')
+        assert row['dept'] == 1.0
+        assert row['cio'] == 1.0
+        assert row['ext_cio'] == 0.0
+        assert row['cloud_migration'] == 1.0
+        assert row['lgwan_connection'] == 1.0  # 未設定時はLGWAN接続ありとみなす
+
+    def test_stats_parse_once(self, calculator):
+        """カテゴリ2・3統計は同じ特徴量行列を共有し、クエリは1回のみ"""
+        calculator.cur.fetchall.return_value = [
+            {'city_code': r['city_code'], 'dx_status': r['dx_status']}
+            for r in TestBulkScoring.BULK_ROWS if r['dx_status'] is not None
+        ]
+        calculator.get_category2_stats()
+        calculator.get_category3_stats()
+        assert calculator.cur.execute.call_count == 1
+        assert calculator._cat3_stats['mean'] == 0.5
+
+
+# ============================================================
+# 10. COPYベースの一括UPSERT
+# ============================================================
+
+class TestBulkWrite:
+    """スコア保存が1回のCOPY + 1文のマージで行われることを保証"""
+
+    def test_write_scores_single_copy_and_merge(self, calculator):
+        calculator.cur.fetchall.return_value = TestBulkScoring.BULK_ROWS
+        results = calculator.calculate_all_scores(bulk=True)
+        calculator.cur.execute.reset_mock()
+
+        stats = calculator.write_scores(results)
+
+        cursor = calculator.conn.cursor.return_value
+        assert cursor.copy_expert.call_count == 1
+        copy_sql, buf = cursor.copy_expert.call_args[0]
+        assert 'COPY tmp_bulk_dx_scores_improved' in copy_sql
+        lines = buf.getvalue().strip().split('\n')
+        assert len(lines) == 3
+        assert lines[0].startswith('011002,')
+
+        statements = [c[0][0] for c in cursor.execute.call_args_list]
+        merges = [s for s in statements if 'INSERT INTO dx_scores_improved' in s]
+        assert len(merges) == 1
+        assert 'ON CONFLICT (city_code) DO UPDATE SET' in merges[0]
+        assert 'updated_at = NOW()' in merges[0]
+        calculator.conn.commit.assert_called_once()
+
+        assert stats.rows == 3
+        assert stats.rows_per_sec > 0
+
+    def test_write_scores_rollback_on_error(self, calculator):
+        cursor = calculator.conn.cursor.return_value
+        cursor.copy_expert.side_effect = RuntimeError('copy failed')
+        with pytest.raises(RuntimeError):
+            calculator.write_scores([])
+        calculator.conn.rollback.assert_called_once()
+        calculator.conn.commit.assert_not_called()
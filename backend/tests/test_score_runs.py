@@ -0,0 +1,328 @@
+"""
+スコア算出ランのテスト (test_score_runs.py)
+
+DBは使わず、psycopg2 カーソル／非同期セッションをモックして
+ラン作成 → 公開 → 旧ラン削除の流れと、API側の読み分けを確認する。
+"""
+import asyncio
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import exc as sa_exc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from services.score_runs import published_run_id, rollback_run, snapshot_scores
+
+
+def make_conn(fetchone=None, fetchall=None, rowcount=1741):
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = fetchone or []
+    cursor.fetchall.return_value = fetchall or []
+    cursor.rowcount = rowcount
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    return conn, cursor
+
+
+def executed_sql(cursor):
+    return [' '.join(c.args[0].split()) for c in cursor.execute.call_args_list]
+
+
+class TestSnapshotScores:
+    def test_create_publish_prune(self):
+        # 初回ラン（公開中のランなし）
+        conn, cursor = make_conn(fetchone=[('a', 'b'), None, (42,)], fetchall=[(30,), (29,)])
+        run_id = snapshot_scores(conn, 'dx_improved', keep=14)
+
+        assert run_id == 42
+        sql = executed_sql(cursor)
+        assert sql[1].startswith('SELECT run_id FROM score_run_pointer')
+        assert sql[2].startswith('INSERT INTO score_runs')
+        assert 'INSERT INTO dx_score_snapshots' in sql[3] and 'FROM dx_scores_improved' in sql[3]
+        assert sql[4].startswith('UPDATE score_runs SET row_count')
+        assert 'score_run_pointer' in sql[5] and 'ON CONFLICT (kind)' in sql[5]
+        assert sql[7].startswith('DELETE FROM score_runs')
+        # 公開中のランは削除対象外、保持数はパラメータで渡す
+        assert 'NOT IN (SELECT run_id FROM score_run_pointer)' in sql[7]
+        assert cursor.execute.call_args_list[7].args[1] == ('dx_improved', 'dx_improved', 14)
+        # 呼び出し側のトランザクションでコミットする
+        conn.commit.assert_not_called()
+
+    def test_readiness_snapshot_copies_latest_per_city(self):
+        conn, cursor = make_conn(fetchone=[('a', 'b'), None, (7,)])
+        snapshot_scores(conn, 'decision_readiness')
+        sql = executed_sql(cursor)[3]
+        assert 'INSERT INTO readiness_score_snapshots' in sql
+        assert 'DISTINCT ON (city_code)' in sql and 'ORDER BY city_code, scored_at DESC' in sql
+
+    def test_deltas_against_published_run(self):
+        """直前の公開ランを比較元として差分を保存してから公開する"""
+        from unittest.mock import patch
+
+        conn, cursor = make_conn(fetchone=[('a', 'b'), (41,), (42,)])
+        with patch('services.score_runs.record_deltas', return_value=3) as record:
+            snapshot_scores(conn, 'dx_improved')
+        record.assert_called_once_with(conn, 'dx_improved', 42, 41)
+
+    def test_missing_tables(self):
+        conn, cursor = make_conn(fetchone=[(None, None)])
+        assert snapshot_scores(conn, 'dx_improved') is None
+        assert len(cursor.execute.call_args_list) == 1
+
+
+class TestRollback:
+    def test_rollback_restores_live_table(self):
+        conn, cursor = make_conn(fetchone=[('dx_improved',)])
+        rollback_run(conn, 'dx_improved', 41)
+        sql = executed_sql(cursor)
+        assert 'INSERT INTO dx_scores_improved' in sql[1] and 'FROM dx_score_snapshots' in sql[1]
+        assert sql[2].startswith('DELETE FROM dx_scores_improved')
+        assert 'score_run_pointer' in sql[3]
+        assert cursor.execute.call_args_list[3].args[1] == ('dx_improved', 41)
+
+    def test_rollback_pointer_only_for_readiness(self):
+        conn, cursor = make_conn(fetchone=[('decision_readiness',)])
+        rollback_run(conn, 'decision_readiness', 5)
+        sql = executed_sql(cursor)
+        assert not any('dx_scores_improved' in q for q in sql)
+        assert 'score_run_pointer' in sql[1]
+
+    @pytest.mark.parametrize('row', [None, ('decision_readiness',)])
+    def test_rollback_unknown_run(self, row):
+        conn, cursor = make_conn(fetchone=[row])
+        with pytest.raises(ValueError):
+            rollback_run(conn, 'dx_improved', 99)
+
+
+class TestPublishedRun:
+    def test_missing_table(self):
+        class Session:
+            rolled_back = False
+
+            async def execute(self, *args, **kwargs):
+                raise sa_exc.ProgrammingError('SELECT', {}, Exception('relation does not exist'))
+
+            async def rollback(self):
+                self.rolled_back = True
+
+        session = Session()
+        assert asyncio.run(published_run_id(session, 'dx_improved')) is None
+        assert session.rolled_back
+
+    def test_ranking_reads_published_snapshot(self, client):
+        """公開中のランがあればランキングはそのスナップショットを読む"""
+        from database import get_async_db
+
+        executed = []
+
+        class Result:
+            def __init__(self, value=None):
+                self.value = value
+
+            def scalar(self):
+                return self.value
+
+            def mappings(self):
+                return []
+
+        class Session:
+            async def execute(self, statement, params=None):
+                executed.append((str(statement), params))
+                if 'score_run_pointer' in str(statement):
+                    return Result(12)
+                return Result()
+
+        async def fake_db():
+            yield Session()
+
+        app.dependency_overrides[get_async_db] = fake_db
+        try:
+            response = client.get('/api/scores/ranking/北海道')
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        query, params = executed[-1]
+        assert 'readiness_score_snapshots' in query
+        assert params == {'prefecture': '北海道', 'run_id': 12}
+
+    def test_score_reads_published_snapshot(self, client):
+        """単一自治体のスコアも公開中のラン（ロールバック後は戻したラン）を読む"""
+        from datetime import datetime
+        from database import get_async_db
+
+        executed = []
+        row = {
+            'city_code': '011002', 'city_name': '札幌市', 'prefecture': '北海道',
+            'total_score': 61, 'confidence_level': 'high', 'scored_at': datetime(2026, 10, 16, 3, 0),
+            'structural_pressure': 12, 'leadership_commitment': 13, 'peer_pressure': 11,
+            'feasibility': 12, 'accountability': 13, 'evidence_urls': None, 'signal_keywords': None,
+        }
+
+        class Result:
+            def __init__(self, value=None):
+                self.value = value
+
+            def scalar(self):
+                return self.value
+
+            def mappings(self):
+                return self
+
+            def first(self):
+                return self.value
+
+        class Session:
+            async def execute(self, statement, params=None):
+                executed.append((str(statement), params))
+                if 'score_run_pointer' in str(statement):
+                    return Result(5)
+                return Result(row)
+
+        async def fake_db():
+            yield Session()
+
+        app.dependency_overrides[get_async_db] = fake_db
+        try:
+            response = client.get('/api/scores/011002')
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert response.json()['total_score'] == 61
+        query, params = executed[-1]
+        assert 'FROM readiness_score_snapshots s' in query
+        assert params == {'city_code': '011002', 'run_id': 5}
+
+
+class TestScoreDeltas:
+    spec = None
+
+    def setup_method(self):
+        from services.score_deltas import DELTA_SPECS
+        self.spec = DELTA_SPECS['decision_readiness']
+
+    @staticmethod
+    def row(total, **pillars):
+        return {'total_score': total, **pillars}
+
+    def test_only_changed_and_new_cities(self):
+        from services.score_deltas import compute_deltas
+
+        before = {'011002': self.row(55.0, feasibility=10.0), '012025': self.row(40.0, feasibility=8.0)}
+        after = {
+            '011002': self.row(62.4, feasibility=12.5),
+            '012025': self.row(40.0, feasibility=8.0),
+            '013030': self.row(30.0),
+        }
+        deltas = {d.city_code: d for d in compute_deltas(before, after, self.spec)}
+
+        assert set(deltas) == {'011002', '013030'}
+        moved = deltas['011002']
+        assert moved.total_delta == 7.4
+        assert moved.pillar_deltas == {'feasibility': 2.5}
+        assert moved.crossed == [{'threshold': 60.0, 'direction': 'up'}]
+        assert deltas['013030'].total_before is None and deltas['013030'].crossed == []
+
+    def test_summarize(self):
+        from services.score_deltas import compute_deltas, summarize
+
+        before = {c: self.row(v) for c, v in [('a', 70.0), ('b', 50.0), ('c', 85.0)]}
+        after = {c: self.row(v) for c, v in [('a', 81.0), ('b', 55.0), ('c', 79.0), ('d', 20.0)]}
+        feed = summarize(compute_deltas(before, after, self.spec), self.spec, limit=1)
+
+        assert feed['summary'] == {'changed': 4, 'new': 1, 'up': 2, 'down': 1, 'crossed': 2}
+        assert [d['city_code'] for d in feed['gainers']] == ['a']
+        assert [d['city_code'] for d in feed['decliners']] == ['c']
+        assert [d['city_code'] for d in feed['crossed']] == ['a']
+
+
+class TestMoversRoute:
+    def request(self, client, url, handler):
+        from database import get_async_db
+
+        class Result:
+            def __init__(self, rows=None, value=None):
+                self.rows = rows or []
+                self.value = value
+
+            def scalar(self):
+                return self.value
+
+            def mappings(self):
+                return self
+
+            def first(self):
+                return self.rows[0] if self.rows else None
+
+            def __iter__(self):
+                return iter(self.rows)
+
+        class Session:
+            async def execute(self, statement, params=None):
+                return Result(*handler(' '.join(str(statement).split()), params))
+
+            async def rollback(self):
+                pass
+
+        async def fake_db():
+            yield Session()
+
+        app.dependency_overrides[get_async_db] = fake_db
+        try:
+            return client.get(url)
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_stored_deltas_against_previous_run(self, client):
+        def handler(sql, params):
+            if 'score_run_pointer' in sql:
+                return None, 42
+            if 'FROM score_runs' in sql:
+                return [{'run_id': 42, 'kind': 'dx_improved', 'base_run_id': 41,
+                         'created_at': None, 'published_at': None}], None
+            if 'FROM score_run_deltas' in sql:
+                return [{'city_code': '011002', 'total_before': 40.0, 'total_after': 43.5,
+                         'total_delta': 3.5, 'pillar_deltas': {'cat_business_dx': 3.5},
+                         'crossed': [{'threshold': 42.0, 'direction': 'up'}]}], None
+            if 'FROM municipalities' in sql:
+                assert params == {'codes': ['011002']}
+                return [{'city_code': '011002', 'city_name': '札幌市', 'prefecture': '北海道'}], None
+            raise AssertionError(sql)
+
+        response = self.request(client, '/api/v1/map/movers', handler)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['run_id'] == 42 and data['base_run_id'] == 41 and data['changed']
+        assert data['summary']['up'] == 1 and data['summary']['crossed'] == 1
+        assert data['gainers'][0]['city_name'] == '札幌市'
+
+    def test_unchanged_since_run(self, client):
+        def handler(sql, params):
+            if 'score_run_pointer' in sql:
+                return None, 42
+            if 'FROM score_runs' in sql:
+                return [{'run_id': 42, 'kind': 'dx_improved', 'base_run_id': 41,
+                         'created_at': None, 'published_at': None}], None
+            raise AssertionError(sql)
+
+        data = self.request(client, '/api/v1/map/movers?since_run=42', handler).json()
+        assert data['changed'] is False and 'gainers' not in data
+
+    def test_pruned_base_run(self, client):
+        def handler(sql, params):
+            if 'score_run_pointer' in sql:
+                return None, 42
+            if 'FROM score_runs' in sql:
+                return [{'run_id': 42, 'kind': 'dx_improved', 'base_run_id': 41,
+                         'created_at': None, 'published_at': None}], None
+            if 'FROM dx_score_snapshots' in sql:
+                return [], None
+            raise AssertionError(sql)
+
+        response = self.request(client, '/api/v1/map/movers?since_run=3', handler)
+        assert response.status_code == 404
@@ -0,0 +1,60 @@
+"""
+夜間スコアリング差分判定のテスト
+"""
+from services.scoring_fingerprints import StoredFingerprint, plan_incremental, text_hash
+
+ANALYSIS = {'bert_score': 15, 'ollama_keywords': ['budget'], 'ollama_score': 0}
+
+
+class TestPlanIncremental:
+
+    def test_new_cities_are_rescored_with_text_analysis(self):
+        plan = plan_incremental({'000001': 'a'}, {}, {'000001': text_hash('本文')})
+        assert plan.rescore == ['000001']
+        assert plan.analyze_text == ['000001']
+
+    def test_unchanged_city_is_skipped(self):
+        stored = {'000001': StoredFingerprint('a', text_hash('本文'), ANALYSIS)}
+        plan = plan_incremental({'000001': 'a'}, stored, {'000001': text_hash('本文')})
+        assert plan.unchanged == ['000001']
+        assert plan.rescore == []
+
+    def test_input_change_reuses_text_analysis(self):
+        """DB入力だけ変わった自治体は再計算するがテキスト分析は省略"""
+        stored = {'000001': StoredFingerprint('a', text_hash('本文'), ANALYSIS)}
+        plan = plan_incremental({'000001': 'b'}, stored, {'000001': text_hash('本文')})
+        assert plan.rescore == ['000001']
+        assert plan.analyze_text == []
+        assert plan.reused_analysis == {'000001': ANALYSIS}
+
+    def test_text_change_triggers_analysis(self):
+        stored = {'000001': StoredFingerprint('a', text_hash('旧本文'), ANALYSIS)}
+        plan = plan_incremental({'000001': 'a'}, stored, {'000001': text_hash('新本文')})
+        assert plan.analyze_text == ['000001']
+
+    def test_failed_analysis_is_retried(self):
+        """前回テキスト分析に失敗した（text_hash なし）自治体は再分析"""
+        stored = {'000001': StoredFingerprint('a', None, None)}
+        plan = plan_incremental({'000001': 'a'}, stored, {'000001': text_hash('本文')})
+        assert plan.analyze_text == ['000001']
+
+    def test_lite_mode_ignores_text(self):
+        stored = {'000001': StoredFingerprint('a', None, None), '000002': StoredFingerprint('x', None, None)}
+        plan = plan_incremental({'000001': 'a', '000002': 'y'}, stored)
+        assert plan.unchanged == ['000001']
+        assert plan.rescore == ['000002']
+        assert plan.analyze_text == []
+
+    def test_lite_mode_reuses_stored_analysis(self):
+        """Liteモードでもフル版の分析結果を使う（AIなしのスコアで上書きしない）"""
+        stored = {'000001': StoredFingerprint('a', text_hash('本文'), ANALYSIS),
+                  '000002': StoredFingerprint('x', None, None)}
+        plan = plan_incremental({'000001': 'b', '000002': 'y'}, stored)
+        assert plan.rescore == ['000001', '000002']
+        assert plan.reused_analysis == {'000001': ANALYSIS}
+
+    def test_full_run_still_reuses_analysis(self):
+        stored = {'000001': StoredFingerprint('a', text_hash('本文'), ANALYSIS)}
+        plan = plan_incremental({'000001': 'a'}, stored, full=True)
+        assert plan.rescore == ['000001']
+        assert plan.reused_analysis == {'000001': ANALYSIS}
@@ -0,0 +1,285 @@
+"""
+自治体ベクタータイル（MVT）のテスト
+
+エンコード結果はテスト内の最小限の protobuf デコーダーで読み戻して確認する。
+"""
+import asyncio
+import struct
+
+import numpy as np
+import pytest
+
+from services import vector_tiles as vt
+
+
+# --- 最小限の protobuf デコーダー ---
+
+def read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return result, pos
+
+
+def parse(buf):
+    """{field: [value, ...]}（length-delimited は bytes のまま）"""
+    fields, pos = {}, 0
+    while pos < len(buf):
+        key, pos = read_varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = read_varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            length, pos = read_varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        else:
+            raise ValueError(wire)
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def packed(buf):
+    values, pos = [], 0
+    while pos < len(buf):
+        v, pos = read_varint(buf, pos)
+        values.append(v)
+    return values
+
+
+def decode_value(buf):
+    f = parse(buf)
+    if 1 in f:
+        return f[1][0].decode('utf-8')
+    if 3 in f:
+        return struct.unpack('<d', f[3][0])[0]
+    if 6 in f:
+        v = f[6][0]
+        return (v >> 1) ^ -(v & 1)
+    raise ValueError(f)
+
+
+def decode_tile(data):
+    layer = parse(parse(data)[3][0])
+    keys = [k.decode('utf-8') for k in layer.get(3, [])]
+    values = [decode_value(v) for v in layer.get(4, [])]
+    features = []
+    for raw in layer.get(2, []):
+        f = parse(raw)
+        tags = packed(f[2][0])
+        props = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+        features.append({'id': f[1][0], 'type': f[3][0], 'props': props,
+                         'rings': decode_rings(packed(f[4][0]))})
+    return {'name': layer[1][0].decode('utf-8'), 'version': layer[15][0],
+            'extent': layer[5][0], 'features': features}
+
+
+def decode_rings(commands):
+    rings, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        cmd, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if cmd == 7:
+            continue
+        points = []
+        for _ in range(count):
+            dx, dy = commands[i], commands[i + 1]
+            x += (dx >> 1) ^ -(dx & 1)
+            y += (dy >> 1) ^ -(dy & 1)
+            points.append((x, y))
+            i += 2
+        if cmd == 1:
+            rings.append(points)
+        else:
+            rings[-1].extend(points)
+    return rings
+
+
+# --- テスト用の境界 ---
+
+def square(lon0, lat0, lon1, lat1):
+    return [[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]]
+
+
+def make_geojson():
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature',
+         'properties': {'N03_001': '北海道', 'N03_004': '札幌市', 'N03_007': '01100'},
+         'geometry': {'type': 'Polygon', 'coordinates': [
+             square(141.2, 42.9, 141.5, 43.2),
+             square(141.3, 43.0, 141.4, 43.1),  # 穴
+         ]}},
+        {'type': 'Feature',
+         'properties': {'N03_001': '北海道', 'N03_004': '小樽市', 'N03_007': '01203'},
+         'geometry': {'type': 'MultiPolygon', 'coordinates': [
+             [square(140.9, 43.1, 141.1, 43.25)],
+             [square(140.95, 43.3, 140.96, 43.31)],  # 小さな島
+         ]}},
+    ]}
+
+
+ATTRIBUTES = vt.tile_attributes([
+    {'city_code': '011002', 'prefecture': '北海道', 'total_score': 72.345},
+    {'city_code': '012033', 'prefecture': '北海道', 'total_score': None},
+])
+
+
+def tile_for(lon, lat, z):
+    x, y = vt.project(np.array([lon]), np.array([lat]))[0] * 2 ** z
+    return int(x), int(y)
+
+
+@pytest.fixture
+def boundaries():
+    return vt.BoundarySet.from_geojson(make_geojson())
+
+
+class TestEncoding:
+    def test_varint(self):
+        assert vt._varint(1) == b'\x01'
+        assert vt._varint(300) == b'\xac\x02'
+
+    def test_zigzag(self):
+        assert vt._zigzag(np.array([0, -1, 1, -2], dtype=np.int64)).tolist() == [0, 1, 2, 3]
+
+    def test_geometry_commands(self):
+        ring = np.array([[0, 0], [10, 0], [10, 10]], dtype=np.int64)
+        # MoveTo(1) 0,0 / LineTo(2) +10,0 0,+10 / ClosePath
+        assert vt.encode_geometry([[ring]]) == [9, 0, 0, 18, 20, 0, 0, 20, 15]
+
+
+class TestGeometry:
+    def test_clip_ring(self):
+        ring = np.array([[-100.0, -100.0], [200.0, -100.0], [200.0, 200.0], [-100.0, 200.0]])
+        clipped = vt.clip_ring(ring, 0, 100)
+        assert clipped.min() == 0 and clipped.max() == 100
+        assert abs(vt.signed_area(clipped)) == 100 * 100
+
+    def test_clip_ring_outside(self):
+        ring = np.array([[200.0, 200.0], [300.0, 200.0], [300.0, 300.0]])
+        assert len(vt.clip_ring(ring, 0, 100)) == 0
+
+    def test_simplify_drops_collapsed_ring(self):
+        ring = np.array([[0.0, 0.0], [3.0, 0.0], [3.0, 3.0]])
+        assert vt.simplify_ring(ring, 16) is None
+        assert vt.simplify_ring(ring * 100, 16) is not None
+
+
+class TestRenderTile:
+    def test_sapporo_tile(self, boundaries):
+        x, y = tile_for(141.35, 43.05, 8)
+        tile = decode_tile(vt.render_tile(boundaries, ATTRIBUTES, 8, x, y))
+
+        assert tile['name'] == 'municipalities'
+        assert tile['version'] == 2 and tile['extent'] == 4096
+        sapporo = next(f for f in tile['features'] if f['props']['N03_004'] == '札幌市')
+        assert sapporo['type'] == 3
+        assert sapporo['props']['city_code'] == '011002'
+        assert sapporo['props']['total_score'] == 72.3
+        assert sapporo['props']['N03_007'] == '01100'
+        # 外周は正の面積、穴は負の面積（MVT の巻き方向）
+        outer, hole = sapporo['rings']
+        assert vt.signed_area(np.array(outer)) > 0
+        assert vt.signed_area(np.array(hole)) < 0
+
+    def test_score_missing(self, boundaries):
+        x, y = tile_for(141.0, 43.2, 8)
+        tile = decode_tile(vt.render_tile(boundaries, ATTRIBUTES, 8, x, y))
+        otaru = next(f for f in tile['features'] if f['props']['N03_004'] == '小樽市')
+        assert 'total_score' not in otaru['props']
+
+    def test_small_island_dropped_at_low_zoom(self, boundaries):
+        x, y = tile_for(141.0, 43.2, 4)
+        low = decode_tile(vt.render_tile(boundaries, ATTRIBUTES, 4, x, y))
+        otaru = next(f for f in low['features'] if f['props']['N03_004'] == '小樽市')
+        assert len(otaru['rings']) == 1
+
+        x, y = tile_for(140.955, 43.305, 12)
+        high = decode_tile(vt.render_tile(boundaries, ATTRIBUTES, 12, x, y))
+        assert [f['props']['N03_004'] for f in high['features']] == ['小樽市']
+
+    def test_empty_tile(self, boundaries):
+        x, y = tile_for(135.0, 35.0, 8)
+        assert vt.render_tile(boundaries, ATTRIBUTES, 8, x, y) == b''
+
+
+class TestTileDiskCache:
+    def test_prunes_old_versions(self, tmp_path):
+        cache = vt.TileDiskCache(str(tmp_path))
+        cache.put('v1', 8, 1, 2, b'old')
+        assert cache.get('v1', 8, 1, 2) == b'old'
+        cache.put('v2', 8, 1, 2, b'new')
+        assert cache.get('v2', 8, 1, 2) == b'new'
+        assert cache.get('v1', 8, 1, 2) is None
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_stale_render_does_not_prune_newer_version(self, tmp_path, boundaries, monkeypatch):
+        """描画中にバージョンが進んだ場合、古い世代の書き込みで新しい世代を消さない"""
+        tiles = vt.MunicipalityTiles(cache=vt.TileDiskCache(str(tmp_path)), attribute_ttl=3600)
+        tiles.set_boundaries(boundaries)
+        tiles.set_attributes(ATTRIBUTES, 'v1')
+        render = vt.render_tile
+        seen = []
+
+        def render_then_rescore(boundaries, attributes, z, x, y):
+            seen.append(attributes)
+            tiles.set_attributes({}, 'v2')
+            tiles.cache.put('v2', z, x, y, b'new')
+            return render(boundaries, attributes, z, x, y)
+
+        monkeypatch.setattr(vt, 'render_tile', render_then_rescore)
+        x, y = tile_for(141.35, 43.05, 8)
+        data, version = asyncio.run(tiles.tile(None, 8, x, y))
+
+        assert version == 'v1' and seen == [ATTRIBUTES]
+        assert decode_tile(data)['features']
+        assert tiles.cache.get('v2', 8, x, y) == b'new'
+
+
+class TestTileEndpoint:
+
+    @pytest.fixture
+    def tiles(self, tmp_path, boundaries):
+        from main import app
+        from database import get_async_db
+        from routers.map_data import municipality_tiles
+
+        async def no_db():
+            yield None
+
+        original_cache = municipality_tiles.cache
+        municipality_tiles.cache = vt.TileDiskCache(str(tmp_path))
+        municipality_tiles.set_boundaries(boundaries)
+        municipality_tiles.set_attributes(ATTRIBUTES, 'v1')
+        app.dependency_overrides[get_async_db] = no_db
+        yield municipality_tiles
+        app.dependency_overrides.clear()
+        municipality_tiles.cache = original_cache
+        municipality_tiles._boundaries = None
+        municipality_tiles.invalidate()
+
+    def test_tile_and_etag(self, client, tiles):
+        x, y = tile_for(141.35, 43.05, 8)
+        response = client.get(f'/api/v1/map/tiles/municipalities/8/{x}/{y}.mvt')
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/vnd.mapbox-vector-tile'
+        assert decode_tile(response.content)['features']
+
+        # 2回目はディスクキャッシュから、ETag 一致なら304
+        assert tiles.cache.get('v1', 8, x, y) == response.content
+        etag = response.headers['etag']
+        again = client.get(f'/api/v1/map/tiles/municipalities/8/{x}/{y}.mvt',
+                           headers={'If-None-Match': f'"other", {etag}'})
+        assert again.status_code == 304
+        assert 'Accept-Encoding' in response.headers['vary']
+
+    def test_empty_and_out_of_range(self, client, tiles):
+        x, y = tile_for(135.0, 35.0, 8)
+        assert client.get(f'/api/v1/map/tiles/municipalities/8/{x}/{y}.mvt').status_code == 204
+        assert client.get('/api/v1/map/tiles/municipalities/20/0/0.mvt').status_code == 404
+        assert client.get('/api/v1/map/tiles/municipalities/8/999/0.mvt').status_code == 404
@@ -1,9 +1,17 @@
 import math
 import os
-from typing import Tuple, Optional
-import jageocoder
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.geocode_cache import Coords, GeocodeCache, normalize_address
+from utils.mesh import encode_mesh
+
+JAGEOCODER_DB_DIR = os.getenv("JAGEOCODER_DB_DIR", "/app/data/jageocoder_db")
+# batch geocoding: worker processes (each loads its own jageocoder dictionary)
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "1"))
 
 # JIS X 0410 Standard Area Mesh calculation
+# 配列をまとめて変換する場合は utils.mesh.encode_mesh を使うこと
 
 def lat_lon_to_mesh(lat: float, lon: float, level: int = 3) -> str:
     """
@@ -15,95 +23,132 @@ def lat_lon_to_mesh(lat: float, lon: float, level: int = 3) -> str:
     Level 4: 9 digits (approx 500m) - Half standard
     Level 5: 10 digits (approx 250m) - Quarter standard
     """
-    
-    # 1st Mesh
-    # Lat difference: 40 mins (2/3 degree)
-    # Lon difference: 1 degree
-    lat_1 = int(lat * 1.5)
-    lon_1 = int(lon - 100.0)
-    
-    code = f"{lat_1}{lon_1}"
-    if level == 1:
-        return code
-        
-    # 2nd Mesh (8x8 breakdown of 1st)
-    # Lat diff: 5 mins (1/12 degree)
-    # Lon diff: 7.5 mins (1/8 degree)
-    res_lat_1 = lat * 1.5 - lat_1
-    res_lon_1 = lon - 100.0 - lon_1
-    
-    lat_2 = int(res_lat_1 * 8)
-    lon_2 = int(res_lon_1 * 8)
-    
-    code += f"{lat_2}{lon_2}"
-    if level == 2:
-        return code
-        
-    # 3rd Mesh (10x10 breakdown of 2nd) - Basic Grid
-    # Lat diff: 30 secs
-    # Lon diff: 45 secs
-    res_lat_2 = res_lat_1 * 8 - lat_2
-    res_lon_2 = res_lon_1 * 8 - lon_2
-    
-    lat_3 = int(res_lat_2 * 10)
-    lon_3 = int(res_lon_2 * 10)
-    
-    code += f"{lat_3}{lon_3}"
-    if level == 3:
-        return code
-        
-    # 4th Mesh (2x2 breakdown of 3rd) - Half Grid
-    res_lat_3 = res_lat_2 * 10 - lat_3
-    res_lon_3 = res_lon_2 * 10 - lon_3
-    
-    lat_4 = int(res_lat_3 * 2)
-    lon_4 = int(res_lon_3 * 2)
-    
-    # 1=SW, 2=SE, 3=NW, 4=NE (JIS convention: 1 for lower-left, 2 for lower-right...)
-    # Actually:
-    # lat 0, lon 0 -> 1
-    # lat 0, lon 1 -> 2
-    # lat 1, lon 0 -> 3
-    # lat 1, lon 1 -> 4
-    n_4 = (lat_4 * 2) + (lon_4 + 1)
-    
-    code += f"{n_4}"
-    
-    if level == 4:
-        return code
+    return str(int(encode_mesh(lat, lon, level)))
 
-    # Higher levels logic can be added if needed
-    return code
 
-def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+_geocoder_ready: Optional[bool] = None
+
+
+def _init_geocoder() -> bool:
     """
-    Geocode address string to (lat, lon) using jageocoder.
-    Returns None if not found or dictionary not initialized.
+    Initialize jageocoder once per process.
+    Returns False if the package or the dictionary is unavailable.
     """
+    global _geocoder_ready
+    if _geocoder_ready is not None:
+        return _geocoder_ready
     try:
-        # Check if jageocoder is initialized
-        if not jageocoder.is_initialized():
-            # Try to init with default (env var or default path)
-            db_dir = os.getenv("JAGEOCODER_DB_DIR", "/app/data/jageocoder_db")
-            if os.path.exists(db_dir):
-                try:
-                    jageocoder.init(db_dir=db_dir)
-                except Exception as e:
-                    print(f"❌ jageocoder init failed: {e}")
-                    return None
-            else:
-                 # print(f"❌ DB dir not found: {db_dir}")
-                 return None
+        import jageocoder
+    except ImportError:
+        print("❌ jageocoder is not installed")
+        _geocoder_ready = False
+        return False
+
+    if jageocoder.is_initialized():
+        _geocoder_ready = True
+    elif not os.path.exists(JAGEOCODER_DB_DIR):
+        print(f"❌ DB dir not found: {JAGEOCODER_DB_DIR}")
+        _geocoder_ready = False
+    else:
+        try:
+            jageocoder.init(db_dir=JAGEOCODER_DB_DIR)
+            _geocoder_ready = True
+        except Exception as e:
+            print(f"❌ jageocoder init failed: {e}")
+            _geocoder_ready = False
+    return _geocoder_ready
+
+
+# shared by geocode_address / geocode_addresses in this process
+geocode_cache = GeocodeCache(dictionary=JAGEOCODER_DB_DIR)
+
+
+# Returned by _search when the lookup itself failed (locked/corrupt dictionary, worker
+# crash, ...). Unlike None ("not found") it is never cached, so the address is retried.
+# A plain string so that it survives pickling across the process pool.
+SEARCH_ERROR = "__geocode_error__"
+
 
+def _search(address: str):
+    """Raw jageocoder lookup (no cache). None if not found, SEARCH_ERROR on failure."""
+    import jageocoder
+    try:
         results = jageocoder.searchNode(address)
-        if results and len(results) > 0:
-            # Best match
-            node = results[0].node
-            return (node.y, node.x) # lat, lon
-        
-        print(f"⚠️ No results for '{address}'")
-        return None
-        
     except Exception as e:
         print(f"❌ Geocoding error: {e}")
+        return SEARCH_ERROR
+    if results:
+        # Best match
+        node = results[0].node
+        return (node.y, node.x)  # lat, lon
     return None
+
+
+def _search_many(addresses: List[str]) -> Optional[List[Coords]]:
+    """
+    Worker entry point: geocode a chunk of normalized addresses.
+    None if jageocoder is unavailable in this process.
+    """
+    if not _init_geocoder():
+        return None
+    return [_search(address) for address in addresses]
+
+
+def geocode_addresses(addresses: Iterable[str], workers: int = GEOCODE_WORKERS,
+                      cache: Optional[GeocodeCache] = None) -> Dict[str, Coords]:
+    """
+    Geocode many addresses at once.
+
+    Addresses are normalized and deduplicated first; only those not in the
+    cache are searched (in-process, or over a process pool with one
+    jageocoder instance per worker when workers > 1).
+
+    Returns {original address: (lat, lon) or None}.
+    """
+    cache = cache if cache is not None else geocode_cache
+    keys = {address: normalize_address(address) for address in addresses if address}
+    unique = list(dict.fromkeys(k for k in keys.values() if k))
+
+    resolved = cache.get_many(unique)
+    pending = [k for k in unique if k not in resolved]
+    if pending:
+        if workers > 1 and len(pending) > 1:
+            chunksize = max(1, min(1000, len(pending) // (workers * 4)))
+            chunks = [pending[i:i + chunksize] for i in range(0, len(pending), chunksize)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_geocoder) as pool:
+                parts = list(pool.map(_search_many, chunks))
+        else:
+            chunks = [pending]
+            parts = [_search_many(pending)]
+        searched = {}
+        failed = 0
+        for chunk, found in zip(chunks, parts):
+            # Dictionary unavailable: leave uncached so a later run retries
+            if found is None:
+                continue
+            for key, coords in zip(chunk, found):
+                # Lookup errors are not "no match": leave uncached so a later run retries
+                if coords == SEARCH_ERROR:
+                    failed += 1
+                else:
+                    searched[key] = coords
+        cache.put_many(searched)
+        resolved.update(searched)
+        if failed:
+            print(f"⚠️ {failed} addresses failed to geocode (not cached, will be retried)")
+        unavailable = len(pending) - len(searched) - failed
+        if unavailable:
+            print(f"⚠️ {unavailable} addresses not geocoded (jageocoder unavailable)")
+
+    return {address: resolved.get(key) for address, key in keys.items()}
+
+
+def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+    """
+    Geocode address string to (lat, lon) using jageocoder.
+    Returns None if not found or dictionary not initialized.
+    Results (including misses, but not lookup errors) are cached; see services/geocode_cache.py.
+    """
+    if not address:
+        return None
+    return geocode_addresses([address], workers=1).get(address)
@@ -3,6 +3,12 @@ import axios from 'axios';
 
 const API_BASE = import.meta.env.VITE_API_BASE || import.meta.env.VITE_API_URL || '';
 
+// 自治体境界のベクタータイル（スコア属性埋め込み済み、レイヤー名 municipalities）
+// MapLibre はタイルURLを Worker で解決するため絶対URLにする
+export const MUNICIPALITY_TILE_URL =
+    `${API_BASE || window.location.origin}/api/v1/map/tiles/municipalities/{z}/{x}/{y}.mvt`;
+export const MUNICIPALITY_TILE_LAYER = 'municipalities';
+
 const api = axios.create({
     baseURL: API_BASE,
     timeout: 10000,
@@ -74,11 +80,47 @@ export interface MunicipalityDetail extends MunicipalityData {
     news: NewsItem[];
     national_rank: number;
     total_municipalities: number;
+    ranks?: {
+        national: RankEntry;
+        prefecture: RankEntry;
+        population_band: RankEntry & { band: string };
+    };
     similar_municipalities: Array<{
         city_name: string;
         population: number;
         total_score: number;
     }>;
+    nearest_peers?: Array<{
+        city_code: string;
+        city_name: string;
+        prefecture: string;
+        population: number | null;
+        total_score: number | null;
+        distance: number;
+    }>;
+    spatial?: SpatialSummary;
+}
+
+export interface SpatialSummary {
+    mesh_count: number;
+    companies: {
+        count: number;
+        certified: number;
+        cert_counts: Record<string, number>;
+        per_mesh: number | null;
+    };
+    buildings: {
+        count: number;
+        avg_height: number | null;
+        height_bands: Record<string, number>;
+        age_bands: Record<string, number>;
+    };
+}
+
+export interface RankEntry {
+    rank: number | null;
+    total: number | null;
+    percentile: number | null;
 }
 
 export interface StatsData {
@@ -93,6 +135,31 @@ export interface StatsData {
     }>;
 }
 
+// スコア変動フィード（/api/v1/map/movers）
+export interface CityMove {
+    city_code: string;
+    city_name: string | null;
+    prefecture: string | null;
+    total_before: number | null;
+    total_after: number;
+    total_delta: number | null;
+    pillar_deltas: Record<string, number>;
+    crossed: Array<{ threshold: number; direction: 'up' | 'down' }>;
+}
+
+export interface MoversFeed {
+    kind: string;
+    run_id: number | null;
+    base_run_id: number | null;
+    published_at: string | null;
+    changed: boolean;
+    summary?: { changed: number; new: number; up: number; down: number; crossed: number };
+    pillar_summary?: Record<string, { up: number; down: number }>;
+    gainers?: CityMove[];
+    decliners?: CityMove[];
+    crossed?: CityMove[];
+}
+
 // ドリルダウンの階層レベル
 export type ViewLevel = 'national' | 'region' | 'prefecture' | 'municipality';
 
@@ -116,10 +183,36 @@ export async function fetchMunicipalities(
     const params: Record<string, string> = {};
     if (prefecture) params.prefecture = prefecture;
     if (region) params.region = region;
-    const { data } = await api.get<MunicipalityData[]>('/api/v1/map/municipalities', { params });
+    const data = await fetchMunicipalityColumns(params);
+    return columnsToRows<MunicipalityData>(data);
+}
+
+// 列形式（struct-of-arrays）のレスポンス。キー名の繰り返しが無く転送量が小さい
+export interface ColumnarResponse {
+    length: number;
+    fields: string[];
+    columns: Record<string, unknown[]>;
+}
+
+export async function fetchMunicipalityColumns(
+    params: Record<string, string> = {}
+): Promise<ColumnarResponse> {
+    const { data } = await api.get<ColumnarResponse>('/api/v1/map/municipalities', {
+        params: { ...params, format: 'columns' },
+    });
     return data;
 }
 
+export function columnsToRows<T>(data: ColumnarResponse): T[] {
+    const rows: T[] = [];
+    for (let i = 0; i < data.length; i++) {
+        const row: Record<string, unknown> = {};
+        for (const field of data.fields) row[field] = data.columns[field][i];
+        rows.push(row as T);
+    }
+    return rows;
+}
+
 export async function fetchMunicipalityDetail(cityCode: string): Promise<MunicipalityDetail> {
     const { data } = await api.get<MunicipalityDetail>(`/api/v1/map/municipality/${cityCode}`);
     return data;
@@ -130,6 +223,18 @@ export async function fetchStats(): Promise<StatsData> {
     return data;
 }
 
+// 前回確認した run_id を渡すと、新しいランが無い場合は changed=false だけが返る
+export async function fetchMovers(
+    kind: 'dx_improved' | 'decision_readiness' = 'dx_improved',
+    sinceRun?: number,
+    limit = 20
+): Promise<MoversFeed> {
+    const params: Record<string, string | number> = { kind, limit };
+    if (sinceRun !== undefined) params.since_run = sinceRun;
+    const { data } = await api.get<MoversFeed>('/api/v1/map/movers', { params });
+    return data;
+}
+
 // ===== ユーティリティ =====
 
 // DXスコアに対応する色を返す（改善版スコア対応: 10-54点範囲）
@@ -16,6 +16,8 @@ import {
     REGION_CENTERS,
     PREFECTURE_CENTERS,
     fetchPrefectures,
+    MUNICIPALITY_TILE_URL,
+    MUNICIPALITY_TILE_LAYER,
 } from '../api/mapApi';
 
 // MapLibre GL JS: トークン不要、CARTOタイルを使用
@@ -54,8 +56,6 @@ export default function MapView({
     const [allPrefScores, setAllPrefScores] = useState<Record<string, number>>({});
     // 全都道府県データ（地方情報を含む、ナビゲーション用）
     const [allPrefecturesData, setAllPrefecturesData] = useState<PrefectureData[]>([]);
-    // 自治体境界GeoJSON（コロプレスマップ用）
-    const [municipalityGeoJson, setMunicipalityGeoJson] = useState<any>(null);
 
     // MapLibre初期化
     useEffect(() => {
@@ -108,8 +108,6 @@ export default function MapView({
             loadBoundaries();
             // 全都道府県スコアを取得（コロプレス用）
             loadAllPrefectureScores();
-            // 自治体境界データを読み込み（コロプレス用）
-            loadMunicipalityBoundaries();
         });
 
         return () => {
@@ -133,20 +131,6 @@ export default function MapView({
         }
     };
 
-    // 自治体境界GeoJSONを読み込み（コロプレス用）
-    const loadMunicipalityBoundaries = async () => {
-        try {
-            const response = await fetch(
-                'https://raw.githubusercontent.com/smartnews-smri/japan-topography/main/data/municipality/geojson/s0001/N03-21_210101.json'
-            );
-            const geojson = await response.json();
-            setMunicipalityGeoJson(geojson);
-            console.log('✅ 自治体境界データ読み込み完了:', geojson.features.length, '件');
-        } catch (err) {
-            console.error('自治体境界データ読み込みエラー:', err);
-        }
-    };
-
     // 境界線データの読み込みと追加
     const loadBoundaries = async () => {
         if (!map.current) return;
@@ -244,13 +228,16 @@ export default function MapView({
 
     // 自治体境界レイヤーを追加（コロプレス用）
     const addMunicipalityBoundaryLayers = () => {
-        if (!map.current || !municipalityGeoJson) return;
+        if (!map.current) return;
         if (map.current.getSource('municipality-boundaries')) return;
 
-        // 自治体境界ソース追加
+        // 自治体境界ソース追加（バックエンドのベクタータイル、ズームに応じて簡略化済み）
+        // 12より先はクライアント側で拡大表示する
         map.current.addSource('municipality-boundaries', {
-            type: 'geojson',
-            data: municipalityGeoJson,
+            type: 'vector',
+            tiles: [MUNICIPALITY_TILE_URL],
+            minzoom: 3,
+            maxzoom: 12,
         });
 
         // 塗りつぶしレイヤー（初期は非表示）
@@ -258,6 +245,7 @@ export default function MapView({
             id: 'municipality-fill',
             type: 'fill',
             source: 'municipality-boundaries',
+            'source-layer': MUNICIPALITY_TILE_LAYER,
             paint: {
                 'fill-color': '#1f6feb',
                 'fill-opacity': 0,
@@ -269,6 +257,7 @@ export default function MapView({
             id: 'municipality-borders',
             type: 'line',
             source: 'municipality-boundaries',
+            'source-layer': MUNICIPALITY_TILE_LAYER,
             paint: {
                 'line-color': '#58a6ff',
                 'line-width': 1.5, // 太くして見やすく
@@ -281,6 +270,7 @@ export default function MapView({
             id: 'municipality-labels',
             type: 'symbol',
             source: 'municipality-boundaries',
+            'source-layer': MUNICIPALITY_TILE_LAYER,
             layout: {
                 'text-field': ['get', 'N03_004'], // 市区町村名
                 'text-font': ['Open Sans Regular', 'Arial Unicode MS Regular'],
@@ -307,11 +297,11 @@ export default function MapView({
         console.log('✅ 自治体境界レイヤー追加完了');
     };
 
-    // 自治体境界GeoJSONが読み込まれたらレイヤーを追加
+    // 地図の準備ができたら自治体境界レイヤーを追加（タイルは表示範囲の分だけ取得される）
     useEffect(() => {
-        if (!mapReady || !municipalityGeoJson) return;
+        if (!mapReady) return;
         addMunicipalityBoundaryLayers();
-    }, [mapReady, municipalityGeoJson]);
+    }, [mapReady]);
 
     // デバッグ: マップ全体のクリックイベントをログ
     useEffect(() => {
@@ -484,20 +474,13 @@ export default function MapView({
             total_score: m.total_score
         })));
 
-        // GeoJSONのN03_007サンプルを確認
-        const features = municipalityGeoJson?.features?.slice(0, 3);
-        console.log('🔍 GeoJSON N03_007 sample:', features?.map((f: any) => ({
-            name: f.properties.N03_004,
-            code: f.properties.N03_007
-        })));
-
         // 自治体のcity_codeとスコアのマッピング（重複排除）
         const codeToColor: Map<string, string> = new Map();
         const scoreDebug: Array<{name: string, code: string, score: number, color: string}> = [];
         municipalities.forEach(muni => {
             const score = muni.total_score || 0;
             // city_codeを5桁に正規化
-            // GeoJSONは5桁標準コード、APIは6桁（末尾にチェックディジット）
+            // タイルのN03_007は5桁標準コード、APIは6桁（末尾にチェックディジット）
             const normalizedCode = muni.city_code.length === 6
                 ? muni.city_code.substring(0, 5)  // 末尾1桁を削除して5桁に
                 : muni.city_code;
@@ -536,7 +519,7 @@ export default function MapView({
         console.log('✅ 自治体コロプレスマップ適用完了:', municipalities.length, '件');
         console.log('📊 Match expression length:', matchExpr.length, 'entries');
         console.log('🔍 First 10 match entries:', matchExpr.slice(3, 23));
-    }, [mapReady, municipalities, municipalityGeoJson]);
+    }, [mapReady, municipalities]);
 
     // マーカーをクリア
     const clearMarkers = () => {
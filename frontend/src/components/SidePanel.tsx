@@ -68,6 +68,13 @@ export default function SidePanel({ municipality: m, onClose }: Props) {
                 <div className="score-rank">
                     全国 {m.national_rank || '-'} 位 / {m.total_municipalities || '-'}
                 </div>
+                {m.ranks && (
+                    <div className="score-rank">
+                        {m.prefecture} {m.ranks.prefecture.rank || '-'} 位 / {m.ranks.prefecture.total || '-'}
+                        {' ・ '}
+                        {m.ranks.population_band.band} {m.ranks.population_band.rank || '-'} 位 / {m.ranks.population_band.total || '-'}
+                    </div>
+                )}
             </div>
 
             {/* パターンバッジ */}